@@ -0,0 +1,89 @@
+"""
+Memory and allocation micro-benchmark of the DNS query representations.
+
+Parses the same query into many objects and reports, for each representation, the memory retained per object and the
+number of allocations per parsed query, measured with tracemalloc. DictDNSQuery reproduces the previous DNSQuery, a
+dataclass with a per-instance __dict__, as the baseline.
+
+Run with: python -m benchmarks.custom_types_memory
+"""
+import argparse
+import tracemalloc
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from src.dns_query_resolver import DNSQueryResolver
+from src.fast_dns_query_resolver import FastDNSQueryResolver
+from src.custom_types.dns_query import DNSQuery
+from src.custom_types.dns_record_type import DNSRecordType
+from src.custom_types.edns_options import EDNSOptions
+
+EXAMPLE_QUERY = b"\x12\x34\x01\x20\x00\x01\x00\x00\x00\x00\x00\x00\x03www\x07example\x03com\x00\x00\x01\x00\x01"
+
+
+@dataclass
+class DictDNSQuery:
+    original_query: bytes
+    transaction_id: bytes
+    flags: bytes
+    question_count: int
+    answer_count: int
+    authority_count: int
+    additional_count: int
+    question: bytes
+    domain_name: str
+    domain_name_key: bytes
+    query_type: DNSRecordType
+    query_class: int
+    edns: Optional[EDNSOptions]
+
+
+def read_dict_dns_query(query_data: bytes) -> DictDNSQuery:
+    dns_query = DNSQueryResolver().read_query(query_data)
+    return DictDNSQuery(**{field: getattr(dns_query, field) for field in DNSQuery.__slots__})
+
+
+def measure(create: Callable[[bytes], object], count: int) -> dict:
+    """
+    Creates count objects from distinct copies of the example query and measures the memory they retain.
+
+    :param create: A callable parsing a raw query into the measured representation.
+    :param count: The number of objects to create.
+    :return: The retained bytes per object and the allocations per object.
+    """
+    queries = [bytes(EXAMPLE_QUERY) + bytes([index % 256]) for index in range(count)]
+    tracemalloc.start()
+    baseline = tracemalloc.take_snapshot()
+    objects = [create(query_data) for query_data in queries]
+    snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    statistics = snapshot.compare_to(baseline, "filename")
+    retained_bytes = sum(statistic.size_diff for statistic in statistics)
+    allocations = sum(statistic.count_diff for statistic in statistics)
+    del objects
+    return {
+        "bytes_per_query": retained_bytes / count,
+        "allocations_per_query": allocations / count,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=100000, help="Number of queries parsed per representation.")
+    args = parser.parse_args()
+
+    fast_dns_query_resolver = FastDNSQueryResolver()
+    dns_query_resolver = DNSQueryResolver()
+    representations = {
+        "DictDNSQuery (baseline)": read_dict_dns_query,
+        "DNSQuery (slotted)": dns_query_resolver.read_query,
+        "LazyDNSQuery": fast_dns_query_resolver.read_query,
+    }
+    print(f"{'representation':<26}{'bytes/query':>14}{'allocs/query':>14}")
+    for name, create in representations.items():
+        result = measure(create, args.count)
+        print(f"{name:<26}{result['bytes_per_query']:>14.1f}{result['allocations_per_query']:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+"""
+Load generator and benchmark suite of the DNS query and register request paths.
+
+Scenarios:
+- query: DNS queries drawn from a configurable mix of cache hits (registered names), misses (unknown names), malformed
+  queries and non-A (AAAA) queries.
+- register: register requests for new names, with a share of malformed requests.
+
+Each scenario runs against the target(s):
+- inprocess: calls DNSServer.handle_dns_query or DNSServer.handle_register_request directly.
+- loopback: sends UDP datagrams to a DNSServer served by a forked process on 127.0.0.1, keeping --concurrency requests
+  in flight and matching the responses by transaction ID.
+
+Every run reports the throughput, the p50/p99/p999 latencies and, for the in-process target, the memory allocated per
+request measured with tracemalloc on a separate pass. Results are printed and can be saved as JSON with --output, then
+compared with a previous run with --compare. Queries and requests are generated from --seed, so runs are reproducible.
+
+Run with: python -m benchmarks.dns_benchmark [--scenario query register] [--target inprocess loopback]
+          [--count 100000] [--mix hit=90,miss=5,malformed=3,non_a=2] [--output results.json] [--compare previous.json]
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import platform
+import random
+import select
+import socket
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+
+from src.async_dns_server import AsyncDNSServer
+from src.batched_dns_server import BatchedDNSServer
+from src.dns_register import DNSRegister
+from src.dns_query_resolver import DNSQueryResolver
+from src.dns_server import DNSServer
+from src.domain_name_codec import DomainNameCodec
+from src.fast_dns_query_resolver import FastDNSQueryResolver
+from src.register_request_resolver import RegisterRequestResolver
+
+QUERY_KINDS = ("hit", "miss", "malformed", "non_a")
+REGISTERED_NAME_COUNT = 1000
+QUERY_HEADER = b"\x01\x00\x00\x01\x00\x00\x00\x00\x00\x00"
+ALLOCATION_SAMPLE_COUNT = 10000
+
+
+class LoopbackDNSServer(DNSServer):
+    """
+    DNSServer bound to ephemeral loopback ports instead of ports 53 and 8080.
+    """
+    @staticmethod
+    def create_dns_query_socket(address: Tuple[str, int] = ("127.0.0.1", 0), reuse_port: bool = False):
+        return DNSServer.create_dns_query_socket(address=address, reuse_port=reuse_port)
+
+    @staticmethod
+    def create_register_request_socket():
+        register_request_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        register_request_socket.bind(("127.0.0.1", 0))
+        return register_request_socket
+
+
+def parse_mix(mix: str) -> Dict[str, int]:
+    weights = {}
+    for item in mix.split(","):
+        kind, _, weight = item.partition("=")
+        if kind not in QUERY_KINDS:
+            raise argparse.ArgumentTypeError(f"Unknown query kind {kind}, expected one of {', '.join(QUERY_KINDS)}.")
+        weights[kind] = int(weight)
+    return weights
+
+
+def registered_name(index: int) -> str:
+    return f"host{index}.example.com"
+
+
+def build_query(domain_name: str, query_type: int) -> bytes:
+    return b"\x00\x00" + QUERY_HEADER + DomainNameCodec.encode(domain_name) + query_type.to_bytes(2, "big") \
+        + b"\x00\x01"
+
+
+def build_register_request(domain_name: str, ip_address: str) -> bytes:
+    wire_name = DomainNameCodec.encode(domain_name)
+    return b"\x00\x00\x00\x01" + bytes((len(wire_name) - 1,)) + wire_name + b"\x00\x04" + socket.inet_aton(ip_address)
+
+
+def generate_queries(count: int, weights: Dict[str, int], seed: int) -> List[bytes]:
+    """
+    Generates a reproducible list of DNS queries following the query mix.
+
+    :param count: The number of queries.
+    :param weights: The relative weight of each query kind.
+    :param seed: The seed of the random generator.
+    :return: The queries, with a zero transaction ID.
+    """
+    generator = random.Random(seed)
+    kinds = generator.choices(list(weights), weights=list(weights.values()), k=count)
+    queries = []
+    for index, kind in enumerate(kinds):
+        if kind == "hit":
+            queries.append(build_query(registered_name(generator.randrange(REGISTERED_NAME_COUNT)), 1))
+        elif kind == "miss":
+            queries.append(build_query(f"missing{index}.example.net", 1))
+        elif kind == "malformed":
+            queries.append(build_query(registered_name(0), 1)[:generator.randrange(2, 16)])
+        else:
+            queries.append(build_query(registered_name(generator.randrange(REGISTERED_NAME_COUNT)), 28))
+    return queries
+
+
+def generate_register_requests(count: int, seed: int, malformed_percent: int = 5) -> List[bytes]:
+    """
+    Generates a reproducible list of register requests for new names, some of them malformed.
+
+    :param count: The number of register requests.
+    :param seed: The seed of the random generator.
+    :param malformed_percent: The share of malformed register requests, in percent.
+    :return: The register requests, with a zero transaction ID.
+    """
+    generator = random.Random(seed)
+    requests = []
+    for index in range(count):
+        request = build_register_request(f"new{index}.example.org", f"10.{index >> 16 & 255}.{index >> 8 & 255}."
+                                                                    f"{index & 255}")
+        if generator.randrange(100) < malformed_percent:
+            request = request[:generator.randrange(2, len(request) - 1)]
+        requests.append(request)
+    return requests
+
+
+def create_dns_server(resolver: str) -> LoopbackDNSServer:
+    dns_server = LoopbackDNSServer(
+        dns_resolver=FastDNSQueryResolver() if resolver == "fast" else DNSQueryResolver(),
+        dns_register=DNSRegister(records={}),
+        register_request_resolver=RegisterRequestResolver()
+    )
+    dns_server.dns_register.load_records((registered_name(index), f"10.0.{index >> 8}.{index & 255}")
+                                         for index in range(REGISTERED_NAME_COUNT))
+    return dns_server
+
+
+def summarize(latencies: List[int], elapsed: float, lost_count: int = 0) -> dict:
+    """
+    Summarizes the latencies of a run.
+
+    :param latencies: The latency of each answered request, in nanoseconds.
+    :param elapsed: The duration of the run, in seconds.
+    :param lost_count: The number of requests left without response.
+    :return: The throughput and latency percentiles of the run.
+    """
+    latencies = sorted(latencies)
+
+    def percentile(fraction: float) -> float:
+        if not latencies:
+            return 0.0
+        return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] / 1000
+
+    return {
+        "count": len(latencies),
+        "lost": lost_count,
+        "seconds": round(elapsed, 3),
+        "qps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "latency_us": {
+            "p50": percentile(0.5),
+            "p99": percentile(0.99),
+            "p999": percentile(0.999),
+            "max": percentile(1.0),
+        },
+    }
+
+
+def measure_allocations(handle: Callable[[bytes], bytes], requests: List[bytes]) -> dict:
+    """
+    Measures the memory allocated while handling requests with tracemalloc.
+
+    :param handle: The handler of a request.
+    :param requests: The requests to handle.
+    :return: The peak and retained memory per request, in bytes.
+    """
+    tracemalloc.start()
+    start_memory, _ = tracemalloc.get_traced_memory()
+    for request in requests:
+        handle(request)
+    current_memory, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "peak_bytes": peak_memory - start_memory,
+        "retained_bytes_per_request": round((current_memory - start_memory) / len(requests), 1),
+    }
+
+
+def run_inprocess(handle: Callable[[bytes], bytes], requests: List[bytes], warmup_count: int) -> dict:
+    """
+    Times each request handled by an in-process handler.
+
+    :param handle: The handler of a request, such as DNSServer.handle_dns_query.
+    :param requests: The requests to handle, their transaction ID is replaced by a counter.
+    :param warmup_count: The number of requests handled before timing, to fill the caches.
+    :return: The summary of the run, with its allocations.
+    """
+    requests = [index.to_bytes(4, "big")[2:] + request[2:] for index, request in enumerate(requests)]
+    for request in requests[:warmup_count]:
+        handle(request)
+    latencies = []
+    perf_counter_ns = time.perf_counter_ns
+    start = time.perf_counter()
+    for request in requests:
+        request_start = perf_counter_ns()
+        handle(request)
+        latencies.append(perf_counter_ns() - request_start)
+    result = summarize(latencies, time.perf_counter() - start)
+    result["allocations"] = measure_allocations(handle, requests[:ALLOCATION_SAMPLE_COUNT])
+    return result
+
+
+def serve(dns_server: DNSServer, mode: str):
+    if mode == "asyncio":
+        AsyncDNSServer(dns_server).listen()
+    elif mode == "batched":
+        BatchedDNSServer(dns_server).listen()
+    else:
+        dns_server.listen()
+
+
+def run_loopback(address: Tuple[str, int], requests: List[bytes], concurrency: int, timeout: float = 1.0) -> dict:
+    """
+    Sends requests over UDP, keeping up to concurrency requests in flight, and times each response.
+
+    :param address: The address of the server socket.
+    :param requests: The requests to send, their transaction ID is replaced by a counter.
+    :param concurrency: The maximum number of requests in flight.
+    :param timeout: The number of seconds after which the requests in flight are counted as lost.
+    :return: The summary of the run.
+    """
+    client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    client.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+    client.connect(address)
+    sent_at = {}  # type: Dict[bytes, int]
+    latencies = []
+    lost_count = 0
+    next_index = 0
+    perf_counter_ns = time.perf_counter_ns
+    start = time.perf_counter()
+    while next_index < len(requests) or sent_at:
+        while len(sent_at) < concurrency and next_index < len(requests):
+            transaction_id = (next_index & 0xFFFF).to_bytes(2, "big")
+            client.send(transaction_id + requests[next_index][2:])
+            sent_at[transaction_id] = perf_counter_ns()
+            next_index += 1
+        ready_sockets, _, _ = select.select([client], [], [], timeout)
+        if not ready_sockets:
+            lost_count += len(sent_at)
+            sent_at.clear()
+            continue
+        response = client.recv(65535)
+        request_start = sent_at.pop(response[:2], None)
+        if request_start is not None:
+            latencies.append(perf_counter_ns() - request_start)
+    elapsed = time.perf_counter() - start
+    client.close()
+    return summarize(latencies, elapsed, lost_count)
+
+
+def compare(results: List[dict], previous_path: str):
+    with open(previous_path) as previous_file:
+        previous = {(result["scenario"], result["target"]): result for result in json.load(previous_file)["results"]}
+    print(f"\nCompared with {previous_path}:")
+    for result in results:
+        baseline = previous.get((result["scenario"], result["target"]))
+        if baseline is None:
+            continue
+        qps_change = (result["qps"] / baseline["qps"] - 1) * 100 if baseline["qps"] else 0.0
+        p99_change = (result["latency_us"]["p99"] / baseline["latency_us"]["p99"] - 1) * 100 \
+            if baseline["latency_us"]["p99"] else 0.0
+        print(f"{result['scenario']:<10}{result['target']:<11}qps {qps_change:+7.1f}%   p99 {p99_change:+7.1f}%")
+
+
+def print_result(result: dict):
+    latency = result["latency_us"]
+    print(f"{result['scenario']:<10}{result['target']:<11}{result['qps']:>12.0f}{latency['p50']:>10.1f}"
+          f"{latency['p99']:>10.1f}{latency['p999']:>10.1f}{result['lost']:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", nargs="+", choices=["query", "register"], default=["query", "register"])
+    parser.add_argument("--target", nargs="+", choices=["inprocess", "loopback"], default=["inprocess", "loopback"])
+    parser.add_argument("--count", type=int, default=100000, help="Number of requests per run.")
+    parser.add_argument("--mix", type=parse_mix, default="hit=90,miss=5,malformed=3,non_a=2",
+                        help="Relative weights of the query kinds: hit, miss, malformed and non_a.")
+    parser.add_argument("--warmup", type=int, default=1000, help="Number of in-process requests handled untimed.")
+    parser.add_argument("--concurrency", type=int, default=16, help="Number of loopback requests in flight.")
+    parser.add_argument("--mode", choices=["select", "asyncio", "batched"], default="select",
+                        help="Serving engine of the loopback server.")
+    parser.add_argument("--resolver", choices=["standard", "fast"], default="fast")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Path of the JSON file the results are saved to.")
+    parser.add_argument("--compare", help="Path of a previous JSON results file to compare the results with.")
+    args = parser.parse_args()
+    # Malformed register requests are logged as warnings, keep the output of the runs out of the measures
+    logging.getLogger("src").setLevel(logging.ERROR)
+
+    queries = generate_queries(args.count, args.mix, args.seed)
+    register_requests = generate_register_requests(args.count, args.seed)
+    results = []
+    print(f"{'scenario':<10}{'target':<11}{'qps':>12}{'p50 us':>10}{'p99 us':>10}{'p999 us':>10}{'lost':>7}")
+    for scenario in args.scenario:
+        requests = queries if scenario == "query" else register_requests
+        for target in args.target:
+            dns_server = create_dns_server(args.resolver)
+            if target == "inprocess":
+                handle = dns_server.handle_dns_query if scenario == "query" else dns_server.handle_register_request
+                result = run_inprocess(handle, requests, args.warmup)
+            else:
+                address = (dns_server.dns_query_socket if scenario == "query"
+                           else dns_server.register_request_socket).getsockname()
+                server_process = multiprocessing.get_context("fork").Process(
+                    target=serve, args=(dns_server, args.mode), daemon=True)
+                server_process.start()
+                try:
+                    result = run_loopback(address, requests, args.concurrency)
+                finally:
+                    server_process.terminate()
+                    server_process.join()
+            dns_server.dns_query_socket.close()
+            dns_server.register_request_socket.close()
+            result = dict(scenario=scenario, target=target, **result)
+            results.append(result)
+            print_result(result)
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump({
+                "python": sys.version.split()[0],
+                "platform": platform.platform(),
+                "arguments": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+                "results": results,
+            }, output_file, indent=2)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Memory and lookup time benchmark of ReverseLabelTrie against a plain dictionary of domain names.
+
+Indexes the same generated names, spread over a thousand zones, in a dictionary and in a ReverseLabelTrie, and reports
+the memory each index retains, measured with tracemalloc, and the time of exact and wildcard lookups.
+
+Run with: python -m benchmarks.label_trie_memory [--count 1000000]
+"""
+import argparse
+import time
+import tracemalloc
+from typing import Callable, List
+
+from src.label_trie import ReverseLabelTrie
+
+ZONE_COUNT = 1000
+IP_ADDRESS = "10.0.0.1"
+
+
+def generate_domain_names(count: int) -> List[str]:
+    return [f"host{index}.zone{index % ZONE_COUNT}.example.com" for index in range(count)]
+
+
+def build_dict(count: int) -> dict:
+    return {domain_name: IP_ADDRESS for domain_name in generate_domain_names(count)}
+
+
+def build_trie(count: int) -> ReverseLabelTrie:
+    trie = ReverseLabelTrie()
+    for domain_name in generate_domain_names(count):
+        trie.insert(domain_name, IP_ADDRESS)
+    for zone in range(ZONE_COUNT):
+        trie.insert(f"*.zone{zone}.example.com", IP_ADDRESS)
+    return trie
+
+
+def measure_memory(build: Callable[[int], object], count: int) -> float:
+    """
+    Builds an index of generated domain names and measures the memory it retains, including the name strings.
+
+    :param build: A callable building the index of count generated domain names.
+    :param count: The number of domain names to index.
+    :return: The retained bytes per domain name.
+    """
+    tracemalloc.start()
+    baseline = tracemalloc.take_snapshot()
+    index = build(count)
+    snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    retained_bytes = sum(statistic.size_diff for statistic in snapshot.compare_to(baseline, "filename"))
+    del index
+    return retained_bytes / count
+
+
+def measure_lookups(lookup: Callable[[str], object], domain_names: List[str]) -> float:
+    """
+    Times a lookup function over a list of domain names.
+
+    :param lookup: The lookup function to time.
+    :param domain_names: The domain names to look up.
+    :return: The mean lookup time in nanoseconds.
+    """
+    start = time.perf_counter()
+    for domain_name in domain_names:
+        lookup(domain_name)
+    return (time.perf_counter() - start) / len(domain_names) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=1000000, help="Number of domain names indexed.")
+    args = parser.parse_args()
+
+    dict_bytes = measure_memory(build_dict, args.count)
+    trie_bytes = measure_memory(build_trie, args.count)
+    print(f"{'index':<20}{'bytes/name':>14}")
+    print(f"{'dict':<20}{dict_bytes:>14.1f}")
+    print(f"{'ReverseLabelTrie':<20}{trie_bytes:>14.1f}")
+
+    domain_names = generate_domain_names(args.count)
+    records = build_dict(args.count)
+    trie = build_trie(args.count)
+    sample = domain_names[::max(1, len(domain_names) // 100000)]
+    wildcard_sample = ["missing." + domain_name.split(".", 1)[1] for domain_name in sample]
+    print(f"{'lookup':<30}{'ns/lookup':>14}")
+    print(f"{'dict.get (exact)':<30}{measure_lookups(records.get, sample):>14.1f}")
+    print(f"{'trie.get (exact)':<30}{measure_lookups(trie.get, sample):>14.1f}")
+    print(f"{'trie.lookup (wildcard)':<30}{measure_lookups(trie.lookup, wildcard_sample):>14.1f}")
+    print(f"{'trie.closest_encloser':<30}{measure_lookups(trie.closest_encloser, wildcard_sample):>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+import asyncio
+import functools
+import logging
+import time
+from typing import Optional, Set, Tuple
+
+from src.dns_metrics import SEND_STAGE
+from src.dns_response_factory import MIN_UDP_PAYLOAD_SIZE
+from src.dns_server import DNSServer
+from src.tcp_dns_server import TCPDNSServer
+
+logger = logging.getLogger(__name__)
+
+
+class DNSQueryProtocol(asyncio.DatagramProtocol):
+    """
+    DNSQueryProtocol answers DNS query datagrams received on the DNS query socket.
+
+    Attributes:
+    -----------
+    dns_server: DNSServer
+        The DNSServer whose query pipeline is used to generate the responses.
+    transport: asyncio.DatagramTransport
+        The transport of the DNS query socket, set once the endpoint is created.
+    forward_tasks: Set[asyncio.Future]
+        The tasks forwarding queries to the upstream resolvers, referenced until they are done so that they are not
+        garbage collected while pending.
+    """
+    def __init__(self, dns_server: DNSServer):
+        self.dns_server = dns_server
+        self.transport = None
+        self.forward_tasks = set()  # type: Set[asyncio.Future]
+
+    def connection_made(self, transport: asyncio.DatagramTransport):
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, client_address: Tuple[str, int]):
+        """
+        Handles a DNS query datagram and sends the generated response back to the client.
+
+        :param data: The raw bytes of the DNS query message.
+        :param client_address: The address of the client that sent the query.
+        """
+        dns_response = self.dns_server.handle_dns_query(data)
+        if dns_response is None:
+            # The response is sent once the upstream resolvers answer, without blocking the other queries
+            forward_task = asyncio.ensure_future(self.forward_dns_query(data, client_address))
+            self.forward_tasks.add(forward_task)
+            forward_task.add_done_callback(self.forward_done)
+            return
+        self.send_response(data, dns_response, client_address)
+
+    async def forward_dns_query(self, data: bytes, client_address: Tuple[str, int]):
+        """
+        Forwards a DNS query to the upstream resolvers of the DNSServer's forwarder and sends their response back.
+
+        :param data: The raw bytes of the DNS query message.
+        :param client_address: The address of the client that sent the query.
+        """
+        dns_response = await self.dns_server.forward_dns_query(data)
+        if not self.transport.is_closing():
+            self.send_response(data, dns_response, client_address)
+
+    def forward_done(self, forward_task: asyncio.Future):
+        """
+        Releases a forward task once it is done, and logs its error if it failed.
+
+        :param forward_task: The task of forward_dns_query.
+        """
+        self.forward_tasks.discard(forward_task)
+        if not forward_task.cancelled() and forward_task.exception() is not None:
+            logger.error("Failed to forward DNS query: %s", forward_task.exception())
+
+    def send_response(self, data: bytes, dns_response: bytes, client_address: Tuple[str, int]):
+        """
+        Sends a DNS response back to the client, truncated if it does not fit in the query's UDP payload size.
+
+        :param data: The raw bytes of the DNS query message.
+        :param dns_response: The DNS response message.
+        :param client_address: The address of the client that sent the query.
+        """
+        if len(dns_response) > MIN_UDP_PAYLOAD_SIZE:
+            dns_response = self.dns_server.fit_udp_response(data, dns_response)
+        dns_metrics = self.dns_server.dns_metrics
+        # The transport reads the datagrams, only the send stage can be timed
+        stage_start = dns_metrics.sample_timing()
+        self.transport.sendto(dns_response, client_address)
+        if stage_start:
+            dns_metrics.observe_stage(SEND_STAGE, stage_start)
+        self.dns_server.log_dns_exchange(data, dns_response, client_address)
+
+    def error_received(self, error: Exception):
+        logger.error("DNS query socket error: %s", error)
+
+
+class RegisterRequestProtocol(asyncio.DatagramProtocol):
+    """
+    RegisterRequestProtocol answers DNS register request datagrams received on the register request socket.
+
+    Attributes:
+    -----------
+    dns_server: DNSServer
+        The DNSServer whose register request pipeline is used to generate the responses.
+    transport: asyncio.DatagramTransport
+        The transport of the register request socket, set once the endpoint is created.
+    loop: asyncio.AbstractEventLoop
+        The event loop serving the transport, set once the endpoint is created.
+    """
+    def __init__(self, dns_server: DNSServer):
+        self.dns_server = dns_server
+        self.transport = None
+        self.loop = None
+
+    def connection_made(self, transport: asyncio.DatagramTransport):
+        self.transport = transport
+        self.loop = asyncio.get_event_loop()
+
+    def datagram_received(self, data: bytes, client_address: Tuple[str, int]):
+        """
+        Handles a DNS register request datagram and sends the generated response back to the client.
+
+        :param data: The raw bytes of the DNS register request message.
+        :param client_address: The address of the client that sent the register request.
+        """
+        logger.info("Received DNS register request from %s:%d", client_address[0], client_address[1])
+        register_request_response = self.dns_server.handle_register_request(data)
+        self.dns_server.send_when_durable(functools.partial(self.send_response, register_request_response,
+                                                            client_address))
+
+    def send_response(self, register_request_response: bytes, client_address: Tuple[str, int]):
+        """
+        Sends a register request response, from any thread.
+
+        :param register_request_response: The response to send.
+        :param client_address: The address of the client that sent the register request.
+        """
+        # Responses can be sent from the register journal's commit thread
+        self.loop.call_soon_threadsafe(self.transport.sendto, register_request_response, client_address)
+
+    def error_received(self, error: Exception):
+        logger.error("DNS register request socket error: %s", error)
+
+
+class AsyncDNSServer:
+    """
+    AsyncDNSServer serves the sockets of a DNSServer from an asyncio event loop instead of the blocking select loop.
+
+    Each socket is driven by its own asyncio.DatagramProtocol, so a datagram is handled as soon as the event loop reads
+    it and replies are queued on the transport when the socket buffer is full instead of blocking the loop.
+
+    Attributes:
+    -----------
+    dns_server: DNSServer
+        The DNSServer providing the sockets and the query and register request pipelines.
+    dns_query_transport: Optional[asyncio.DatagramTransport]
+        The transport serving the DNS query socket, once started.
+    register_request_transport: Optional[asyncio.DatagramTransport]
+        The transport serving the register request socket, once started.
+    tcp_dns_server: Optional[TCPDNSServer]
+        A TCPDNSServer started and closed with the datagram endpoints, to also serve DNS queries over TCP, if any.
+
+    The DNSForwarder of the DNSServer, if any, is started and closed with the datagram endpoints.
+
+    Methods:
+    --------
+    start()
+        Creates the datagram endpoints for the DNS query and register request sockets, and starts the TCP server and
+        the forwarder.
+
+    close()
+        Closes the datagram endpoints, the TCP server and the forwarder.
+
+    serve()
+        Starts the datagram endpoints and serves them until cancelled.
+
+    listen()
+        Runs serve() in a new event loop, blocking the calling thread.
+    """
+    def __init__(self, dns_server: DNSServer, tcp_dns_server: Optional[TCPDNSServer] = None):
+        self.dns_server = dns_server
+        self.dns_query_transport = None  # type: Optional[asyncio.DatagramTransport]
+        self.register_request_transport = None  # type: Optional[asyncio.DatagramTransport]
+        self.tcp_dns_server = tcp_dns_server
+
+    async def start(self):
+        """
+        Creates the datagram endpoints for the DNS query and register request sockets, and starts the TCP server and
+        the forwarder.
+        """
+        loop = asyncio.get_event_loop()
+        if self.dns_server.dns_forwarder is not None:
+            await self.dns_server.dns_forwarder.start()
+        self.dns_query_transport, _ = await loop.create_datagram_endpoint(
+            lambda: DNSQueryProtocol(self.dns_server),
+            sock=self.dns_server.dns_query_socket
+        )
+        self.register_request_transport, _ = await loop.create_datagram_endpoint(
+            lambda: RegisterRequestProtocol(self.dns_server),
+            sock=self.dns_server.register_request_socket
+        )
+        if self.tcp_dns_server is not None:
+            await self.tcp_dns_server.start()
+
+    def close(self):
+        """
+        Closes the datagram endpoints, the TCP server and the forwarder.
+        """
+        if self.dns_query_transport is not None:
+            self.dns_query_transport.close()
+            self.dns_query_transport = None
+        if self.register_request_transport is not None:
+            self.register_request_transport.close()
+            self.register_request_transport = None
+        if self.tcp_dns_server is not None:
+            self.tcp_dns_server.close()
+        if self.dns_server.dns_forwarder is not None:
+            self.dns_server.dns_forwarder.close()
+
+    async def serve(self):
+        """
+        Starts the datagram endpoints and serves them until cancelled.
+        """
+        await self.start()
+        logger.info("Server is listening to port 53 for DNS query requests (asyncio)")
+        logger.info("Server is listening to port 8080 for DNS register requests (asyncio)")
+        try:
+            await asyncio.Future()
+        finally:
+            self.close()
+
+    def listen(self):
+        """
+        Runs serve() in a new event loop, blocking the calling thread.
+        """
+        asyncio.run(self.serve())
@@ -0,0 +1,320 @@
+import ctypes
+import errno
+import functools
+import logging
+import os
+import select
+import socket
+import sys
+from typing import List, Tuple
+
+from src.dns_metrics import RECV_STAGE, SEND_STAGE
+from src.dns_server import DNS_QUERY_BUFFER_SIZE, DNSServer
+
+Datagram = Tuple[bytes, Tuple[str, int]]
+
+logger = logging.getLogger(__name__)
+
+
+class _IOVec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p), ("iov_len", ctypes.c_size_t)]
+
+
+class _SockAddrIn(ctypes.Structure):
+    _fields_ = [
+        ("sin_family", ctypes.c_ushort),
+        ("sin_port", ctypes.c_ubyte * 2),
+        ("sin_addr", ctypes.c_ubyte * 4),
+        ("sin_zero", ctypes.c_ubyte * 8),
+    ]
+
+
+class _MsgHdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p),
+        ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.POINTER(_IOVec)),
+        ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p),
+        ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int),
+    ]
+
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", _MsgHdr), ("msg_len", ctypes.c_uint)]
+
+
+def _load_mmsg_functions():
+    """
+    Loads recvmmsg and sendmmsg from the C library.
+
+    :return: The recvmmsg and sendmmsg functions, or (None, None) if they are not available on this platform.
+    """
+    if not sys.platform.startswith("linux"):
+        return None, None
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        recvmmsg = libc.recvmmsg
+        sendmmsg = libc.sendmmsg
+    except (OSError, AttributeError):
+        return None, None
+    recvmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(_MMsgHdr), ctypes.c_uint, ctypes.c_int, ctypes.c_void_p]
+    recvmmsg.restype = ctypes.c_int
+    sendmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(_MMsgHdr), ctypes.c_uint, ctypes.c_int]
+    sendmmsg.restype = ctypes.c_int
+    return recvmmsg, sendmmsg
+
+
+_recvmmsg, _sendmmsg = _load_mmsg_functions()
+
+
+class BatchedDatagramSocket:
+    """
+    BatchedDatagramSocket receives and sends UDP datagrams in batches on a non-blocking IPv4 socket.
+
+    On Linux, a whole batch is received with a single recvmmsg call into preallocated buffers and the replies are
+    flushed with a single sendmmsg call. Elsewhere, the socket is drained with recvfrom_into until it would block and
+    the replies are sent one by one.
+
+    Attributes:
+    -----------
+    sock: socket.socket
+        The wrapped UDP socket, switched to non-blocking mode.
+    batch_size: int
+        The maximum number of datagrams received per batch.
+    buffer_size: int
+        The size of the preallocated receive buffer of each datagram.
+    use_mmsg: bool
+        Whether recvmmsg/sendmmsg are used.
+
+    Methods:
+    --------
+    fileno() -> int
+        Returns the file descriptor of the wrapped socket.
+
+    receive_batch() -> List[Tuple[bytes, Tuple[str, int]]]
+        Receives every datagram ready on the socket, up to batch_size.
+
+    send_batch(datagrams: List[Tuple[bytes, Tuple[str, int]]])
+        Sends every datagram of the batch.
+    """
+    def __init__(self, sock: socket.socket, batch_size: int = 64, buffer_size: int = DNS_QUERY_BUFFER_SIZE):
+        sock.setblocking(False)
+        self.sock = sock
+        self.batch_size = batch_size
+        self.buffer_size = buffer_size
+        self.use_mmsg = _recvmmsg is not None and sock.family == socket.AF_INET
+
+        # Buffers used by the recvfrom_into fallback
+        self._receive_buffers = [bytearray(buffer_size) for _ in range(batch_size)]
+        self._receive_views = [memoryview(buffer) for buffer in self._receive_buffers]
+
+        # Structures used by recvmmsg and sendmmsg
+        self._mmsg_buffers = (ctypes.c_char * buffer_size * batch_size)()
+        self._mmsg_buffer_addresses = [ctypes.addressof(buffer) for buffer in self._mmsg_buffers]
+        self._receive_addresses = (_SockAddrIn * batch_size)()
+        self._receive_iovecs = (_IOVec * batch_size)()
+        self._receive_messages = (_MMsgHdr * batch_size)()
+        self._send_addresses = (_SockAddrIn * batch_size)()
+        self._send_iovecs = (_IOVec * batch_size)()
+        self._send_messages = (_MMsgHdr * batch_size)()
+        for index in range(batch_size):
+            self._receive_iovecs[index].iov_base = self._mmsg_buffer_addresses[index]
+            self._receive_iovecs[index].iov_len = buffer_size
+            self._receive_messages[index].msg_hdr.msg_name = ctypes.addressof(self._receive_addresses[index])
+            self._receive_messages[index].msg_hdr.msg_iov = ctypes.pointer(self._receive_iovecs[index])
+            self._receive_messages[index].msg_hdr.msg_iovlen = 1
+            self._send_messages[index].msg_hdr.msg_name = ctypes.addressof(self._send_addresses[index])
+            self._send_messages[index].msg_hdr.msg_namelen = ctypes.sizeof(_SockAddrIn)
+            self._send_messages[index].msg_hdr.msg_iov = ctypes.pointer(self._send_iovecs[index])
+            self._send_messages[index].msg_hdr.msg_iovlen = 1
+
+    def fileno(self) -> int:
+        """
+        Returns the file descriptor of the wrapped socket.
+
+        :return: The file descriptor.
+        """
+        return self.sock.fileno()
+
+    def receive_batch(self) -> List[Datagram]:
+        """
+        Receives every datagram ready on the socket, up to batch_size.
+
+        :return: The received datagrams with the address of their sender, empty if none is ready.
+        """
+        if self.use_mmsg:
+            return self._receive_batch_mmsg()
+        return self._receive_batch_drain()
+
+    def send_batch(self, datagrams: List[Datagram]):
+        """
+        Sends every datagram of the batch.
+
+        :param datagrams: The datagrams to send, with the address of their recipient.
+        """
+        if self.use_mmsg:
+            for start in range(0, len(datagrams), self.batch_size):
+                self._send_batch_mmsg(datagrams[start:start + self.batch_size])
+        else:
+            self._send_batch_sendto(datagrams)
+
+    def _receive_batch_mmsg(self) -> List[Datagram]:
+        address_length = ctypes.sizeof(_SockAddrIn)
+        for index in range(self.batch_size):
+            self._receive_messages[index].msg_hdr.msg_namelen = address_length
+        received_count = _recvmmsg(self.sock.fileno(), self._receive_messages, self.batch_size,
+                                   socket.MSG_DONTWAIT, None)
+        if received_count < 0:
+            error_number = ctypes.get_errno()
+            if error_number in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return []
+            raise OSError(error_number, "recvmmsg failed")
+
+        datagrams = []
+        for index in range(received_count):
+            address = self._receive_addresses[index]
+            client_address = (socket.inet_ntoa(bytes(address.sin_addr)),
+                              int.from_bytes(bytes(address.sin_port), "big"))
+            data = ctypes.string_at(self._mmsg_buffer_addresses[index], self._receive_messages[index].msg_len)
+            datagrams.append((data, client_address))
+        return datagrams
+
+    def _receive_batch_drain(self) -> List[Datagram]:
+        datagrams = []
+        for index in range(self.batch_size):
+            try:
+                received_length, client_address = self.sock.recvfrom_into(self._receive_buffers[index])
+            except BlockingIOError:
+                break
+            datagrams.append((bytes(self._receive_views[index][:received_length]), client_address))
+        return datagrams
+
+    def _send_batch_mmsg(self, datagrams: List[Datagram]):
+        # Keep the payloads referenced until sendmmsg returns, the iovecs point into them
+        payloads = []
+        for index, (data, client_address) in enumerate(datagrams):
+            payload = ctypes.c_char_p(data)
+            payloads.append(payload)
+            self._send_iovecs[index].iov_base = ctypes.cast(payload, ctypes.c_void_p)
+            self._send_iovecs[index].iov_len = len(data)
+            address = self._send_addresses[index]
+            address.sin_family = socket.AF_INET
+            address.sin_port[:] = client_address[1].to_bytes(2, "big")
+            address.sin_addr[:] = socket.inet_aton(client_address[0])
+
+        sent_count = 0
+        while sent_count < len(datagrams):
+            messages = ctypes.cast(ctypes.addressof(self._send_messages) + sent_count * ctypes.sizeof(_MMsgHdr),
+                                   ctypes.POINTER(_MMsgHdr))
+            result = _sendmmsg(self.sock.fileno(), messages, len(datagrams) - sent_count, 0)
+            if result < 0:
+                error_number = ctypes.get_errno()
+                if error_number in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    select.select([], [self.sock], [])
+                    continue
+                # sendmmsg fails on the first message it cannot send, the rest of the batch is still sent
+                client_address = datagrams[sent_count][1]
+                logger.error("Failed to send DNS response to %s:%d: %s", client_address[0], client_address[1],
+                             os.strerror(error_number))
+                sent_count += 1
+            else:
+                sent_count += result
+
+    def _send_batch_sendto(self, datagrams: List[Datagram]):
+        for data, client_address in datagrams:
+            while True:
+                try:
+                    self.sock.sendto(data, client_address)
+                    break
+                except BlockingIOError:
+                    select.select([], [self.sock], [])
+                except OSError as error:
+                    logger.error("Failed to send DNS response to %s:%d: %s", client_address[0], client_address[1],
+                                 error)
+                    break
+
+
+class BatchedDNSServer:
+    """
+    BatchedDNSServer serves the sockets of a DNSServer with batched datagram I/O.
+
+    Every wakeup drains all the DNS queries ready on the socket, runs them through DNSServer.handle_dns_queries as a
+    batch and flushes the replies together, so the select and socket syscalls are paid once per batch instead of once
+    per query.
+
+    Attributes:
+    -----------
+    dns_server: DNSServer
+        The DNSServer providing the sockets and the query and register request pipelines.
+    dns_query_socket: BatchedDatagramSocket
+        The batched wrapper around the DNS query socket.
+
+    Methods:
+    --------
+    serve_dns_query_batch() -> int
+        Handles every DNS query ready on the DNS query socket and sends the replies.
+
+    serve_register_request()
+        Handles a single register request.
+
+    listen()
+        Listens for incoming DNS query and register request messages and handles them accordingly.
+    """
+    def __init__(self, dns_server: DNSServer, batch_size: int = 64):
+        self.dns_server = dns_server
+        self.dns_query_socket = BatchedDatagramSocket(dns_server.dns_query_socket, batch_size=batch_size)
+
+    def serve_dns_query_batch(self) -> int:
+        """
+        Handles every DNS query ready on the DNS query socket and sends the replies.
+
+        :return: The number of queries handled.
+        """
+        # The recv and send stages are timed per batch
+        dns_metrics = self.dns_server.dns_metrics
+        stage_start = dns_metrics.sample_timing()
+        datagrams = self.dns_query_socket.receive_batch()
+        if stage_start:
+            dns_metrics.observe_stage(RECV_STAGE, stage_start)
+        if not datagrams:
+            return 0
+        dns_responses = self.dns_server.handle_dns_queries([data for data, _ in datagrams])
+        stage_start = dns_metrics.sample_timing()
+        self.dns_query_socket.send_batch([
+            (dns_response, client_address)
+            for dns_response, (_, client_address) in zip(dns_responses, datagrams)
+        ])
+        if stage_start:
+            dns_metrics.observe_stage(SEND_STAGE, stage_start)
+        if self.dns_server.is_logging_dns_exchanges():
+            for dns_response, (data, client_address) in zip(dns_responses, datagrams):
+                self.dns_server.log_dns_exchange(data, dns_response, client_address)
+        return len(datagrams)
+
+    def serve_register_request(self):
+        """
+        Handles a single register request.
+        """
+        register_request_socket = self.dns_server.register_request_socket
+        data, client_address = register_request_socket.recvfrom(1024)
+        logger.info("Received DNS register request from %s:%d", client_address[0], client_address[1])
+        register_request_response = self.dns_server.handle_register_request(data)
+        self.dns_server.send_when_durable(functools.partial(
+            register_request_socket.sendto, register_request_response, client_address))
+
+    def listen(self):
+        """
+        Listens for incoming DNS query and register request messages and handles them accordingly.
+        """
+        logger.info("Server is listening to port 53 for DNS query requests (batched)")
+        logger.info("Server is listening to port 8080 for DNS register requests")
+        register_request_socket = self.dns_server.register_request_socket
+        while True:
+            ready_sockets, _, _ = select.select([self.dns_query_socket, register_request_socket], [], [])
+            for sock in ready_sockets:
+                if sock is self.dns_query_socket:
+                    self.serve_dns_query_batch()
+                else:
+                    self.serve_register_request()
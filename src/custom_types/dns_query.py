@@ -1,10 +1,28 @@
 from dataclasses import dataclass
+from typing import Optional
 
 from src.custom_types.dns_record_type import DNSRecordType
+from src.custom_types.edns_options import EDNSOptions
 
 
 @dataclass
 class DNSQuery:
+    __slots__ = (
+        "original_query",
+        "transaction_id",
+        "flags",
+        "question_count",
+        "answer_count",
+        "authority_count",
+        "additional_count",
+        "question",
+        "domain_name",
+        "domain_name_key",
+        "query_type",
+        "query_class",
+        "edns",
+    )
+
     original_query: bytes
     transaction_id: bytes
     flags: bytes
@@ -14,5 +32,7 @@ class DNSQuery:
     additional_count: int
     question: bytes
     domain_name: str
+    domain_name_key: bytes
     query_type: DNSRecordType
     query_class: int
+    edns: Optional[EDNSOptions]
@@ -5,7 +5,10 @@ from src.custom_types.dns_record_type import DNSRecordType
 
 @dataclass
 class DNSQueryQuestion:
+    __slots__ = ("domain_name", "domain_name_key", "query_type", "query_class", "as_bytes")
+
     domain_name: str
+    domain_name_key: bytes
     query_type: DNSRecordType
     query_class: int
     as_bytes: bytes
@@ -1,31 +1,62 @@
-from dataclasses import dataclass
-
 from src.custom_types.error_types import UnknownRecordTypeError
 
+RECORD_TYPE_STRINGS = {
+    1: "A",
+    2: "NS",
+    5: "CNAME",
+    6: "SOA",
+    12: "PTR",
+    15: "MX",
+    16: "TXT",
+    28: "AAAA",
+    33: "SRV",
+    255: "ANY",
+}
+RECORD_TYPE_BYTES = {value: value.to_bytes(2, "big") for value in RECORD_TYPE_STRINGS}
+
 
-@dataclass
 class DNSRecordType:
-    value: int
-
-    def __post_init__(self):
-        self._record_type_mapping = {
-            1: {"str": "A", "bytes": b"\x00\x01"},
-            2: {"str": "NS", "bytes": b"\x00\x02"},
-            5: {"str": "CNAME", "bytes": b"\x00\x05"},
-            6: {"str": "SOA", "bytes": b"\x00\x06"},
-            12: {"str": "PTR", "bytes": b"\x00\x0c"},
-            15: {"str": "MX", "bytes": b"\x00\x0f"},
-            16: {"str": "TXT", "bytes": b"\x00\x10"},
-            28: {"str": "AAAA", "bytes": b"\x00\x1c"},
-            33: {"str": "SRV", "bytes": b"\x00\x21"},
-            255: {"str": "ANY", "bytes": b"\x00\xff"},
-        }
-
-        if self.value not in self._record_type_mapping:
+    """
+    DNSRecordType is a DNS record type, such as A or CNAME.
+
+    There is a single shared instance per record type: DNSRecordType(1) always returns the same object, so creating a
+    record type for every query or register request does not allocate anything.
+    """
+    __slots__ = ("value", "_string", "_bytes")
+
+    def __new__(cls, value: int):
+        try:
+            return _RECORD_TYPES[value]
+        except (KeyError, TypeError):
             raise UnknownRecordTypeError("Unknown query type.")
 
+    def __repr__(self) -> str:
+        return f"DNSRecordType(value={self.value})"
+
+    def __eq__(self, other) -> bool:
+        if other.__class__ is DNSRecordType:
+            return self.value == other.value
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(self.value)
+
+    def __reduce__(self):
+        return DNSRecordType, (self.value,)
+
     def to_string(self) -> str:
-        return self._record_type_mapping[self.value]["str"]
+        return self._string
 
     def to_bytes(self) -> bytes:
-        return self._record_type_mapping[self.value]["bytes"]
+        return self._bytes
+
+
+def _create_record_type(value: int) -> DNSRecordType:
+    record_type = object.__new__(DNSRecordType)
+    record_type.value = value
+    record_type._string = RECORD_TYPE_STRINGS[value]
+    record_type._bytes = RECORD_TYPE_BYTES[value]
+    return record_type
+
+
+_RECORD_TYPES = {value: _create_record_type(value) for value in RECORD_TYPE_STRINGS}
@@ -0,0 +1,11 @@
+from dataclasses import dataclass
+
+
+@dataclass
+class EDNSOptions:
+    __slots__ = ("udp_payload_size", "version", "dnssec_ok", "options")
+
+    udp_payload_size: int
+    version: int
+    dnssec_ok: bool
+    options: bytes
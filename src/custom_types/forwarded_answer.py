@@ -0,0 +1,13 @@
+from dataclasses import dataclass
+from typing import Tuple
+
+
+@dataclass
+class ForwardedAnswer:
+    __slots__ = ("response", "ttl_offsets", "ttls", "stored_at", "expires_at")
+
+    response: bytes
+    ttl_offsets: Tuple[int, ...]
+    ttls: Tuple[int, ...]
+    stored_at: float
+    expires_at: float
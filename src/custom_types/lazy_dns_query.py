@@ -0,0 +1,62 @@
+from typing import Optional
+
+from src.domain_name_codec import DomainNameCodec
+from src.custom_types.dns_record_type import DNSRecordType
+from src.custom_types.edns_options import EDNSOptions
+
+
+class LazyDNSQuery:
+    """
+    LazyDNSQuery is a DNSQuery that keeps a reference to the original query buffer instead of copying its fields.
+
+    Only the domain name key, query type, query class and EDNS(0) options are decoded when the query is parsed. The
+    transaction ID, flags, section counts, question bytes and domain name are sliced or decoded from the original
+    buffer when they are accessed, which the query pipeline only does for a few of them.
+    """
+    __slots__ = ("original_query", "question_end", "domain_name_key", "query_type", "query_class", "edns")
+
+    def __init__(self, original_query: bytes, question_end: int, domain_name_key: bytes, query_type: DNSRecordType,
+                 query_class: int, edns: Optional[EDNSOptions] = None):
+        self.original_query = original_query
+        self.question_end = question_end
+        self.domain_name_key = domain_name_key
+        self.query_type = query_type
+        self.query_class = query_class
+        self.edns = edns
+
+    def __repr__(self) -> str:
+        return f"LazyDNSQuery(original_query={self.original_query!r}, domain_name={self.domain_name!r}, " \
+               f"query_type={self.query_type!r}, query_class={self.query_class!r})"
+
+    @property
+    def transaction_id(self) -> bytes:
+        return self.original_query[:2]
+
+    @property
+    def flags(self) -> bytes:
+        return self.original_query[2:4]
+
+    @property
+    def question_count(self) -> int:
+        return int.from_bytes(self.original_query[4:6], "big")
+
+    @property
+    def answer_count(self) -> int:
+        return int.from_bytes(self.original_query[6:8], "big")
+
+    @property
+    def authority_count(self) -> int:
+        return int.from_bytes(self.original_query[8:10], "big")
+
+    @property
+    def additional_count(self) -> int:
+        return int.from_bytes(self.original_query[10:12], "big")
+
+    @property
+    def domain_name(self) -> str:
+        # The key is the case folded copy of the wire format domain name that follows the header
+        return DomainNameCodec.decode(self.original_query[12:12 + len(self.domain_name_key)])
+
+    @property
+    def question(self) -> bytes:
+        return self.original_query[12:self.question_end]
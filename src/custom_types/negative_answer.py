@@ -0,0 +1,10 @@
+from dataclasses import dataclass
+
+
+@dataclass
+class NegativeAnswer:
+    __slots__ = ("response", "expires_at", "hit_count")
+
+    response: bytes
+    expires_at: float
+    hit_count: int
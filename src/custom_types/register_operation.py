@@ -0,0 +1,10 @@
+class RegisterOperation:
+    """
+    RegisterOperation holds the operations a register request applies to the addresses of a domain name.
+
+    REGISTER replaces the addresses of the domain name with the address of the request, ADD_ADDRESS adds it to them with
+    the weight of the request, and REMOVE_ADDRESS removes it from them.
+    """
+    REGISTER = 0
+    ADD_ADDRESS = 1
+    REMOVE_ADDRESS = 2
@@ -5,8 +5,12 @@ from src.custom_types.dns_record_type import DNSRecordType
 
 @dataclass
 class RegisterRequest:
+    __slots__ = ("original_query", "transaction_id", "record_type", "domain_name", "ip_address", "operation", "weight")
+
     original_query: bytes
     transaction_id: bytes
     record_type: DNSRecordType
     domain_name: str
     ip_address: str
+    operation: int
+    weight: int
@@ -0,0 +1,13 @@
+from dataclasses import dataclass
+from typing import Tuple
+
+from src.custom_types.dns_record_type import DNSRecordType
+
+
+@dataclass
+class ResourceRecordSet:
+    __slots__ = ("record_type", "ttl", "rdatas")
+
+    record_type: DNSRecordType
+    ttl: int
+    rdatas: Tuple[bytes, ...]
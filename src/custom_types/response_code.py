@@ -0,0 +1,15 @@
+class ResponseCode:
+    """
+    ResponseCode holds the DNS response codes (RCODE) the server answers with.
+
+    The query pipeline passes these codes along with its results instead of raising DNSError exceptions, and
+    DNSResponseFactory maps them to pre-built error response headers. Codes above 15 are extended response codes, whose
+    upper bits are carried by the OPT record of EDNS(0) responses (RFC 6891).
+    """
+    NO_ERROR = 0
+    FORMAT_ERROR = 1
+    SERVER_FAILURE = 2
+    NAME_ERROR = 3
+    NOT_IMPLEMENTED = 4
+    REFUSED = 5
+    BAD_VERSION = 16
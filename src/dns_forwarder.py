@@ -0,0 +1,326 @@
+import asyncio
+import functools
+import logging
+import random
+from typing import Callable, Dict, List, Optional, Tuple
+
+from src.dns_query_resolver import DNSQueryResolver
+from src.dns_response_factory import DNSResponseFactory, TRUNCATED_FLAG
+from src.forwarding_cache import ForwardingCache
+from src.custom_types.response_code import ResponseCode
+
+logger = logging.getLogger(__name__)
+
+# Every DNS message sent over TCP is preceded by its length on 2 bytes (RFC 1035 section 4.2.2)
+LENGTH_PREFIX_SIZE = 2
+# Transaction IDs are drawn from the operating system's random source, so upstream responses cannot be guessed
+_transaction_id_random = random.SystemRandom()
+
+
+class UpstreamExchange:
+    """
+    UpstreamExchange matches the responses of an upstream resolver to the queries sent on one socket.
+
+    Every query is sent with a fresh random transaction ID, unused by the other pending queries of the socket, and a
+    response is only accepted if its transaction ID and its question match a pending query.
+
+    Attributes:
+    -----------
+    pending: Dict[int, Tuple[asyncio.Future, bytes]]
+        A dictionary that maps the transaction IDs of the pending queries to the future of their response and their
+        lowercased question section.
+    """
+    def __init__(self):
+        self.pending = {}  # type: Dict[int, Tuple[asyncio.Future, bytes]]
+
+    async def exchange(self, query_data: bytes, question: bytes, timeout: float) -> bytes:
+        """
+        Sends a query with a new transaction ID and waits for its response.
+
+        :param query_data: The raw bytes of the DNS query message, its transaction ID is replaced.
+        :param question: The lowercased question section of the query.
+        :param timeout: The number of seconds to wait for the response.
+        :return: The raw bytes of the response, with the transaction ID it was sent with.
+        :raises asyncio.TimeoutError: If no response was received in time.
+        :raises ConnectionError: If the socket was closed before the response was received.
+        """
+        pending = self.pending
+        if len(pending) >= 0x10000:
+            raise ConnectionError("Every transaction ID is in use.")
+        transaction_id = _transaction_id_random.getrandbits(16)
+        while transaction_id in pending:
+            transaction_id = _transaction_id_random.getrandbits(16)
+        future = asyncio.get_event_loop().create_future()
+        pending[transaction_id] = (future, question)
+        try:
+            self.send_query(transaction_id.to_bytes(2, "big") + query_data[2:])
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            del pending[transaction_id]
+
+    def send_query(self, query_data: bytes):
+        """
+        Sends a query on the socket.
+
+        :param query_data: The raw bytes of the DNS query message.
+        """
+        raise NotImplementedError
+
+    def response_received(self, response: bytes):
+        """
+        Resolves the pending query the response answers, ignoring unexpected and spoofed responses.
+
+        :param response: The raw bytes of a DNS response message.
+        """
+        if len(response) < 12:
+            return
+        pending_query = self.pending.get(response[0] << 8 | response[1])
+        if pending_query is None:
+            return
+        future, question = pending_query
+        if response[12:12 + len(question)].lower() != question:
+            return
+        if not future.done():
+            future.set_result(response)
+
+    def fail_pending_queries(self, error: Optional[Exception]):
+        """
+        Fails every pending query, once the socket is closed.
+
+        :param error: The error that closed the socket, if any.
+        """
+        for future, _ in self.pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError(f"Upstream socket closed: {error}"))
+
+
+class UpstreamDatagramProtocol(UpstreamExchange, asyncio.DatagramProtocol):
+    """
+    UpstreamDatagramProtocol sends queries to an upstream resolver over a UDP socket of the forwarder's pool.
+
+    Attributes:
+    -----------
+    upstream: Tuple[str, int]
+        The address of the upstream resolver, responses from any other address are ignored.
+    transport: asyncio.DatagramTransport
+        The transport of the socket, set once the endpoint is created.
+    """
+    def __init__(self, upstream: Tuple[str, int]):
+        super().__init__()
+        self.upstream = upstream
+        self.transport = None  # type: Optional[asyncio.DatagramTransport]
+
+    def connection_made(self, transport: asyncio.DatagramTransport):
+        self.transport = transport
+
+    def send_query(self, query_data: bytes):
+        self.transport.sendto(query_data, self.upstream)
+
+    def datagram_received(self, data: bytes, address: Tuple[str, int]):
+        if address[:2] == self.upstream:
+            self.response_received(data)
+
+    def error_received(self, error: Exception):
+        logger.warning("Upstream socket error for %s:%d: %s", self.upstream[0], self.upstream[1], error)
+
+    def connection_lost(self, error: Optional[Exception]):
+        self.fail_pending_queries(error)
+
+
+class UpstreamStreamProtocol(UpstreamExchange, asyncio.Protocol):
+    """
+    UpstreamStreamProtocol sends queries to an upstream resolver over a persistent TCP connection of the forwarder's
+    pool, pipelining them as RFC 7766 allows: responses are matched by transaction ID, in any order.
+
+    Attributes:
+    -----------
+    on_connection_lost: Callable[[], None]
+        A callable called once the connection is closed, to remove it from the pool.
+    transport: asyncio.Transport
+        The transport of the connection, set once the connection is made.
+    """
+    def __init__(self, on_connection_lost: Callable[[], None]):
+        super().__init__()
+        self.on_connection_lost = on_connection_lost
+        self.transport = None  # type: Optional[asyncio.Transport]
+        self._buffer = bytearray()
+
+    def connection_made(self, transport: asyncio.Transport):
+        self.transport = transport
+
+    def send_query(self, query_data: bytes):
+        self.transport.write(len(query_data).to_bytes(LENGTH_PREFIX_SIZE, "big") + query_data)
+
+    def data_received(self, data: bytes):
+        buffer = self._buffer
+        buffer += data
+        offset = 0
+        buffer_length = len(buffer)
+        while buffer_length - offset >= LENGTH_PREFIX_SIZE:
+            message_end = offset + LENGTH_PREFIX_SIZE + (buffer[offset] << 8 | buffer[offset + 1])
+            if message_end > buffer_length:
+                break
+            self.response_received(bytes(buffer[offset + LENGTH_PREFIX_SIZE:message_end]))
+            offset = message_end
+        if offset:
+            del buffer[:offset]
+
+    def connection_lost(self, error: Optional[Exception]):
+        self.on_connection_lost()
+        self.fail_pending_queries(error)
+
+
+class DNSForwarder:
+    """
+    DNSForwarder forwards the DNS queries the server cannot answer to upstream resolvers, and caches their responses.
+
+    Queries are sent over a pool of UDP sockets, each bound to its own random source port, to the upstream resolvers in
+    turn, and to the next upstream resolver when one does not answer in time. A query whose UDP response is truncated
+    is sent again over a persistent TCP connection to the same upstream resolver, from a pool of at most
+    tcp_connection_count connections per upstream resolver. Responses are cached by ForwardingCache for as long as their
+    TTLs allow.
+
+    The forwarder runs on the asyncio event loop of AsyncDNSServer, and DNSServer coalesces the identical queries it
+    forwards concurrently with SingleFlight.
+
+    Attributes:
+    -----------
+    upstreams: List[Tuple[str, int]]
+        The addresses of the upstream resolvers.
+    socket_count: int
+        The number of UDP sockets each upstream resolver is queried from.
+    tcp_connection_count: int
+        The maximum number of TCP connections to each upstream resolver.
+    timeout: float
+        The number of seconds to wait for the response of an upstream resolver.
+    forwarding_cache: ForwardingCache
+        The cache of the responses of the upstream resolvers.
+
+    Methods:
+    --------
+    start()
+        Creates the pool of UDP sockets.
+
+    close()
+        Closes the UDP sockets and the TCP connections.
+
+    lookup_query(query_data: bytes) -> Optional[bytes]
+        Returns the cached upstream response for a raw DNS query, with the query's transaction ID.
+
+    forward(query_data: bytes) -> bytes
+        Forwards a raw DNS query to the upstream resolvers and returns their response, with the query's transaction ID.
+    """
+    def __init__(self, upstreams: List[Tuple[str, int]], socket_count: int = 4, tcp_connection_count: int = 2,
+                 timeout: float = 2.0, forwarding_cache: Optional[ForwardingCache] = None):
+        self.upstreams = list(upstreams)
+        self.socket_count = socket_count
+        self.tcp_connection_count = tcp_connection_count
+        self.timeout = timeout
+        self.forwarding_cache = forwarding_cache if forwarding_cache is not None else ForwardingCache()
+        self._datagram_protocols = {}  # type: Dict[Tuple[str, int], List[UpstreamDatagramProtocol]]
+        self._stream_connections = {}  # type: Dict[Tuple[str, int], List[asyncio.Future]]
+        self._next_upstream = 0
+        self._next_socket = 0
+
+    async def start(self):
+        """
+        Creates the pool of UDP sockets.
+        """
+        loop = asyncio.get_event_loop()
+        for upstream in self.upstreams:
+            protocols = self._datagram_protocols[upstream] = []
+            for _ in range(self.socket_count):
+                _, protocol = await loop.create_datagram_endpoint(
+                    lambda: UpstreamDatagramProtocol(upstream),
+                    local_addr=("0.0.0.0", 0)
+                )
+                protocols.append(protocol)
+        logger.info("Forwarding unknown names to %s",
+                    ", ".join(f"{upstream[0]}:{upstream[1]}" for upstream in self.upstreams))
+
+    def close(self):
+        """
+        Closes the UDP sockets and the TCP connections.
+        """
+        for protocols in self._datagram_protocols.values():
+            for protocol in protocols:
+                protocol.transport.close()
+        self._datagram_protocols.clear()
+        for connections in self._stream_connections.values():
+            for connection in connections:
+                if not connection.done():
+                    connection.cancel()
+                elif not connection.cancelled() and connection.exception() is None:
+                    connection.result().transport.close()
+        self._stream_connections.clear()
+
+    def lookup_query(self, query_data: bytes) -> Optional[bytes]:
+        """
+        Returns the cached upstream response for a raw DNS query, with the query's transaction ID.
+
+        :param query_data: The raw bytes of the DNS query message.
+        :return: The cached response with its TTLs decremented, or None if it is not cached.
+        """
+        return self.forwarding_cache.lookup_query(query_data)
+
+    async def forward(self, query_data: bytes) -> bytes:
+        """
+        Forwards a raw DNS query to the upstream resolvers and returns their response, with the query's transaction ID.
+
+        :param query_data: The raw bytes of a valid DNS query message.
+        :return: The response of an upstream resolver, or a SERVFAIL response if none of them answered.
+        """
+        question_end = DNSQueryResolver.skip_domain_name(query_data, 12) + 4
+        question = query_data[12:question_end].lower()
+        upstream_count = len(self.upstreams)
+        first_upstream = self._next_upstream
+        self._next_upstream = (first_upstream + 1) % upstream_count
+        for attempt in range(upstream_count):
+            upstream = self.upstreams[(first_upstream + attempt) % upstream_count]
+            try:
+                response = await self._exchange_datagram(upstream, query_data, question)
+                if response[2] & TRUNCATED_FLAG:
+                    response = await self._exchange_stream(upstream, query_data, question)
+            except (asyncio.TimeoutError, OSError) as error:
+                logger.warning("Upstream resolver %s:%d failed: %r", upstream[0], upstream[1], error)
+                continue
+            self.forwarding_cache.store(query_data, response)
+            return query_data[:2] + response[2:]
+        return DNSResponseFactory.generate_error_response(
+            error_code=ResponseCode.SERVER_FAILURE,
+            transaction_id=query_data[:2],
+            question=query_data[12:question_end]
+        )
+
+    async def _exchange_datagram(self, upstream: Tuple[str, int], query_data: bytes, question: bytes) -> bytes:
+        protocols = self._datagram_protocols[upstream]
+        self._next_socket = (self._next_socket + 1) % len(protocols)
+        return await protocols[self._next_socket].exchange(query_data, question, self.timeout)
+
+    async def _exchange_stream(self, upstream: Tuple[str, int], query_data: bytes, question: bytes) -> bytes:
+        connections = self._stream_connections.setdefault(upstream, [])
+        if len(connections) < self.tcp_connection_count:
+            # Connections are shared while they are being opened, so concurrent queries do not open more of them
+            connection = asyncio.ensure_future(self._open_stream_connection(upstream))
+            connections.append(connection)
+        else:
+            connection = connections[random.randrange(len(connections))]
+        protocol = await asyncio.wait_for(asyncio.shield(connection), self.timeout)
+        return await protocol.exchange(query_data, question, self.timeout)
+
+    async def _open_stream_connection(self, upstream: Tuple[str, int]) -> UpstreamStreamProtocol:
+        loop = asyncio.get_event_loop()
+        # The connection leaves the pool once it is closed, by the upstream resolver or after an error
+        remove_connection = functools.partial(self._remove_stream_connection, upstream, asyncio.current_task())
+        try:
+            _, protocol = await loop.create_connection(lambda: UpstreamStreamProtocol(remove_connection),
+                                                       upstream[0], upstream[1])
+        except OSError:
+            remove_connection()
+            raise
+        return protocol
+
+    def _remove_stream_connection(self, upstream: Tuple[str, int], connection: asyncio.Future):
+        connections = self._stream_connections.get(upstream)
+        if connections is not None and connection in connections:
+            connections.remove(connection)
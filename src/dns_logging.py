@@ -0,0 +1,105 @@
+import logging
+import os
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional, TextIO
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+
+class SamplingFilter(logging.Filter):
+    """
+    SamplingFilter keeps one in sample_every of the log records below INFO, such as the per-query debug records, and
+    every record at INFO and above.
+    """
+    def __init__(self, sample_every: int = 1):
+        super().__init__()
+        self.sample_every = sample_every
+        self._count = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.INFO or self.sample_every <= 1:
+            return True
+        self._count += 1
+        if self._count >= self.sample_every:
+            self._count = 0
+            return True
+        return False
+
+
+class DNSLogging:
+    """
+    DNSLogging configures the logging of the server so that the packet loops never block on the output stream.
+
+    The modules of the server log through logging.getLogger(__name__), under the "src" logger. Once started, that
+    logger only has a QueueHandler, which formats a record and puts it on an in-memory queue, and a QueueListener
+    thread writes the queued records to the output stream. Records below INFO, logged for every query, are sampled
+    with a SamplingFilter before being queued. Forked worker processes get their own queue and writer thread.
+
+    Attributes:
+    -----------
+    level: int
+        The minimum level of the logged records, such as logging.INFO.
+    sample_every: int
+        Only one in sample_every of the records below INFO is written.
+    stream: TextIO
+        The stream the records are written to, sys.stdout by default.
+    logger: logging.Logger
+        The "src" logger configured by start().
+
+    Methods:
+    --------
+    start()
+        Installs the queue handler on the "src" logger and starts the writer thread.
+
+    stop()
+        Writes the queued records, stops the writer thread and removes the queue handler.
+    """
+    def __init__(self, level: int = logging.INFO, sample_every: int = 1, stream: Optional[TextIO] = None):
+        self.level = level
+        self.sample_every = sample_every
+        self.stream = stream if stream is not None else sys.stdout
+        self.logger = logging.getLogger("src")
+        self._queue_handler = None  # type: Optional[QueueHandler]
+        self._listener = None  # type: Optional[QueueListener]
+        self._fork_hook_registered = False
+
+    def start(self):
+        """
+        Installs the queue handler on the "src" logger and starts the writer thread.
+        """
+        self.logger.setLevel(self.level)
+        self.logger.propagate = False
+        self._start_listener()
+        if not self._fork_hook_registered and hasattr(os, "register_at_fork"):
+            # The writer thread does not survive a fork, the child needs its own
+            os.register_at_fork(after_in_child=self._restart_after_fork)
+            self._fork_hook_registered = True
+
+    def stop(self):
+        """
+        Writes the queued records, stops the writer thread and removes the queue handler.
+        """
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+        if self._queue_handler is not None:
+            self.logger.removeHandler(self._queue_handler)
+            self._queue_handler = None
+
+    def _start_listener(self):
+        log_queue = queue.SimpleQueue()
+        stream_handler = logging.StreamHandler(self.stream)
+        stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        self._queue_handler = QueueHandler(log_queue)
+        self._queue_handler.addFilter(SamplingFilter(self.sample_every))
+        self._listener = QueueListener(log_queue, stream_handler)
+        self.logger.addHandler(self._queue_handler)
+        self._listener.start()
+
+    def _restart_after_fork(self):
+        if self._listener is None:
+            return
+        self.logger.removeHandler(self._queue_handler)
+        self._start_listener()
@@ -0,0 +1,203 @@
+import struct
+from typing import Dict, List, Optional
+
+from src.domain_name_codec import DomainNameCodec
+from src.custom_types.resource_record_set import ResourceRecordSet
+
+HEADER_SIZE = 12
+# Question count, answer count, authority count and additional count, following the transaction ID and the flags
+SECTION_COUNTS_STRUCT = struct.Struct("!HHHH")
+SECTION_COUNTS_OFFSET = 4
+# Type, class, TTL and RDLENGTH of a resource record, following its owner name
+RECORD_FIELDS_STRUCT = struct.Struct("!HHIH")
+RECORD_FIELDS_PLACEHOLDER = bytes(RECORD_FIELDS_STRUCT.size)
+IN_CLASS = 1
+# The largest DNS message, whose length is sent on 2 bytes over TCP (RFC 1035 section 4.2.2)
+MAX_MESSAGE_SIZE = 0xffff
+ANSWER_SECTION = 0
+AUTHORITY_SECTION = 1
+ADDITIONAL_SECTION = 2
+# The offset of the domain name ending the RDATA of the record types whose RDATA names can be compressed (RFC 3597
+# section 4): CNAME, NS and MX
+COMPRESSIBLE_RDATA_NAME_OFFSETS = {2: 0, 5: 0, 15: 2}
+# Compression pointers are 14-bit offsets, prefixed with two set bits (RFC 1035 section 4.1.4)
+MAX_COMPRESSION_OFFSET = 0x3fff
+COMPRESSION_POINTER_FLAGS = 0xc000
+
+
+class DNSMessageBuilder:
+    """
+    DNSMessageBuilder writes a DNS message with compressed domain names into a preallocated buffer.
+
+    Every suffix of a domain name written to the message is remembered in suffix_offsets with its offset, so a name
+    whose suffix was already written, by the question or by any earlier record, is written as its leading labels
+    followed by a pointer to that suffix. Records are written in place into the buffer, which only grows (doubling) if
+    its capacity was underestimated, so building a message with many records costs one copy of each record and a
+    final copy of the message, instead of repeated concatenations. The section counts are written into the header by
+    build.
+
+    Suffixes are keyed on the lowercased wire format of DomainNameCodec, the format of the domain name keys of
+    DNSRegister: the question name is folded to lower case before its suffixes are remembered, and the names added to
+    the message are expected in that format.
+
+    Attributes:
+    -----------
+    buffer: bytearray
+        The buffer the message is written into, at least as large as the message.
+    length: int
+        The length of the message written so far.
+    suffix_offsets: Dict[bytes, int]
+        A dictionary that maps the lowercased name suffixes written to the message to their offset.
+    section_counts: List[int]
+        The number of records of the answer, authority and additional sections.
+
+    Methods:
+    --------
+    start(transaction_id: bytes, flags: bytes, question: bytes)
+        Starts a new message with its header and question section.
+
+    add_name(domain_name_key: bytes)
+        Writes a domain name, compressed with the suffixes already written.
+
+    add_record(section: int, owner_name_key: bytes, record_type: int, ttl: int, rdata: bytes,
+               rdata_name_offset: Optional[int])
+        Writes a resource record to a section.
+
+    add_rrset(section: int, owner_name_key: bytes, rrset: ResourceRecordSet)
+        Writes every record of an RRset to a section.
+
+    add_encoded_record(section: int, record: bytes)
+        Writes an encoded resource record, such as an OPT record, to a section.
+
+    build() -> bytes
+        Writes the section counts into the header and returns the message.
+    """
+    def __init__(self, capacity: int = 512):
+        self.buffer = bytearray(min(max(capacity, HEADER_SIZE), MAX_MESSAGE_SIZE))
+        self.length = 0
+        self.suffix_offsets = {}  # type: Dict[bytes, int]
+        self.section_counts = [0, 0, 0]
+        self._question_count = 0
+        self._section = ANSWER_SECTION
+
+    def start(self, transaction_id: bytes, flags: bytes, question: bytes):
+        """
+        Starts a new message with its header and question section.
+
+        :param transaction_id: The 2-byte transaction ID of the message.
+        :param flags: The 2-byte flags of the message.
+        :param question: The question section, a wire format domain name followed by QTYPE and QCLASS, or empty.
+        """
+        self.buffer[:2] = transaction_id
+        self.buffer[2:4] = flags
+        self.length = HEADER_SIZE
+        self.suffix_offsets.clear()
+        self.section_counts[:] = (0, 0, 0)
+        self._question_count = 1 if question else 0
+        self._section = ANSWER_SECTION
+        if not question:
+            return
+        self._write(question)
+        # The question is written as received, the suffixes of its name are remembered in lower case
+        question_name = DomainNameCodec.fold(question[:-4])
+        suffix_offsets = self.suffix_offsets
+        position = 0
+        while question_name[position]:
+            suffix_offsets[question_name[position:]] = HEADER_SIZE + position
+            position += question_name[position] + 1
+
+    def add_name(self, domain_name_key: bytes):
+        """
+        Writes a domain name, compressed with the suffixes already written.
+
+        :param domain_name_key: The lowercased wire format domain name.
+        """
+        offset = self.length
+        suffix_offsets = self.suffix_offsets
+        position = 0
+        while domain_name_key[position]:
+            suffix = domain_name_key[position:]
+            suffix_offset = suffix_offsets.get(suffix)
+            if suffix_offset is not None:
+                self._write(domain_name_key[:position] + (COMPRESSION_POINTER_FLAGS | suffix_offset).to_bytes(2, "big"))
+                return
+            if offset + position <= MAX_COMPRESSION_OFFSET:
+                suffix_offsets[suffix] = offset + position
+            position += domain_name_key[position] + 1
+        self._write(domain_name_key)
+
+    def add_record(self, section: int, owner_name_key: bytes, record_type: int, ttl: int, rdata: bytes,
+                   rdata_name_offset: Optional[int] = None):
+        """
+        Writes a resource record to a section.
+
+        :param section: ANSWER_SECTION, AUTHORITY_SECTION or ADDITIONAL_SECTION, in that order.
+        :param owner_name_key: The lowercased wire format owner name.
+        :param record_type: The record type value.
+        :param ttl: The TTL of the record, in seconds.
+        :param rdata: The encoded RDATA.
+        :param rdata_name_offset: The offset of the domain name ending the RDATA, compressed, or None.
+        :raises ValueError: If a record was already added to a later section, or the message is too large.
+        """
+        self._enter_section(section)
+        self.add_name(owner_name_key)
+        fields_offset = self.length
+        self._write(RECORD_FIELDS_PLACEHOLDER)
+        if rdata_name_offset is None:
+            self._write(rdata)
+        else:
+            self._write(rdata[:rdata_name_offset])
+            self.add_name(rdata[rdata_name_offset:])
+        rdata_length = self.length - fields_offset - RECORD_FIELDS_STRUCT.size
+        RECORD_FIELDS_STRUCT.pack_into(self.buffer, fields_offset, record_type, IN_CLASS, ttl, rdata_length)
+        self.section_counts[section] += 1
+
+    def add_rrset(self, section: int, owner_name_key: bytes, rrset: ResourceRecordSet):
+        """
+        Writes every record of an RRset to a section.
+
+        :param section: ANSWER_SECTION, AUTHORITY_SECTION or ADDITIONAL_SECTION, in that order.
+        :param owner_name_key: The lowercased wire format owner name of the RRset.
+        :param rrset: The RRset, whose RDATA names are compressed for the record types of
+            COMPRESSIBLE_RDATA_NAME_OFFSETS.
+        :raises ValueError: If a record was already added to a later section, or the message is too large.
+        """
+        record_type = rrset.record_type.value
+        rdata_name_offset = COMPRESSIBLE_RDATA_NAME_OFFSETS.get(record_type)
+        for rdata in rrset.rdatas:
+            self.add_record(section, owner_name_key, record_type, rrset.ttl, rdata, rdata_name_offset)
+
+    def add_encoded_record(self, section: int, record: bytes):
+        """
+        Writes an encoded resource record, such as an OPT record, to a section.
+
+        :param section: ANSWER_SECTION, AUTHORITY_SECTION or ADDITIONAL_SECTION, in that order.
+        :param record: The wire format resource record, written as is.
+        :raises ValueError: If a record was already added to a later section, or the message is too large.
+        """
+        self._enter_section(section)
+        self._write(record)
+        self.section_counts[section] += 1
+
+    def build(self) -> bytes:
+        """
+        Writes the section counts into the header and returns the message.
+
+        :return: The DNS message as bytes.
+        """
+        SECTION_COUNTS_STRUCT.pack_into(self.buffer, SECTION_COUNTS_OFFSET, self._question_count, *self.section_counts)
+        return bytes(memoryview(self.buffer)[:self.length])
+
+    def _enter_section(self, section: int):
+        if section < self._section:
+            raise ValueError("Records must be added in section order.")
+        self._section = section
+
+    def _write(self, data: bytes):
+        end = self.length + len(data)
+        if end > len(self.buffer):
+            if end > MAX_MESSAGE_SIZE:
+                raise ValueError(f"DNS message larger than {MAX_MESSAGE_SIZE} bytes.")
+            self.buffer.extend(bytes(min(max(end, 2 * len(self.buffer)), MAX_MESSAGE_SIZE) - len(self.buffer)))
+        self.buffer[self.length:end] = data
+        self.length = end
@@ -0,0 +1,301 @@
+import mmap
+import time
+from array import array
+from typing import List
+
+from src.custom_types.dns_record_type import RECORD_TYPE_STRINGS
+
+QUERY_TYPE_LABELS = tuple(RECORD_TYPE_STRINGS.values()) + ("OTHER",)
+RESPONSE_CODE_LABELS = ("NOERROR", "FORMERR", "SERVFAIL", "NXDOMAIN", "NOTIMP", "REFUSED") \
+    + tuple(f"RCODE{code}" for code in range(6, 16)) + ("BADVERS",)
+STAGE_LABELS = ("recv", "read_query", "resolve_ip", "generate_response", "send")
+RECV_STAGE = 0
+READ_QUERY_STAGE = 1
+RESOLVE_IP_STAGE = 2
+GENERATE_RESPONSE_STAGE = 3
+SEND_STAGE = 4
+
+# Log-linear latency buckets: values below 16ns have a bucket each, then every power of two is split in 8 sub-buckets
+SUB_BUCKET_BITS = 3
+BUCKET_COUNT = 272  # Up to 2**36ns, about 68s, the last bucket holds every longer latency
+QUERY_TYPE_OFFSETS = {
+    query_type: index * len(RESPONSE_CODE_LABELS) for index, query_type in enumerate(RECORD_TYPE_STRINGS)
+}
+OTHER_QUERY_TYPE_OFFSET = len(RECORD_TYPE_STRINGS) * len(RESPONSE_CODE_LABELS)
+REGISTER_REQUEST_OFFSET = len(QUERY_TYPE_LABELS) * len(RESPONSE_CODE_LABELS)
+RESPONSE_CACHE_HIT_INDEX = REGISTER_REQUEST_OFFSET + len(RESPONSE_CODE_LABELS)
+NEGATIVE_CACHE_HIT_INDEX = RESPONSE_CACHE_HIT_INDEX + 1
+CACHE_MISS_INDEX = RESPONSE_CACHE_HIT_INDEX + 2
+STAGE_OFFSETS = tuple(CACHE_MISS_INDEX + 1 + stage * (BUCKET_COUNT + 1) for stage in range(len(STAGE_LABELS)))
+# Every value is an unsigned 64-bit integer, the latency sums are in nanoseconds
+VALUE_COUNT = STAGE_OFFSETS[-1] + BUCKET_COUNT + 1
+
+
+def bucket_upper_bound(bucket: int) -> int:
+    """
+    Returns the exclusive upper bound of a latency bucket, in nanoseconds.
+
+    :param bucket: The index of the latency bucket.
+    :return: The smallest latency above the bucket.
+    """
+    if bucket < 2 << SUB_BUCKET_BITS:
+        return bucket + 1
+    shift = (bucket >> SUB_BUCKET_BITS) - 1
+    return ((bucket & ((1 << SUB_BUCKET_BITS) - 1)) + (1 << SUB_BUCKET_BITS) + 1) << shift
+
+
+class DNSMetrics:
+    """
+    DNSMetrics counts the queries and register requests handled by a DNSServer and records the latency of each stage of
+    the query pipeline in log-linear histograms.
+
+    Every process accumulates its metrics in a plain list of integers, updated by the thread serving the queries
+    without locks. Forked DNSWorkerPool workers switch to their own slot of an anonymous shared memory mapping with
+    use_slot() and regularly copy their list to that slot with publish(), and collect() sums the list of the calling
+    process and the slots of the other processes when the metrics are scraped.
+
+    Counters are updated for every query. Stage latencies are only measured for one in latency_sample_every queries, as
+    reading the clock costs more than the counters: the pipeline calls sample_timing(), which returns 0 for the queries
+    that are not sampled, and observe_stage() when it returned a clock reading.
+
+    Attributes:
+    -----------
+    slot_count: int
+        The number of processes that can update the metrics.
+    latency_sample_every: int
+        Stage latencies are measured for one in latency_sample_every queries.
+    slots: List[memoryview]
+        The published values of each slot, as unsigned 64-bit integers.
+    values: List[int]
+        The values accumulated by this process.
+
+    Methods:
+    --------
+    use_slot(slot: int)
+        Makes this process publish its values to the given slot, starting from zero.
+
+    publish()
+        Copies the values accumulated by this process to its slot.
+
+    sample_timing() -> int
+        Returns a clock reading in nanoseconds for the queries whose latencies are measured, 0 for the others.
+
+    observe_stage(stage: int, start: int) -> int
+        Records the latency of a pipeline stage started at the given clock reading.
+
+    count_query(query_type: int, response_code: int)
+        Counts a DNS query answered with the given response code.
+
+    count_cache_hit(query_data: bytes, response: bytes, negative: bool = False)
+        Counts a DNS query answered from the response cache or the negative answer cache.
+
+    count_cache_miss()
+        Counts a DNS query that was not found in the caches.
+
+    count_register_request(response_code: int)
+        Counts a register request answered with the given response code.
+
+    collect() -> List[int]
+        Returns the sum of the values of this process and of the values published to the other slots.
+
+    quantile(values: List[int], stage: int, quantile: float) -> float
+        Returns an upper estimate of a latency quantile of a stage, in seconds.
+
+    render_prometheus() -> str
+        Returns the collected metrics in the Prometheus text exposition format.
+    """
+    def __init__(self, slot_count: int = 1, latency_sample_every: int = 64):
+        self.slot_count = slot_count
+        self.latency_sample_every = latency_sample_every
+        slot_size = VALUE_COUNT * 8
+        # An anonymous mapping is shared with the processes forked afterwards
+        self._buffer = mmap.mmap(-1, slot_count * slot_size)
+        buffer_view = memoryview(self._buffer)
+        self.slots = [buffer_view[slot * slot_size:(slot + 1) * slot_size].cast("Q")
+                      for slot in range(slot_count)]  # type: List[memoryview]
+        self.values = [0] * VALUE_COUNT
+        self._slot = 0
+        self._sample_countdown = latency_sample_every
+
+    def use_slot(self, slot: int):
+        """
+        Makes this process publish its values to the given slot, starting from zero, such as a forked worker process.
+
+        :param slot: The index of the slot, no other process may publish to it.
+        """
+        # A forked process inherits the values of its parent, which are already counted in the parent's slot
+        self.values = [0] * VALUE_COUNT
+        self._slot = slot
+
+    def publish(self):
+        """
+        Copies the values accumulated by this process to its slot.
+        """
+        self.slots[self._slot][:] = array("Q", self.values)
+
+    def sample_timing(self) -> int:
+        """
+        Returns a clock reading in nanoseconds for the queries whose latencies are measured, 0 for the others.
+
+        :return: time.perf_counter_ns() for one in latency_sample_every calls, 0 otherwise.
+        """
+        self._sample_countdown -= 1
+        if self._sample_countdown:
+            return 0
+        self._sample_countdown = self.latency_sample_every
+        return time.perf_counter_ns()
+
+    def observe_stage(self, stage: int, start: int) -> int:
+        """
+        Records the latency of a pipeline stage started at the given clock reading.
+
+        :param stage: The pipeline stage, such as READ_QUERY_STAGE.
+        :param start: The clock reading returned by sample_timing() or observe_stage() when the stage started.
+        :return: The clock reading at the end of the stage, which is the start of the next stage.
+        """
+        now = time.perf_counter_ns()
+        latency = now - start
+        bit_length = latency.bit_length()
+        if bit_length > SUB_BUCKET_BITS + 1:
+            shift = bit_length - SUB_BUCKET_BITS - 1
+            bucket = (shift << SUB_BUCKET_BITS) + (latency >> shift)
+            if bucket >= BUCKET_COUNT:
+                bucket = BUCKET_COUNT - 1
+        else:
+            bucket = latency
+        offset = STAGE_OFFSETS[stage]
+        values = self.values
+        values[offset + bucket] += 1
+        values[offset + BUCKET_COUNT] += latency
+        return now
+
+    def count_query(self, query_type: int, response_code: int):
+        """
+        Counts a DNS query answered with the given response code.
+
+        :param query_type: The query type value (QTYPE), 0 if the query could not be parsed.
+        :param response_code: The response code of the answer.
+        """
+        self.values[QUERY_TYPE_OFFSETS.get(query_type, OTHER_QUERY_TYPE_OFFSET) + response_code] += 1
+
+    def count_cache_hit(self, query_data: bytes, response: bytes, negative: bool = False):
+        """
+        Counts a DNS query answered from the response cache or the negative answer cache.
+
+        Cached queries have a single question followed by nothing but an OPT record without options (see
+        DNSResponseCache.cache_key), so their query type is read at a fixed offset from the end of the query and their
+        response code from the header of the response.
+
+        :param query_data: The raw bytes of the DNS query message.
+        :param response: The cached DNS response message.
+        :param negative: Whether the response comes from the negative answer cache.
+        """
+        values = self.values
+        values[NEGATIVE_CACHE_HIT_INDEX if negative else RESPONSE_CACHE_HIT_INDEX] += 1
+        # The additional count of a cached query is 0 or 1, and its OPT record is 11 bytes long
+        query_type_index = -4 - 11 * query_data[11]
+        query_type = query_data[query_type_index] << 8 | query_data[query_type_index + 1]
+        values[QUERY_TYPE_OFFSETS.get(query_type, OTHER_QUERY_TYPE_OFFSET) + (response[3] & 15)] += 1
+
+    def count_cache_miss(self):
+        """
+        Counts a DNS query that was not found in the caches.
+        """
+        self.values[CACHE_MISS_INDEX] += 1
+
+    def count_register_request(self, response_code: int):
+        """
+        Counts a register request answered with the given response code.
+
+        :param response_code: The response code of the answer.
+        """
+        self.values[REGISTER_REQUEST_OFFSET + response_code] += 1
+
+    def collect(self) -> List[int]:
+        """
+        Returns the sum of the values of this process and of the values published to the other slots.
+
+        :return: The aggregated values, indexed like DNSMetrics.values.
+        """
+        totals = list(self.values)
+        for slot_index, slot in enumerate(self.slots):
+            if slot_index != self._slot:
+                totals = [total + value for total, value in zip(totals, slot.tolist())]
+        return totals
+
+    @staticmethod
+    def quantile(values: List[int], stage: int, quantile: float) -> float:
+        """
+        Returns an upper estimate of a latency quantile of a stage, in seconds.
+
+        :param values: The values returned by collect().
+        :param stage: The pipeline stage, such as READ_QUERY_STAGE.
+        :param quantile: The quantile, between 0 and 1 (e.g., 0.99).
+        :return: The upper bound of the bucket holding the quantile, 0.0 if the stage has no observation.
+        """
+        offset = STAGE_OFFSETS[stage]
+        buckets = values[offset:offset + BUCKET_COUNT]
+        rank = quantile * sum(buckets)
+        if rank == 0:
+            return 0.0
+        cumulative_count = 0
+        for bucket, count in enumerate(buckets):
+            cumulative_count += count
+            if cumulative_count >= rank:
+                return bucket_upper_bound(bucket) / 1e9
+        return bucket_upper_bound(BUCKET_COUNT - 1) / 1e9
+
+    def render_prometheus(self) -> str:
+        """
+        Returns the collected metrics in the Prometheus text exposition format.
+
+        The latency histograms are exposed with one bucket per power of two nanoseconds, from 256ns.
+
+        :return: The metrics, one sample per line.
+        """
+        values = self.collect()
+        lines = [
+            "# HELP dns_queries_total DNS queries answered, by query type and response code.",
+            "# TYPE dns_queries_total counter",
+        ]
+        for type_index, query_type in enumerate(QUERY_TYPE_LABELS):
+            for response_code, response_code_label in enumerate(RESPONSE_CODE_LABELS):
+                count = values[type_index * len(RESPONSE_CODE_LABELS) + response_code]
+                if count:
+                    lines.append(f'dns_queries_total{{qtype="{query_type}",rcode="{response_code_label}"}} {count}')
+        lines += [
+            "# HELP dns_register_requests_total Register requests answered, by response code.",
+            "# TYPE dns_register_requests_total counter",
+        ]
+        for response_code, response_code_label in enumerate(RESPONSE_CODE_LABELS):
+            count = values[REGISTER_REQUEST_OFFSET + response_code]
+            if count:
+                lines.append(f'dns_register_requests_total{{rcode="{response_code_label}"}} {count}')
+        lines += [
+            "# HELP dns_cache_hits_total DNS queries answered from a cache.",
+            "# TYPE dns_cache_hits_total counter",
+            f'dns_cache_hits_total{{cache="response"}} {values[RESPONSE_CACHE_HIT_INDEX]}',
+            f'dns_cache_hits_total{{cache="negative"}} {values[NEGATIVE_CACHE_HIT_INDEX]}',
+            "# HELP dns_cache_misses_total DNS queries not found in the caches.",
+            "# TYPE dns_cache_misses_total counter",
+            f"dns_cache_misses_total {values[CACHE_MISS_INDEX]}",
+            "# HELP dns_stage_latency_seconds Latency of the stages of the query pipeline, for the sampled queries.",
+            "# TYPE dns_stage_latency_seconds histogram",
+        ]
+        for stage, stage_label in enumerate(STAGE_LABELS):
+            offset = STAGE_OFFSETS[stage]
+            cumulative_count = 0
+            for bucket in range(BUCKET_COUNT - 1):
+                cumulative_count += values[offset + bucket]
+                upper_bound = bucket_upper_bound(bucket)
+                # Report the buckets ending on a power of two, from 256ns
+                if upper_bound >= 256 and upper_bound & (upper_bound - 1) == 0:
+                    lines.append(f'dns_stage_latency_seconds_bucket{{stage="{stage_label}",le="{upper_bound / 1e9:g}"}}'
+                                 f" {cumulative_count}")
+            cumulative_count += values[offset + BUCKET_COUNT - 1]
+            lines += [
+                f'dns_stage_latency_seconds_bucket{{stage="{stage_label}",le="+Inf"}} {cumulative_count}',
+                f'dns_stage_latency_seconds_sum{{stage="{stage_label}"}} {values[offset + BUCKET_COUNT] / 1e9:g}',
+                f'dns_stage_latency_seconds_count{{stage="{stage_label}"}} {cumulative_count}',
+            ]
+        return "\n".join(lines) + "\n"
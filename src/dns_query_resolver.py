@@ -1,7 +1,23 @@
+import struct
+from typing import Optional, Tuple
+
+from src.domain_name_codec import DomainNameCodec
 from src.custom_types.error_types import FormatError, FunctionalityNotImplementedError
 from src.custom_types.dns_query import DNSQuery
 from src.custom_types.dns_query_question import DNSQueryQuestion
-from src.custom_types.dns_record_type import DNSRecordType
+from src.custom_types.dns_record_type import DNSRecordType, RECORD_TYPE_STRINGS
+from src.custom_types.edns_options import EDNSOptions
+from src.custom_types.response_code import ResponseCode
+
+# Question count, answer count, authority count, additional count (the transaction ID and flags are skipped)
+HEADER_STRUCT = struct.Struct("!4xHHHH")
+# Query type, query class
+QUESTION_TAIL_STRUCT = struct.Struct("!HH")
+# Type, class, TTL and RDATA length of a resource record, after its owner name
+RECORD_HEADER_STRUCT = struct.Struct("!HHIH")
+# A resource record is at least a root owner name and its 10 byte header
+MIN_RECORD_SIZE = 11
+OPT_RECORD_TYPE = 41
 
 
 class DNSQueryResolver:
@@ -10,12 +26,27 @@ class DNSQueryResolver:
 
     Methods:
     --------
+    parse_query(query_data: bytes) -> Tuple[int, Optional[DNSQuery]]:
+        Parses the given query_data and returns a response code and, if it is NO_ERROR, the DNSQuery object.
+
     read_query(query_data: bytes) -> DNSQuery:
         Parses the given query_data and returns a DNSQuery object containing the relevant information.
 
+    parse_dns_query_question(question_data: bytes) -> Optional[DNSQueryQuestion]:
+        Parses the DNS question section from the given question_data and returns a DNSQueryQuestion object, or None if
+        it is malformed.
+
     read_dns_query_question(question_data: bytes) -> DNSQueryQuestion:
         Parses the DNS question section from the given question_data and returns a DNSQueryQuestion object.
 
+    parse_edns_options(query_data: bytes, offset: int, skipped_count: int, additional_count: int)
+            -> Tuple[int, Optional[EDNSOptions]]:
+        Reads the resource records following the question section and returns a response code and, if the query has
+        an OPT record, its EDNS(0) options.
+
+    skip_domain_name(message: bytes, offset: int) -> int:
+        Returns the index following the wire format domain name starting at the given offset of a DNS message.
+
     validate_dns_query_length(query_data: bytes, authority_count: int, additional_count: int) -> bool:
         Validates the length of the DNS query data to ensure it matches the expected format.
 
@@ -28,109 +59,212 @@ class DNSQueryResolver:
     def __init__(self):
         pass
 
-    def read_query(self, query_data: bytes) -> DNSQuery:
+    def parse_query(self, query_data: bytes) -> Tuple[int, Optional[DNSQuery]]:
         """
-        Reads and parses a DNS query from the given raw bytes.
+        Parses a DNS query from the given raw bytes without raising for invalid queries.
+
+        Every bound is checked explicitly, so a malformed query costs no more than a valid one.
 
         :param query_data: The raw bytes representing the DNS query.
-        :return: A DNSQuery object containing the parsed query data.
-        :raises FormatError: If the query data is malformed or does not match the expected format.
-        :raises FunctionalityNotImplementedError: If the query contains multiple questions (not supported).
+        :return: ResponseCode.NO_ERROR and the DNSQuery object, or the FORMAT_ERROR or NOT_IMPLEMENTED response code
+            and None.
         """
-        transaction_id = query_data[:2]
-        flags = query_data[2:4]
-        try:
-            question_count = int.from_bytes(query_data[4:6], "big")
-            answer_count = int.from_bytes(query_data[6:8], "big")
-            authority_count = int.from_bytes(query_data[8:10], "big")
-            additional_count = int.from_bytes(query_data[10:12], "big")
-        except Exception:
-            raise FormatError("Malformed query.")
+        if len(query_data) <= 12:
+            return ResponseCode.FORMAT_ERROR, None
+        question_count, answer_count, authority_count, additional_count = HEADER_STRUCT.unpack_from(query_data)
 
         # Validate query length
         if not self.validate_dns_query_length(query_data=query_data,
                                               authority_count=authority_count,
                                               additional_count=additional_count):
-            raise FormatError("Malformed query.")
+            return ResponseCode.FORMAT_ERROR, None
 
         question_index_start = 12  # The header section is always 12 bytes long
-        # Each additional and authority record sections are two bytes long
-        question_index_end = len(query_data) - authority_count * 2 - additional_count * 2
-        dns_query_question = self.read_dns_query_question(query_data[question_index_start:question_index_end])
+        dns_query_question = self.parse_dns_query_question(query_data[question_index_start:])
+        if dns_query_question is None or dns_query_question.domain_name == "":
+            return ResponseCode.FORMAT_ERROR, None
 
-        if dns_query_question.domain_name == "":
-            raise FormatError("Empty domain name.")
+        if question_count > 1:
+            return ResponseCode.NOT_IMPLEMENTED, None
+
+        response_code, edns = self.parse_edns_options(
+            query_data=query_data,
+            offset=question_index_start + len(dns_query_question.as_bytes),
+            skipped_count=answer_count + authority_count,
+            additional_count=additional_count
+        )
+        if response_code != ResponseCode.NO_ERROR:
+            return response_code, None
 
-        dns_query = DNSQuery(
+        return ResponseCode.NO_ERROR, DNSQuery(
             original_query=query_data,
-            transaction_id=transaction_id,
-            flags=flags,
+            transaction_id=query_data[:2],
+            flags=query_data[2:4],
             question_count=question_count,
             answer_count=answer_count,
             authority_count=authority_count,
             additional_count=additional_count,
             question=dns_query_question.as_bytes,
             domain_name=dns_query_question.domain_name,
+            domain_name_key=dns_query_question.domain_name_key,
             query_type=dns_query_question.query_type,
-            query_class=dns_query_question.query_class
+            query_class=dns_query_question.query_class,
+            edns=edns
         )
 
-        if question_count > 1:
+    def read_query(self, query_data: bytes) -> DNSQuery:
+        """
+        Reads and parses a DNS query from the given raw bytes.
+
+        :param query_data: The raw bytes representing the DNS query.
+        :return: A DNSQuery object containing the parsed query data.
+        :raises FormatError: If the query data is malformed or does not match the expected format.
+        :raises FunctionalityNotImplementedError: If the query contains multiple questions (not supported).
+        """
+        response_code, dns_query = self.parse_query(query_data)
+        if response_code == ResponseCode.FORMAT_ERROR:
+            raise FormatError("Malformed query.")
+        if response_code == ResponseCode.NOT_IMPLEMENTED:
             raise FunctionalityNotImplementedError(
                 message="This server does not handle queries with multiple questions.",
-                transaction_id=transaction_id
+                transaction_id=query_data[:2]
             )
-
         return dns_query
 
     @staticmethod
-    def read_dns_query_question(question_data: bytes) -> DNSQueryQuestion:
+    def parse_dns_query_question(question_data: bytes) -> Optional[DNSQueryQuestion]:
         """
-        Parses the DNS question section from the given question_data and returns a DNSQueryQuestion object.
+        Parses the DNS question section from the given question_data without raising for invalid questions.
 
-        :param question_data: The raw bytes representing the DNS question section.
-        :return: A DNSQueryQuestion object containing the parsed question data.
-        :raises FormatError: If the question_data is malformed or does not match the expected format.
+        :param question_data: The raw bytes starting with the DNS question section, which may be followed by other
+            sections.
+        :return: A DNSQueryQuestion object containing the parsed question data and the question section bytes, or None
+            if the question is malformed.
         """
+        question_length = len(question_data)
         pointer = 0
         domain_name = ""
 
         # Handle http:// and https://
-        original_question_data = question_data
-        if question_data[0] == 7 and question_data[1:5] == b"http":
+        if question_length and question_data[0] == 7 and question_data[1:5] == b"http":
             domain_name += "http://"
-            question_data = question_data[5:]
-        if question_data[0] == 8 and question_data[1:6] == b"https":
+            pointer = 5
+        if (pointer < question_length and question_data[pointer] == 8
+                and question_data[pointer + 1:pointer + 6] == b"https"):
             domain_name += "https://"
-            question_data = question_data[6:]
+            pointer += 6
 
+        labels = []
+        while True:
+            if pointer >= question_length:
+                return None
+            label_length = question_data[pointer]
+            if label_length == 0:
+                # End of domain name
+                break
+            labels.append(question_data[pointer + 1:pointer + 1 + label_length])
+            pointer += label_length + 1
         try:
-            while True:
-                label_length = question_data[pointer]
-                if label_length == 0:
-                    # End of domain name
-                    break
-                elif pointer != 0:
-                    # Add . before label if it's not the first one
-                    domain_name += "."
-                label = question_data[pointer + 1: pointer + 1 + label_length]
-                domain_name += label.decode("utf-8")
-                pointer += label_length + 1
-
-            if len(question_data) < (pointer + 5):
-                # there should be at least 4 bytes after pointer for query_type and query_class
-                raise FormatError("Malformed query.")
-            query_type = int.from_bytes(question_data[pointer + 1: pointer + 3], "big")
-            query_class = int.from_bytes(question_data[pointer + 3: pointer + 5], "big")
-
-            return DNSQueryQuestion(
-                domain_name=domain_name,
-                query_type=DNSRecordType(query_type),
-                query_class=query_class,
-                as_bytes=original_question_data
-            )
-        except Exception:
+            domain_name += b".".join(labels).decode("utf-8")
+        except UnicodeDecodeError:
+            return None
+
+        if question_length < pointer + 5:
+            # there should be at least 4 bytes after pointer for query_type and query_class
+            return None
+        query_type, query_class = QUESTION_TAIL_STRUCT.unpack_from(question_data, pointer + 1)
+        if query_type not in RECORD_TYPE_STRINGS:
+            return None
+
+        return DNSQueryQuestion(
+            domain_name=domain_name,
+            # Folded from the name bytes of the question, instead of encoding domain_name again
+            domain_name_key=DomainNameCodec.fold(question_data[:pointer + 1]),
+            query_type=DNSRecordType(query_type),
+            query_class=query_class,
+            as_bytes=question_data[:pointer + 5]
+        )
+
+    @staticmethod
+    def read_dns_query_question(question_data: bytes) -> DNSQueryQuestion:
+        """
+        Parses the DNS question section from the given question_data and returns a DNSQueryQuestion object.
+
+        :param question_data: The raw bytes starting with the DNS question section, which may be followed by other
+            sections.
+        :return: A DNSQueryQuestion object containing the parsed question data and the question section bytes.
+        :raises FormatError: If the question_data is malformed or does not match the expected format.
+        """
+        dns_query_question = DNSQueryResolver.parse_dns_query_question(question_data)
+        if dns_query_question is None:
             raise FormatError("Malformed query.")
+        return dns_query_question
+
+    @staticmethod
+    def parse_edns_options(query_data: bytes, offset: int, skipped_count: int,
+                           additional_count: int) -> Tuple[int, Optional[EDNSOptions]]:
+        """
+        Reads the resource records following the question section and returns a response code and, if the query has
+        an OPT record, its EDNS(0) options (RFC 6891).
+
+        Answer and authority records, which queries do not usually carry, and the other additional records are
+        skipped. Bytes following the last record are ignored.
+
+        :param query_data: The raw bytes representing the DNS query.
+        :param offset: The index of the first resource record, right after the question section.
+        :param skipped_count: The number of answer and authority records.
+        :param additional_count: The number of additional records.
+        :return: ResponseCode.NO_ERROR and the EDNS options, or None if the query has no OPT record, or the
+            FORMAT_ERROR response code and None if a record is malformed or the OPT record is invalid.
+        """
+        edns = None
+        query_length = len(query_data)
+        for record_index in range(skipped_count + additional_count):
+            name_start = offset
+            offset = DNSQueryResolver.skip_domain_name(query_data, offset)
+            if offset < 0 or offset + 10 > query_length:
+                return ResponseCode.FORMAT_ERROR, None
+            record_type, record_class, ttl, data_length = RECORD_HEADER_STRUCT.unpack_from(query_data, offset)
+            data_start = offset + 10
+            offset = data_start + data_length
+            if offset > query_length:
+                return ResponseCode.FORMAT_ERROR, None
+            if record_type != OPT_RECORD_TYPE:
+                continue
+            # There is at most one OPT record, in the additional section and owned by the root domain
+            if edns is not None or record_index < skipped_count or query_data[name_start] != 0:
+                return ResponseCode.FORMAT_ERROR, None
+            # The class holds the requestor's UDP payload size, the TTL its extended response code, version and flags
+            edns = EDNSOptions(
+                udp_payload_size=record_class,
+                version=ttl >> 16 & 0xff,
+                dnssec_ok=bool(ttl & 0x8000),
+                options=query_data[data_start:offset]
+            )
+        return ResponseCode.NO_ERROR, edns
+
+    @staticmethod
+    def skip_domain_name(message: bytes, offset: int) -> int:
+        """
+        Returns the index following the wire format domain name starting at the given offset of a DNS message.
+
+        The name ends with the root label or a compression pointer, which is not followed.
+
+        :param message: The raw bytes of the DNS message.
+        :param offset: The index of the first label of the domain name.
+        :return: The index following the domain name, or -1 if it is malformed or overruns the message.
+        """
+        message_length = len(message)
+        while offset < message_length:
+            label_length = message[offset]
+            if label_length >= 0xc0:
+                return offset + 2 if offset + 2 <= message_length else -1
+            if label_length > 63:
+                return -1
+            offset += label_length + 1
+            if label_length == 0:
+                return offset
+        return -1
 
     @staticmethod
     def validate_dns_query_length(query_data:bytes, authority_count: int, additional_count: int) -> bool:
@@ -142,5 +276,5 @@ class DNSQueryResolver:
         :param additional_count: The number of additional records in the DNS query.
         :return: True if the query data length is valid, False otherwise.
         """
-        # Query should be longer than header (12 bytes) plus authorization and additional record sections (2 bytes each)
-        return len(query_data) > 12 + authority_count * 2 + additional_count * 2
+        # Query should be longer than header (12 bytes) plus authority and additional records (at least 11 bytes each)
+        return len(query_data) > 12 + (authority_count + additional_count) * MIN_RECORD_SIZE
@@ -1,54 +1,395 @@
-from typing import Optional
+import socket
+from typing import Callable, Dict, Iterable, List, MutableMapping, Optional, Tuple
 
-from src.dns_response_factory import DNSResponseFactory
+from src.domain_name_codec import DomainNameCodec, WILDCARD_KEY_PREFIX
+from src.dns_response_factory import DNSResponseFactory, DEFAULT_RECORD_TTL
+from src.label_trie import ReverseLabelTrie
+from src.mmap_record_store import MmapRecordStore
+from src.record_data_codec import RecordDataCodec
+from src.weighted_address_set import MAX_ADDRESS_WEIGHT, WeightedAddressSet
 from src.custom_types.dns_query import DNSQuery
+from src.custom_types.dns_record_type import DNSRecordType
+from src.custom_types.register_operation import RegisterOperation
+from src.custom_types.resource_record_set import ResourceRecordSet
+
+A_RECORD_TYPE = DNSRecordType(1)
+CNAME_RECORD_TYPE = DNSRecordType(5)
+# The record types stored as RRsets: NS, CNAME, MX, TXT, AAAA and SRV, A records are stored in DNSRegister.records
+RECORD_SET_TYPES = frozenset((2, 5, 15, 16, 28, 33))
+# The query types answered from the register, other query types are answered with NOTIMP
+ANSWERED_RECORD_TYPES = RECORD_SET_TYPES | {A_RECORD_TYPE.value}
+# The longest CNAME chain followed within the register, which also stops CNAME loops
+MAX_CNAME_CHAIN_LENGTH = 8
 
 
 class DNSRegister:
     """
     DNSRegister is responsible for registering and resolving domain names with associated IP addresses.
 
+    Records are keyed by the lowercased wire format of the domain names (see DomainNameCodec), so lookups are case
+    insensitive and a query is resolved from the name bytes of the query without decoding them to a string. Domain
+    names are resolved with an exact lookup in the records. Wildcard names such as "*.example.com" are also
+    indexed in a ReverseLabelTrie, which resolves the names without exact record, such as "a.example.com" or
+    "b.a.example.com", with the deepest matching wildcard. Only wildcard names are indexed, so exact lookups keep the
+    cost and memory of a dictionary.
+
+    A records, the hot path of the server, map a name to a single IPv4 address string in records. The records of the
+    other answered types (NS, CNAME, MX, TXT, AAAA and SRV) are stored in rrsets, as ResourceRecordSets of RDATA
+    pre-encoded by RecordDataCodec, and only match exact names. resolve_records follows CNAME records within the
+    register, so a query for an alias is answered with the CNAME chain and the records of its canonical name.
+
+    A name can also carry several weighted IPv4 addresses, added and removed one at a time with add_address and
+    remove_address. They are held by a WeightedAddressSet in address_sets, which rotates them across answers and takes
+    precedence over the name's entry in records, if any: the first address added to a name with a record in records
+    joins that record, and removing an address from a name without address set shadows its record with an empty set.
+    register_domain replaces the address set of the name with its single address.
+
     Attributes:
     -----------
     dns_response_factory: DNSResponseFactory
         An instance of DNSResponseFactory to generate DNS response messages.
-    records: dict
-        A dictionary that maps domain names (str) to their corresponding IP addresses (str).
+    records: MutableMapping[bytes, str]
+        A mapping of domain name keys (bytes) to their corresponding IP addresses (str): by default an in-memory
+        dictionary seeded with a few domains, or a persistent store such as MmapRecordStore.
+    rrsets: Dict[bytes, Dict[int, ResourceRecordSet]]
+        A dictionary that maps domain name keys to their RRsets, by record type value.
+    address_sets: Dict[bytes, WeightedAddressSet]
+        A dictionary that maps domain name keys to their weighted IPv4 addresses, for names with an address set.
+    wildcard_trie: ReverseLabelTrie
+        An index of the registered wildcard names and their IP addresses.
+    write_ahead_listeners: List[Callable[[str, str], None]]
+        Callables notified with the domain name and IP address of every registration before the records are written,
+        such as a RegisterJournal: a registration a write-ahead listener raises for is not applied.
+    register_listeners: List[Callable[[str, str], None]]
+        Callables notified with the domain name and IP address of every registration, once it is applied.
+    address_listeners: List[Callable[[str, str, int, int], None]]
+        Callables notified with the domain name, IP address, RegisterOperation and weight of every address added or
+        removed, before the address set is changed, such as a RegisterJournal: an operation an address listener raises
+        for is not applied.
+    record_listeners: List[Callable[[str, str], None]]
+        Callables notified with the domain name and record data of every RRset record registration, and with the
+        domain name and IP address of every address added or removed.
 
     Methods:
     --------
     register_domain(domain_name: str, ip_address: str)
         Registers a domain name with the provided IP address.
 
+    refresh_domain(domain_name: str, ip_address: str)
+        Applies a registration another process already wrote to shared records.
+
+    load_records(records: Iterable[Tuple[str, str]]) -> int
+        Registers every domain name and IP address of an iterable, streaming them into the records.
+
+    add_register_listener(listener: Callable[[str, str], None], write_ahead: bool)
+        Adds a callable to be notified of every registration.
+
+    register_record(domain_name: str, record_type: DNSRecordType, data: str, ttl: int)
+        Adds a record, given in presentation format, to the RRset of the domain name and record type.
+
+    add_record_listener(listener: Callable[[str, str], None])
+        Adds a callable to be notified of every RRset record registration and address set change.
+
+    add_address_listener(listener: Callable[[str, str, int, int], None])
+        Adds a callable to be notified of every address added or removed.
+
+    add_address(domain_name: str, ip_address: str, weight: int)
+        Adds an IP address with the given weight to the addresses of a domain name.
+
+    remove_address(domain_name: str, ip_address: str) -> bool
+        Removes an IP address from the addresses of a domain name.
+
     resolve_ip(dns_query: DNSQuery) -> Optional[str]
         Resolves the IP address associated with the domain name in the given DNS query.
+
+    resolve_records(dns_query: DNSQuery) -> Optional[List[Tuple[bytes, ResourceRecordSet]]]
+        Resolves the RRsets answering the given DNS query, following CNAME records.
     """
-    def __init__(self):
+    def __init__(self, records: Optional[MutableMapping[bytes, str]] = None):
         self.dns_response_factory = DNSResponseFactory()
-        self.records = {
-            "https://www.google.com": "172.217.1.110",
-            "https://www.yahoo.com": "74.6.231.21",
-            "https://www.nhl.com": "104.18.17.236",
-            "https://www.python.org": "151.101.193.168"
-        }
+        if records is None:
+            records = {
+                DomainNameCodec.encode("https://www.google.com"): "172.217.1.110",
+                DomainNameCodec.encode("https://www.yahoo.com"): "74.6.231.21",
+                DomainNameCodec.encode("https://www.nhl.com"): "104.18.17.236",
+                DomainNameCodec.encode("https://www.python.org"): "151.101.193.168"
+            }
+        self.records = records
+        self.rrsets = {}  # type: Dict[bytes, Dict[int, ResourceRecordSet]]
+        self.address_sets = {}  # type: Dict[bytes, WeightedAddressSet]
+        self.wildcard_trie = ReverseLabelTrie()
+        if isinstance(records, MmapRecordStore):
+            # The store keeps its wildcard names apart, so opening it does not scan every record
+            wildcard_records = records.wildcard_items()  # type: Iterable[Tuple[bytes, str]]
+        else:
+            wildcard_records = [(domain_name_key, ip_address) for domain_name_key, ip_address in records.items()
+                                if domain_name_key.startswith(WILDCARD_KEY_PREFIX)]
+        for domain_name_key, ip_address in wildcard_records:
+            self.wildcard_trie.insert(DomainNameCodec.decode(domain_name_key), ip_address)
+        self.write_ahead_listeners = []  # type: List[Callable[[str, str], None]]
+        self.register_listeners = []  # type: List[Callable[[str, str], None]]
+        self.address_listeners = []  # type: List[Callable[[str, str, int, int], None]]
+        self.record_listeners = []  # type: List[Callable[[str, str], None]]
 
     def register_domain(self, domain_name: str, ip_address: str):
         """
-        Registers a domain name with the provided IP address.
+        Registers a domain name with the provided IP address, replacing the address set of the domain name, if any.
 
         :param domain_name: The domain name to be registered (e.g., "example.com").
         :param ip_address: The IP address associated with the domain name (e.g., "1.2.3.4").
+        :raises ValueError: If the domain name or the IP address is invalid, before anything is written.
+        """
+        domain_name_key = DomainNameCodec.encode(domain_name)
+        try:
+            socket.inet_aton(ip_address)
+        except OSError:
+            raise ValueError(f"Invalid IPv4 address: {ip_address}.")
+        for listener in self.write_ahead_listeners:
+            listener(domain_name, ip_address)
+        self.records[domain_name_key] = ip_address
+        self._apply_registration(domain_name, domain_name_key, ip_address)
+
+    def refresh_domain(self, domain_name: str, ip_address: str):
+        """
+        Applies a registration another process already wrote to shared records.
+
+        The records, such as an MmapRecordStore mapped by several processes, are not written again: only the wildcard
+        index and the address sets of this process are updated, and the listeners notified, so their caches are
+        invalidated.
+
+        :param domain_name: The registered domain name (e.g., "example.com").
+        :param ip_address: The IP address associated with the domain name (e.g., "1.2.3.4").
+        """
+        self._apply_registration(domain_name, DomainNameCodec.encode(domain_name), ip_address)
+
+    def load_records(self, records: Iterable[Tuple[str, str]]) -> int:
+        """
+        Registers every domain name and IP address of an iterable, streaming them into the records.
+
+        When nothing listens to the registrations and no address set was added, as when zones are loaded at startup, an
+        in-memory dictionary is filled directly, without going through register_domain. Records whose domain name
+        cannot be encoded are skipped, so each domain name is only encoded once.
+
+        :param records: An iterable of (domain name, IP address) tuples, consumed once.
+        :return: The number of records skipped because their domain name cannot be encoded.
+        """
+        if isinstance(self.records, dict) and not self.write_ahead_listeners and not self.register_listeners \
+                and not self.address_sets:
+            return self._load_encoded_records(records)
+        skipped_count = 0
+        for domain_name, ip_address in records:
+            try:
+                self.register_domain(domain_name, ip_address)
+            except ValueError:
+                skipped_count += 1
+        return skipped_count
+
+    def add_register_listener(self, listener: Callable[[str, str], None], write_ahead: bool = False):
+        """
+        Adds a callable to be notified of every registration.
+
+        :param listener: A callable receiving the registered domain name and IP address.
+        :param write_ahead: Whether the listener is notified before the records are written, see
+            write_ahead_listeners, instead of once the registration is applied.
+        """
+        if write_ahead:
+            self.write_ahead_listeners.append(listener)
+        else:
+            self.register_listeners.append(listener)
+
+    def register_record(self, domain_name: str, record_type: DNSRecordType, data: str, ttl: int = DEFAULT_RECORD_TTL):
+        """
+        Adds a record, given in presentation format, to the RRset of the domain name and record type.
+
+        A records are registered with register_domain. A CNAME RRset holds a single record, so registering a CNAME
+        record replaces it. The TTL applies to the whole RRset (RFC 2181 section 5.2).
+
+        :param domain_name: The owner name of the record (e.g., "example.com").
+        :param record_type: The type of the record.
+        :param data: The record data in presentation format (e.g., "10 mail.example.com."), see RecordDataCodec.
+        :param ttl: The TTL of the RRset, in seconds.
+        :raises ValueError: If the record data is invalid or the record type is not supported.
+        """
+        if record_type is A_RECORD_TYPE:
+            self.register_domain(domain_name, data)
+            return
+        if record_type.value not in RECORD_SET_TYPES:
+            raise ValueError(f"Unsupported record type: {record_type.to_string()}.")
+        rdata = RecordDataCodec.encode(record_type, data)
+        rrsets = self.rrsets.setdefault(DomainNameCodec.encode(domain_name), {})
+        rrset = rrsets.get(record_type.value)
+        if rrset is None or record_type is CNAME_RECORD_TYPE:
+            rrsets[record_type.value] = ResourceRecordSet(record_type=record_type, ttl=ttl, rdatas=(rdata,))
+        else:
+            rrset.ttl = ttl
+            if rdata not in rrset.rdatas:
+                rrset.rdatas += (rdata,)
+        for listener in self.record_listeners:
+            listener(domain_name, data)
+
+    def add_record_listener(self, listener: Callable[[str, str], None]):
+        """
+        Adds a callable to be notified of every RRset record registration and address set change.
+
+        :param listener: A callable receiving the domain name and the registered record data or changed IP address.
+        """
+        self.record_listeners.append(listener)
+
+    def add_address_listener(self, listener: Callable[[str, str, int, int], None]):
+        """
+        Adds a callable to be notified of every address added or removed, see address_listeners.
+
+        :param listener: A callable receiving the domain name, the IP address, the RegisterOperation and the weight.
+        """
+        self.address_listeners.append(listener)
+
+    def add_address(self, domain_name: str, ip_address: str, weight: int = 1):
+        """
+        Adds an IP address with the given weight to the addresses of a domain name.
+
+        Adding an address already in the set of the domain name sets its weight. When the domain name has no address
+        set yet, its record in records, if any, joins the new set with a weight of 1.
+
+        :param domain_name: The domain name (e.g., "example.com"), wildcard names are not supported.
+        :param ip_address: The IPv4 address to add (e.g., "1.2.3.4").
+        :param weight: The share of the answers starting with the address, see WeightedAddressSet.
+        :raises ValueError: If the domain name is a wildcard name, the IP address is invalid or the weight is not
+            between 1 and MAX_ADDRESS_WEIGHT, before anything is changed.
+        """
+        domain_name_key = DomainNameCodec.encode(domain_name)
+        if domain_name_key.startswith(WILDCARD_KEY_PREFIX):
+            raise ValueError(f"Addresses cannot be added to wildcard name {domain_name}.")
+        if not 1 <= weight <= MAX_ADDRESS_WEIGHT:
+            raise ValueError(f"Invalid address weight: {weight}.")
+        try:
+            socket.inet_aton(ip_address)
+        except OSError:
+            raise ValueError(f"Invalid IPv4 address: {ip_address}.")
+        for listener in self.address_listeners:
+            listener(domain_name, ip_address, RegisterOperation.ADD_ADDRESS, weight)
+        address_set = self.address_sets.get(domain_name_key)
+        if address_set is None:
+            address_set = WeightedAddressSet()
+            registered_ip_address = self.records.get(domain_name_key)
+            if registered_ip_address is not None:
+                address_set.add(registered_ip_address)
+        address_set.add(ip_address, weight)
+        self.address_sets[domain_name_key] = address_set
+        for listener in self.record_listeners:
+            listener(domain_name, ip_address)
+
+    def remove_address(self, domain_name: str, ip_address: str) -> bool:
         """
-        self.records[domain_name] = ip_address
+        Removes an IP address from the addresses of a domain name.
+
+        A domain name whose last address is removed keeps an empty address set, so it has no A record even if it is
+        still in records, until an address is added or it is registered again.
+
+        :param domain_name: The domain name (e.g., "example.com").
+        :param ip_address: The IPv4 address to remove (e.g., "1.2.3.4").
+        :return: True if the address was an address of the domain name, False otherwise.
+        """
+        domain_name_key = DomainNameCodec.encode(domain_name)
+        address_set = self.address_sets.get(domain_name_key)
+        if address_set is not None:
+            if ip_address not in address_set.weights:
+                return False
+        elif self.records.get(domain_name_key) != ip_address:
+            return False
+        for listener in self.address_listeners:
+            listener(domain_name, ip_address, RegisterOperation.REMOVE_ADDRESS, 0)
+        if address_set is not None:
+            address_set.remove(ip_address)
+        else:
+            self.address_sets[domain_name_key] = WeightedAddressSet()
+        for listener in self.record_listeners:
+            listener(domain_name, ip_address)
+        return True
 
     def resolve_ip(self, dns_query: DNSQuery) -> Optional[str]:
         """
         Resolves the IP address associated with the domain name in the given DNS query.
 
         :param dns_query: The DNS query containing the domain name to be resolved.
-        :return: The IP address associated with the domain name if found, None otherwise.
+        :return: The IP address associated with the domain name, or with its deepest matching wildcard name, if found,
+            None otherwise.
         """
-        if dns_query.domain_name in self.records:
-            return self.records[dns_query.domain_name]
-        else:
-            return None
+        domain_name_key = dns_query.domain_name_key
+        ip_address = self.records.get(domain_name_key)
+        if ip_address is None and self.wildcard_trie:
+            return self.wildcard_trie.lookup(DomainNameCodec.decode(domain_name_key))
+        return ip_address
+
+    def resolve_records(self, dns_query: DNSQuery) -> Optional[List[Tuple[bytes, ResourceRecordSet]]]:
+        """
+        Resolves the RRsets answering the given DNS query, following CNAME records.
+
+        When the queried name has a CNAME record and no record of the query type, the CNAME RRset is part of the answer
+        and the lookup continues with its canonical name, for at most MAX_CNAME_CHAIN_LENGTH names. A records of the
+        canonical names are resolved from their address set if they have one, and like resolve_ip otherwise, wildcard
+        names included.
+
+        :param dns_query: The DNS query, with a query type of ANSWERED_RECORD_TYPES.
+        :return: The owner name keys and RRsets of the answer, in order: the CNAME chain, then the RRset of the query
+            type if the chain ends in the register. An empty list if the name exists without records of the query type,
+            or None if the name does not exist.
+        """
+        domain_name_key = dns_query.domain_name_key
+        record_type = dns_query.query_type.value
+        answers = []  # type: List[Tuple[bytes, ResourceRecordSet]]
+        for _ in range(MAX_CNAME_CHAIN_LENGTH):
+            rrsets = self.rrsets.get(domain_name_key)
+            if rrsets is not None:
+                rrset = rrsets.get(record_type)
+                if rrset is not None:
+                    answers.append((domain_name_key, rrset))
+                    return answers
+                rrset = rrsets.get(CNAME_RECORD_TYPE.value)
+                if rrset is not None:
+                    answers.append((domain_name_key, rrset))
+                    domain_name_key = rrset.rdatas[0]
+                    continue
+            address_set = self.address_sets.get(domain_name_key) if self.address_sets else None
+            if address_set is not None:
+                ip_address = None
+                has_address = address_set.answer_count > 0
+            else:
+                ip_address = self.records.get(domain_name_key)
+                if ip_address is None and self.wildcard_trie:
+                    ip_address = self.wildcard_trie.lookup(DomainNameCodec.decode(domain_name_key))
+                has_address = ip_address is not None
+            if has_address and record_type == A_RECORD_TYPE.value:
+                if address_set is not None:
+                    # Only A answers advance the rotation
+                    answers.append((domain_name_key, address_set.next_rrset()))
+                else:
+                    answers.append((domain_name_key, ResourceRecordSet(
+                        record_type=A_RECORD_TYPE, ttl=DEFAULT_RECORD_TTL, rdatas=(socket.inet_aton(ip_address),))))
+            elif not answers and rrsets is None and not has_address:
+                return None
+            return answers
+        return answers
+
+    def _apply_registration(self, domain_name: str, domain_name_key: bytes, ip_address: str):
+        if self.address_sets:
+            self.address_sets.pop(domain_name_key, None)
+        if domain_name_key.startswith(WILDCARD_KEY_PREFIX):
+            self.wildcard_trie.insert(DomainNameCodec.decode(domain_name_key), ip_address)
+        for listener in self.register_listeners:
+            listener(domain_name, ip_address)
+
+    def _load_encoded_records(self, records: Iterable[Tuple[str, str]]) -> int:
+        store = self.records
+        encode = DomainNameCodec.encode
+        wildcard_trie = self.wildcard_trie
+        skipped_count = 0
+        for domain_name, ip_address in records:
+            try:
+                domain_name_key = encode(domain_name)
+            except ValueError:
+                skipped_count += 1
+                continue
+            if domain_name_key.startswith(WILDCARD_KEY_PREFIX):
+                wildcard_trie.insert(DomainNameCodec.decode(domain_name_key), ip_address)
+            store[domain_name_key] = ip_address
+        return skipped_count
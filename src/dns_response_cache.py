@@ -0,0 +1,166 @@
+import time
+from typing import Dict, List, Optional, Tuple
+
+from src.dns_response_factory import DEFAULT_RECORD_TTL
+from src.domain_name_codec import DomainNameCodec
+from src.custom_types.dns_query import DNSQuery
+
+# Header counts of a query with exactly one question and no other section
+SINGLE_QUESTION_COUNTS = b"\x00\x01\x00\x00\x00\x00\x00\x00"
+# Header counts of a query with exactly one question and an EDNS(0) OPT record
+EDNS_SINGLE_QUESTION_COUNTS = b"\x00\x01\x00\x00\x00\x00\x00\x01"
+# The size of an OPT record without options
+PLAIN_OPT_RECORD_SIZE = 11
+
+
+class DNSResponseCache:
+    """
+    DNSResponseCache stores fully encoded DNS responses so identical questions are answered without being parsed,
+    resolved or encoded again.
+
+    Responses are stored without their 2-byte transaction ID, which is the only part that changes between identical
+    questions, and are keyed on the bytes following the header: the question section and, for EDNS(0) queries, an OPT
+    record without options. The question section ends with QTYPE and QCLASS, so the key covers the query type as well
+    as the domain name, and the OPT record covers the UDP payload size the response was generated for. A hit costs one
+    dict lookup, a clock read and splicing the transaction ID of the query in front of the cached bytes. Entries are
+    removed when their domain name is registered again, and also expire ttl seconds after being stored, so a response
+    is never served for longer than the TTL of its records.
+
+    Attributes:
+    -----------
+    max_entries: int
+        The maximum number of cached responses, the oldest entry is evicted when it is reached.
+    ttl: float
+        The number of seconds a response stays cached, DEFAULT_RECORD_TTL by default.
+    responses: Dict[bytes, Tuple[bytes, float]]
+        A dictionary that maps cache keys to the encoded response without its transaction ID and its expiry, in
+        time.monotonic() seconds.
+    questions_by_domain_name_key: Dict[bytes, List[bytes]]
+        A dictionary that maps domain name keys (see DomainNameCodec) to the cache keys of that name, in any letter
+        case.
+
+    Methods:
+    --------
+    lookup_query(query_data: bytes) -> Optional[bytes]
+        Returns the cached response for a raw single question DNS query, with the query's transaction ID.
+
+    store(dns_query: DNSQuery, response: bytes)
+        Caches the response generated for the given DNS query.
+
+    cache_key(dns_query: DNSQuery) -> Optional[bytes]
+        Returns the key the response to the given DNS query is cached under, if it can be cached.
+
+    invalidate(domain_name: str, ip_address: Optional[str])
+        Removes every cached response for the given domain name.
+
+    clear()
+        Removes every cached response.
+    """
+    def __init__(self, max_entries: int = 65536, ttl: float = DEFAULT_RECORD_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.responses = {}  # type: Dict[bytes, Tuple[bytes, float]]
+        self.questions_by_domain_name_key = {}  # type: Dict[bytes, List[bytes]]
+        self._domain_name_key_by_question = {}  # type: Dict[bytes, bytes]
+
+    def lookup_query(self, query_data: bytes) -> Optional[bytes]:
+        """
+        Returns the cached response for a raw single question DNS query, with the query's transaction ID.
+
+        :param query_data: The raw bytes of the DNS query message.
+        :return: The cached response if the query has a single question that is cached and not expired, None otherwise.
+        """
+        section_counts = query_data[4:12]
+        if section_counts != SINGLE_QUESTION_COUNTS and section_counts != EDNS_SINGLE_QUESTION_COUNTS:
+            return None
+        question = query_data[12:]
+        cached_response = self.responses.get(question)
+        if cached_response is None:
+            return None
+        response, expires_at = cached_response
+        if expires_at <= time.monotonic():
+            self._evict(question)
+            return None
+        return query_data[:2] + response
+
+    def store(self, dns_query: DNSQuery, response: bytes):
+        """
+        Caches the response generated for the given DNS query.
+
+        :param dns_query: The DNS query the response was generated for.
+        :param response: The encoded DNS response message.
+        """
+        question = self.cache_key(dns_query)
+        if question is None:
+            return
+        cached_response = (response[2:], time.monotonic() + self.ttl)
+        if question in self.responses:
+            self.responses[question] = cached_response
+            return
+        if len(self.responses) >= self.max_entries:
+            self._evict(next(iter(self.responses)))
+        self.responses[question] = cached_response
+        domain_name_key = dns_query.domain_name_key
+        self._domain_name_key_by_question[question] = domain_name_key
+        self.questions_by_domain_name_key.setdefault(domain_name_key, []).append(question)
+
+    @staticmethod
+    def cache_key(dns_query: DNSQuery) -> Optional[bytes]:
+        """
+        Returns the key the response to the given DNS query is cached under, if it can be cached.
+
+        Only queries made of the header, a single question and optionally an OPT record without options are cached, so
+        the query type of a cached query is at a fixed offset from its end.
+
+        :param dns_query: The DNS query.
+        :return: The bytes following the header of the query, or None if the query has other sections or bytes.
+        """
+        original_query = dns_query.original_query
+        key_length = len(dns_query.question)
+        if dns_query.edns is None:
+            section_counts = SINGLE_QUESTION_COUNTS
+        else:
+            section_counts = EDNS_SINGLE_QUESTION_COUNTS
+            key_length += PLAIN_OPT_RECORD_SIZE
+        if len(original_query) != 12 + key_length or original_query[4:12] != section_counts:
+            return None
+        return original_query[12:]
+
+    def invalidate(self, domain_name: str, ip_address: Optional[str] = None):
+        """
+        Removes every cached response for the given domain name.
+
+        The signature matches DNSRegister listeners, so the cache can be notified of every registration. A wildcard name
+        such as "*.example.com" can answer any name below "example.com", so every cached response below it is removed.
+
+        :param domain_name: The domain name whose responses are removed.
+        :param ip_address: The newly registered IP address, unused.
+        """
+        domain_name_key = DomainNameCodec.encode(domain_name)
+        if domain_name.startswith("*."):
+            # Skip the wire format "*" label
+            suffix = domain_name_key[2:]
+            for cached_key in [key for key in self.questions_by_domain_name_key if key.endswith(suffix)]:
+                self._invalidate_key(cached_key)
+        self._invalidate_key(domain_name_key)
+
+    def clear(self):
+        """
+        Removes every cached response.
+        """
+        self.responses.clear()
+        self.questions_by_domain_name_key.clear()
+        self._domain_name_key_by_question.clear()
+
+    def _invalidate_key(self, domain_name_key: bytes):
+        for question in self.questions_by_domain_name_key.pop(domain_name_key, ()):
+            del self.responses[question]
+            del self._domain_name_key_by_question[question]
+
+    def _evict(self, question: bytes):
+        del self.responses[question]
+        domain_name_key = self._domain_name_key_by_question.pop(question)
+        questions = self.questions_by_domain_name_key[domain_name_key]
+        questions.remove(question)
+        if not questions:
+            del self.questions_by_domain_name_key[domain_name_key]
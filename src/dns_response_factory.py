@@ -1,6 +1,34 @@
 import socket
+from typing import List, Optional, Tuple
 
+from src.dns_message_builder import ADDITIONAL_SECTION, ANSWER_SECTION, DNSMessageBuilder, HEADER_SIZE, \
+    RECORD_FIELDS_STRUCT
 from src.custom_types.dns_query import DNSQuery
+from src.custom_types.edns_options import EDNSOptions
+from src.custom_types.resource_record_set import ResourceRecordSet
+
+# Flags (standard response with the error code) and section counts (one question) of the error responses, by error code
+ERROR_RESPONSE_HEADERS = tuple(b"\x81" + bytes([error_code]) + b"\x00\x01\x00\x00\x00\x00\x00\x00"
+                               for error_code in range(16))
+# The same headers for EDNS(0) queries, whose responses end with an OPT record
+EDNS_ERROR_RESPONSE_HEADERS = tuple(b"\x81" + bytes([error_code]) + b"\x00\x01\x00\x00\x00\x00\x00\x01"
+                                    for error_code in range(16))
+EMPTY_QUESTION = b"\x00\x00\x00\x00\x00\x01"
+GENERIC_TRANSACTION_ID = b"\x00\x00"
+# The largest UDP response sent to requestors without EDNS(0) (RFC 1035 section 4.2.1)
+MIN_UDP_PAYLOAD_SIZE = 512
+# The UDP payload size advertised in the OPT records, and the largest UDP response sent, chosen to avoid IP
+# fragmentation on common paths (DNS Flag Day 2020)
+EDNS_UDP_PAYLOAD_SIZE = 1232
+# Root owner name, type OPT, then the advertised UDP payload size as the class
+OPT_RECORD_PREFIX = b"\x00\x00\x29" + EDNS_UDP_PAYLOAD_SIZE.to_bytes(2, "big")
+# Extended response code 0, version 0, no flags and no options
+OPT_RECORD = OPT_RECORD_PREFIX + b"\x00\x00\x00\x00\x00\x00"
+TRUNCATED_FLAG = 0x02
+# The TTL of the records without TTL of their own, such as the A records of DNSRegister
+DEFAULT_RECORD_TTL = 14
+# Standard response, recursion desired and available, no error
+RESPONSE_FLAGS = b"\x81\x80"
 
 
 class DNSResponseFactory:
@@ -12,9 +40,24 @@ class DNSResponseFactory:
     generate_response(dns_query: DNSQuery, resolved_ip: str) -> bytes:
         Generates a DNS response message containing the resolved IP address for the given DNS query.
 
-    generate_error_response(transaction_id: Optional[bytes], error_code: int) -> bytes:
+    generate_answers_response(dns_query: DNSQuery, answer_count: int, answers: bytes) -> bytes:
+        Generates a DNS response message answering the given DNS query with a pre-encoded answer section.
+
+    generate_records_response(dns_query: DNSQuery, answers: List[Tuple[bytes, ResourceRecordSet]]) -> bytes:
+        Generates a DNS response message answering the given DNS query with the records of the given RRsets.
+
+    generate_error_response(transaction_id: Optional[bytes], error_code: int, question: Optional[bytes],
+                            edns: Optional[EDNSOptions]) -> bytes:
         Generates a DNS response message for an error condition, based on the provided error code and, optionally,
-        the original transaction ID.
+        the original transaction ID, question and EDNS(0) options.
+
+    generate_truncated_response(dns_query: DNSQuery, response: bytes) -> bytes:
+        Generates the response sent over UDP instead of a response too large for the requestor's UDP payload size.
+
+    max_udp_response_size(dns_query: Optional[DNSQuery]) -> int:
+        Returns the size of the largest response that can be sent over UDP for the given DNS query.
+
+    Responses to queries with an EDNS(0) OPT record end with an OPT record advertising EDNS_UDP_PAYLOAD_SIZE.
     """
     @staticmethod
     def generate_response(dns_query: DNSQuery, resolved_ip: str) -> bytes:
@@ -32,7 +75,8 @@ class DNSResponseFactory:
         response += b"\x00\x01"  # One question
         response += b"\x00\x01"  # One answer
         response += b"\x00\x00"  # No authority records
-        response += b"\x00\x00"  # No additional records
+        # An OPT additional record for EDNS(0) queries, no additional records otherwise
+        response += b"\x00\x00" if dns_query.edns is None else b"\x00\x01"
 
         # Add the question section from the original query to the response
         response += dns_query.question
@@ -45,36 +89,109 @@ class DNSResponseFactory:
         response += b"\x00\x04"  # RDLENGTH: 4 bytes for IPv4 address
         response += socket.inet_aton(resolved_ip)  # RDATA: IPv4 address in binary format
 
+        if dns_query.edns is not None:
+            response += OPT_RECORD
+
         return response
 
     @staticmethod
-    def generate_error_response(error_code: int, transaction_id: bytes = None, question: bytes = None) -> bytes:
+    def generate_answers_response(dns_query: DNSQuery, answer_count: int, answers: bytes) -> bytes:
+        """
+        Generates a DNS response message answering the given DNS query with a pre-encoded answer section.
+
+        The owner names of the answers may point to the question name, which always starts at offset 12, such as the
+        answer blocks of WeightedAddressSet.
+
+        :param dns_query: The original DNS query for which the response is generated.
+        :param answer_count: The number of records of the answer section.
+        :param answers: The encoded answer section.
+        :return: The crafted DNS response message as bytes.
+        """
+        header = dns_query.transaction_id + RESPONSE_FLAGS + b"\x00\x01" + answer_count.to_bytes(2, "big") + b"\x00\x00"
+        if dns_query.edns is None:
+            return header + b"\x00\x00" + dns_query.question + answers
+        return header + b"\x00\x01" + dns_query.question + answers + OPT_RECORD
+
+    @staticmethod
+    def generate_records_response(dns_query: DNSQuery, answers: List[Tuple[bytes, ResourceRecordSet]]) -> bytes:
+        """
+        Generates a DNS response message answering the given DNS query with the records of the given RRsets.
+
+        The response is written by a DNSMessageBuilder, which compresses the owner names and the domain names ending
+        CNAME, NS and MX RDATA, into a buffer allocated once with the size of the uncompressed response. A response
+        without answers is a NODATA response.
+
+        :param dns_query: The original DNS query for which the response is generated.
+        :param answers: The owner name keys and RRsets of the answer section, see DNSRegister.resolve_records.
+        :return: The crafted DNS response message as bytes.
+        """
+        question = dns_query.question
+        capacity = HEADER_SIZE + len(question) + len(OPT_RECORD)
+        for owner_name_key, rrset in answers:
+            rdatas = rrset.rdatas
+            capacity += (len(owner_name_key) + RECORD_FIELDS_STRUCT.size) * len(rdatas) + sum(map(len, rdatas))
+
+        message_builder = DNSMessageBuilder(capacity)
+        message_builder.start(dns_query.transaction_id, RESPONSE_FLAGS, question)
+        for owner_name_key, rrset in answers:
+            message_builder.add_rrset(ANSWER_SECTION, owner_name_key, rrset)
+        if dns_query.edns is not None:
+            message_builder.add_encoded_record(ADDITIONAL_SECTION, OPT_RECORD)
+        return message_builder.build()
+
+    @staticmethod
+    def generate_error_response(error_code: int, transaction_id: bytes = None, question: bytes = None,
+                                edns: Optional[EDNSOptions] = None) -> bytes:
         """
         Generates a DNS response message for an error condition, based on the provided error code and, optionally,
-        the original transaction ID and question.
+        the original transaction ID, question and EDNS(0) options.
 
-        :param error_code: The error code to be included in the DNS response.
+        :param error_code: The error code to be included in the DNS response, extended codes require EDNS options.
         :param transaction_id: The original transaction ID from the DNS query (optional).
         :param question: The original question from the DNS query (optional).
+        :param edns: The EDNS options of the DNS query, the response then ends with an OPT record (optional).
         :return: The crafted DNS error response message as bytes.
         """
         if question is None:
-            question = b"\x00\x00\x00\x00\x00\x01"  # Empty question
-        else:
-            question = question
+            question = EMPTY_QUESTION
         if transaction_id is None:
-            transaction_id = b"\x00\x00"  # Generic transaction ID
-        else:
-            transaction_id = transaction_id  # Original transaction id
+            transaction_id = GENERIC_TRANSACTION_ID
+
+        # The header after the transaction ID only depends on the error code, so it is pre-built
+        if edns is None:
+            return transaction_id + ERROR_RESPONSE_HEADERS[error_code] + question
+        if error_code < 16:
+            return transaction_id + EDNS_ERROR_RESPONSE_HEADERS[error_code] + question + OPT_RECORD
+        # The upper 8 bits of an extended response code are carried by the TTL of the OPT record
+        return transaction_id + EDNS_ERROR_RESPONSE_HEADERS[error_code & 15] + question + OPT_RECORD_PREFIX \
+            + bytes([error_code >> 4]) + b"\x00\x00\x00\x00\x00"
 
-        flags = b"\x81" + bytes([error_code])  # Add error code in flags field
-        question_count = b"\x00\x01"  # One question
-        answer_count = b"\x00\x00"  # No answer
-        authority_count = b"\x00\x00"  # No authority record
-        additional_count = b"\x00\x00"  # No additional record
-        dns_response = transaction_id + flags + question_count + answer_count + authority_count + additional_count
+    @staticmethod
+    def generate_truncated_response(dns_query: DNSQuery, response: bytes) -> bytes:
+        """
+        Generates the response sent over UDP instead of a response too large for the requestor's UDP payload size.
+
+        The truncated response keeps the flags and response code of the response, with the TC flag set so the requestor
+        retries over TCP, but only the question section and, for EDNS(0) queries, the OPT record.
+
+        :param dns_query: The DNS query the response was generated for.
+        :param response: The DNS response message too large for UDP.
+        :return: The truncated DNS response message as bytes.
+        """
+        header = response[:2] + bytes([response[2] | TRUNCATED_FLAG]) + response[3:4] + b"\x00\x01\x00\x00\x00\x00"
+        if dns_query.edns is None:
+            return header + b"\x00\x00" + dns_query.question
+        return header + b"\x00\x01" + dns_query.question + OPT_RECORD
 
-        # Append the question to the response
-        dns_response += question
+    @staticmethod
+    def max_udp_response_size(dns_query: Optional[DNSQuery]) -> int:
+        """
+        Returns the size of the largest response that can be sent over UDP for the given DNS query.
 
-        return dns_response
+        :param dns_query: The DNS query, None if it could not be parsed.
+        :return: The UDP payload size advertised by the query, between MIN_UDP_PAYLOAD_SIZE and EDNS_UDP_PAYLOAD_SIZE,
+            or MIN_UDP_PAYLOAD_SIZE if the query has no OPT record.
+        """
+        if dns_query is None or dns_query.edns is None:
+            return MIN_UDP_PAYLOAD_SIZE
+        return min(max(dns_query.edns.udp_payload_size, MIN_UDP_PAYLOAD_SIZE), EDNS_UDP_PAYLOAD_SIZE)
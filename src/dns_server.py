@@ -1,11 +1,31 @@
+import functools
+import logging
 import select
 import socket
+import time
+from typing import Callable, List, Optional, Tuple
 
-from src.dns_register import DNSRegister
+from src.dns_metrics import DNSMetrics, GENERATE_RESPONSE_STAGE, READ_QUERY_STAGE, RECV_STAGE, RESOLVE_IP_STAGE, \
+    SEND_STAGE
+from src.dns_forwarder import DNSForwarder
+from src.dns_register import ANSWERED_RECORD_TYPES, A_RECORD_TYPE, CNAME_RECORD_TYPE, DNSRegister
 from src.dns_query_resolver import DNSQueryResolver
-from src.dns_response_factory import DNSResponseFactory
+from src.dns_response_cache import DNSResponseCache
+from src.dns_response_factory import DNSResponseFactory, MIN_UDP_PAYLOAD_SIZE
+from src.mmap_record_store import MmapRecordStore
+from src.negative_answer_cache import NegativeAnswerCache
+from src.query_log_writer import QueryLogWriter
+from src.register_journal import RegisterJournal
 from src.register_request_resolver import RegisterRequestResolver
-from src.custom_types.error_types import NoRecordError, FormatError, FunctionalityNotImplementedError
+from src.single_flight import SingleFlight
+from src.custom_types.register_operation import RegisterOperation
+from src.custom_types.response_code import ResponseCode
+
+logger = logging.getLogger(__name__)
+
+# The size of the buffers DNS queries are received into, larger than the UDP payload size advertised to EDNS(0)
+# requestors so queries with large OPT records are not cut
+DNS_QUERY_BUFFER_SIZE = 4096
 
 
 class DNSServer:
@@ -16,12 +36,27 @@ class DNSServer:
     -----------
     dns_response_factory: DNSResponseFactory
         An instance of DNSResponseFactory to generate DNS response messages.
+    dns_response_cache: DNSResponseCache
+        An instance of DNSResponseCache storing encoded responses, invalidated on every registration.
+    negative_answer_cache: NegativeAnswerCache
+        An instance of NegativeAnswerCache storing encoded NXDOMAIN responses, invalidated on every registration.
     dns_resolver: DNSQueryResolver
         An instance of DNSQueryResolver to parse and handle DNS query messages.
     dns_register: DNSRegister
         An instance of DNSRegister to manage domain name registrations and IP addresses.
     register_request_resolver: RegisterRequestResolver
         An instance of RegisterRequestResolver to parse and handle DNS register request messages.
+    register_journal: Optional[RegisterJournal]
+        A started RegisterJournal making registrations durable before they are acknowledged, if any.
+    query_log: Optional[QueryLogWriter]
+        A started QueryLogWriter recording every DNS query and its response, if any.
+    dns_metrics: DNSMetrics
+        The counters and stage latency histograms of the server, served by MetricsExporter.
+    dns_forwarder: Optional[DNSForwarder]
+        A DNSForwarder the queries DNSRegister cannot answer are forwarded to, instead of being answered with NXDOMAIN
+        or NOTIMP, if any. Forwarding requires an asyncio engine, see handle_dns_query.
+    single_flight: SingleFlight
+        An instance of SingleFlight coalescing the identical queries forwarded concurrently into one upstream lookup.
     dns_query_socket: socket.socket
         A UDP socket used to receive DNS query messages.
     register_request_socket: socket.socket
@@ -29,7 +64,7 @@ class DNSServer:
 
     Methods:
     --------
-    create_dns_query_socket() -> socket.socket
+    create_dns_query_socket(address: Tuple[str, int], reuse_port: bool) -> socket.socket
         Creates and binds a UDP socket for receiving DNS query messages.
 
     create_register_request_socket() -> socket.socket
@@ -38,38 +73,75 @@ class DNSServer:
     listen()
         Listens for incoming DNS query and register request messages and handles them accordingly.
 
+    is_logging_dns_exchanges() -> bool
+        Returns whether log_dns_exchange records anything, so batch loops can skip it.
+
+    log_dns_exchange(data: bytes, response: bytes, client_address: Tuple[str, int])
+        Logs a DNS query and its response, and records them in the query log if there is one.
+
+    send_when_durable(send: Callable[[], None])
+        Sends a register request response once the registrations handled so far are durable.
+
     handle_register_request(data: bytes) -> bytes
         Handles a DNS register request message, generates a response, and returns it as bytes.
 
     generate_register_request_response(data: bytes) -> bytes
         Generates a response for a DNS register request message and returns it as bytes.
 
-    handle_dns_query(data: bytes) -> bytes
-        Handles a DNS query message, generates a response, and returns it as bytes.
+    handle_dns_query(data: bytes) -> Optional[bytes]
+        Handles a DNS query message, generates a response, and returns it as bytes, or None if it must be forwarded.
 
-    generate_dns_query_response(data: bytes) -> bytes
-        Generates a response for a DNS query message and returns it as bytes.
+    generate_dns_query_response(data: bytes) -> Optional[bytes]
+        Generates a response for a DNS query message and returns it as bytes, or None if it must be forwarded.
+
+    forward_dns_query(data: bytes) -> bytes
+        Forwards a DNS query handle_dns_query could not answer and returns the response as bytes.
+
+    handle_dns_queries(data_batch: List[bytes]) -> List[bytes]
+        Handles a batch of DNS query messages received over UDP and returns their responses in the same order.
+
+    fit_udp_response(data: bytes, response: bytes) -> bytes
+        Returns the response, truncated if it is larger than the UDP payload size of the query.
     """
     def __init__(self,
                  dns_resolver: DNSQueryResolver,
                  dns_register: DNSRegister,
-                 register_request_resolver: RegisterRequestResolver):
+                 register_request_resolver: RegisterRequestResolver,
+                 register_journal: Optional[RegisterJournal] = None,
+                 query_log: Optional[QueryLogWriter] = None,
+                 dns_metrics: Optional[DNSMetrics] = None,
+                 dns_forwarder: Optional[DNSForwarder] = None):
         self.dns_response_factory = DNSResponseFactory()
+        self.dns_response_cache = DNSResponseCache()
+        self.negative_answer_cache = NegativeAnswerCache()
         self.dns_resolver = dns_resolver
         self.dns_register = dns_register
+        self.dns_register.add_register_listener(self.dns_response_cache.invalidate)
+        self.dns_register.add_register_listener(self.negative_answer_cache.invalidate)
+        self.dns_register.add_record_listener(self.dns_response_cache.invalidate)
+        self.dns_register.add_record_listener(self.negative_answer_cache.invalidate)
         self.register_request_resolver = register_request_resolver
+        self.register_journal = register_journal
+        self.query_log = query_log
+        self.dns_metrics = dns_metrics if dns_metrics is not None else DNSMetrics()
+        self.dns_forwarder = dns_forwarder
+        self.single_flight = SingleFlight()
         self.dns_query_socket = self.create_dns_query_socket()
         self.register_request_socket = self.create_register_request_socket()
 
     @staticmethod
-    def create_dns_query_socket():
+    def create_dns_query_socket(address: Tuple[str, int] = ("0.0.0.0", 53), reuse_port: bool = False):
         """
         Creates and binds a UDP socket for receiving DNS query messages.
 
+        :param address: The address to bind the socket to.
+        :param reuse_port: Whether to set SO_REUSEPORT so several processes can bind the same address.
         :return: The created and bound UDP socket.
         """
         dns_query_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        dns_query_socket.bind(("0.0.0.0", 53))
+        if reuse_port:
+            dns_query_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        dns_query_socket.bind(address)
         return dns_query_socket
 
     @staticmethod
@@ -87,22 +159,71 @@ class DNSServer:
         """
         Listens for incoming DNS query and register request messages and handles them accordingly.
         """
-        print("Server is listening to post 53 for DNS query requests")
-        print("Server is listening to post 8080 for DNS register requests")
+        logger.info("Server is listening to port 53 for DNS query requests")
+        logger.info("Server is listening to port 8080 for DNS register requests")
+        dns_metrics = self.dns_metrics
         while True:
             ready_sockets, _, _ = select.select([self.dns_query_socket, self.register_request_socket], [], [])
             for sock in ready_sockets:
                 if sock == self.dns_query_socket:
-                    data, client_address = sock.recvfrom(1024)
-                    print(f"Received DNS query from {client_address[0]}:{client_address[1]}")
+                    stage_start = dns_metrics.sample_timing()
+                    data, client_address = sock.recvfrom(DNS_QUERY_BUFFER_SIZE)
+                    if stage_start:
+                        dns_metrics.observe_stage(RECV_STAGE, stage_start)
                     dns_response = self.handle_dns_query(data)
-                    print(f"DNS Response: {dns_response}")
+                    if len(dns_response) > MIN_UDP_PAYLOAD_SIZE:
+                        dns_response = self.fit_udp_response(data, dns_response)
+                    if stage_start:
+                        stage_start = time.perf_counter_ns()
                     self.dns_query_socket.sendto(dns_response, client_address)
+                    if stage_start:
+                        dns_metrics.observe_stage(SEND_STAGE, stage_start)
+                    self.log_dns_exchange(data, dns_response, client_address)
                 elif sock == self.register_request_socket:
                     data, client_address = sock.recvfrom(1024)
-                    print(f"Received DNS register request from {client_address[0]}:{client_address[1]}")
+                    logger.info("Received DNS register request from %s:%d", client_address[0], client_address[1])
                     register_request_response = self.handle_register_request(data)
-                    self.register_request_socket.sendto(register_request_response, client_address)
+                    self.send_when_durable(functools.partial(
+                        self.register_request_socket.sendto, register_request_response, client_address))
+
+    def is_logging_dns_exchanges(self) -> bool:
+        """
+        Returns whether log_dns_exchange records anything, so batch loops can skip it.
+
+        :return: True if DEBUG records are enabled or there is a query log, False otherwise.
+        """
+        return self.query_log is not None or logger.isEnabledFor(logging.DEBUG)
+
+    def log_dns_exchange(self, data: bytes, response: bytes, client_address: Tuple[str, int]):
+        """
+        Logs a DNS query and its response at the DEBUG level, and records them in the query log if there is one.
+
+        Neither the logger nor the query log write anything in the calling thread: records are queued and written by
+        background threads.
+
+        :param data: The raw bytes of the DNS query message.
+        :param response: The raw bytes of the DNS response message.
+        :param client_address: The address of the client that sent the query.
+        """
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("DNS query from %s:%d answered with %d bytes", client_address[0], client_address[1],
+                         len(response))
+        if self.query_log is not None:
+            self.query_log.log_exchange(data, response, client_address)
+
+    def send_when_durable(self, send: Callable[[], None]):
+        """
+        Sends a register request response once the registrations handled so far are durable.
+
+        Without a register journal the response is sent immediately. With one, it is sent by the journal's commit
+        thread once the registration is written to disk, so the send callable must be safe to call from that thread.
+
+        :param send: A callable sending the register request response.
+        """
+        if self.register_journal is None:
+            send()
+        else:
+            self.register_journal.when_durable(send)
 
     def handle_register_request(self, data: bytes) -> bytes:
         """
@@ -113,99 +234,221 @@ class DNSServer:
         """
         try:
             return self.generate_register_request_response(data)
-        except FormatError as error:
-            # Error code 1 (Format Error)
-            print(error)
-            return self.dns_response_factory.generate_error_response(transaction_id=data[:2], error_code=1)
-        except NoRecordError as error:
-            # Error code 3 (Name Error)
-            print(error)
-            return self.dns_response_factory.generate_error_response(transaction_id=data[:2], error_code=3)
-        except FunctionalityNotImplementedError as error:
-            # Error code 4 (Not Implemented Error)
-            print(error)
-            return self.dns_response_factory.generate_error_response(transaction_id=data[:2], error_code=4)
         except Exception as error:
-            # Error code 2 (Server Failure)
-            print(error)
-            return self.dns_response_factory.generate_error_response(transaction_id=None, error_code=2)
+            # Error code 2 (Server Failure), invalid requests are answered without raising
+            logger.error("Failed to handle DNS register request: %s", error)
+            self.dns_metrics.count_register_request(ResponseCode.SERVER_FAILURE)
+            return self.dns_response_factory.generate_error_response(transaction_id=None,
+                                                                     error_code=ResponseCode.SERVER_FAILURE)
 
     def generate_register_request_response(self, data: bytes) -> bytes:
         """
         Generates a response for a DNS register request message and returns it as bytes.
 
+        The request registers its IP address, or adds it to or removes it from the addresses of the domain name,
+        according to its RegisterOperation. Address sets are only kept in memory and made durable by the register
+        journal, so address operations are refused (REFUSED) when the records are persisted by an MmapRecordStore
+        without journal, where they would be lost on restart.
+
         :param data: The raw bytes of the DNS register request message.
         :return: The generated DNS register response message as bytes.
         """
-        register_request = self.register_request_resolver.read_request(data)
-        if register_request.record_type.to_string() != "A":
-            raise FunctionalityNotImplementedError(
-                message=f"Query type {register_request.record_type.to_string()} is not yet implemented.",
-                transaction_id=register_request.transaction_id
-            )
-        print(f"Registration successful. Domain name: {register_request.domain_name}"
-              f" IP Address: {register_request.ip_address}")
+        response_code, register_request = self.register_request_resolver.parse_request(data)
+        if response_code == ResponseCode.NO_ERROR and register_request.record_type.to_string() != "A":
+            response_code = ResponseCode.NOT_IMPLEMENTED
+        if response_code == ResponseCode.NO_ERROR and register_request.operation != RegisterOperation.REGISTER \
+                and self.register_journal is None and isinstance(self.dns_register.records, MmapRecordStore):
+            response_code = ResponseCode.REFUSED
+        if response_code != ResponseCode.NO_ERROR:
+            logger.warning("Invalid register request, error code %d.", response_code)
+            self.dns_metrics.count_register_request(response_code)
+            return self.dns_response_factory.generate_error_response(transaction_id=data[:2], error_code=response_code)
+        operation = register_request.operation
+        if operation == RegisterOperation.ADD_ADDRESS:
+            self.dns_register.add_address(register_request.domain_name, register_request.ip_address,
+                                          register_request.weight)
+        elif operation == RegisterOperation.REMOVE_ADDRESS:
+            self.dns_register.remove_address(register_request.domain_name, register_request.ip_address)
+        else:
+            self.dns_register.register_domain(register_request.domain_name, register_request.ip_address)
+        self.dns_metrics.count_register_request(ResponseCode.NO_ERROR)
+        logger.info("Registration successful. Domain name: %s IP Address: %s Operation: %d",
+                    register_request.domain_name, register_request.ip_address, operation)
         return register_request.transaction_id + b"\x01"
 
-    def handle_dns_query(self, data: bytes) -> bytes:
+    def handle_dns_query(self, data: bytes) -> Optional[bytes]:
         """
         Handles a DNS query message, generates a response, and returns it as bytes.
 
+        With a DNSForwarder, queries DNSRegister cannot answer are answered from the forwarder's cache, or reported
+        with None: the caller must then await forward_dns_query(data) to get the response.
+
         :param data: The raw bytes of the DNS query message.
-        :return: The generated DNS query response message as bytes.
+        :return: The generated DNS query response message as bytes, or None if the query must be forwarded.
         """
+        cached_response = self.dns_response_cache.lookup_query(data)
+        if cached_response is not None:
+            self.dns_metrics.count_cache_hit(data, cached_response)
+            return cached_response
+        cached_response = self.negative_answer_cache.lookup_query(data)
+        if cached_response is not None:
+            self.dns_metrics.count_cache_hit(data, cached_response, True)
+            return cached_response
+        self.dns_metrics.count_cache_miss()
         try:
             return self.generate_dns_query_response(data)
-        except FormatError as error:
-            # Error code 1 (Format Error)
-            print(error)
+        except Exception as error:
+            # Error code 2 (Server Failure), invalid queries are answered without raising
+            logger.error("Failed to handle DNS query: %s", error)
+            self.dns_metrics.count_query(0, ResponseCode.SERVER_FAILURE)
+            return self.dns_response_factory.generate_error_response(transaction_id=None,
+                                                                     error_code=ResponseCode.SERVER_FAILURE)
+
+    def generate_dns_query_response(self, data: bytes) -> Optional[bytes]:
+        """
+        Generates a response for a DNS query message and returns it as bytes.
+
+        A queries are answered from the address sets of DNSRegister, rotated on every query and never cached, or from
+        its A records. The other query types of ANSWERED_RECORD_TYPES, as well as A queries for names without A record,
+        are answered from its RRsets, following CNAME records. Names registered without records of the query type are
+        answered with an empty NOERROR (NODATA) response.
+
+        Invalid queries, unsupported query types and unknown domain names are answered with an error response built
+        from the response code of each step, without raising. With a DNSForwarder, unsupported query types and unknown
+        domain names are answered from the forwarder's cache instead, or reported with None to be forwarded.
+
+        :param data: The raw bytes of the DNS query message.
+        :return: The generated DNS query response message as bytes, or None if the query must be forwarded.
+        """
+        dns_metrics = self.dns_metrics
+        stage_start = dns_metrics.sample_timing()
+        response_code, dns_query = self.dns_resolver.parse_query(data)
+        if stage_start:
+            stage_start = dns_metrics.observe_stage(READ_QUERY_STAGE, stage_start)
+        if response_code != ResponseCode.NO_ERROR:
+            dns_metrics.count_query(0, response_code)
             return self.dns_response_factory.generate_error_response(
                 transaction_id=data[:2],
-                error_code=1,
-                question=error.question
+                error_code=response_code,
+                question=None
             )
-        except NoRecordError as error:
-            # Error code 3 (Name Error)
-            print(error)
+        query_type = dns_query.query_type
+        edns = dns_query.edns
+        if edns is not None and edns.version != 0:
+            # Only EDNS version 0 is implemented (RFC 6891 section 6.1.3)
+            dns_metrics.count_query(query_type.value, ResponseCode.BAD_VERSION)
             return self.dns_response_factory.generate_error_response(
                 transaction_id=data[:2],
-                error_code=3,
-                question=error.question
+                error_code=ResponseCode.BAD_VERSION,
+                question=dns_query.question,
+                edns=edns
             )
-        except FunctionalityNotImplementedError as error:
-            # Error code 4 (Not Implemented Error)
-            print(error)
+        if query_type is A_RECORD_TYPE:
+            address_sets = self.dns_register.address_sets
+            address_set = address_sets.get(dns_query.domain_name_key) if address_sets else None
+            if address_set is not None:
+                if address_set.answer_count:
+                    # The answers rotate on every query, so the response is not cached
+                    response = self.dns_response_factory.generate_answers_response(
+                        dns_query=dns_query,
+                        answer_count=address_set.answer_count,
+                        answers=address_set.next_answer_block()
+                    )
+                    if stage_start:
+                        dns_metrics.observe_stage(GENERATE_RESPONSE_STAGE, stage_start)
+                    dns_metrics.count_query(query_type.value, ResponseCode.NO_ERROR)
+                    return response
+            else:
+                resolved_ip = self.dns_register.resolve_ip(dns_query)
+                if stage_start:
+                    stage_start = dns_metrics.observe_stage(RESOLVE_IP_STAGE, stage_start)
+                if resolved_ip is not None:
+                    response = self.dns_response_factory.generate_response(dns_query=dns_query,
+                                                                           resolved_ip=resolved_ip)
+                    if stage_start:
+                        dns_metrics.observe_stage(GENERATE_RESPONSE_STAGE, stage_start)
+                    dns_metrics.count_query(query_type.value, ResponseCode.NO_ERROR)
+                    self.dns_response_cache.store(dns_query, response)
+                    return response
+        elif query_type.value not in ANSWERED_RECORD_TYPES:
+            if self.dns_forwarder is not None:
+                return self.dns_forwarder.lookup_query(data)
+            dns_metrics.count_query(query_type.value, ResponseCode.NOT_IMPLEMENTED)
             return self.dns_response_factory.generate_error_response(
                 transaction_id=data[:2],
-                error_code=4,
-                question=error.question
+                error_code=ResponseCode.NOT_IMPLEMENTED,
+                question=dns_query.question,
+                edns=edns
             )
-        except Exception as error:
-            # Error code 2 (Server Failure)
-            print(error)
-            return self.dns_response_factory.generate_error_response(transaction_id=None, error_code=2)
 
-    def generate_dns_query_response(self, data: bytes) -> bytes:
+        # Other answered types, and A queries for names without A record, which may have a CNAME record
+        answers = self.dns_register.resolve_records(dns_query)
+        if stage_start and query_type is not A_RECORD_TYPE:
+            stage_start = dns_metrics.observe_stage(RESOLVE_IP_STAGE, stage_start)
+        if answers is None:
+            if self.dns_forwarder is not None:
+                return self.dns_forwarder.lookup_query(data)
+            dns_metrics.count_query(query_type.value, ResponseCode.NAME_ERROR)
+            response = self.dns_response_factory.generate_error_response(
+                transaction_id=data[:2],
+                error_code=ResponseCode.NAME_ERROR,
+                question=dns_query.question,
+                edns=edns
+            )
+            self.negative_answer_cache.store(dns_query, response)
+            return response
+
+        response = self.dns_response_factory.generate_records_response(dns_query=dns_query, answers=answers)
+        if stage_start:
+            dns_metrics.observe_stage(GENERATE_RESPONSE_STAGE, stage_start)
+        dns_metrics.count_query(query_type.value, ResponseCode.NO_ERROR)
+        # Responses with a CNAME record also depend on the records of the canonical name, even when it has none yet,
+        # which do not invalidate the cached responses of the alias
+        if query_type is CNAME_RECORD_TYPE or all(rrset.record_type is not CNAME_RECORD_TYPE for _, rrset in answers):
+            self.dns_response_cache.store(dns_query, response)
+        return response
+
+    async def forward_dns_query(self, data: bytes) -> bytes:
         """
-        Generates a response for a DNS query message and returns it as bytes.
+        Forwards a DNS query handle_dns_query could not answer and returns the response as bytes.
+
+        Concurrent queries for the same question share a single upstream lookup, see SingleFlight.
 
         :param data: The raw bytes of the DNS query message.
-        :return: The generated DNS query response message as bytes.
-        """
-        dns_query = self.dns_resolver.read_query(data)
-        if dns_query.query_type.to_string() != "A":
-            raise FunctionalityNotImplementedError(
-                message=f"Query type {dns_query.query_type.to_string()} is not yet implemented.",
-                transaction_id=dns_query.transaction_id,
-                question=dns_query.question
-            )
+        :return: The response of the upstream resolvers, with the query's transaction ID and question.
+        """
+        return await self.single_flight.resolve(data, self.dns_forwarder.forward)
 
-        resolved_ip = self.dns_register.resolve_ip(dns_query)
-        if resolved_ip is None:
-            raise NoRecordError(
-                message="Domain cannot be found in our records.",
-                transaction_id=dns_query.transaction_id,
-                question=dns_query.question
-            )
+    def handle_dns_queries(self, data_batch: List[bytes]) -> List[bytes]:
+        """
+        Handles a batch of DNS query messages received over UDP and returns their responses in the same order.
 
-        return self.dns_response_factory.generate_response(dns_query=dns_query, resolved_ip=resolved_ip)
+        :param data_batch: The raw bytes of the DNS query messages.
+        :return: The generated DNS query response messages as bytes, truncated to the UDP payload size of each query.
+        """
+        handle_dns_query = self.handle_dns_query
+        responses = [handle_dns_query(data) for data in data_batch]
+        for index, response in enumerate(responses):
+            if len(response) > MIN_UDP_PAYLOAD_SIZE:
+                responses[index] = self.fit_udp_response(data_batch[index], response)
+        return responses
+
+    def fit_udp_response(self, data: bytes, response: bytes) -> bytes:
+        """
+        Returns the response, truncated if it is larger than the UDP payload size of the query.
+
+        Every response fits in MIN_UDP_PAYLOAD_SIZE bytes unless the query advertises a larger UDP payload size with an
+        EDNS(0) OPT record, so the UDP loops only call this method for larger responses, which reparses the query.
+        Responses are cached and answered over TCP untruncated.
+
+        :param data: The raw bytes of the DNS query message.
+        :param response: The DNS response message generated for the query.
+        :return: The response, or a truncated response with the TC flag set if it does not fit.
+        """
+        _, dns_query = self.dns_resolver.parse_query(data)
+        if len(response) <= self.dns_response_factory.max_udp_response_size(dns_query):
+            return response
+        if dns_query is None:
+            # Responses to invalid queries are small, there is nothing to truncate
+            return response
+        return self.dns_response_factory.generate_truncated_response(dns_query, response)
@@ -0,0 +1,224 @@
+import functools
+import logging
+import multiprocessing
+import select
+import time
+from multiprocessing.connection import Connection
+from typing import List, Tuple
+
+from src.dns_metrics import DNSMetrics, RECV_STAGE, SEND_STAGE
+from src.dns_response_factory import MIN_UDP_PAYLOAD_SIZE
+from src.dns_server import DNS_QUERY_BUFFER_SIZE, DNSServer
+from src.mmap_record_store import MmapRecordStore
+from src.custom_types.register_operation import RegisterOperation
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of seconds between two publications of the metrics of a worker
+METRICS_PUBLISH_INTERVAL = 1.0
+
+
+class DNSWorkerPool:
+    """
+    DNSWorkerPool serves DNS queries from several prefork worker processes sharing the DNS query port.
+
+    Every worker binds its own DNS query socket with SO_REUSEPORT, so the kernel spreads incoming queries across the
+    workers, and runs its own copy of the DNSServer query pipeline. The parent process keeps the register request
+    socket: registrations are applied to the parent's DNSRegister and broadcast in order to every worker through a
+    pipe, so all workers apply the same sequence of registrations to their copy of DNSRegister.records. When the records
+    are an MmapRecordStore, which every worker maps and the parent alone writes, workers only refresh their wildcard
+    index and caches for the registered name. Addresses added and removed are broadcast in the same sequence, and
+    applied to the address sets every worker keeps in memory.
+
+    Every worker publishes its DNSServer.dns_metrics to its own shared memory slot at least every
+    METRICS_PUBLISH_INTERVAL seconds, so the metrics served by the parent aggregate the queries of every worker.
+
+    Attributes:
+    -----------
+    dns_server: DNSServer
+        The DNSServer whose pipelines are copied into every worker.
+    worker_count: int
+        The number of worker processes to start.
+    dns_query_address: Tuple[str, int]
+        The address every worker binds its DNS query socket to.
+    workers: List[multiprocessing.Process]
+        The started worker processes.
+    update_connections: List[Connection]
+        The pipes used to send registrations to the workers.
+
+    Methods:
+    --------
+    start()
+        Forks the worker processes and starts broadcasting registrations to them.
+
+    stop()
+        Terminates the worker processes.
+
+    listen()
+        Starts the workers and handles register requests in the parent process.
+
+    broadcast_registration(domain_name: str, ip_address: str, operation: int, weight: int)
+        Sends a registration or an address operation to every worker.
+
+    run_worker(update_connection: Connection, worker_send_connection: Connection, metrics_slot: int)
+        Entry point of a worker process: binds the DNS query socket and serves queries and registrations.
+
+    handle_worker_update(update_connection: Connection) -> bool
+        Applies a registration or an address operation received from the parent to the worker's DNSRegister.
+    """
+    def __init__(self, dns_server: DNSServer, worker_count: int,
+                 dns_query_address: Tuple[str, int] = ("0.0.0.0", 53)):
+        if worker_count < 1:
+            raise ValueError("The worker pool needs at least one worker.")
+        self.dns_server = dns_server
+        self.worker_count = worker_count
+        self.dns_query_address = dns_query_address
+        self.workers = []  # type: List[multiprocessing.Process]
+        self.update_connections = []  # type: List[Connection]
+
+    def start(self):
+        """
+        Forks the worker processes and starts broadcasting registrations to them.
+        """
+        context = multiprocessing.get_context("fork")
+        # The workers bind their own sockets, the parent must not be part of the SO_REUSEPORT group
+        self.dns_server.dns_query_socket.close()
+        dns_metrics = self.dns_server.dns_metrics
+        if dns_metrics.slot_count <= self.worker_count:
+            self.dns_server.dns_metrics = DNSMetrics(slot_count=self.worker_count + 1,
+                                                     latency_sample_every=dns_metrics.latency_sample_every)
+        for worker_index in range(self.worker_count):
+            receive_connection, send_connection = context.Pipe(duplex=False)
+            worker = context.Process(target=self.run_worker,
+                                     args=(receive_connection, send_connection, worker_index + 1), daemon=True)
+            worker.start()
+            receive_connection.close()
+            self.workers.append(worker)
+            self.update_connections.append(send_connection)
+        # Added after forking so that workers do not broadcast the registrations they apply
+        self.dns_server.dns_register.add_register_listener(self.broadcast_registration)
+        self.dns_server.dns_register.add_address_listener(self.broadcast_registration)
+
+    def stop(self):
+        """
+        Terminates the worker processes.
+        """
+        dns_register = self.dns_server.dns_register
+        if self.broadcast_registration in dns_register.register_listeners:
+            dns_register.register_listeners.remove(self.broadcast_registration)
+        if self.broadcast_registration in dns_register.address_listeners:
+            dns_register.address_listeners.remove(self.broadcast_registration)
+        for connection in self.update_connections:
+            connection.close()
+        for worker in self.workers:
+            worker.terminate()
+            worker.join()
+        self.update_connections = []
+        self.workers = []
+
+    def listen(self):
+        """
+        Starts the workers and handles register requests in the parent process.
+        """
+        self.start()
+        logger.info("Server is listening to port %d for DNS query requests with %d workers",
+                    self.dns_query_address[1], self.worker_count)
+        logger.info("Server is listening to port 8080 for DNS register requests")
+        register_request_socket = self.dns_server.register_request_socket
+        try:
+            while True:
+                data, client_address = register_request_socket.recvfrom(1024)
+                logger.info("Received DNS register request from %s:%d", client_address[0], client_address[1])
+                register_request_response = self.dns_server.handle_register_request(data)
+                self.dns_server.send_when_durable(functools.partial(
+                    register_request_socket.sendto, register_request_response, client_address))
+        finally:
+            self.stop()
+
+    def broadcast_registration(self, domain_name: str, ip_address: str, operation: int = RegisterOperation.REGISTER,
+                               weight: int = 1):
+        """
+        Sends a registration or an address operation to every worker.
+
+        The signature matches both DNSRegister register listeners and address listeners.
+
+        :param domain_name: The registered domain name.
+        :param ip_address: The IP address associated with the domain name.
+        :param operation: The RegisterOperation to apply.
+        :param weight: The weight of an added address.
+        """
+        for connection in self.update_connections:
+            connection.send((domain_name, ip_address, operation, weight))
+
+    def run_worker(self, update_connection: Connection, worker_send_connection: Connection, metrics_slot: int):
+        """
+        Entry point of a worker process: binds the DNS query socket and serves queries and registrations.
+
+        :param update_connection: The pipe end the worker receives registrations from.
+        :param worker_send_connection: The parent's end of the same pipe, closed in the worker.
+        :param metrics_slot: The slot of DNSServer.dns_metrics the worker publishes its metrics to.
+        """
+        # Close the parent's resources inherited through fork, so the worker sees EOF when the parent exits
+        worker_send_connection.close()
+        for connection in self.update_connections:
+            connection.close()
+        self.dns_server.register_request_socket.close()
+        # Only the parent journals registrations, the commit thread does not survive the fork anyway
+        register_journal = self.dns_server.register_journal
+        if register_journal is not None:
+            register_journal.detach()
+            self.dns_server.register_journal = None
+
+        dns_metrics = self.dns_server.dns_metrics
+        dns_metrics.use_slot(metrics_slot)
+
+        dns_query_socket = DNSServer.create_dns_query_socket(address=self.dns_query_address, reuse_port=True)
+        self.dns_server.dns_query_socket = dns_query_socket
+        next_publish_time = time.monotonic() + METRICS_PUBLISH_INTERVAL
+        while True:
+            ready_objects, _, _ = select.select([dns_query_socket, update_connection], [], [], METRICS_PUBLISH_INTERVAL)
+            now = time.monotonic()
+            if now >= next_publish_time:
+                dns_metrics.publish()
+                next_publish_time = now + METRICS_PUBLISH_INTERVAL
+            for ready_object in ready_objects:
+                if ready_object is update_connection:
+                    if not self.handle_worker_update(update_connection):
+                        return
+                else:
+                    stage_start = dns_metrics.sample_timing()
+                    data, client_address = dns_query_socket.recvfrom(DNS_QUERY_BUFFER_SIZE)
+                    if stage_start:
+                        dns_metrics.observe_stage(RECV_STAGE, stage_start)
+                    dns_response = self.dns_server.handle_dns_query(data)
+                    if len(dns_response) > MIN_UDP_PAYLOAD_SIZE:
+                        dns_response = self.dns_server.fit_udp_response(data, dns_response)
+                    if stage_start:
+                        stage_start = time.perf_counter_ns()
+                    dns_query_socket.sendto(dns_response, client_address)
+                    if stage_start:
+                        dns_metrics.observe_stage(SEND_STAGE, stage_start)
+                    self.dns_server.log_dns_exchange(data, dns_response, client_address)
+
+    def handle_worker_update(self, update_connection: Connection) -> bool:
+        """
+        Applies a registration or an address operation received from the parent to the worker's DNSRegister.
+
+        :param update_connection: The pipe end the worker receives registrations from.
+        :return: False if the parent closed the pipe and the worker should exit, True otherwise.
+        """
+        try:
+            domain_name, ip_address, operation, weight = update_connection.recv()
+        except EOFError:
+            return False
+        dns_register = self.dns_server.dns_register
+        if operation == RegisterOperation.ADD_ADDRESS:
+            dns_register.add_address(domain_name, ip_address, weight)
+        elif operation == RegisterOperation.REMOVE_ADDRESS:
+            dns_register.remove_address(domain_name, ip_address)
+        elif isinstance(dns_register.records, MmapRecordStore):
+            # The parent already wrote the registration to the shared store, which must only have one writer
+            dns_register.refresh_domain(domain_name, ip_address)
+        else:
+            dns_register.register_domain(domain_name, ip_address)
+        return True
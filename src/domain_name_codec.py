@@ -0,0 +1,99 @@
+from typing import Tuple
+
+# Folds ASCII upper case letters to lower case, leaving every other byte, including label lengths (at most 63), as is
+CASE_FOLD_TABLE = bytes.maketrans(b"ABCDEFGHIJKLMNOPQRSTUVWXYZ", b"abcdefghijklmnopqrstuvwxyz")
+# Labels are 1 to 63 bytes long and wire format names at most 255 bytes long (RFC 1035 section 2.3.4)
+MAX_LABEL_LENGTH = 63
+MAX_DOMAIN_NAME_LENGTH = 255
+LABEL_LENGTH_BYTES = tuple(bytes((length,)) for length in range(MAX_LABEL_LENGTH + 1))  # type: Tuple[bytes, ...]
+HTTP_LABEL = b"\x07http"
+HTTPS_LABEL = b"\x08https"
+# Wire format of the leading "*" label of a wildcard domain name
+WILDCARD_KEY_PREFIX = b"\x01*"
+
+
+class DomainNameCodec:
+    """
+    DomainNameCodec converts domain names between their string form and the lowercased wire format used as DNSRegister
+    keys.
+
+    A key is the domain name as it appears in a query, a sequence of length-prefixed labels ending with a zero byte,
+    with ASCII letters folded to lower case. Queries are looked up by folding the name bytes of the query with
+    CASE_FOLD_TABLE, without decoding them, and names differing only by case (such as 0x20-randomized queries) share the
+    same key. The "http://" and "https://" prefixes are encoded with the \\x07http and \\x08https labels read by
+    DNSQueryResolver.
+
+    Methods:
+    --------
+    encode(domain_name: str) -> bytes
+        Encodes a domain name to a lowercased wire format key.
+
+    fold(wire_name: bytes) -> bytes
+        Folds the ASCII letters of a wire format domain name to lower case.
+
+    decode(wire_name: bytes) -> str
+        Decodes a wire format domain name to its string form.
+    """
+    @staticmethod
+    def encode(domain_name: str) -> bytes:
+        """
+        Encodes a domain name to a lowercased wire format key.
+
+        :param domain_name: The domain name, without trailing dot (e.g., "https://www.Example.com").
+        :return: The lowercased wire format domain name (e.g., b"\\x08https\\x03www\\x07example\\x03com\\x00").
+        :raises ValueError: If a label of the domain name is empty or longer than MAX_LABEL_LENGTH bytes, or if the wire
+            format domain name is longer than MAX_DOMAIN_NAME_LENGTH bytes.
+        """
+        prefix = b""
+        if domain_name.startswith("http://"):
+            prefix = HTTP_LABEL
+            domain_name = domain_name[7:]
+        if domain_name.startswith("https://"):
+            prefix += HTTPS_LABEL
+            domain_name = domain_name[8:]
+        if not domain_name:
+            return prefix.translate(CASE_FOLD_TABLE) + b"\x00"
+        labels = domain_name.encode("utf-8").split(b".")
+        if not all(0 < len(label) <= MAX_LABEL_LENGTH for label in labels):
+            raise ValueError(f"Domain name {domain_name} has an empty label or a label longer than {MAX_LABEL_LENGTH} "
+                             f"bytes.")
+        wire_name = prefix + b"".join([LABEL_LENGTH_BYTES[len(label)] + label for label in labels]) + b"\x00"
+        if len(wire_name) > MAX_DOMAIN_NAME_LENGTH:
+            raise ValueError(f"Domain name {domain_name} is longer than {MAX_DOMAIN_NAME_LENGTH} bytes.")
+        return wire_name.translate(CASE_FOLD_TABLE)
+
+    @staticmethod
+    def fold(wire_name: bytes) -> bytes:
+        """
+        Folds the ASCII letters of a wire format domain name to lower case.
+
+        :param wire_name: The wire format domain name, as read from a query.
+        :return: The lowercased wire format domain name.
+        """
+        return wire_name.translate(CASE_FOLD_TABLE)
+
+    @staticmethod
+    def decode(wire_name: bytes) -> str:
+        """
+        Decodes a wire format domain name to its string form.
+
+        :param wire_name: The wire format domain name, ending with a zero byte.
+        :return: The domain name, without trailing dot.
+        :raises UnicodeDecodeError: If a label is not valid UTF-8.
+        """
+        domain_name = ""
+        if wire_name.startswith(HTTP_LABEL):
+            domain_name += "http://"
+            wire_name = wire_name[5:]
+        if wire_name.startswith(HTTPS_LABEL):
+            domain_name += "https://"
+            wire_name = wire_name[6:]
+
+        labels = []
+        pointer = 0
+        label_length = wire_name[0]
+        while label_length != 0:
+            labels.append(wire_name[pointer + 1:pointer + 1 + label_length])
+            pointer += label_length + 1
+            label_length = wire_name[pointer]
+        return domain_name + b".".join(labels).decode("utf-8")
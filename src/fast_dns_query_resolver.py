@@ -0,0 +1,125 @@
+from typing import Optional, Tuple
+
+from src.dns_query_resolver import DNSQueryResolver, HEADER_STRUCT, QUESTION_TAIL_STRUCT
+from src.domain_name_codec import CASE_FOLD_TABLE, DomainNameCodec
+from src.custom_types.error_types import FormatError, FunctionalityNotImplementedError
+from src.custom_types.dns_record_type import DNSRecordType, RECORD_TYPE_STRINGS
+from src.custom_types.lazy_dns_query import LazyDNSQuery
+from src.custom_types.response_code import ResponseCode
+
+NO_ERROR = ResponseCode.NO_ERROR
+FORMAT_ERROR = ResponseCode.FORMAT_ERROR
+NOT_IMPLEMENTED = ResponseCode.NOT_IMPLEMENTED
+
+
+class FastDNSQueryResolver(DNSQueryResolver):
+    """
+    FastDNSQueryResolver is a drop-in alternative to DNSQueryResolver that parses DNS queries with fewer copies.
+
+    The header is unpacked with a precompiled struct.Struct and the labels of the domain name are walked in place, with
+    explicit bounds checks so invalid queries are reported with a response code instead of an exception. The wire
+    format domain name is then copied and case folded once into the key DNSRegister looks it up with, without decoding
+    any label to a string. The records following the question are only walked when the header counts any, to read
+    the OPT record of EDNS(0) queries. It returns LazyDNSQuery objects, which expose the same attributes as the
+    DNSQuery objects of DNSQueryResolver but only decode the header fields and the domain name when they are accessed,
+    and read_query raises the same errors as DNSQueryResolver.
+
+    Methods:
+    --------
+    parse_query(query_data: bytes) -> Tuple[int, Optional[LazyDNSQuery]]:
+        Parses the given query_data and returns a response code and, if it is NO_ERROR, the LazyDNSQuery object.
+
+    read_query(query_data: bytes) -> LazyDNSQuery:
+        Parses the given query_data and returns a LazyDNSQuery object containing the relevant information.
+    """
+    def parse_query(self, query_data: bytes) -> Tuple[int, Optional[LazyDNSQuery]]:
+        """
+        Parses a DNS query from the given raw bytes without raising for invalid queries.
+
+        Every bound is checked explicitly, so a malformed query costs no more than a valid one.
+
+        :param query_data: The raw bytes representing the DNS query.
+        :return: ResponseCode.NO_ERROR and the LazyDNSQuery object, or the FORMAT_ERROR or NOT_IMPLEMENTED response code
+            and None.
+        """
+        if len(query_data) <= 12:
+            return FORMAT_ERROR, None
+        question_count, answer_count, authority_count, additional_count = HEADER_STRUCT.unpack_from(query_data)
+        query_length = len(query_data)
+
+        # Handle http:// and https://
+        has_prefix = False
+        pointer = 12
+        if query_data[pointer] == 7 and query_data[pointer + 1:pointer + 5] == b"http":
+            has_prefix = True
+            pointer += 5
+        if pointer < query_length and query_data[pointer] == 8 and query_data[pointer + 1:pointer + 6] == b"https":
+            has_prefix = True
+            pointer += 6
+
+        # Walk the labels without copying them
+        name_start = pointer
+        if pointer >= query_length:
+            return FORMAT_ERROR, None
+        label_length = query_data[pointer]
+        while label_length != 0:
+            pointer += label_length + 1
+            if pointer >= query_length:
+                return FORMAT_ERROR, None
+            label_length = query_data[pointer]
+        question_end = pointer + 5
+        if query_length < question_end:
+            # there should be at least 4 bytes after the end of the domain name for query_type and query_class
+            return FORMAT_ERROR, None
+        if pointer == name_start and not has_prefix:
+            # Empty domain name
+            return FORMAT_ERROR, None
+
+        wire_name = query_data[12:pointer + 1]
+        if not wire_name.isascii():
+            # ASCII names are valid UTF-8, only the others are decoded to be validated
+            try:
+                DomainNameCodec.decode(wire_name)
+            except UnicodeDecodeError:
+                return FORMAT_ERROR, None
+
+        query_type, query_class = QUESTION_TAIL_STRUCT.unpack_from(query_data, pointer + 1)
+        if query_type not in RECORD_TYPE_STRINGS:
+            return FORMAT_ERROR, None
+        if question_count > 1:
+            return NOT_IMPLEMENTED, None
+
+        edns = None
+        if answer_count or authority_count or additional_count:
+            response_code, edns = self.parse_edns_options(query_data, question_end, answer_count + authority_count,
+                                                          additional_count)
+            if response_code != NO_ERROR:
+                return response_code, None
+
+        return NO_ERROR, LazyDNSQuery(
+            original_query=query_data,
+            question_end=question_end,
+            domain_name_key=wire_name.translate(CASE_FOLD_TABLE),
+            query_type=DNSRecordType(query_type),
+            query_class=query_class,
+            edns=edns
+        )
+
+    def read_query(self, query_data: bytes) -> LazyDNSQuery:
+        """
+        Reads and parses a DNS query from the given raw bytes.
+
+        :param query_data: The raw bytes representing the DNS query.
+        :return: A LazyDNSQuery object containing the parsed query data.
+        :raises FormatError: If the query data is malformed or does not match the expected format.
+        :raises FunctionalityNotImplementedError: If the query contains multiple questions (not supported).
+        """
+        response_code, dns_query = self.parse_query(query_data)
+        if response_code == FORMAT_ERROR:
+            raise FormatError("Malformed query.")
+        if response_code == NOT_IMPLEMENTED:
+            raise FunctionalityNotImplementedError(
+                message="This server does not handle queries with multiple questions.",
+                transaction_id=query_data[:2]
+            )
+        return dns_query
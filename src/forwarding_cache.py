@@ -0,0 +1,148 @@
+import struct
+import time
+from typing import Dict, List, Optional
+
+from src.dns_query_resolver import DNSQueryResolver, OPT_RECORD_TYPE, RECORD_HEADER_STRUCT
+from src.dns_response_factory import TRUNCATED_FLAG
+from src.custom_types.forwarded_answer import ForwardedAnswer
+from src.custom_types.response_code import ResponseCode
+
+# Question count, answer count, authority count, additional count (the transaction ID and flags are skipped)
+SECTION_COUNTS_STRUCT = struct.Struct("!4xHHHH")
+TTL_STRUCT = struct.Struct("!I")
+SOA_RECORD_TYPE = 6
+
+
+class ForwardingCache:
+    """
+    ForwardingCache stores the responses of upstream resolvers for as long as their records are valid.
+
+    Responses are keyed on the bytes following the transaction ID of the query, so the flags, the question and the OPT
+    record of the query are part of the key, and stored without their transaction ID. A response expires when its
+    shortest TTL runs out, capped at max_ttl seconds. Negative responses (NXDOMAIN, or no answer) are cached for the TTL
+    of the SOA record of their authority section, or its MINIMUM field if lower (RFC 2308), and are not cached without
+    one. Truncated responses and other response codes are never cached.
+
+    When a response is stored, the offset of the TTL of each of its records is recorded, so a hit only has to rewrite
+    the TTLs, decremented by the number of seconds the response has been cached, instead of parsing the response again.
+
+    Attributes:
+    -----------
+    max_entries: int
+        The maximum number of cached responses, the oldest entry is evicted when it is reached.
+    max_ttl: int
+        The maximum number of seconds a response stays cached.
+    responses: Dict[bytes, ForwardedAnswer]
+        A dictionary that maps the bytes following the transaction ID of the queries to their cached responses.
+
+    Methods:
+    --------
+    lookup_query(query_data: bytes) -> Optional[bytes]
+        Returns the cached response for a raw DNS query, with the query's transaction ID and the remaining TTLs.
+
+    store(query_data: bytes, response: bytes) -> bool
+        Caches the response of an upstream resolver for the given query, if it can be cached.
+
+    clear()
+        Removes every cached response.
+    """
+    def __init__(self, max_entries: int = 65536, max_ttl: int = 86400):
+        self.max_entries = max_entries
+        self.max_ttl = max_ttl
+        self.responses = {}  # type: Dict[bytes, ForwardedAnswer]
+
+    def lookup_query(self, query_data: bytes) -> Optional[bytes]:
+        """
+        Returns the cached response for a raw DNS query, with the query's transaction ID and the remaining TTLs.
+
+        :param query_data: The raw bytes of the DNS query message.
+        :return: The cached response if it is cached and not expired, None otherwise.
+        """
+        key = query_data[2:]
+        forwarded_answer = self.responses.get(key)
+        if forwarded_answer is None:
+            return None
+        now = time.monotonic()
+        if forwarded_answer.expires_at <= now:
+            del self.responses[key]
+            return None
+        age = int(now - forwarded_answer.stored_at)
+        if age == 0 or not forwarded_answer.ttl_offsets:
+            return query_data[:2] + forwarded_answer.response
+        response = bytearray(query_data[:2] + forwarded_answer.response)
+        for ttl_offset, ttl in zip(forwarded_answer.ttl_offsets, forwarded_answer.ttls):
+            TTL_STRUCT.pack_into(response, ttl_offset, ttl - age if ttl > age else 0)
+        return bytes(response)
+
+    def store(self, query_data: bytes, response: bytes) -> bool:
+        """
+        Caches the response of an upstream resolver for the given query, if it can be cached.
+
+        :param query_data: The raw bytes of the DNS query message the response answers.
+        :param response: The raw bytes of the DNS response message.
+        :return: True if the response was cached, False if it is malformed, truncated or cannot be cached.
+        """
+        if len(response) < 12 or response[2] & TRUNCATED_FLAG:
+            return False
+        response_code = response[3] & 15
+        if response_code != ResponseCode.NO_ERROR and response_code != ResponseCode.NAME_ERROR:
+            return False
+        question_count, answer_count, authority_count, additional_count = SECTION_COUNTS_STRUCT.unpack_from(response)
+
+        offset = 12
+        for _ in range(question_count):
+            offset = DNSQueryResolver.skip_domain_name(response, offset)
+            if offset < 0:
+                return False
+            offset += 4
+        ttl_offsets = []  # type: List[int]
+        ttls = []  # type: List[int]
+        negative_ttl = None  # type: Optional[int]
+        response_length = len(response)
+        for record_index in range(answer_count + authority_count + additional_count):
+            offset = DNSQueryResolver.skip_domain_name(response, offset)
+            if offset < 0 or offset + 10 > response_length:
+                return False
+            record_type, _, ttl, data_length = RECORD_HEADER_STRUCT.unpack_from(response, offset)
+            data_end = offset + 10 + data_length
+            if data_end > response_length:
+                return False
+            if record_type != OPT_RECORD_TYPE:
+                # The TTL of an OPT record holds its flags
+                ttl_offsets.append(offset + 4)
+                ttls.append(ttl)
+            if record_type == SOA_RECORD_TYPE and answer_count <= record_index < answer_count + authority_count \
+                    and data_length >= 20:
+                # The MINIMUM field ends the RDATA of the SOA record
+                negative_ttl = min(ttl, TTL_STRUCT.unpack_from(response, data_end - 4)[0])
+            offset = data_end
+
+        if response_code == ResponseCode.NAME_ERROR or answer_count == 0:
+            if negative_ttl is None:
+                return False
+            ttl = negative_ttl
+        else:
+            ttl = min(ttls[:answer_count])
+        ttl = min(ttl, self.max_ttl)
+        if ttl <= 0:
+            return False
+
+        key = query_data[2:]
+        if key not in self.responses and len(self.responses) >= self.max_entries:
+            del self.responses[next(iter(self.responses))]
+        now = time.monotonic()
+        # The offsets are those of the response with its transaction ID, which is spliced back in on a hit
+        self.responses[key] = ForwardedAnswer(
+            response=response[2:],
+            ttl_offsets=tuple(ttl_offsets),
+            ttls=tuple(ttls),
+            stored_at=now,
+            expires_at=now + ttl
+        )
+        return True
+
+    def clear(self):
+        """
+        Removes every cached response.
+        """
+        self.responses.clear()
@@ -0,0 +1,184 @@
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+WILDCARD_LABEL = "*"
+
+
+class ReverseLabelTrie:
+    """
+    ReverseLabelTrie indexes domain names by their labels in reverse order, from the top-level domain down.
+
+    "www.example.com" is stored under the path com -> example -> www, so the names sharing a suffix share the nodes of
+    that suffix and every lookup walks at most one node per label of the queried name: exact, wildcard and closest
+    encloser lookups are O(labels) whatever the number of names. Each node is a plain dictionary mapping the child
+    labels to the child nodes, with the value of the node, if any, stored under the None key.
+
+    Attributes:
+    -----------
+    root: Dict
+        The root node, representing the DNS root.
+
+    Methods:
+    --------
+    insert(domain_name: str, value: Any)
+        Associates a value with a domain name, which can be a wildcard name such as "*.example.com".
+
+    remove(domain_name: str) -> bool
+        Removes the value associated with a domain name.
+
+    get(domain_name: str) -> Optional[Any]
+        Returns the value associated with exactly this domain name.
+
+    lookup(domain_name: str) -> Optional[Any]
+        Returns the value of the domain name, or of the wildcard name of its closest encloser.
+
+    closest_encloser(domain_name: str) -> Tuple[str, Optional[Any]]
+        Returns the longest existing suffix of the domain name and its value.
+
+    longest_match(domain_name: str) -> Optional[Tuple[str, Any]]
+        Returns the longest suffix of the domain name that has a value, and that value.
+    """
+    def __init__(self):
+        self.root = {}  # type: Dict
+        self._length = 0
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __contains__(self, domain_name: str) -> bool:
+        node = self._find_node(domain_name)
+        return node is not None and None in node
+
+    def __iter__(self) -> Iterator[str]:
+        stack = [(self.root, [])]
+        while stack:
+            node, labels = stack.pop()
+            for label, child in node.items():
+                if label is None:
+                    yield ".".join(reversed(labels))
+                else:
+                    stack.append((child, labels + [label]))
+
+    def insert(self, domain_name: str, value: Any):
+        """
+        Associates a value with a domain name, which can be a wildcard name such as "*.example.com".
+
+        :param domain_name: The domain name, without trailing dot.
+        :param value: The value associated with the domain name.
+        """
+        node = self.root
+        for label in reversed(domain_name.split(".")):
+            child = node.get(label)
+            if child is None:
+                child = node[label] = {}
+            node = child
+        if None not in node:
+            self._length += 1
+        node[None] = value
+
+    def remove(self, domain_name: str) -> bool:
+        """
+        Removes the value associated with a domain name, and the nodes left without value nor children.
+
+        :param domain_name: The domain name, without trailing dot.
+        :return: True if the domain name had a value, False otherwise.
+        """
+        path = [self.root]
+        labels = list(reversed(domain_name.split(".")))
+        for label in labels:
+            child = path[-1].get(label)
+            if child is None:
+                return False
+            path.append(child)
+        if None not in path[-1]:
+            return False
+        del path[-1][None]
+        self._length -= 1
+        # Prune the nodes left empty, from the deepest one up
+        for depth in range(len(labels), 0, -1):
+            if path[depth]:
+                break
+            del path[depth - 1][labels[depth - 1]]
+        return True
+
+    def get(self, domain_name: str) -> Optional[Any]:
+        """
+        Returns the value associated with exactly this domain name.
+
+        :param domain_name: The domain name, without trailing dot.
+        :return: The value if the domain name has one, None otherwise.
+        """
+        node = self._find_node(domain_name)
+        if node is None:
+            return None
+        return node.get(None)
+
+    def lookup(self, domain_name: str) -> Optional[Any]:
+        """
+        Returns the value of the domain name, or of the wildcard name of its closest encloser.
+
+        Following RFC 4592, a wildcard "*.example.com" matches "a.example.com" and "b.a.example.com", unless a closer
+        name such as "a.example.com" exists, and never matches "example.com" itself.
+
+        :param domain_name: The domain name, without trailing dot.
+        :return: The value of the domain name or of the matching wildcard name, None if there is none.
+        """
+        node = self.root
+        for label in reversed(domain_name.split(".")):
+            child = node.get(label)
+            if child is None:
+                wildcard = node.get(WILDCARD_LABEL)
+                if wildcard is None:
+                    return None
+                return wildcard.get(None)
+            node = child
+        return node.get(None)
+
+    def closest_encloser(self, domain_name: str) -> Tuple[str, Optional[Any]]:
+        """
+        Returns the longest existing suffix of the domain name and its value.
+
+        A suffix exists if a name was inserted at or below it, even if the suffix itself has no value.
+
+        :param domain_name: The domain name, without trailing dot.
+        :return: The closest encloser ("" for the root) and its value, None if it has none.
+        """
+        node = self.root
+        labels = domain_name.split(".")
+        depth = 0
+        for label in reversed(labels):
+            child = node.get(label)
+            if child is None:
+                break
+            node = child
+            depth += 1
+        return ".".join(labels[len(labels) - depth:]), node.get(None)
+
+    def longest_match(self, domain_name: str) -> Optional[Tuple[str, Any]]:
+        """
+        Returns the longest suffix of the domain name that has a value, and that value.
+
+        :param domain_name: The domain name, without trailing dot.
+        :return: The matching suffix and its value, None if no suffix has a value.
+        """
+        node = self.root
+        labels = domain_name.split(".")
+        match = None
+        depth = 0
+        for label in reversed(labels):
+            node = node.get(label)
+            if node is None:
+                break
+            depth += 1
+            if None in node:
+                match = (depth, node[None])
+        if match is None:
+            return None
+        return ".".join(labels[len(labels) - match[0]:]), match[1]
+
+    def _find_node(self, domain_name: str) -> Optional[Dict]:
+        node = self.root
+        for label in reversed(domain_name.split(".")):
+            node = node.get(label)
+            if node is None:
+                return None
+        return node
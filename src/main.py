@@ -1,14 +1,125 @@
+import argparse
+import logging
+
+from src.async_dns_server import AsyncDNSServer
+from src.batched_dns_server import BatchedDNSServer
+from src.dns_forwarder import DNSForwarder
+from src.dns_logging import DNSLogging
+from src.dns_metrics import DNSMetrics
 from src.dns_register import DNSRegister
 from src.dns_query_resolver import DNSQueryResolver
 from src.dns_server import DNSServer
+from src.dns_worker_pool import DNSWorkerPool
+from src.fast_dns_query_resolver import FastDNSQueryResolver
+from src.metrics_exporter import MetricsExporter
+from src.mmap_record_store import MmapRecordStore
+from src.query_log_writer import QueryLogWriter
+from src.register_journal import RegisterJournal
 from src.register_request_resolver import RegisterRequestResolver
+from src.sampling_profiler import SamplingProfiler
+from src.tcp_dns_server import TCPDNSServer
+from src.zone_loader import ZoneLoader
+
+# Named explicitly, __name__ is "__main__" when run with python -m, outside the "src" logger DNSLogging configures
+logger = logging.getLogger("src.main")
 
-dns_query_resolver = DNSQueryResolver()
+parser = argparse.ArgumentParser(description="DNS server")
+parser.add_argument("--mode", choices=["select", "asyncio", "batched"], default="select",
+                    help="Serving engine used to listen to the DNS query and register request sockets.")
+parser.add_argument("--workers", type=int, default=1,
+                    help="Number of prefork worker processes sharing port 53 through SO_REUSEPORT.")
+parser.add_argument("--resolver", choices=["standard", "fast"], default="standard",
+                    help="DNS query parser: the standard DNSQueryResolver, or the FastDNSQueryResolver which only reads "
+                         "the question name bytes and decodes the domain name lazily.")
+parser.add_argument("--store", help="Path of a memory-mapped record store persisting the registrations.")
+parser.add_argument("--store-capacity", type=int, default=65536,
+                    help="Maximum number of records of the record store, used when the store file is created.")
+parser.add_argument("--zone-file", action="append", default=[],
+                    help="Zone file (RFC 1035 master file, or CSV with a .csv extension) loaded at startup. Repeatable.")
+parser.add_argument("--journal-dir",
+                    help="Directory of the register journal and snapshots: registrations are replayed on startup and "
+                         "only acknowledged once written to disk.")
+parser.add_argument("--log-level", choices=["DEBUG", "INFO", "WARNING", "ERROR"], default="INFO",
+                    help="Minimum level of the logged records, DEBUG logs every DNS query.")
+parser.add_argument("--log-sample", type=int, default=1,
+                    help="Only log one in N of the DEBUG records logged for every DNS query.")
+parser.add_argument("--query-log",
+                    help="Path of a binary query log recording every DNS query and response, written in batches.")
+parser.add_argument("--metrics-port", type=int,
+                    help="Serve Prometheus metrics on http://127.0.0.1:PORT/metrics.")
+parser.add_argument("--metrics-sample", type=int, default=64,
+                    help="Measure the stage latencies of one in N DNS queries.")
+parser.add_argument("--tcp", action="store_true",
+                    help="Also serve DNS queries over TCP on port 53, with persistent pipelined connections "
+                         "(--mode asyncio only).")
+parser.add_argument("--forward", action="append", default=[], metavar="ADDRESS[:PORT]",
+                    help="Upstream resolver the queries for unknown names and unsupported types are forwarded to, "
+                         "instead of being answered with NXDOMAIN or NOTIMP (--mode asyncio only). Repeatable.")
+parser.add_argument("--profile-dir",
+                    help="Directory of the profiles captured when the process receives SIGUSR1, as collapsed stacks.")
+parser.add_argument("--profile-seconds", type=float, default=10.0,
+                    help="Duration of the profiles captured on SIGUSR1.")
+args = parser.parse_args()
+if args.workers < 1:
+    parser.error("--workers must be at least 1.")
+if args.tcp and args.mode != "asyncio":
+    parser.error("--tcp can only be used with --mode asyncio.")
+if args.forward and args.mode != "asyncio":
+    parser.error("--forward can only be used with --mode asyncio.")
+if args.log_sample < 1:
+    parser.error("--log-sample must be at least 1.")
+if args.metrics_sample < 1:
+    parser.error("--metrics-sample must be at least 1.")
+if args.workers > 1 and args.mode != "select":
+    parser.error("--workers can only be used with --mode select.")
+
+DNSLogging(level=getattr(logging, args.log_level), sample_every=args.log_sample).start()
+if args.profile_dir:
+    # Installed before forking the workers, so every worker can be profiled with its own pid
+    SamplingProfiler(args.profile_dir).install_signal_handler(args.profile_seconds)
+dns_query_resolver = FastDNSQueryResolver() if args.resolver == "fast" else DNSQueryResolver()
 register_request_resolver = RegisterRequestResolver()
-dns_register = DNSRegister()
+dns_register = DNSRegister(
+    records=MmapRecordStore(args.store, capacity=args.store_capacity) if args.store else None
+)
+zone_loader = ZoneLoader(dns_register)
+for zone_file in args.zone_file:
+    report = zone_loader.load(zone_file)
+    logger.info("Loaded %d records from %s in %.2fs (%d skipped, peak memory %s KiB)", report.record_count,
+                report.path, report.seconds, report.skipped_count, report.peak_memory_kib)
+register_journal = None
+if args.journal_dir:
+    register_journal = RegisterJournal(args.journal_dir, dns_register)
+    logger.info("Replayed %d registrations from %s", register_journal.replay(), args.journal_dir)
+    register_journal.start()
+query_log = None
+if args.query_log:
+    query_log = QueryLogWriter(args.query_log)
+    query_log.start()
+dns_forwarder = None
+if args.forward:
+    upstreams = []
+    for upstream in args.forward:
+        host, _, port = upstream.partition(":")
+        upstreams.append((host, int(port) if port else 53))
+    dns_forwarder = DNSForwarder(upstreams)
 dns_server = DNSServer(
     dns_resolver=dns_query_resolver,
     dns_register=dns_register,
-    register_request_resolver=register_request_resolver
+    register_request_resolver=register_request_resolver,
+    register_journal=register_journal,
+    query_log=query_log,
+    dns_metrics=DNSMetrics(slot_count=args.workers + 1 if args.workers > 1 else 1,
+                           latency_sample_every=args.metrics_sample),
+    dns_forwarder=dns_forwarder
 )
-dns_server.listen()
+if args.metrics_port is not None:
+    MetricsExporter(lambda: dns_server.dns_metrics, address=("127.0.0.1", args.metrics_port)).start()
+if args.workers > 1:
+    DNSWorkerPool(dns_server, worker_count=args.workers).listen()
+elif args.mode == "asyncio":
+    AsyncDNSServer(dns_server, tcp_dns_server=TCPDNSServer(dns_server) if args.tcp else None).listen()
+elif args.mode == "batched":
+    BatchedDNSServer(dns_server).listen()
+else:
+    dns_server.listen()
@@ -0,0 +1,81 @@
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional, Tuple
+
+from src.dns_metrics import DNSMetrics
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class MetricsExporter:
+    """
+    MetricsExporter serves DNSMetrics in the Prometheus text exposition format over HTTP, at the /metrics path.
+
+    The HTTP server runs in a background thread of the parent process. Every scrape reads the metrics through the
+    get_metrics callable, so a DNSWorkerPool can replace DNSServer.dns_metrics with a multi-slot instance before forking
+    its workers, and aggregates the slots of every process.
+
+    Attributes:
+    -----------
+    get_metrics: Callable[[], DNSMetrics]
+        Returns the metrics to serve, such as lambda: dns_server.dns_metrics.
+    address: Tuple[str, int]
+        The address the HTTP server binds to, localhost by default.
+    http_server: Optional[ThreadingHTTPServer]
+        The HTTP server, once started.
+
+    Methods:
+    --------
+    start()
+        Binds the HTTP server and serves it from a background thread.
+
+    close()
+        Stops the HTTP server and closes its socket.
+    """
+    def __init__(self, get_metrics: Callable[[], DNSMetrics], address: Tuple[str, int] = ("127.0.0.1", 9153)):
+        self.get_metrics = get_metrics
+        self.address = address
+        self.http_server = None  # type: Optional[ThreadingHTTPServer]
+        self._thread = None  # type: Optional[threading.Thread]
+
+    def start(self):
+        """
+        Binds the HTTP server and serves it from a background thread.
+        """
+        get_metrics = self.get_metrics
+
+        class MetricsRequestHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = get_metrics().render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args):
+                logger.debug(format, *args)
+
+        self.http_server = ThreadingHTTPServer(self.address, MetricsRequestHandler)
+        self.http_server.daemon_threads = True
+        self._thread = threading.Thread(target=self.http_server.serve_forever, name="metrics-exporter", daemon=True)
+        self._thread.start()
+        logger.info("Metrics are served on http://%s:%d/metrics", *self.http_server.server_address[:2])
+
+    def close(self):
+        """
+        Stops the HTTP server and closes its socket.
+        """
+        if self.http_server is None:
+            return
+        self.http_server.shutdown()
+        self.http_server.server_close()
+        self._thread.join()
+        self.http_server = None
+        self._thread = None
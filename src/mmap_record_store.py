@@ -0,0 +1,189 @@
+import mmap
+import os
+import socket
+import struct
+import zlib
+from collections.abc import Mapping
+from typing import Iterator, Optional, Tuple
+
+from src.domain_name_codec import MAX_DOMAIN_NAME_LENGTH, WILDCARD_KEY_PREFIX
+
+# Version 3: the wildcard records are linked together
+MAGIC = b"DNSREG03"
+# Magic, capacity (number of records in the slab), index size (number of index entries), record count, slab slot of the
+# last wildcard record plus one (0 without wildcard record)
+HEADER_STRUCT = struct.Struct("!8sIIII")
+HEADER_SIZE = 32
+# Slab slot of the record plus one, 0 for an empty index entry
+INDEX_ENTRY_STRUCT = struct.Struct("!I")
+# Hash of the domain name key, IPv4 address, slab slot of the previous wildcard record plus one (wildcard records only),
+# domain name key length, followed by the domain name key
+RECORD_STRUCT = struct.Struct("!I4sIB")
+RECORD_SIZE = RECORD_STRUCT.size + MAX_DOMAIN_NAME_LENGTH
+
+
+class MmapRecordStore(Mapping):
+    """
+    MmapRecordStore is a persistent mapping of domain name keys to IPv4 addresses backed by a memory-mapped file.
+
+    Keys are the lowercased wire format domain names of DomainNameCodec, as used by DNSRegister.
+
+    The file has a fixed layout: a header, an open addressing hash index and a slab of fixed-size records. Lookups read
+    the mapping directly, so opening an existing store is O(1) in the number of records and nothing is deserialized at
+    startup. Several processes can map the same file and see each other's registrations, with a single process
+    writing: records are written to the slab before being published in the index. The wildcard records are linked from
+    the header, so the wildcard names are listed without scanning the slab.
+
+    Attributes:
+    -----------
+    path: str
+        The path of the store file.
+    capacity: int
+        The maximum number of records of the store, fixed when the file is created.
+    index_size: int
+        The number of entries of the hash index, a power of two at least twice the capacity.
+
+    Methods:
+    --------
+    get(domain_name_key: bytes, default: Optional[str]) -> Optional[str]
+        Returns the IP address registered for the domain name key, or default.
+
+    wildcard_items() -> Iterator[Tuple[bytes, str]]
+        Yields the wildcard domain name keys and their IP addresses, the last registered first.
+
+    flush()
+        Writes the modified pages of the mapping back to the file.
+
+    close()
+        Closes the mapping and the file.
+    """
+    def __init__(self, path: str, capacity: int = 65536):
+        self.path = path
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            self._file = open(path, "r+b")
+            self._mmap = mmap.mmap(self._file.fileno(), 0)
+            magic, self.capacity, self.index_size, _, _ = HEADER_STRUCT.unpack_from(self._mmap, 0)
+            if magic != MAGIC:
+                self.close()
+                raise ValueError(f"{path} is not a record store file.")
+        else:
+            self.capacity = capacity
+            self.index_size = 1 << (2 * capacity - 1).bit_length()
+            self._file = open(path, "w+b")
+            self._file.truncate(HEADER_SIZE + self.index_size * INDEX_ENTRY_STRUCT.size + capacity * RECORD_SIZE)
+            self._mmap = mmap.mmap(self._file.fileno(), 0)
+            HEADER_STRUCT.pack_into(self._mmap, 0, MAGIC, self.capacity, self.index_size, 0, 0)
+        self._index_mask = self.index_size - 1
+        self._slab_offset = HEADER_SIZE + self.index_size * INDEX_ENTRY_STRUCT.size
+
+    def __len__(self) -> int:
+        return HEADER_STRUCT.unpack_from(self._mmap, 0)[3]
+
+    def __iter__(self) -> Iterator[bytes]:
+        for slot in range(len(self)):
+            record_offset = self._slab_offset + slot * RECORD_SIZE
+            domain_name_length = self._mmap[record_offset + RECORD_STRUCT.size - 1]
+            domain_name_offset = record_offset + RECORD_STRUCT.size
+            yield self._mmap[domain_name_offset:domain_name_offset + domain_name_length]
+
+    def __contains__(self, domain_name_key) -> bool:
+        return isinstance(domain_name_key, bytes) and self._find(domain_name_key)[1] is not None
+
+    def __getitem__(self, domain_name_key: bytes) -> str:
+        ip_address = self.get(domain_name_key)
+        if ip_address is None:
+            raise KeyError(domain_name_key)
+        return ip_address
+
+    def __setitem__(self, domain_name_key: bytes, ip_address: str):
+        if len(domain_name_key) > MAX_DOMAIN_NAME_LENGTH:
+            raise ValueError(f"Domain name {domain_name_key!r} is longer than {MAX_DOMAIN_NAME_LENGTH} bytes.")
+        packed_ip_address = socket.inet_aton(ip_address)
+
+        index_entry_offset, record_offset = self._find(domain_name_key)
+        if record_offset is not None:
+            self._mmap[record_offset + 4:record_offset + 8] = packed_ip_address
+            return
+
+        _, _, _, record_count, last_wildcard_slot = HEADER_STRUCT.unpack_from(self._mmap, 0)
+        if record_count >= self.capacity:
+            raise ValueError(f"Record store {self.path} is full ({self.capacity} records).")
+        previous_wildcard_slot = 0
+        if domain_name_key.startswith(WILDCARD_KEY_PREFIX):
+            previous_wildcard_slot = last_wildcard_slot
+            last_wildcard_slot = record_count + 1
+        record_offset = self._slab_offset + record_count * RECORD_SIZE
+        RECORD_STRUCT.pack_into(self._mmap, record_offset, zlib.crc32(domain_name_key), packed_ip_address,
+                                previous_wildcard_slot, len(domain_name_key))
+        domain_name_offset = record_offset + RECORD_STRUCT.size
+        self._mmap[domain_name_offset:domain_name_offset + len(domain_name_key)] = domain_name_key
+        # Publish the record only once it is completely written
+        INDEX_ENTRY_STRUCT.pack_into(self._mmap, index_entry_offset, record_count + 1)
+        HEADER_STRUCT.pack_into(self._mmap, 0, MAGIC, self.capacity, self.index_size, record_count + 1,
+                                last_wildcard_slot)
+
+    def get(self, domain_name_key: bytes, default: Optional[str] = None) -> Optional[str]:
+        """
+        Returns the IP address registered for the domain name key, or default.
+
+        :param domain_name_key: The lowercased wire format domain name to look up.
+        :param default: The value returned if the domain name is not registered.
+        :return: The IP address associated with the domain name if found, default otherwise.
+        """
+        record_offset = self._find(domain_name_key)[1]
+        if record_offset is None:
+            return default
+        return socket.inet_ntoa(self._mmap[record_offset + 4:record_offset + 8])
+
+    def wildcard_items(self) -> Iterator[Tuple[bytes, str]]:
+        """
+        Yields the wildcard domain name keys and their IP addresses, the last registered first.
+
+        Only the linked wildcard records are read, whatever the number of records of the store.
+
+        :return: An iterator of (domain name key, IP address) tuples.
+        """
+        slot = HEADER_STRUCT.unpack_from(self._mmap, 0)[4]
+        while slot:
+            record_offset = self._slab_offset + (slot - 1) * RECORD_SIZE
+            _, packed_ip_address, slot, domain_name_length = RECORD_STRUCT.unpack_from(self._mmap, record_offset)
+            domain_name_offset = record_offset + RECORD_STRUCT.size
+            yield self._mmap[domain_name_offset:domain_name_offset + domain_name_length], \
+                socket.inet_ntoa(packed_ip_address)
+
+    def flush(self):
+        """
+        Writes the modified pages of the mapping back to the file.
+        """
+        self._mmap.flush()
+
+    def close(self):
+        """
+        Closes the mapping and the file.
+        """
+        self._mmap.close()
+        self._file.close()
+
+    def _find(self, domain_name_key: bytes) -> Tuple[int, Optional[int]]:
+        """
+        Probes the hash index for a domain name key.
+
+        :param domain_name_key: The lowercased wire format domain name.
+        :return: The offset of the index entry of the domain name, or of the empty entry where it would be inserted,
+            and the offset of its record, None if it is not registered.
+        """
+        domain_name_hash = zlib.crc32(domain_name_key)
+        domain_name_length = len(domain_name_key)
+        position = domain_name_hash & self._index_mask
+        while True:
+            index_entry_offset = HEADER_SIZE + position * INDEX_ENTRY_STRUCT.size
+            slot = INDEX_ENTRY_STRUCT.unpack_from(self._mmap, index_entry_offset)[0]
+            if slot == 0:
+                return index_entry_offset, None
+            record_offset = self._slab_offset + (slot - 1) * RECORD_SIZE
+            record_hash, _, _, record_domain_name_length = RECORD_STRUCT.unpack_from(self._mmap, record_offset)
+            if record_hash == domain_name_hash and record_domain_name_length == domain_name_length:
+                domain_name_offset = record_offset + RECORD_STRUCT.size
+                if self._mmap[domain_name_offset:domain_name_offset + domain_name_length] == domain_name_key:
+                    return index_entry_offset, record_offset
+            position = (position + 1) & self._index_mask
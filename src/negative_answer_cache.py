@@ -0,0 +1,100 @@
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from src.dns_response_cache import DNSResponseCache, EDNS_SINGLE_QUESTION_COUNTS, SINGLE_QUESTION_COUNTS
+from src.custom_types.dns_query import DNSQuery
+from src.custom_types.negative_answer import NegativeAnswer
+
+
+class NegativeAnswerCache(DNSResponseCache):
+    """
+    NegativeAnswerCache stores encoded NXDOMAIN responses so repeated queries for unknown names are answered without
+    being parsed, resolved or encoded again.
+
+    Like DNSResponseCache, responses are keyed on the bytes following the header of the query and stored without their
+    transaction ID, and every response cached for a domain name is removed when that name, or a wildcard name above it,
+    is registered. Entries also expire ttl seconds after being stored.
+
+    When the cache is full, entries are evicted in insertion order with a second chance (CLOCK) policy, an
+    approximation of LRU that only costs a counter increment on a hit: the oldest entry is evicted unless it was hit
+    since it was stored or last spared, in which case it is moved to the end of the queue. During a random-subdomain
+    flood, the flood names are never hit again and are evicted first, while the unknown names that are actually
+    repeated stay cached.
+
+    Attributes:
+    -----------
+    max_entries: int
+        The maximum number of cached responses.
+    ttl: float
+        The number of seconds a response stays cached.
+    responses: OrderedDict[bytes, NegativeAnswer]
+        An ordered dictionary that maps cache keys to the cached response, its expiry and its hit count.
+
+    Methods:
+    --------
+    lookup_query(query_data: bytes) -> Optional[bytes]
+        Returns the cached NXDOMAIN response for a raw single question DNS query, with the query's transaction ID.
+
+    store(dns_query: DNSQuery, response: bytes)
+        Caches the NXDOMAIN response generated for the given DNS query.
+    """
+    def __init__(self, max_entries: int = 65536, ttl: float = 60.0):
+        super().__init__(max_entries=max_entries, ttl=ttl)
+        self.responses = OrderedDict()  # type: OrderedDict[bytes, NegativeAnswer]
+
+    def lookup_query(self, query_data: bytes) -> Optional[bytes]:
+        """
+        Returns the cached NXDOMAIN response for a raw single question DNS query, with the query's transaction ID.
+
+        :param query_data: The raw bytes of the DNS query message.
+        :return: The cached response if the query has a single question that is cached and not expired, None otherwise.
+        """
+        section_counts = query_data[4:12]
+        if section_counts != SINGLE_QUESTION_COUNTS and section_counts != EDNS_SINGLE_QUESTION_COUNTS:
+            return None
+        question = query_data[12:]
+        negative_answer = self.responses.get(question)
+        if negative_answer is None:
+            return None
+        if negative_answer.expires_at <= time.monotonic():
+            self._evict(question)
+            return None
+        negative_answer.hit_count += 1
+        return query_data[:2] + negative_answer.response
+
+    def store(self, dns_query: DNSQuery, response: bytes):
+        """
+        Caches the NXDOMAIN response generated for the given DNS query.
+
+        :param dns_query: The DNS query the response was generated for.
+        :param response: The encoded NXDOMAIN response message.
+        """
+        question = self.cache_key(dns_query)
+        if question is None:
+            return
+        expires_at = time.monotonic() + self.ttl
+        negative_answer = self.responses.get(question)
+        if negative_answer is not None:
+            negative_answer.response = response[2:]
+            negative_answer.expires_at = expires_at
+            return
+        if len(self.responses) >= self.max_entries:
+            self._evict_oldest()
+        self.responses[question] = NegativeAnswer(response=response[2:], expires_at=expires_at, hit_count=0)
+        domain_name_key = dns_query.domain_name_key
+        self._domain_name_key_by_question[question] = domain_name_key
+        self.questions_by_domain_name_key.setdefault(domain_name_key, []).append(question)
+
+    def _evict_oldest(self):
+        now = time.monotonic()
+        # Every spared entry has its hit count reset, so at most max_entries entries are spared
+        for _ in range(len(self.responses)):
+            question, negative_answer = next(iter(self.responses.items()))
+            if negative_answer.hit_count == 0 or negative_answer.expires_at <= now:
+                break
+            negative_answer.hit_count = 0
+            self.responses.move_to_end(question)
+        else:
+            question = next(iter(self.responses))
+        self._evict(question)
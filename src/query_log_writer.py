@@ -0,0 +1,168 @@
+import os
+import socket
+import struct
+import threading
+import time
+from typing import Iterator, List, Tuple
+
+MAGIC = b"DNSQLOG1"
+# Timestamp, message type, client IPv4 address, client port, message length, followed by the DNS message
+RECORD_HEADER_STRUCT = struct.Struct("!dB4sHH")
+QUERY_MESSAGE = 1
+RESPONSE_MESSAGE = 2
+
+
+class QueryLogWriter:
+    """
+    QueryLogWriter records the DNS queries and responses of the server in a binary log file, in the spirit of dnstap.
+
+    Each record holds the time, the message type (query or response), the client address and the raw DNS message.
+    Records are appended to an in-memory batch and a background thread writes the batch with a single write call every
+    flush_interval seconds, or as soon as it reaches max_batch_entries records, so the packet loops never wait for the
+    disk. If the writer falls behind by more than max_pending_entries records, new records are dropped and counted
+    instead of blocking the packet loop.
+
+    The file is opened in append mode and every batch is written at once, so the forked worker processes of
+    DNSWorkerPool can share the file: each worker restarts its own writer thread after the fork.
+
+    Attributes:
+    -----------
+    path: str
+        The path of the query log file.
+    flush_interval: float
+        The maximum number of seconds a record waits before being written.
+    max_batch_entries: int
+        The number of pending records that triggers an immediate write.
+    max_pending_entries: int
+        The number of pending records above which new records are dropped.
+    dropped_count: int
+        The number of records dropped because the writer fell behind.
+
+    Methods:
+    --------
+    start()
+        Opens the log file and starts the writer thread.
+
+    close()
+        Writes the pending records and stops the writer thread.
+
+    log_exchange(query_data: bytes, response_data: bytes, client_address: Tuple[str, int])
+        Records a DNS query and the response sent to the client.
+
+    read_records(path: str) -> Iterator[Tuple[float, int, Tuple[str, int], bytes]]
+        Yields the records of a query log file.
+    """
+    def __init__(self, path: str, flush_interval: float = 1.0, max_batch_entries: int = 4096,
+                 max_pending_entries: int = 65536):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_batch_entries = max_batch_entries
+        self.max_pending_entries = max_pending_entries
+        self.dropped_count = 0
+        self._file_descriptor = None
+        self._fork_hook_registered = False
+        self._reset_writer_state()
+
+    def start(self):
+        """
+        Opens the log file and starts the writer thread.
+        """
+        self._file_descriptor = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        if os.fstat(self._file_descriptor).st_size == 0:
+            os.write(self._file_descriptor, MAGIC)
+        self._start_thread()
+        if not self._fork_hook_registered and hasattr(os, "register_at_fork"):
+            # The writer thread does not survive a fork, the child needs its own
+            os.register_at_fork(after_in_child=self._restart_after_fork)
+            self._fork_hook_registered = True
+
+    def close(self):
+        """
+        Writes the pending records and stops the writer thread.
+        """
+        with self._condition:
+            self._closing = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._file_descriptor is not None:
+            os.close(self._file_descriptor)
+            self._file_descriptor = None
+
+    def log_exchange(self, query_data: bytes, response_data: bytes, client_address: Tuple[str, int]):
+        """
+        Records a DNS query and the response sent to the client.
+
+        :param query_data: The raw bytes of the DNS query message.
+        :param response_data: The raw bytes of the DNS response message.
+        :param client_address: The address of the client that sent the query.
+        """
+        timestamp = time.time()
+        packed_address = socket.inet_aton(client_address[0])
+        port = client_address[1]
+        records = RECORD_HEADER_STRUCT.pack(timestamp, QUERY_MESSAGE, packed_address, port, len(query_data)) \
+            + query_data \
+            + RECORD_HEADER_STRUCT.pack(timestamp, RESPONSE_MESSAGE, packed_address, port, len(response_data)) \
+            + response_data
+        with self._condition:
+            pending_count = len(self._pending_records)
+            if pending_count >= self.max_pending_entries:
+                self.dropped_count += 1
+                return
+            self._pending_records.append(records)
+            if pending_count + 1 == self.max_batch_entries:
+                self._condition.notify()
+
+    @staticmethod
+    def read_records(path: str) -> Iterator[Tuple[float, int, Tuple[str, int], bytes]]:
+        """
+        Yields the records of a query log file, stopping at the first incomplete record.
+
+        :param path: The path of the query log file.
+        :return: An iterator of (timestamp, message type, client address, DNS message) tuples.
+        :raises ValueError: If the file is not a query log file.
+        """
+        with open(path, "rb") as log_file:
+            data = log_file.read()
+        if not data.startswith(MAGIC):
+            raise ValueError(f"{path} is not a query log file.")
+        offset = len(MAGIC)
+        while offset + RECORD_HEADER_STRUCT.size <= len(data):
+            timestamp, message_type, packed_address, port, length = RECORD_HEADER_STRUCT.unpack_from(data, offset)
+            message_start = offset + RECORD_HEADER_STRUCT.size
+            message = data[message_start:message_start + length]
+            if len(message) != length:
+                return
+            offset = message_start + length
+            yield timestamp, message_type, (socket.inet_ntoa(packed_address), port), message
+
+    def _reset_writer_state(self):
+        self._condition = threading.Condition()
+        self._pending_records = []  # type: List[bytes]
+        self._thread = None
+        self._closing = False
+
+    def _start_thread(self):
+        self._thread = threading.Thread(target=self._run, name="query-log-writer", daemon=True)
+        self._thread.start()
+
+    def _restart_after_fork(self):
+        if self._thread is None:
+            return
+        # Records pending in the parent are written by the parent
+        self._reset_writer_state()
+        self._start_thread()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if len(self._pending_records) < self.max_batch_entries and not self._closing:
+                    self._condition.wait(self.flush_interval)
+                records = self._pending_records
+                self._pending_records = []
+                closing = self._closing
+            if records:
+                os.write(self._file_descriptor, b"".join(records))
+            if closing:
+                return
@@ -0,0 +1,100 @@
+import re
+import socket
+import struct
+from typing import List
+
+from src.domain_name_codec import DomainNameCodec
+from src.custom_types.dns_record_type import DNSRecordType
+
+# Preference of an MX record, followed by the exchange domain name
+MX_PREFERENCE_STRUCT = struct.Struct("!H")
+# Priority, weight and port of an SRV record, followed by the target domain name
+SRV_STRUCT = struct.Struct("!HHH")
+# The longest character string of a TXT record, prefixed with its length on 1 byte
+MAX_CHARACTER_STRING_LENGTH = 255
+QUOTED_STRING_PATTERN = re.compile(r'"((?:[^"\\]|\\.)*)"')
+
+
+class RecordDataCodec:
+    """
+    RecordDataCodec encodes the presentation format of record data, as found in master files, to its wire format
+    RDATA.
+
+    Domain names in the record data are encoded as lowercased DomainNameCodec keys, without compression, so the
+    encoded RDATA can be stored once and copied into every response. DNSResponseFactory compresses the trailing domain
+    name of the CNAME, NS and MX RDATA when it writes them to a response.
+
+    Supported record data:
+    ----------------------
+    - A: a dotted-quad IPv4 address ("192.0.2.1").
+    - AAAA: an IPv6 address ("2001:db8::1").
+    - CNAME, NS: a domain name ("www.example.com.").
+    - MX: a preference and a domain name ("10 mail.example.com.").
+    - TXT: one or more quoted or unquoted character strings ("v=spf1 -all", "a" "b"), strings longer than 255 bytes
+      are split.
+    - SRV: a priority, a weight, a port and a domain name ("10 5 5060 sip.example.com.").
+
+    Methods:
+    --------
+    encode(record_type: DNSRecordType, data: str) -> bytes
+        Encodes the presentation format of record data to its wire format RDATA.
+
+    encode_character_strings(data: str) -> bytes
+        Encodes the character strings of TXT record data to their wire format.
+    """
+    @staticmethod
+    def encode(record_type: DNSRecordType, data: str) -> bytes:
+        """
+        Encodes the presentation format of record data to its wire format RDATA.
+
+        :param record_type: The type of the record.
+        :param data: The record data in presentation format.
+        :return: The wire format RDATA.
+        :raises ValueError: If the record data is invalid or the record type is not supported.
+        """
+        type_string = record_type.to_string()
+        try:
+            if type_string == "A":
+                if data.count(".") != 3:
+                    raise ValueError
+                return socket.inet_aton(data)
+            if type_string == "AAAA":
+                return socket.inet_pton(socket.AF_INET6, data)
+            if type_string == "CNAME" or type_string == "NS":
+                return DomainNameCodec.encode(data.strip().rstrip("."))
+            if type_string == "MX":
+                preference, exchange = data.split()
+                return MX_PREFERENCE_STRUCT.pack(int(preference)) + DomainNameCodec.encode(exchange.rstrip("."))
+            if type_string == "TXT":
+                return RecordDataCodec.encode_character_strings(data)
+            if type_string == "SRV":
+                priority, weight, port, target = data.split()
+                return SRV_STRUCT.pack(int(priority), int(weight), int(port)) \
+                    + DomainNameCodec.encode(target.rstrip("."))
+        except (OSError, ValueError, struct.error):
+            raise ValueError(f"Invalid {type_string} record data: {data!r}.")
+        raise ValueError(f"Unsupported record type: {type_string}.")
+
+    @staticmethod
+    def encode_character_strings(data: str) -> bytes:
+        """
+        Encodes the character strings of TXT record data to their wire format.
+
+        :param data: Quoted character strings (with \\" and \\\\ escapes), or unquoted strings separated by spaces.
+        :return: The length-prefixed character strings.
+        :raises ValueError: If the record data has no character string.
+        """
+        data = data.strip()
+        if data.startswith('"'):
+            strings = [re.sub(r"\\(.)", r"\1", string) for string in QUOTED_STRING_PATTERN.findall(data)]
+        else:
+            strings = data.split()
+        if not strings:
+            raise ValueError
+        encoded_strings = []  # type: List[bytes]
+        for string in strings:
+            encoded_string = string.encode("utf-8")
+            for start in range(0, max(len(encoded_string), 1), MAX_CHARACTER_STRING_LENGTH):
+                chunk = encoded_string[start:start + MAX_CHARACTER_STRING_LENGTH]
+                encoded_strings.append(bytes((len(chunk),)) + chunk)
+        return b"".join(encoded_strings)
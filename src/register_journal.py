@@ -0,0 +1,410 @@
+import logging
+import os
+import socket
+import struct
+import threading
+import zlib
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+from src.dns_register import DNSRegister
+from src.domain_name_codec import DomainNameCodec
+from src.custom_types.register_operation import RegisterOperation
+
+# Leading bytes of the journal and snapshot files whose entries carry a RegisterOperation and a weight
+FILE_MAGIC = b"DNSJRN02"
+# CRC32 of the payload, domain name length, followed by the payload: the domain name and the entry tail
+ENTRY_HEADER_STRUCT = struct.Struct("!IB")
+# IPv4 address, RegisterOperation and weight
+ENTRY_TAIL_STRUCT = struct.Struct("!4sBB")
+# Files without FILE_MAGIC, written before addresses were journaled, only hold registrations: their entry tail is the
+# IPv4 address
+LEGACY_ENTRY_TAIL_SIZE = 4
+JOURNAL_FILE_NAME = "register.journal"
+SNAPSHOT_FILE_NAME = "register.snapshot"
+
+logger = logging.getLogger(__name__)
+
+
+class RegisterJournal:
+    """
+    RegisterJournal makes registrations durable with a write-ahead journal and periodic compacted snapshots.
+
+    Every registration of the DNSRegister, and every address added or removed, is appended to an in-memory batch, and a
+    background thread writes and fsyncs the batch to the journal file when it reaches max_batch_entries or
+    commit_interval seconds after its first entry (group commit). Responses to register requests are sent through
+    when_durable, so a registration is only acknowledged once it is on disk. Once snapshot_interval_entries entries have
+    been journaled, the next registration applied makes the thread applying it write the state of the register, records
+    and address sets, to a snapshot file and truncate the journal. On startup, replay loads the snapshot and then the
+    journal into the register. Journal files written before addresses were journaled, without FILE_MAGIC, are still
+    read, and rewritten in the current format by start().
+
+    If the journal cannot be written, registrations are no longer accepted: append raises, so they are not applied and
+    their requests are answered with a server failure, and the responses to the registrations of the failed batch, which
+    are applied but not durable, are never sent.
+
+    Attributes:
+    -----------
+    directory: str
+        The directory of the journal and snapshot files.
+    dns_register: DNSRegister
+        The register whose registrations are journaled.
+    commit_interval: float
+        The maximum number of seconds a registration waits for its batch to be written.
+    max_batch_entries: int
+        The number of pending registrations that triggers an immediate write.
+    snapshot_interval_entries: int
+        The number of journaled registrations that triggers a snapshot.
+
+    Methods:
+    --------
+    replay() -> int
+        Loads the snapshot and the journal into the register.
+
+    start()
+        Opens the journal, starts the commit thread and starts journaling the registrations of the register.
+
+    close()
+        Writes the pending registrations and stops the commit thread.
+
+    detach()
+        Stops journaling the registrations of the register.
+
+    append(domain_name: str, ip_address: str, operation: int, weight: int)
+        Adds a registration or an address operation to the pending batch.
+
+    when_durable(callback: Callable[[], None])
+        Runs the callback once every registration appended so far is written to disk.
+
+    snapshot_if_due(domain_name: str, data: str)
+        Writes a snapshot if snapshot_interval_entries entries were journaled since the last one.
+
+    snapshot()
+        Writes the state of the register to the snapshot file and truncates the journal.
+
+    encode_entry(domain_name: str, ip_address: str, operation: int, weight: int) -> bytes
+        Encodes a registration or an address operation as a journal entry.
+
+    read_entries(path: str) -> Iterator[Tuple[str, str, int, int]]
+        Yields the entries of a journal or snapshot file, stopping at the first incomplete or corrupted entry.
+    """
+    def __init__(self, directory: str, dns_register: DNSRegister, commit_interval: float = 0.005,
+                 max_batch_entries: int = 256, snapshot_interval_entries: int = 100000):
+        self.directory = directory
+        self.dns_register = dns_register
+        self.commit_interval = commit_interval
+        self.max_batch_entries = max_batch_entries
+        self.snapshot_interval_entries = snapshot_interval_entries
+        self.journal_path = os.path.join(directory, JOURNAL_FILE_NAME)
+        self.snapshot_path = os.path.join(directory, SNAPSHOT_FILE_NAME)
+        os.makedirs(directory, exist_ok=True)
+
+        self._condition = threading.Condition()
+        # Held by the commit thread while it writes a batch and by snapshot() while it truncates the journal
+        self._journal_lock = threading.Lock()
+        self._pending_entries = []  # type: List[bytes]
+        self._durable_callbacks = []  # type: List[Tuple[int, Callable[[], None]]]
+        self._appended_sequence = 0
+        self._durable_sequence = 0
+        self._entries_since_snapshot = 0
+        self._snapshot_due = False
+        self._write_error = None  # type: Optional[OSError]
+        self._valid_journal_length = 0
+        self._journal_file = None
+        self._thread = None
+        self._closing = False
+
+    def replay(self) -> int:
+        """
+        Loads the snapshot and the journal into the register.
+
+        :return: The number of registrations replayed.
+        """
+        replayed_count = 0
+        for path in (self.snapshot_path, self.journal_path):
+            if os.path.exists(path):
+                entries = list(self.read_entries(path))
+                self._apply_entries(entries)
+                replayed_count += len(entries)
+                if path == self.journal_path:
+                    self._entries_since_snapshot = len(entries)
+        return replayed_count
+
+    def start(self):
+        """
+        Opens the journal, starts the commit thread and starts journaling the registrations of the register.
+        """
+        if os.path.exists(self.journal_path):
+            # Drop an incomplete entry left by a crash, so new entries are appended after the last valid one
+            entries = list(self.read_entries(self.journal_path))
+            with open(self.journal_path, "rb") as journal_file:
+                is_legacy = journal_file.read(len(FILE_MAGIC)) != FILE_MAGIC
+            if is_legacy:
+                self._write_file(self.journal_path, [self.encode_entry(*entry) for entry in entries])
+            else:
+                os.truncate(self.journal_path, self._valid_journal_length)
+        else:
+            self._write_file(self.journal_path, [])
+        self._journal_file = open(self.journal_path, "ab")
+        self._closing = False
+        self._thread = threading.Thread(target=self._run, name="register-journal", daemon=True)
+        self._thread.start()
+        # Journaled before the register is changed, so an operation that cannot be journaled is not applied
+        self.dns_register.add_register_listener(self.append, write_ahead=True)
+        self.dns_register.add_address_listener(self.append)
+        # Notified once registrations and address operations are applied, so snapshots copy every journaled entry
+        self.dns_register.add_register_listener(self.snapshot_if_due)
+        self.dns_register.add_record_listener(self.snapshot_if_due)
+
+    def close(self):
+        """
+        Writes the pending registrations and stops the commit thread.
+        """
+        self.detach()
+        with self._condition:
+            self._closing = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._journal_file is not None:
+            try:
+                self._journal_file.close()
+            except OSError as error:
+                # The entries of a failed write are still buffered
+                logger.error("Failed to close the register journal: %s", error)
+            self._journal_file = None
+
+    def detach(self):
+        """
+        Stops journaling the registrations of the register.
+        """
+        dns_register = self.dns_register
+        for listeners, listener in ((dns_register.write_ahead_listeners, self.append),
+                                    (dns_register.address_listeners, self.append),
+                                    (dns_register.register_listeners, self.snapshot_if_due),
+                                    (dns_register.record_listeners, self.snapshot_if_due)):
+            if listener in listeners:
+                listeners.remove(listener)
+
+    def append(self, domain_name: str, ip_address: str, operation: int = RegisterOperation.REGISTER,
+               weight: int = 1):
+        """
+        Adds a registration or an address operation to the pending batch.
+
+        The signature matches both DNSRegister register listeners and address listeners, so the journal can be
+        notified of every registration and of every address added or removed.
+
+        :param domain_name: The registered domain name.
+        :param ip_address: The IP address associated with the domain name.
+        :param operation: The RegisterOperation of the entry.
+        :param weight: The weight of an added address.
+        :raises OSError: If the journal could not be written, so the registration is not applied.
+        """
+        entry = self.encode_entry(domain_name, ip_address, operation, weight)
+        with self._condition:
+            if self._write_error is not None:
+                raise OSError(f"Register journal unavailable: {self._write_error}")
+            self._pending_entries.append(entry)
+            self._appended_sequence += 1
+            if len(self._pending_entries) == 1 or len(self._pending_entries) >= self.max_batch_entries:
+                self._condition.notify()
+
+    def when_durable(self, callback: Callable[[], None]):
+        """
+        Runs the callback once every registration appended so far is written to disk.
+
+        The callback runs immediately if nothing is pending, and on the commit thread otherwise. Once the journal could
+        not be written, callbacks waiting for the failed entries are dropped, and later ones run immediately: no
+        registration is applied anymore.
+
+        :param callback: The callable to run, such as sending the response to a register request.
+        """
+        with self._condition:
+            if self._write_error is None and self._durable_sequence < self._appended_sequence:
+                self._durable_callbacks.append((self._appended_sequence, callback))
+                return
+        callback()
+
+    def snapshot_if_due(self, domain_name: str, data: str):
+        """
+        Writes a snapshot if snapshot_interval_entries entries were journaled since the last one.
+
+        The signature matches both DNSRegister register listeners and record listeners: the register calls it once a
+        registration or an address operation is applied.
+
+        :param domain_name: The domain name of the applied registration or address operation.
+        :param data: The IP address or record data of the applied registration or address operation.
+        """
+        if self._snapshot_due:
+            self.snapshot()
+
+    def snapshot(self):
+        """
+        Writes the state of the register to the snapshot file and truncates the journal.
+
+        Must run on the thread applying registrations, between registrations: it is called by snapshot_if_due, or
+        before start().
+        """
+        with self._journal_lock:
+            self._write_snapshot()
+            self._entries_since_snapshot = 0
+            self._snapshot_due = False
+
+    def _write_snapshot(self):
+        # Every entry appended so far is applied, registrations are appended and applied by this thread, and the records
+        # are not written while they are copied. Entries still pending are written to the journal after the truncation:
+        # replaying them on top of the snapshot they are already in leaves the same state.
+        records = list(self.dns_register.records.items())
+        address_sets = [(domain_name_key, list(address_set.weights.items()))
+                        for domain_name_key, address_set in list(self.dns_register.address_sets.items())]
+        entries = [self.encode_entry(DomainNameCodec.decode(domain_name_key), ip_address)
+                   for domain_name_key, ip_address in records]
+        # Replayed after the records: removing the record of a name starts its address set empty, then every address
+        # is added back in order, so the rotations of the set are restored as they were. Registrations applied since
+        # the copies were taken are replayed from the journal afterwards.
+        for domain_name_key, weights in address_sets:
+            domain_name = DomainNameCodec.decode(domain_name_key)
+            registered_ip_address = self.dns_register.records.get(domain_name_key)
+            if registered_ip_address is not None:
+                entries.append(self.encode_entry(domain_name, registered_ip_address, RegisterOperation.REMOVE_ADDRESS,
+                                                 0))
+            entries.extend(self.encode_entry(domain_name, ip_address, RegisterOperation.ADD_ADDRESS, weight)
+                           for ip_address, weight in weights)
+        self._write_file(self.snapshot_path, entries)
+
+        if self._journal_file is not None:
+            # The journal keeps its FILE_MAGIC, new entries are appended right after it
+            self._journal_file.truncate(len(FILE_MAGIC))
+            self._journal_file.flush()
+            os.fsync(self._journal_file.fileno())
+        elif os.path.exists(self.journal_path):
+            self._write_file(self.journal_path, [])
+
+    @staticmethod
+    def encode_entry(domain_name: str, ip_address: str, operation: int = RegisterOperation.REGISTER,
+                     weight: int = 1) -> bytes:
+        """
+        Encodes a registration or an address operation as a journal entry.
+
+        :param domain_name: The registered domain name.
+        :param ip_address: The IP address associated with the domain name.
+        :param operation: The RegisterOperation of the entry.
+        :param weight: The weight of an added address.
+        :return: The encoded entry.
+        """
+        domain_name_bytes = domain_name.encode("utf-8")
+        payload = domain_name_bytes + ENTRY_TAIL_STRUCT.pack(socket.inet_aton(ip_address), operation, weight)
+        return ENTRY_HEADER_STRUCT.pack(zlib.crc32(payload), len(domain_name_bytes)) + payload
+
+    def read_entries(self, path: str) -> Iterator[Tuple[str, str, int, int]]:
+        """
+        Yields the entries of a journal or snapshot file, stopping at the first incomplete or corrupted entry.
+
+        :param path: The path of the journal or snapshot file, with or without FILE_MAGIC.
+        :return: An iterator of (domain name, IP address, RegisterOperation, weight) tuples, the entries of files
+            without FILE_MAGIC being registrations.
+        """
+        with open(path, "rb") as file:
+            data = file.read()
+        is_legacy = not data.startswith(FILE_MAGIC)
+        tail_size = LEGACY_ENTRY_TAIL_SIZE if is_legacy else ENTRY_TAIL_STRUCT.size
+        offset = 0 if is_legacy else len(FILE_MAGIC)
+        self._valid_journal_length = offset
+        while offset + ENTRY_HEADER_STRUCT.size <= len(data):
+            checksum, domain_name_length = ENTRY_HEADER_STRUCT.unpack_from(data, offset)
+            payload_start = offset + ENTRY_HEADER_STRUCT.size
+            payload_end = payload_start + domain_name_length + tail_size
+            payload = data[payload_start:payload_end]
+            if len(payload) != domain_name_length + tail_size or zlib.crc32(payload) != checksum:
+                break
+            offset = payload_end
+            self._valid_journal_length = offset
+            domain_name = payload[:domain_name_length].decode("utf-8")
+            if is_legacy:
+                yield domain_name, socket.inet_ntoa(payload[domain_name_length:]), RegisterOperation.REGISTER, 1
+            else:
+                ip_address, operation, weight = ENTRY_TAIL_STRUCT.unpack_from(payload, domain_name_length)
+                yield domain_name, socket.inet_ntoa(ip_address), operation, weight
+
+    def _apply_entries(self, entries: Iterable[Tuple[str, str, int, int]]):
+        # Runs of registrations are loaded together, so a snapshot without address set is loaded in bulk
+        registrations = []  # type: List[Tuple[str, str]]
+        for domain_name, ip_address, operation, weight in entries:
+            if operation == RegisterOperation.REGISTER:
+                registrations.append((domain_name, ip_address))
+                continue
+            if registrations:
+                self.dns_register.load_records(registrations)
+                registrations = []
+            if operation == RegisterOperation.ADD_ADDRESS:
+                self.dns_register.add_address(domain_name, ip_address, weight)
+            else:
+                self.dns_register.remove_address(domain_name, ip_address)
+        if registrations:
+            self.dns_register.load_records(registrations)
+
+    def _write_file(self, path: str, entries: List[bytes]):
+        # Written to a temporary file and renamed, so a crash leaves either the previous or the new file
+        temporary_path = path + ".tmp"
+        with open(temporary_path, "wb") as file:
+            file.write(FILE_MAGIC + b"".join(entries))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_path, path)
+        self._fsync_directory()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending_entries and not self._closing:
+                    self._condition.wait()
+                if not self._pending_entries:
+                    return
+                if len(self._pending_entries) < self.max_batch_entries and not self._closing:
+                    # Give the batch time to grow, append() wakes the thread up early when it is full
+                    self._condition.wait(self.commit_interval)
+                entries = self._pending_entries
+                batch_sequence = self._appended_sequence
+                self._pending_entries = []
+
+            with self._journal_lock:
+                try:
+                    self._journal_file.write(b"".join(entries))
+                    self._journal_file.flush()
+                    os.fsync(self._journal_file.fileno())
+                except OSError as error:
+                    self._fail(error)
+                    return
+                self._entries_since_snapshot += len(entries)
+                if self._entries_since_snapshot >= self.snapshot_interval_entries:
+                    self._snapshot_due = True
+
+            with self._condition:
+                self._durable_sequence = batch_sequence
+                ready_callbacks = [callback for sequence, callback in self._durable_callbacks
+                                   if sequence <= batch_sequence]
+                self._durable_callbacks = [(sequence, callback) for sequence, callback in self._durable_callbacks
+                                           if sequence > batch_sequence]
+            for callback in ready_callbacks:
+                try:
+                    callback()
+                except Exception as error:
+                    logger.error("Register journal callback failed: %s", error)
+
+    def _fail(self, error: OSError):
+        with self._condition:
+            self._write_error = error
+            dropped_count = len(self._durable_callbacks)
+            self._durable_callbacks = []
+            self._pending_entries = []
+        logger.error("Failed to write the register journal, registrations are no longer accepted and %d responses are "
+                     "dropped: %s", dropped_count, error)
+
+    def _fsync_directory(self):
+        if not hasattr(os, "O_DIRECTORY"):
+            return
+        directory_descriptor = os.open(self.directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(directory_descriptor)
+        finally:
+            os.close(directory_descriptor)
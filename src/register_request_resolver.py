@@ -1,6 +1,15 @@
-from src.custom_types.dns_record_type import DNSRecordType
+from typing import Optional, Tuple
+
+from src.domain_name_codec import MAX_DOMAIN_NAME_LENGTH, MAX_LABEL_LENGTH
+from src.custom_types.dns_record_type import DNSRecordType, RECORD_TYPE_STRINGS
 from src.custom_types.error_types import FormatError
+from src.custom_types.register_operation import RegisterOperation
 from src.custom_types.register_request import RegisterRequest
+from src.custom_types.response_code import ResponseCode
+
+# Record data lengths: an IPv4 address, or an IPv4 address followed by an operation and a weight
+IPV4_ADDRESS_LENGTH = 4
+ADDRESS_OPERATION_LENGTH = 6
 
 
 class RegisterRequestResolver:
@@ -22,15 +31,80 @@ class RegisterRequestResolver:
     For an IPv4 address, the record data is encoded as a sequence of 4 bytes representing the numbers of the IP address.
     For example, the IP address "129.1.1.1" would be encoded as: b"\x81\x01\x01\x01".
 
+    Address Operations:
+    -------------------
+    Record data of 4 bytes registers the IP address, replacing the addresses of the domain name. Record data of 6 bytes
+    is the IPv4 address followed by an operation (1 byte) and a weight (1 byte): operation 1 adds the IP address to the
+    addresses of the domain name with the given weight (1 to 255), operation 2 removes it and ignores the weight.
+    Record data of any other length is malformed.
+    For example, b"\x81\x01\x01\x01\x01\x03" adds "129.1.1.1" with a weight of 3.
+
     Methods:
     --------
+    parse_request(request_data: bytes) -> Tuple[int, Optional[RegisterRequest]]:
+        Parses the given request_data and returns a response code and, if it is NO_ERROR, the RegisterRequest object.
     read_request(request_data: bytes) -> RegisterRequest:
         Parses the given request_data and returns a RegisterRequest object containing the relevant information.
+    parse_register_request_domain_name(domain_name_data: bytes) -> Optional[str]:
+        Decodes the domain name from the given domain_name_data and returns it as a string, or None if it is invalid.
     read_register_request_domain_name(domain_name_data: bytes) -> str:
         Decodes the domain name from the given domain_name_data and returns it as a string.
+    parse_register_request_operation(record_data: bytes) -> Optional[Tuple[int, int]]:
+        Decodes the operation and the weight following the IPv4 address of the given record_data, or returns None if
+        the operation is invalid.
+    read_register_request_operation(record_data: bytes) -> Tuple[int, int]:
+        Decodes the operation and the weight following the IPv4 address of the given record_data.
     validate_register_request_length(request_data: bytes, domain_name_length: int, record_data_length: int) -> bool:
         Validates the length of the register request data to ensure it matches the expected format.
     """
+    def parse_request(self, request_data: bytes) -> Tuple[int, Optional[RegisterRequest]]:
+        """
+        Parses a register request from the given raw bytes without raising for invalid requests.
+
+        Every bound is checked explicitly, so a malformed request costs no more than a valid one.
+
+        :param request_data: The raw bytes representing the register request.
+        :return: ResponseCode.NO_ERROR and the RegisterRequest object, or ResponseCode.FORMAT_ERROR and None.
+        """
+        if len(request_data) < 5:
+            return ResponseCode.FORMAT_ERROR, None
+        domain_name_length = request_data[4]
+        domain_name_index_start = 5
+        domain_name_index_end = 5 + domain_name_length + 1
+        record_data_length = int.from_bytes(request_data[domain_name_index_end:domain_name_index_end + 2], "big")
+
+        if not self.validate_register_request_length(request_data=request_data,
+                                                     domain_name_length=domain_name_length,
+                                                     record_data_length=record_data_length):
+            return ResponseCode.FORMAT_ERROR, None
+        if record_data_length != IPV4_ADDRESS_LENGTH and record_data_length != ADDRESS_OPERATION_LENGTH:
+            # Rejected before anything is registered, DNSRegister would refuse the IP address anyway
+            return ResponseCode.FORMAT_ERROR, None
+        record_type = int.from_bytes(request_data[2:4], "big")
+        if record_type not in RECORD_TYPE_STRINGS:
+            return ResponseCode.FORMAT_ERROR, None
+
+        domain_name = self.parse_register_request_domain_name(
+            request_data[domain_name_index_start:domain_name_index_end])
+        if not domain_name:
+            return ResponseCode.FORMAT_ERROR, None
+
+        record_data = request_data[domain_name_index_end + 2:]
+        operation_and_weight = self.parse_register_request_operation(record_data)
+        if operation_and_weight is None:
+            return ResponseCode.FORMAT_ERROR, None
+        operation, weight = operation_and_weight
+
+        return ResponseCode.NO_ERROR, RegisterRequest(
+            original_query=request_data,
+            transaction_id=request_data[:2],
+            record_type=DNSRecordType(record_type),
+            domain_name=domain_name,
+            ip_address=self.read_register_request_ip_address(record_data[:IPV4_ADDRESS_LENGTH]),
+            operation=operation,
+            weight=weight
+        )
+
     def read_request(self, request_data: bytes) -> RegisterRequest:
         """
         Reads and parses a register request from the given raw bytes.
@@ -39,76 +113,106 @@ class RegisterRequestResolver:
         :return: A RegisterRequest object containing the parsed request data.
         :raises FormatError: If the request data is malformed or does not match the expected format.
         """
-        try:
-            transaction_id = request_data[:2]
-            record_type = int.from_bytes(request_data[2:4], "big")
-            domain_name_length = int.from_bytes(request_data[4:5], "big")
-            domain_name_index_start = 5
-            domain_name_index_end = 5 + domain_name_length + 1
-            record_data_length = int.from_bytes(request_data[domain_name_index_end:domain_name_index_end + 2],
-                                                "big")
-
-            if not self.validate_register_request_length(request_data=request_data,
-                                                         domain_name_length=domain_name_length,
-                                                         record_data_length=record_data_length):
-                raise FormatError("Malformed register request.")
-
-            domain_name = self.read_register_request_domain_name(
-                request_data[domain_name_index_start:domain_name_index_end])
-            if domain_name == "":
-                raise Exception
-
-            ip_address = self.read_register_request_ip_address(
-                request_data[domain_name_index_end+2:])
-            if ip_address == "":
-                raise Exception
-
-            return RegisterRequest(
-                original_query=request_data,
-                transaction_id=transaction_id,
-                record_type=DNSRecordType(record_type),
-                domain_name=domain_name,
-                ip_address=ip_address
-            )
-        except Exception:
+        response_code, register_request = self.parse_request(request_data)
+        if response_code != ResponseCode.NO_ERROR:
             raise FormatError("Malformed register request.")
+        return register_request
 
     @staticmethod
-    def read_register_request_domain_name(domain_name_data: bytes) -> str:
+    def parse_register_request_domain_name(domain_name_data: bytes) -> Optional[str]:
         """
-        Decodes the domain name from the given domain_name_data and returns it as a string.
+        Decodes the domain name from the given domain_name_data without raising for invalid domain names.
 
         :param domain_name_data: The raw bytes representing the domain name.
-        :return: The decoded domain name as a string.
-        :raises FormatError: If the domain name data is malformed or does not match the expected format.
+        :return: The decoded domain name as a string, or None if the domain name data is malformed, has a label longer
+            than MAX_LABEL_LENGTH bytes or containing a dot, or is longer than MAX_DOMAIN_NAME_LENGTH bytes.
         """
+        if not isinstance(domain_name_data, bytes):
+            return None
+        data_length = len(domain_name_data)
         pointer = 0
         domain_name = ""
 
         # Handle http:// and https://
-        if domain_name_data[0] == 7 and domain_name_data[1:5] == b"http":
+        if data_length and domain_name_data[0] == 7 and domain_name_data[1:5] == b"http":
             domain_name += "http://"
-            domain_name_data = domain_name_data[5:]
-        if domain_name_data[0] == 8 and domain_name_data[1:6] == b"https":
+            pointer = 5
+        if (pointer < data_length and domain_name_data[pointer] == 8
+                and domain_name_data[pointer + 1:pointer + 6] == b"https"):
             domain_name += "https://"
-            domain_name_data = domain_name_data[6:]
+            pointer += 6
+
+        labels = []
+        while True:
+            if pointer >= data_length:
+                return None
+            label_length = domain_name_data[pointer]
+            if label_length == 0:
+                # End of domain name
+                break
+            label = domain_name_data[pointer + 1:pointer + 1 + label_length]
+            if label_length > MAX_LABEL_LENGTH or b"." in label:
+                # DNSRegister could not encode the label, or would register another domain name
+                return None
+            labels.append(label)
+            pointer += label_length + 1
+        if pointer + 1 > MAX_DOMAIN_NAME_LENGTH:
+            return None
 
         try:
-            while True:
-                label_length = domain_name_data[pointer]
-                if label_length == 0:
-                    # End of domain name
-                    break
-                elif pointer != 0:
-                    # Add . before label if it's not the first one
-                    domain_name += "."
-                label = domain_name_data[pointer + 1: pointer + 1 + label_length]
-                domain_name += label.decode("utf-8")
-                pointer += label_length + 1
-
-            return domain_name
-        except Exception:
+            return domain_name + b".".join(labels).decode("utf-8")
+        except UnicodeDecodeError:
+            return None
+
+    @staticmethod
+    def read_register_request_domain_name(domain_name_data: bytes) -> str:
+        """
+        Decodes the domain name from the given domain_name_data and returns it as a string.
+
+        :param domain_name_data: The raw bytes representing the domain name.
+        :return: The decoded domain name as a string.
+        :raises FormatError: If the domain name data is malformed or does not match the expected format.
+        """
+        domain_name = RegisterRequestResolver.parse_register_request_domain_name(domain_name_data)
+        if domain_name is None:
+            raise FormatError("Malformed register request.")
+        return domain_name
+
+    @staticmethod
+    def parse_register_request_operation(record_data: bytes) -> Optional[Tuple[int, int]]:
+        """
+        Decodes the operation and the weight following the IPv4 address of the given record_data without raising for
+        invalid operations.
+
+        :param record_data: The raw bytes representing the record data.
+        :return: The RegisterOperation and the weight of the request: RegisterOperation.REGISTER and a weight of 1 if
+            the record data is a plain IPv4 address. None if the operation is unknown, or an address is added with a
+            weight of 0.
+        """
+        if len(record_data) != ADDRESS_OPERATION_LENGTH:
+            return RegisterOperation.REGISTER, 1
+        operation = record_data[4]
+        weight = record_data[5]
+        if operation == RegisterOperation.ADD_ADDRESS and weight == 0:
+            return None
+        if operation not in (RegisterOperation.ADD_ADDRESS, RegisterOperation.REMOVE_ADDRESS):
+            return None
+        return operation, weight
+
+    @staticmethod
+    def read_register_request_operation(record_data: bytes) -> Tuple[int, int]:
+        """
+        Decodes the operation and the weight following the IPv4 address of the given record_data.
+
+        :param record_data: The raw bytes representing the record data.
+        :return: The RegisterOperation and the weight of the request: RegisterOperation.REGISTER and a weight of 1 if
+            the record data is a plain IPv4 address.
+        :raises FormatError: If the operation is unknown, or an address is added with a weight of 0.
+        """
+        operation_and_weight = RegisterRequestResolver.parse_register_request_operation(record_data)
+        if operation_and_weight is None:
             raise FormatError("Malformed register request.")
+        return operation_and_weight
 
     @staticmethod
     def read_register_request_ip_address(ip_address_bytes: bytes) -> str:
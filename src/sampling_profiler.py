@@ -0,0 +1,142 @@
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SamplingProfiler:
+    """
+    SamplingProfiler captures a statistical profile of a running server, without restarting it under a profiler.
+
+    Once started, a background thread reads the current stack of every other thread with sys._current_frames() every
+    interval seconds, for the requested number of seconds, and counts identical stacks. The profile is then written as a
+    collapsed stack file (one "thread;outermost function;...;innermost function count" line per stack), which
+    flamegraph.pl, speedscope or inferno can render as a flame graph. The serving threads are not instrumented: they
+    only pay for the GIL switches to the sampling thread while a profile is captured.
+
+    A profile is usually triggered on a live server with a signal, see install_signal_handler(): with DNSWorkerPool,
+    each worker process inherits the handler and profiles itself when it receives the signal.
+
+    Attributes:
+    -----------
+    output_directory: str
+        The directory the collapsed stack files are written to.
+    interval: float
+        The number of seconds between two samples.
+    stack_counts: Dict[str, int]
+        The number of samples of each collapsed stack of the last profile.
+    output_path: Optional[str]
+        The path of the last collapsed stack file written.
+
+    Methods:
+    --------
+    install_signal_handler(seconds: float, signal_number: int)
+        Starts a profile of the given duration whenever the process receives the signal.
+
+    start(seconds: float) -> bool
+        Starts capturing a profile of the given duration in the background.
+
+    wait(timeout: Optional[float]) -> Optional[str]
+        Waits for the profile being captured and returns the path of its collapsed stack file.
+
+    sample()
+        Adds the current stack of every other thread to the profile.
+
+    write_collapsed_stacks(path: str)
+        Writes the profile as a collapsed stack file.
+    """
+    def __init__(self, output_directory: str = ".", interval: float = 0.001):
+        self.output_directory = output_directory
+        self.interval = interval
+        self.stack_counts = {}  # type: Dict[str, int]
+        self.output_path = None  # type: Optional[str]
+        self._thread = None  # type: Optional[threading.Thread]
+        self._frame_labels = {}  # type: Dict[object, str]
+
+    def install_signal_handler(self, seconds: float, signal_number: int = getattr(signal, "SIGUSR1", 10)):
+        """
+        Starts a profile of the given duration whenever the process receives the signal (SIGUSR1 by default).
+
+        The handler must be installed from the main thread, e.g. kill -USR1 <pid> then profiles the server.
+
+        :param seconds: The duration of each profile.
+        :param signal_number: The signal triggering the profiles.
+        """
+        signal.signal(signal_number, lambda received_signal, frame: self.start(seconds))
+
+    def start(self, seconds: float) -> bool:
+        """
+        Starts capturing a profile of the given duration in the background.
+
+        :param seconds: The duration of the profile.
+        :return: True if the profile was started, False if a profile is already being captured.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return False
+        self.stack_counts = {}
+        self._thread = threading.Thread(target=self._run, args=(seconds,), name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return True
+
+    def wait(self, timeout: Optional[float] = None) -> Optional[str]:
+        """
+        Waits for the profile being captured and returns the path of its collapsed stack file.
+
+        :param timeout: The maximum number of seconds to wait, None to wait until the profile is written.
+        :return: The path of the collapsed stack file, None if no profile was written yet.
+        """
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.output_path
+
+    def sample(self):
+        """
+        Adds the current stack of every other thread to the profile.
+        """
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        current_thread_id = threading.get_ident()
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == current_thread_id:
+                continue
+            frames = []  # type: List[str]
+            while frame is not None:
+                code = frame.f_code
+                label = self._frame_labels.get(code)
+                if label is None:
+                    label = self._frame_labels[code] = \
+                        f"{code.co_name} ({os.path.relpath(code.co_filename)}:{code.co_firstlineno})"
+                frames.append(label)
+                frame = frame.f_back
+            frames.append(thread_names.get(thread_id, str(thread_id)))
+            stack = ";".join(reversed(frames))
+            self.stack_counts[stack] = self.stack_counts.get(stack, 0) + 1
+
+    def write_collapsed_stacks(self, path: str):
+        """
+        Writes the profile as a collapsed stack file, the most sampled stacks first.
+
+        :param path: The path of the collapsed stack file.
+        """
+        temporary_path = path + ".tmp"
+        with open(temporary_path, "w") as collapsed_file:
+            for stack, count in sorted(self.stack_counts.items(), key=lambda item: item[1], reverse=True):
+                collapsed_file.write(f"{stack} {count}\n")
+        os.replace(temporary_path, path)
+
+    def _run(self, seconds: float):
+        logger.info("Capturing a %.1fs profile", seconds)
+        deadline = time.monotonic() + seconds
+        sample_count = 0
+        while time.monotonic() < deadline:
+            self.sample()
+            sample_count += 1
+            time.sleep(self.interval)
+        path = os.path.join(self.output_directory, f"profile-{os.getpid()}-{int(time.time())}.collapsed")
+        self.write_collapsed_stacks(path)
+        self.output_path = path
+        logger.info("Wrote %d samples to %s", sample_count, path)
@@ -0,0 +1,66 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Tuple
+
+from src.dns_query_resolver import DNSQueryResolver
+
+
+class SingleFlight:
+    """
+    SingleFlight coalesces the concurrent lookups of identical DNS questions, so a burst of queries for the same name,
+    typically after its cached response expired, is looked up once instead of once per client.
+
+    The first query for a (name, query type) pair starts the lookup; the queries received until it completes wait for
+    its response instead of starting their own. Every waiting client then receives the response with its own
+    transaction ID and its own question, so names sent with a randomized letter case (DNS 0x20) are echoed as sent.
+
+    Attributes:
+    -----------
+    in_flight: Dict[Tuple[bytes, bytes, bytes], asyncio.Future]
+        A dictionary that maps the flight keys of the questions being looked up to the future of their response.
+
+    Methods:
+    --------
+    flight_key(query_data: bytes) -> Tuple[Tuple[bytes, bytes, bytes], int]
+        Returns the key identical questions are coalesced on, and the end of the question section.
+
+    resolve(query_data: bytes, lookup: Callable[[bytes], Awaitable[bytes]]) -> bytes
+        Returns the response of a raw DNS query, joining the lookup of an identical question if one is in flight.
+    """
+    def __init__(self):
+        self.in_flight = {}  # type: Dict[Tuple[bytes, bytes, bytes], asyncio.Future]
+
+    @staticmethod
+    def flight_key(query_data: bytes) -> Tuple[Tuple[bytes, bytes, bytes], int]:
+        """
+        Returns the key identical questions are coalesced on, and the end of the question section.
+
+        The key is made of the lowercased domain name, the query type and class, and the additional section without the
+        UDP payload size of its OPT record: queries with and without EDNS, or with different EDNS flags, get different
+        responses, while the payload size only limits how much of the response is sent back.
+
+        :param query_data: The raw bytes of a valid single question DNS query message.
+        :return: The flight key of the query and the index following its question section.
+        """
+        question_end = DNSQueryResolver.skip_domain_name(query_data, 12) + 4
+        additional = query_data[question_end:]
+        # An OPT record starts with the root name, its type and its UDP payload size (RFC 6891 section 6.1.2)
+        return (query_data[12:question_end - 4].lower(), query_data[question_end - 4:question_end],
+                additional[:3] + additional[5:]), question_end
+
+    async def resolve(self, query_data: bytes, lookup: Callable[[bytes], Awaitable[bytes]]) -> bytes:
+        """
+        Returns the response of a raw DNS query, joining the lookup of an identical question if one is in flight.
+
+        :param query_data: The raw bytes of a valid single question DNS query message.
+        :param lookup: A coroutine function returning the response of a raw DNS query.
+        :return: The response of the lookup, with the transaction ID and the question of the query.
+        """
+        key, question_end = self.flight_key(query_data)
+        in_flight = self.in_flight
+        flight = in_flight.get(key)
+        if flight is None:
+            flight = in_flight[key] = asyncio.ensure_future(lookup(query_data))
+            flight.add_done_callback(lambda _: in_flight.pop(key, None))
+        # A client giving up must not cancel the lookup the other clients wait for
+        response = await asyncio.shield(flight)
+        return query_data[:2] + response[2:12] + query_data[12:question_end] + response[question_end:]
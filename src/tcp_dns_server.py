@@ -0,0 +1,186 @@
+import asyncio
+import logging
+from typing import Optional, Set, Tuple
+
+from src.dns_server import DNSServer
+
+logger = logging.getLogger(__name__)
+
+# Every DNS message sent over TCP is preceded by its length on 2 bytes (RFC 1035 section 4.2.2)
+LENGTH_PREFIX_SIZE = 2
+
+
+class TCPDNSQueryProtocol(asyncio.Protocol):
+    """
+    TCPDNSQueryProtocol answers the DNS queries of one TCP connection, following RFC 7766.
+
+    A connection stays open for any number of queries, and clients can pipeline queries without waiting for the
+    responses: every complete length-prefixed message received is answered with the DNSServer query pipeline, and the
+    responses of all the queries of a read are written together. Queries forwarded to upstream resolvers are answered
+    as soon as their response arrives, possibly out of order. The connection is closed once it has been idle for
+    idle_timeout seconds. When the client stops reading its responses and the transport's write buffer fills up,
+    reading from the connection is paused until the buffer drains.
+
+    Attributes:
+    -----------
+    dns_server: DNSServer
+        The DNSServer whose query pipeline is used to generate the responses.
+    idle_timeout: float
+        The number of seconds without query after which the connection is closed.
+    transport: asyncio.Transport
+        The transport of the connection, set once the connection is made.
+    client_address: Tuple[str, int]
+        The address of the client.
+    forward_tasks: Set[asyncio.Future]
+        The tasks forwarding queries to the upstream resolvers, referenced until they are done so that they are not
+        garbage collected while pending.
+    """
+    def __init__(self, dns_server: DNSServer, idle_timeout: float):
+        self.dns_server = dns_server
+        self.idle_timeout = idle_timeout
+        self.transport = None  # type: Optional[asyncio.Transport]
+        self.client_address = None  # type: Optional[Tuple[str, int]]
+        self.forward_tasks = set()  # type: Set[asyncio.Future]
+        self._buffer = bytearray()
+        self._loop = None  # type: Optional[asyncio.AbstractEventLoop]
+        self._last_activity = 0.0
+        self._idle_timer = None  # type: Optional[asyncio.TimerHandle]
+
+    def connection_made(self, transport: asyncio.Transport):
+        self.transport = transport
+        self.client_address = transport.get_extra_info("peername")
+        self._loop = asyncio.get_event_loop()
+        self._last_activity = self._loop.time()
+        self._idle_timer = self._loop.call_later(self.idle_timeout, self._check_idle)
+
+    def data_received(self, data: bytes):
+        """
+        Answers every complete DNS query received so far, keeping the incomplete one buffered.
+
+        :param data: The bytes received on the connection.
+        """
+        buffer = self._buffer
+        buffer += data
+        responses = []
+        offset = 0
+        buffer_length = len(buffer)
+        while buffer_length - offset >= LENGTH_PREFIX_SIZE:
+            message_end = offset + LENGTH_PREFIX_SIZE + (buffer[offset] << 8 | buffer[offset + 1])
+            if message_end > buffer_length:
+                break
+            query_data = bytes(buffer[offset + LENGTH_PREFIX_SIZE:message_end])
+            dns_response = self.dns_server.handle_dns_query(query_data)
+            if dns_response is None:
+                # Answered once the upstream resolvers answer, after the responses of the next queries if they are
+                # quicker, which RFC 7766 allows
+                forward_task = asyncio.ensure_future(self.forward_dns_query(query_data))
+                self.forward_tasks.add(forward_task)
+                forward_task.add_done_callback(self.forward_done)
+            else:
+                responses.append(len(dns_response).to_bytes(LENGTH_PREFIX_SIZE, "big") + dns_response)
+                self.dns_server.log_dns_exchange(query_data, dns_response, self.client_address)
+            offset = message_end
+        if offset:
+            del buffer[:offset]
+        if responses:
+            self.transport.write(b"".join(responses))
+        self._last_activity = self._loop.time()
+
+    async def forward_dns_query(self, query_data: bytes):
+        """
+        Forwards a DNS query to the upstream resolvers of the DNSServer's forwarder and writes their response.
+
+        :param query_data: The raw bytes of the DNS query message.
+        """
+        dns_response = await self.dns_server.forward_dns_query(query_data)
+        if self.transport.is_closing():
+            return
+        self.transport.write(len(dns_response).to_bytes(LENGTH_PREFIX_SIZE, "big") + dns_response)
+        self.dns_server.log_dns_exchange(query_data, dns_response, self.client_address)
+        self._last_activity = self._loop.time()
+
+    def forward_done(self, forward_task: asyncio.Future):
+        """
+        Releases a forward task once it is done, and logs its error if it failed.
+
+        :param forward_task: The task of forward_dns_query.
+        """
+        self.forward_tasks.discard(forward_task)
+        if not forward_task.cancelled() and forward_task.exception() is not None:
+            logger.error("Failed to forward DNS query from %s: %s", self.client_address, forward_task.exception())
+
+    def pause_writing(self):
+        # The client does not read its responses, stop reading its queries
+        self.transport.pause_reading()
+
+    def resume_writing(self):
+        self.transport.resume_reading()
+
+    def connection_lost(self, error: Optional[Exception]):
+        if self._idle_timer is not None:
+            self._idle_timer.cancel()
+            self._idle_timer = None
+
+    def _check_idle(self):
+        # A single timer per connection, pushed back on activity instead of being rescheduled for every read
+        idle_deadline = self._last_activity + self.idle_timeout
+        if self._loop.time() >= idle_deadline:
+            self._idle_timer = None
+            self.transport.close()
+        else:
+            self._idle_timer = self._loop.call_at(idle_deadline, self._check_idle)
+
+
+class TCPDNSServer:
+    """
+    TCPDNSServer serves DNS queries over TCP with persistent, pipelined connections, next to the UDP sockets served by
+    AsyncDNSServer.
+
+    It runs on the event loop of AsyncDNSServer, so the query pipeline of the DNSServer is never used by two threads.
+
+    Attributes:
+    -----------
+    dns_server: DNSServer
+        The DNSServer whose query pipeline is used to generate the responses.
+    address: Tuple[str, int]
+        The address the TCP listening socket binds to.
+    idle_timeout: float
+        The number of seconds without query after which a connection is closed.
+    server: Optional[asyncio.AbstractServer]
+        The listening server, once started.
+
+    Methods:
+    --------
+    start()
+        Binds the TCP listening socket and starts accepting connections.
+
+    close()
+        Stops accepting connections.
+    """
+    def __init__(self, dns_server: DNSServer, address: Tuple[str, int] = ("0.0.0.0", 53), idle_timeout: float = 10.0):
+        self.dns_server = dns_server
+        self.address = address
+        self.idle_timeout = idle_timeout
+        self.server = None  # type: Optional[asyncio.AbstractServer]
+
+    async def start(self):
+        """
+        Binds the TCP listening socket and starts accepting connections.
+        """
+        loop = asyncio.get_event_loop()
+        self.server = await loop.create_server(
+            lambda: TCPDNSQueryProtocol(self.dns_server, self.idle_timeout),
+            host=self.address[0],
+            port=self.address[1],
+            reuse_address=True
+        )
+        logger.info("Server is listening to TCP port %d for DNS query requests",
+                    self.server.sockets[0].getsockname()[1])
+
+    def close(self):
+        """
+        Stops accepting connections.
+        """
+        if self.server is not None:
+            self.server.close()
+            self.server = None
@@ -0,0 +1,146 @@
+import itertools
+import math
+import socket
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from src.dns_response_factory import DEFAULT_RECORD_TTL
+from src.custom_types.dns_record_type import DNSRecordType
+from src.custom_types.resource_record_set import ResourceRecordSet
+
+A_RECORD_TYPE = DNSRecordType(1)
+# The owner name of an answer to the question (a pointer to offset 12), type A and class IN, followed by the TTL
+A_ANSWER_PREFIX = b"\xc0\x0c\x00\x01\x00\x01"
+# The RDLENGTH of an IPv4 address
+A_RDATA_LENGTH = b"\x00\x04"
+# Weights are sent on 1 byte by register requests, and bound the length of the schedule
+MAX_ADDRESS_WEIGHT = 255
+
+
+class WeightedAddressSet:
+    """
+    WeightedAddressSet holds the IPv4 addresses of a domain name with their weights, and rotates them across answers.
+
+    Every answer carries all the addresses, and clients mostly connect to the first one, so the addresses are spread
+    across clients by rotating which address comes first. The answer section of every rotation is encoded once, when an
+    address is added or removed: rotation i starts with the i-th address and continues in cyclic order, so there are as
+    many answer blocks as addresses. The schedule is the sequence of rotations answered in turn, in which each address
+    comes first as many times as its weight (divided by the greatest common divisor of the weights), interleaved with
+    the smooth weighted round-robin algorithm so that heavy addresses are not answered first in bursts. Answering a
+    query costs one step of an itertools.cycle over the schedule, whatever the number of addresses.
+
+    Attributes:
+    -----------
+    ttl: int
+        The TTL of the A records, in seconds.
+    weights: Dict[str, int]
+        A dictionary that maps the IP addresses, in the order they were added, to their weights.
+    answer_count: int
+        The number of A records of every answer.
+    answer_blocks: Tuple[bytes, ...]
+        The encoded answer section of every rotation, whose owner names point to the question name.
+    rrsets: Tuple[ResourceRecordSet, ...]
+        The A RRset of every rotation, for the answers built by DNSMessageBuilder.
+    schedule: Tuple[int, ...]
+        The rotations answered in turn.
+
+    Methods:
+    --------
+    add(ip_address: str, weight: int)
+        Adds an IP address with the given weight, or sets the weight of an IP address already in the set.
+
+    remove(ip_address: str) -> bool
+        Removes an IP address from the set.
+
+    next_answer_block() -> bytes
+        Returns the answer section of the next rotation.
+
+    next_rrset() -> Optional[ResourceRecordSet]
+        Returns the A RRset of the next rotation.
+    """
+    def __init__(self, ttl: int = DEFAULT_RECORD_TTL):
+        self.ttl = ttl
+        self.weights = {}  # type: Dict[str, int]
+        self.answer_count = 0
+        self.answer_blocks = ()  # type: Tuple[bytes, ...]
+        self.rrsets = ()  # type: Tuple[ResourceRecordSet, ...]
+        self.schedule = ()  # type: Tuple[int, ...]
+        self._turns = iter(())  # type: Iterator[int]
+
+    def add(self, ip_address: str, weight: int = 1):
+        """
+        Adds an IP address with the given weight, or sets the weight of an IP address already in the set.
+
+        :param ip_address: The IPv4 address (e.g., "1.2.3.4").
+        :param weight: The share of the answers starting with the address, relative to the other weights.
+        :raises ValueError: If the IP address is invalid or the weight is not between 1 and MAX_ADDRESS_WEIGHT.
+        """
+        if not 1 <= weight <= MAX_ADDRESS_WEIGHT:
+            raise ValueError(f"Invalid address weight: {weight}.")
+        try:
+            socket.inet_aton(ip_address)
+        except OSError:
+            raise ValueError(f"Invalid IPv4 address: {ip_address}.")
+        self.weights[ip_address] = weight
+        self._encode()
+
+    def remove(self, ip_address: str) -> bool:
+        """
+        Removes an IP address from the set.
+
+        :param ip_address: The IPv4 address to remove.
+        :return: True if the address was in the set, False otherwise.
+        """
+        if self.weights.pop(ip_address, None) is None:
+            return False
+        self._encode()
+        return True
+
+    def next_answer_block(self) -> bytes:
+        """
+        Returns the answer section of the next rotation.
+
+        :return: The encoded answer section, of answer_count records.
+        :raises StopIteration: If the set is empty.
+        """
+        return self.answer_blocks[next(self._turns)]
+
+    def next_rrset(self) -> Optional[ResourceRecordSet]:
+        """
+        Returns the A RRset of the next rotation.
+
+        :return: The RRset, or None if the set is empty.
+        """
+        if not self.answer_count:
+            return None
+        return self.rrsets[next(self._turns)]
+
+    def _encode(self):
+        rdatas = [socket.inet_aton(ip_address) for ip_address in self.weights]
+        answer_prefix = A_ANSWER_PREFIX + self.ttl.to_bytes(4, "big") + A_RDATA_LENGTH
+        records = [answer_prefix + rdata for rdata in rdatas]
+        self.answer_count = len(records)
+        self.answer_blocks = tuple(b"".join(records[index:] + records[:index]) for index in range(len(records)))
+        self.rrsets = tuple(ResourceRecordSet(record_type=A_RECORD_TYPE, ttl=self.ttl,
+                                              rdatas=tuple(rdatas[index:] + rdatas[:index]))
+                            for index in range(len(rdatas)))
+        self.schedule = self._smooth_weighted_schedule(list(self.weights.values()))
+        self._turns = itertools.cycle(self.schedule)
+
+    @staticmethod
+    def _smooth_weighted_schedule(weights: List[int]) -> Tuple[int, ...]:
+        if not weights:
+            return ()
+        divisor = 0
+        for weight in weights:
+            divisor = math.gcd(divisor, weight)
+        weights = [weight // divisor for weight in weights]
+        total_weight = sum(weights)
+        current_weights = [0] * len(weights)
+        schedule = []  # type: List[int]
+        for _ in range(total_weight):
+            for index, weight in enumerate(weights):
+                current_weights[index] += weight
+            selected = max(range(len(weights)), key=current_weights.__getitem__)
+            current_weights[selected] -= total_weight
+            schedule.append(selected)
+        return tuple(schedule)
@@ -0,0 +1,249 @@
+import csv
+from socket import inet_aton
+import time
+from dataclasses import dataclass
+from typing import Iterator, Optional, Tuple
+
+from src.dns_register import DNSRegister, RECORD_SET_TYPES
+from src.dns_response_factory import DEFAULT_RECORD_TTL
+from src.custom_types.dns_record_type import DNSRecordType, RECORD_TYPE_STRINGS
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# Classes that can appear before the record type in a master file record
+RECORD_CLASSES = {"IN", "CH", "HS", "CS", "in", "ch", "hs", "cs"}
+A_RECORD_TYPES = {"A", "a"}
+# The record types registered as RRsets, by their upper and lower case mnemonics
+RRSET_RECORD_TYPES = {mnemonic: DNSRecordType(value) for value in RECORD_SET_TYPES
+                      for mnemonic in (RECORD_TYPE_STRINGS[value], RECORD_TYPE_STRINGS[value].lower())}
+# The record types whose record data ends with a domain name, relative to the origin unless it ends with a dot: NS,
+# CNAME, MX and SRV
+DOMAIN_NAME_DATA_RECORD_TYPES = {2, 5, 15, 33}
+
+
+@dataclass
+class ZoneLoadReport:
+    __slots__ = ("path", "record_count", "skipped_count", "seconds", "peak_memory_kib")
+
+    path: str
+    record_count: int
+    skipped_count: int
+    seconds: float
+    peak_memory_kib: Optional[int]
+
+
+class ZoneLoader:
+    """
+    ZoneLoader loads domain name to IPv4 address records in bulk from a zone file or a CSV file into a DNSRegister, as
+    well as the NS, CNAME, MX, TXT, AAAA and SRV records of zone files.
+
+    Records are parsed one line at a time and streamed into the register without building intermediate lists, so
+    loading millions of records only needs memory for the register itself.
+
+    Supported formats:
+    ------------------
+    - RFC 1035 master files (.zone, .txt, ...): the A records are loaded, and the NS, CNAME, MX, TXT, AAAA and SRV
+      records are registered with DNSRegister.register_record and their TTL ($TTL, or DEFAULT_RECORD_TTL, when they
+      have none); $ORIGIN, "@", relative owner names and omitted owner names are supported; classes are accepted and
+      ignored; other record types, records spanning several lines and other directives are skipped.
+    - CSV files (.csv): one "domain name,IP address" record per row; rows starting with "#" and invalid rows, such as
+      a header row, are skipped.
+
+    Records whose domain name has an empty label, a label longer than 63 bytes or more than 255 bytes in wire format are
+    skipped by DNSRegister.load_records, which encodes every domain name once, and counted in the report.
+
+    Attributes:
+    -----------
+    dns_register: DNSRegister
+        The register the records are loaded into.
+    record_count: int
+        The number of records yielded by the last read, including the ones DNSRegister.load_records skips.
+    skipped_count: int
+        The number of records or rows skipped by the last read.
+
+    Methods:
+    --------
+    load(path: str, file_format: Optional[str]) -> ZoneLoadReport
+        Loads every record of the file into the register and reports the load time and memory.
+
+    read_zone_file(path: str) -> Iterator[Tuple[str, str]]
+        Yields the domain name and IP address of every A record of a master file, and registers its other records.
+
+    read_csv_file(path: str) -> Iterator[Tuple[str, str]]
+        Yields the domain name and IP address of every row of a CSV file.
+    """
+    def __init__(self, dns_register: DNSRegister):
+        self.dns_register = dns_register
+        self.record_count = 0
+        self.skipped_count = 0
+
+    def load(self, path: str, file_format: Optional[str] = None) -> ZoneLoadReport:
+        """
+        Loads every record of the file into the register and reports the load time and memory.
+
+        :param path: The path of the zone or CSV file.
+        :param file_format: "zone" or "csv", guessed from the file extension if None.
+        :return: The number of loaded and skipped records, the load time and the peak memory of the process.
+        """
+        if file_format is None:
+            file_format = "csv" if path.lower().endswith(".csv") else "zone"
+        records = self.read_csv_file(path) if file_format == "csv" else self.read_zone_file(path)
+
+        start = time.perf_counter()
+        invalid_count = self.dns_register.load_records(records)
+        seconds = time.perf_counter() - start
+
+        peak_memory_kib = None
+        if resource is not None:
+            peak_memory_kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return ZoneLoadReport(
+            path=path,
+            record_count=self.record_count - invalid_count,
+            skipped_count=self.skipped_count + invalid_count,
+            seconds=seconds,
+            peak_memory_kib=peak_memory_kib
+        )
+
+    def read_zone_file(self, path: str) -> Iterator[Tuple[str, str]]:
+        """
+        Yields the domain name and IP address of every A record of a master file, and registers its other records.
+
+        The records of the types of RRSET_RECORD_TYPES are registered with the register as they are read, so they are
+        streamed like the A records.
+
+        :param path: The path of the master file.
+        :return: An iterator of (domain name, IP address) tuples.
+        """
+        is_ip_address = self.is_ip_address
+        register_record = self.dns_register.register_record
+        record_count = 0
+        skipped_count = 0
+        origin = ""
+        origin_suffix = ""
+        owner = ""
+        default_ttl = DEFAULT_RECORD_TTL
+        try:
+            with open(path, encoding="utf-8") as zone_file:
+                for line in zone_file:
+                    # Comments are left in quoted TXT data, which only reads the quoted strings
+                    if ";" in line and '"' not in line:
+                        line = line.split(";", 1)[0]
+                    fields = line.split()
+                    if not fields or fields[0][0] == ";":
+                        continue
+
+                    if line[0] in " \t":
+                        # The owner name is omitted, the record belongs to the previous owner
+                        index = 0
+                    else:
+                        first_field = fields[0]
+                        if first_field[0] == "$":
+                            directive = first_field.upper()
+                            if directive == "$ORIGIN" and len(fields) > 1:
+                                origin = fields[1].rstrip(".")
+                                origin_suffix = "." + origin
+                            elif directive == "$TTL" and len(fields) > 1 and fields[1].isdigit():
+                                default_ttl = int(fields[1])
+                            continue
+                        if first_field[-1] != "." and first_field != "@" and origin:
+                            owner = first_field + origin_suffix
+                        else:
+                            owner = self.absolute_domain_name(first_field, origin)
+                        index = 1
+
+                    # Skip the optional TTL and class
+                    ttl = default_ttl
+                    field_count = len(fields)
+                    while index < field_count and (fields[index][0].isdigit() or fields[index] in RECORD_CLASSES):
+                        if fields[index].isdigit():
+                            ttl = int(fields[index])
+                        index += 1
+                    if field_count - index < 2:
+                        skipped_count += 1
+                        continue
+                    record_type = fields[index]
+                    if record_type in A_RECORD_TYPES and is_ip_address(fields[index + 1]):
+                        record_count += 1
+                        yield owner, fields[index + 1]
+                        continue
+                    rrset_record_type = RRSET_RECORD_TYPES.get(record_type)
+                    if rrset_record_type is None:
+                        skipped_count += 1
+                        continue
+                    data = line.split(None, index + 1)[-1].strip()
+                    if rrset_record_type.value in DOMAIN_NAME_DATA_RECORD_TYPES:
+                        data_fields = data.split()
+                        data_fields[-1] = self.absolute_domain_name(data_fields[-1], origin)
+                        data = " ".join(data_fields)
+                    try:
+                        register_record(owner, rrset_record_type, data, ttl)
+                    except ValueError:
+                        skipped_count += 1
+                        continue
+                    record_count += 1
+        finally:
+            self.record_count = record_count
+            self.skipped_count = skipped_count
+
+    def read_csv_file(self, path: str) -> Iterator[Tuple[str, str]]:
+        """
+        Yields the domain name and IP address of every row of a CSV file.
+
+        :param path: The path of the CSV file.
+        :return: An iterator of (domain name, IP address) tuples.
+        """
+        is_ip_address = self.is_ip_address
+        record_count = 0
+        skipped_count = 0
+        try:
+            with open(path, encoding="utf-8", newline="") as csv_file:
+                for row in csv.reader(csv_file):
+                    if len(row) < 2 or row[0].startswith("#"):
+                        skipped_count += 1
+                        continue
+                    domain_name = row[0].strip().rstrip(".")
+                    ip_address = row[1].strip()
+                    if not is_ip_address(ip_address):
+                        skipped_count += 1
+                        continue
+                    record_count += 1
+                    yield domain_name, ip_address
+        finally:
+            self.record_count = record_count
+            self.skipped_count = skipped_count
+
+    @staticmethod
+    def absolute_domain_name(domain_name: str, origin: str) -> str:
+        """
+        Converts a master file owner name to the domain name format used by the register (no trailing dot).
+
+        :param domain_name: The owner name, "@", relative to the origin, or absolute with a trailing dot.
+        :param origin: The current $ORIGIN, without trailing dot.
+        :return: The absolute domain name without trailing dot.
+        """
+        if domain_name == "@":
+            return origin
+        if domain_name.endswith("."):
+            return domain_name[:-1]
+        if origin:
+            return domain_name + "." + origin
+        return domain_name
+
+    @staticmethod
+    def is_ip_address(ip_address: str) -> bool:
+        """
+        Checks whether a string is a dotted-quad IPv4 address.
+
+        :param ip_address: The string to check.
+        :return: True if the string is an IPv4 address, False otherwise.
+        """
+        if ip_address.count(".") != 3:
+            return False
+        try:
+            inet_aton(ip_address)
+        except OSError:
+            return False
+        return True
@@ -0,0 +1,93 @@
+import asyncio
+import socket
+import unittest
+from unittest.mock import MagicMock, patch
+
+from src.async_dns_server import AsyncDNSServer, DNSQueryProtocol, RegisterRequestProtocol
+from src.dns_metrics import DNSMetrics
+from src.dns_register import DNSRegister
+from src.dns_query_resolver import DNSQueryResolver
+from src.dns_server import DNSServer
+from src.register_request_resolver import RegisterRequestResolver
+from tests.helpers import create_loopback_socket
+
+EXAMPLE_QUERY = b"\x12\x34\x01\x00\x00\x01\x00\x00\x00\x00\x00\x00\x08https\x03www\x06google\x03com\x00\x00\x01\x00\x01"
+
+
+class TestAsyncDNSServer(unittest.TestCase):
+    def setUp(self):
+        with patch.object(DNSServer, "create_dns_query_socket", side_effect=create_loopback_socket), \
+                patch.object(DNSServer, "create_register_request_socket", side_effect=create_loopback_socket):
+            self.dns_server = DNSServer(
+                dns_resolver=DNSQueryResolver(),
+                dns_register=DNSRegister(),
+                register_request_resolver=RegisterRequestResolver()
+            )
+
+    def tearDown(self):
+        self.dns_server.dns_query_socket.close()
+        self.dns_server.register_request_socket.close()
+
+    def test_query_protocol_sends_response(self):
+        dns_server_mock = MagicMock(spec=DNSServer)
+        dns_server_mock.handle_dns_query.return_value = b"DNS_RESPONSE"
+        dns_server_mock.dns_metrics = DNSMetrics()
+        transport_mock = MagicMock()
+        protocol = DNSQueryProtocol(dns_server_mock)
+        protocol.connection_made(transport_mock)
+
+        protocol.datagram_received(b"DNS_QUERY_DATA", ("127.0.0.1", 5353))
+
+        dns_server_mock.handle_dns_query.assert_called_once_with(b"DNS_QUERY_DATA")
+        transport_mock.sendto.assert_called_once_with(b"DNS_RESPONSE", ("127.0.0.1", 5353))
+
+    def test_query_protocol_tracks_forward_tasks(self):
+        dns_server_mock = MagicMock(spec=DNSServer)
+        dns_server_mock.handle_dns_query.return_value = None
+        dns_server_mock.forward_dns_query.side_effect = OSError("upstream unreachable")
+        protocol = DNSQueryProtocol(dns_server_mock)
+        protocol.connection_made(MagicMock())
+
+        async def forward_query():
+            protocol.datagram_received(b"DNS_QUERY_DATA", ("127.0.0.1", 5353))
+            self.assertEqual(len(protocol.forward_tasks), 1)
+            await asyncio.gather(*protocol.forward_tasks, return_exceptions=True)
+
+        # Verify that the task is referenced while pending, then released and its error logged
+        with self.assertLogs("src.async_dns_server", level="ERROR") as logs:
+            asyncio.run(forward_query())
+        self.assertEqual(protocol.forward_tasks, set())
+        self.assertIn("upstream unreachable", logs.output[0])
+
+    def test_register_protocol_sends_response(self):
+        dns_server_mock = MagicMock(spec=DNSServer)
+        dns_server_mock.handle_register_request.return_value = b"\x00\x01\x01"
+        dns_server_mock.send_when_durable.side_effect = lambda send: send()
+        transport_mock = MagicMock()
+        protocol = RegisterRequestProtocol(dns_server_mock)
+        protocol.transport = transport_mock
+        protocol.loop = MagicMock()
+
+        protocol.datagram_received(b"REGISTER_DATA", ("127.0.0.1", 5353))
+
+        dns_server_mock.handle_register_request.assert_called_once_with(b"REGISTER_DATA")
+        protocol.loop.call_soon_threadsafe.assert_called_once_with(
+            transport_mock.sendto, b"\x00\x01\x01", ("127.0.0.1", 5353))
+
+    def test_serves_query_over_loopback(self):
+        async def exchange():
+            async_dns_server = AsyncDNSServer(self.dns_server)
+            await async_dns_server.start()
+            loop = asyncio.get_event_loop()
+            client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            client.setblocking(False)
+            try:
+                client.sendto(EXAMPLE_QUERY, self.dns_server.dns_query_socket.getsockname())
+                return await asyncio.wait_for(loop.sock_recv(client, 1024), timeout=2)
+            finally:
+                client.close()
+                async_dns_server.close()
+
+        response = asyncio.run(exchange())
+        self.assertEqual(response, self.dns_server.handle_dns_query(EXAMPLE_QUERY))
+        self.assertEqual(response[-4:], socket.inet_aton("172.217.1.110"))
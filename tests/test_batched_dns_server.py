@@ -0,0 +1,117 @@
+import socket
+import time
+import unittest
+from unittest.mock import patch
+
+from src.batched_dns_server import BatchedDatagramSocket, BatchedDNSServer
+from src.dns_register import DNSRegister
+from src.dns_query_resolver import DNSQueryResolver
+from src.dns_server import DNSServer
+from src.register_request_resolver import RegisterRequestResolver
+from tests.helpers import create_loopback_socket
+
+EXAMPLE_QUERY = b"\x12\x34\x01\x00\x00\x01\x00\x00\x00\x00\x00\x00\x08https\x03www\x06google\x03com\x00\x00\x01\x00\x01"
+
+
+def receive_batch_until(batched_socket: BatchedDatagramSocket, count: int) -> list:
+    datagrams = []
+    deadline = time.monotonic() + 2
+    while len(datagrams) < count and time.monotonic() < deadline:
+        datagrams.extend(batched_socket.receive_batch())
+    return datagrams
+
+
+class TestBatchedDatagramSocket(unittest.TestCase):
+    def setUp(self):
+        self.server_socket = create_loopback_socket()
+        self.client_socket = create_loopback_socket()
+        self.client_socket.settimeout(2)
+
+    def tearDown(self):
+        self.server_socket.close()
+        self.client_socket.close()
+
+    def check_round_trip(self, batched_socket: BatchedDatagramSocket):
+        self.assertEqual(batched_socket.receive_batch(), [])
+        for index in range(10):
+            self.client_socket.sendto(bytes([index]) * (index + 1), self.server_socket.getsockname())
+
+        datagrams = receive_batch_until(batched_socket, 10)
+        self.assertEqual([data for data, _ in datagrams], [bytes([index]) * (index + 1) for index in range(10)])
+        for _, client_address in datagrams:
+            self.assertEqual(client_address, self.client_socket.getsockname())
+
+        batched_socket.send_batch([(data + b"!", client_address) for data, client_address in datagrams])
+        replies = [self.client_socket.recv(1024) for _ in range(10)]
+        self.assertEqual(replies, [bytes([index]) * (index + 1) + b"!" for index in range(10)])
+
+    def test_round_trip_mmsg(self):
+        batched_socket = BatchedDatagramSocket(self.server_socket, batch_size=4)
+        if not batched_socket.use_mmsg:
+            self.skipTest("recvmmsg/sendmmsg are not available on this platform.")
+        self.check_round_trip(batched_socket)
+
+    def test_round_trip_drain(self):
+        batched_socket = BatchedDatagramSocket(self.server_socket, batch_size=4)
+        batched_socket.use_mmsg = False
+        self.check_round_trip(batched_socket)
+
+    def check_failed_send_is_skipped(self, batched_socket: BatchedDatagramSocket):
+        client_address = self.client_socket.getsockname()
+        # Broadcasting is not enabled on the socket, so the kernel refuses the second datagram
+        with self.assertLogs("src.batched_dns_server", level="ERROR") as logs:
+            batched_socket.send_batch([(b"first", client_address), (b"refused", ("255.255.255.255", 53)),
+                                       (b"second", client_address)])
+        self.assertIn("255.255.255.255:53", logs.output[0])
+        self.assertEqual([self.client_socket.recv(1024) for _ in range(2)], [b"first", b"second"])
+
+    def test_failed_send_is_skipped_mmsg(self):
+        batched_socket = BatchedDatagramSocket(self.server_socket, batch_size=4)
+        if not batched_socket.use_mmsg:
+            self.skipTest("recvmmsg/sendmmsg are not available on this platform.")
+        self.check_failed_send_is_skipped(batched_socket)
+
+    def test_failed_send_is_skipped_drain(self):
+        batched_socket = BatchedDatagramSocket(self.server_socket, batch_size=4)
+        batched_socket.use_mmsg = False
+        self.check_failed_send_is_skipped(batched_socket)
+
+    def test_receive_batch_is_bounded(self):
+        batched_socket = BatchedDatagramSocket(self.server_socket, batch_size=3)
+        for _ in range(5):
+            self.client_socket.sendto(b"data", self.server_socket.getsockname())
+        time.sleep(0.05)
+        self.assertEqual(len(batched_socket.receive_batch()), 3)
+
+
+class TestBatchedDNSServer(unittest.TestCase):
+    def setUp(self):
+        with patch.object(DNSServer, "create_dns_query_socket", side_effect=create_loopback_socket), \
+                patch.object(DNSServer, "create_register_request_socket", side_effect=create_loopback_socket):
+            self.dns_server = DNSServer(
+                dns_resolver=DNSQueryResolver(),
+                dns_register=DNSRegister(),
+                register_request_resolver=RegisterRequestResolver()
+            )
+        self.client_socket = create_loopback_socket()
+        self.client_socket.settimeout(2)
+
+    def tearDown(self):
+        self.dns_server.dns_query_socket.close()
+        self.dns_server.register_request_socket.close()
+        self.client_socket.close()
+
+    def test_serve_dns_query_batch(self):
+        batched_dns_server = BatchedDNSServer(self.dns_server, batch_size=8)
+        for _ in range(3):
+            self.client_socket.sendto(EXAMPLE_QUERY, self.dns_server.dns_query_socket.getsockname())
+
+        handled_count = 0
+        deadline = time.monotonic() + 2
+        while handled_count < 3 and time.monotonic() < deadline:
+            handled_count += batched_dns_server.serve_dns_query_batch()
+
+        self.assertEqual(handled_count, 3)
+        expected_response = self.dns_server.handle_dns_query(EXAMPLE_QUERY)
+        for _ in range(3):
+            self.assertEqual(self.client_socket.recv(1024), expected_response)
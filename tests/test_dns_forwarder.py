@@ -0,0 +1,144 @@
+import asyncio
+import unittest
+from typing import Callable, List, Optional, Tuple
+
+from src.dns_forwarder import DNSForwarder
+
+QUERY = b"\x12\x34\x01\x00\x00\x01\x00\x00\x00\x00\x00\x00\x07example\x03com\x00\x00\x01\x00\x01"
+QUESTION = QUERY[12:]
+ANSWER = b"\xc0\x0c\x00\x01\x00\x01\x00\x00\x01\x2c\x00\x04\x01\x02\x03\x04"
+
+
+def build_response(query_data: bytes, flags: bytes = b"\x81\x80", answer: bytes = ANSWER) -> bytes:
+    answer_count = b"\x00\x01" if answer else b"\x00\x00"
+    return query_data[:2] + flags + b"\x00\x01" + answer_count + b"\x00\x00\x00\x00" + query_data[12:] + answer
+
+
+class StubUpstreamProtocol(asyncio.DatagramProtocol):
+    """
+    A stand-in upstream resolver, answering every query with the responses built by respond after delay seconds.
+    """
+    def __init__(self, respond: Callable[[bytes], List[bytes]], delay: float = 0.0):
+        self.respond = respond
+        self.delay = delay
+        self.queries = []  # type: List[bytes]
+        self.transport = None  # type: Optional[asyncio.DatagramTransport]
+
+    def connection_made(self, transport: asyncio.DatagramTransport):
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, address: Tuple[str, int]):
+        self.queries.append(data)
+        for response in self.respond(data):
+            asyncio.get_event_loop().call_later(self.delay, self.transport.sendto, response, address)
+
+
+async def start_stub_upstream(respond: Callable[[bytes], List[bytes]], delay: float = 0.0,
+                              port: int = 0) -> StubUpstreamProtocol:
+    _, protocol = await asyncio.get_event_loop().create_datagram_endpoint(
+        lambda: StubUpstreamProtocol(respond, delay), local_addr=("127.0.0.1", port))
+    return protocol
+
+
+def stub_address(stub: StubUpstreamProtocol) -> Tuple[str, int]:
+    return stub.transport.get_extra_info("sockname")[:2]
+
+
+async def start_forwarder(upstreams: List[Tuple[str, int]], timeout: float = 2.0) -> DNSForwarder:
+    dns_forwarder = DNSForwarder(upstreams, socket_count=2, timeout=timeout)
+    await dns_forwarder.start()
+    return dns_forwarder
+
+
+class TestDNSForwarder(unittest.TestCase):
+    def test_forward_rewrites_transaction_id_and_caches_response(self):
+        async def exchange():
+            stub = await start_stub_upstream(lambda query_data: [build_response(query_data)])
+            dns_forwarder = await start_forwarder([stub_address(stub)])
+            response = await dns_forwarder.forward(QUERY)
+            stub.transport.close()
+            dns_forwarder.close()
+            return stub.queries, response, dns_forwarder.lookup_query(b"\xab\xcd" + QUERY[2:])
+
+        queries, response, cached_response = asyncio.run(exchange())
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(queries[0][2:], QUERY[2:])
+        self.assertEqual(response, build_response(QUERY))
+        self.assertEqual(cached_response, build_response(b"\xab\xcd" + QUERY[2:]))
+
+    def test_ignores_mismatched_responses(self):
+        def respond(query_data: bytes) -> List[bytes]:
+            # A response for another question, then the expected response
+            other_query = query_data[:-3] + b"\x1c\x00\x01"
+            return [build_response(other_query), build_response(query_data)]
+
+        async def exchange():
+            stub = await start_stub_upstream(respond)
+            dns_forwarder = await start_forwarder([stub_address(stub)])
+            response = await dns_forwarder.forward(QUERY)
+            dns_forwarder.close()
+            stub.transport.close()
+            return response
+
+        self.assertEqual(asyncio.run(exchange()), build_response(QUERY))
+
+    def test_retries_truncated_responses_over_tcp(self):
+        tcp_queries = []
+
+        async def handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+            while True:
+                try:
+                    length = int.from_bytes(await reader.readexactly(2), "big")
+                    query_data = await reader.readexactly(length)
+                except asyncio.IncompleteReadError:
+                    break
+                tcp_queries.append(query_data)
+                response = build_response(query_data, answer=ANSWER * 40)
+                response = response[:6] + b"\x00\x28" + response[8:]
+                writer.write(len(response).to_bytes(2, "big") + response)
+            writer.close()
+
+        async def exchange():
+            tcp_server = await asyncio.start_server(handle_connection, "127.0.0.1", 0)
+            port = tcp_server.sockets[0].getsockname()[1]
+            stub = await start_stub_upstream(lambda query_data: [build_response(query_data, b"\x83\x80", b"")],
+                                             port=port)
+            dns_forwarder = await start_forwarder([("127.0.0.1", port)])
+            responses = [await dns_forwarder.forward(QUERY), await dns_forwarder.forward(QUERY[:-3] + b"\x1c\x00\x01")]
+            stub.transport.close()
+            dns_forwarder.close()
+            tcp_server.close()
+            return responses
+
+        responses = asyncio.run(exchange())
+        self.assertEqual(len(tcp_queries), 2)
+        self.assertEqual(responses[0][:8], b"\x12\x34\x81\x80\x00\x01\x00\x28")
+        self.assertEqual(len(responses[0]), 12 + len(QUESTION) + 40 * len(ANSWER))
+        self.assertEqual(responses[1][:2], b"\x12\x34")
+
+    def test_fails_over_to_next_upstream(self):
+        async def exchange():
+            silent_stub = await start_stub_upstream(lambda query_data: [])
+            stub = await start_stub_upstream(lambda query_data: [build_response(query_data)])
+            dns_forwarder = await start_forwarder([stub_address(silent_stub), stub_address(stub)], timeout=0.2)
+            response = await dns_forwarder.forward(QUERY)
+            silent_stub.transport.close()
+            stub.transport.close()
+            dns_forwarder.close()
+            return silent_stub.queries, response
+
+        silent_queries, response = asyncio.run(exchange())
+        self.assertEqual(len(silent_queries), 1)
+        self.assertEqual(response, build_response(QUERY))
+
+    def test_answers_servfail_without_upstream_response(self):
+        async def exchange():
+            silent_stub = await start_stub_upstream(lambda query_data: [])
+            dns_forwarder = await start_forwarder([stub_address(silent_stub)], timeout=0.1)
+            response = await dns_forwarder.forward(QUERY)
+            dns_forwarder.close()
+            silent_stub.transport.close()
+            return response
+
+        response = asyncio.run(exchange())
+        self.assertEqual(response, b"\x12\x34\x81\x02\x00\x01\x00\x00\x00\x00\x00\x00" + QUESTION)
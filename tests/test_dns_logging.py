@@ -0,0 +1,49 @@
+import io
+import logging
+import unittest
+
+from src.dns_logging import DNSLogging, SamplingFilter
+
+
+class TestSamplingFilter(unittest.TestCase):
+    def make_record(self, level: int) -> logging.LogRecord:
+        return logging.LogRecord("src.dns_server", level, __file__, 1, "message", None, None)
+
+    def test_samples_debug_records(self):
+        sampling_filter = SamplingFilter(sample_every=3)
+        kept = [sampling_filter.filter(self.make_record(logging.DEBUG)) for _ in range(9)]
+        self.assertEqual(kept.count(True), 3)
+
+    def test_keeps_info_records(self):
+        sampling_filter = SamplingFilter(sample_every=3)
+        self.assertTrue(all(sampling_filter.filter(self.make_record(logging.INFO)) for _ in range(9)))
+
+
+class TestDNSLogging(unittest.TestCase):
+    def setUp(self):
+        self.stream = io.StringIO()
+        self.dns_logging = DNSLogging(level=logging.DEBUG, sample_every=2, stream=self.stream)
+
+    def tearDown(self):
+        self.dns_logging.stop()
+        self.dns_logging.logger.propagate = True
+        self.dns_logging.logger.setLevel(logging.NOTSET)
+
+    def test_records_are_written_by_the_listener(self):
+        self.dns_logging.start()
+        logger = logging.getLogger("src.dns_server")
+        logger.info("Server is listening")
+        for index in range(4):
+            logger.debug("DNS query %d", index)
+        self.dns_logging.stop()
+
+        lines = self.stream.getvalue().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[0].endswith("INFO src.dns_server: Server is listening"))
+        self.assertTrue(lines[1].endswith("DEBUG src.dns_server: DNS query 1"))
+        self.assertTrue(lines[2].endswith("DEBUG src.dns_server: DNS query 3"))
+
+    def test_stop_removes_the_queue_handler(self):
+        self.dns_logging.start()
+        self.dns_logging.stop()
+        self.assertEqual(self.dns_logging.logger.handlers, [])
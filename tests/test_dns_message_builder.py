@@ -0,0 +1,86 @@
+import unittest
+
+from src.dns_message_builder import ADDITIONAL_SECTION, ANSWER_SECTION, AUTHORITY_SECTION, DNSMessageBuilder, \
+    MAX_MESSAGE_SIZE
+from src.custom_types.dns_record_type import DNSRecordType
+from src.custom_types.resource_record_set import ResourceRecordSet
+
+QUESTION = b"\x03WWW\x07Example\x03com\x00\x00\x05\x00\x01"
+EXAMPLE_COM = b"\x07example\x03com\x00"
+
+
+class TestDNSMessageBuilder(unittest.TestCase):
+    def test_build_compresses_names_across_sections(self):
+        message_builder = DNSMessageBuilder()
+        message_builder.start(b"\x12\x34", b"\x81\x80", QUESTION)
+        message_builder.add_rrset(ANSWER_SECTION, b"\x03www" + EXAMPLE_COM,
+                                  ResourceRecordSet(DNSRecordType(5), 300, (b"\x03web" + EXAMPLE_COM,)))
+        message_builder.add_record(AUTHORITY_SECTION, EXAMPLE_COM, 2, 60, b"\x03ns1" + EXAMPLE_COM, 0)
+        message_builder.add_record(ADDITIONAL_SECTION, b"\x03ns1" + EXAMPLE_COM, 1, 60, b"\xc0\x00\x02\x01")
+        message = message_builder.build()
+
+        self.assertEqual(message[:12], b"\x12\x34\x81\x80\x00\x01\x00\x01\x00\x01\x00\x01")
+        # The question is written as received
+        self.assertEqual(message[12:12 + len(QUESTION)], QUESTION)
+        answer_offset = 12 + len(QUESTION)
+        # The CNAME owner points to the question name, its target to the question suffix "example.com"
+        self.assertEqual(message[answer_offset:answer_offset + 18],
+                         b"\xc0\x0c\x00\x05\x00\x01\x00\x00\x01\x2c\x00\x06\x03web\xc0\x10")
+        authority_offset = answer_offset + 18
+        self.assertEqual(message[authority_offset:authority_offset + 18],
+                         b"\xc0\x10\x00\x02\x00\x01\x00\x00\x00\x3c\x00\x06\x03ns1\xc0\x10")
+        # The additional owner points to the NS target written in the authority section
+        additional_offset = authority_offset + 18
+        self.assertEqual(message[additional_offset:],
+                         (0xc000 | authority_offset + 12).to_bytes(2, "big") +
+                         b"\x00\x01\x00\x01\x00\x00\x00\x3c\x00\x04\xc0\x00\x02\x01")
+
+    def test_start_resets_message(self):
+        message_builder = DNSMessageBuilder()
+        message_builder.start(b"\x12\x34", b"\x81\x80", QUESTION)
+        message_builder.add_record(ANSWER_SECTION, b"\x03www" + EXAMPLE_COM, 1, 60, b"\xc0\x00\x02\x01")
+        message_builder.start(b"\xab\xcd", b"\x81\x83", b"")
+        message_builder.add_record(ANSWER_SECTION, EXAMPLE_COM, 1, 60, b"\xc0\x00\x02\x01")
+
+        self.assertEqual(message_builder.build(),
+                         b"\xab\xcd\x81\x83\x00\x00\x00\x01\x00\x00\x00\x00" + EXAMPLE_COM +
+                         b"\x00\x01\x00\x01\x00\x00\x00\x3c\x00\x04\xc0\x00\x02\x01")
+
+    def test_add_record_out_of_section_order(self):
+        message_builder = DNSMessageBuilder()
+        message_builder.start(b"\x12\x34", b"\x81\x80", QUESTION)
+        message_builder.add_encoded_record(ADDITIONAL_SECTION, b"\x00\x00\x29\x04\xd0\x00\x00\x00\x00\x00\x00")
+
+        with self.assertRaises(ValueError):
+            message_builder.add_record(ANSWER_SECTION, EXAMPLE_COM, 1, 60, b"\xc0\x00\x02\x01")
+
+    def test_buffer_grows_past_capacity(self):
+        message_builder = DNSMessageBuilder(capacity=12)
+        message_builder.start(b"\x12\x34", b"\x81\x80", QUESTION)
+        rdatas = tuple(bytes((192, 0, 2, index)) for index in range(100))
+        message_builder.add_rrset(ANSWER_SECTION, b"\x03www" + EXAMPLE_COM,
+                                  ResourceRecordSet(DNSRecordType(1), 60, rdatas))
+        message = message_builder.build()
+
+        self.assertEqual(message[6:8], b"\x00\x64")
+        self.assertEqual(len(message), 12 + len(QUESTION) + 100 * 16)
+        self.assertEqual(message[-4:], b"\xc0\x00\x02\x63")
+
+    def test_message_too_large(self):
+        message_builder = DNSMessageBuilder()
+        message_builder.start(b"\x12\x34", b"\x81\x80", QUESTION)
+        rdata = bytes(255)
+
+        with self.assertRaises(ValueError):
+            for _ in range(MAX_MESSAGE_SIZE // len(rdata) + 1):
+                message_builder.add_record(ANSWER_SECTION, EXAMPLE_COM, 16, 60, rdata)
+
+    def test_suffixes_past_max_compression_offset(self):
+        message_builder = DNSMessageBuilder()
+        message_builder.start(b"\x12\x34", b"\x81\x80", b"")
+        message_builder.add_encoded_record(ANSWER_SECTION, bytes(0x4000))
+        message_builder.add_record(ANSWER_SECTION, b"\x03www" + EXAMPLE_COM, 1, 60, b"\xc0\x00\x02\x01")
+        message_builder.add_record(ANSWER_SECTION, b"\x03www" + EXAMPLE_COM, 1, 60, b"\xc0\x00\x02\x01")
+
+        # Names written past the largest pointer offset are not pointed to
+        self.assertEqual(message_builder.build().count(b"\x03www" + EXAMPLE_COM), 2)
@@ -0,0 +1,81 @@
+import multiprocessing
+import unittest
+from unittest.mock import patch
+
+from src.dns_metrics import DNSMetrics, bucket_upper_bound, BUCKET_COUNT, QUERY_TYPE_OFFSETS, READ_QUERY_STAGE, \
+    STAGE_OFFSETS
+from src.custom_types.response_code import ResponseCode
+
+CACHED_QUERY = b"\x12\x34\x01\x00\x00\x01\x00\x00\x00\x00\x00\x00\x07example\x03com\x00\x00\x01\x00\x01"
+CACHED_RESPONSE = b"\x12\x34\x81\x83"
+
+
+def count_queries_in_slot(dns_metrics: DNSMetrics, slot: int):
+    dns_metrics.use_slot(slot)
+    for _ in range(3):
+        dns_metrics.count_query(1, ResponseCode.NO_ERROR)
+    dns_metrics.publish()
+
+
+class TestDNSMetrics(unittest.TestCase):
+    def setUp(self):
+        self.dns_metrics = DNSMetrics(latency_sample_every=1)
+
+    def test_counters_are_rendered(self):
+        self.dns_metrics.count_query(1, ResponseCode.NO_ERROR)
+        self.dns_metrics.count_query(28, ResponseCode.NOT_IMPLEMENTED)
+        self.dns_metrics.count_query(0, ResponseCode.FORMAT_ERROR)
+        self.dns_metrics.count_cache_hit(CACHED_QUERY, CACHED_RESPONSE, negative=True)
+        self.dns_metrics.count_cache_miss()
+        self.dns_metrics.count_register_request(ResponseCode.NO_ERROR)
+
+        lines = self.dns_metrics.render_prometheus().splitlines()
+        self.assertIn('dns_queries_total{qtype="A",rcode="NOERROR"} 1', lines)
+        self.assertIn('dns_queries_total{qtype="A",rcode="NXDOMAIN"} 1', lines)
+        self.assertIn('dns_queries_total{qtype="AAAA",rcode="NOTIMP"} 1', lines)
+        self.assertIn('dns_queries_total{qtype="OTHER",rcode="FORMERR"} 1', lines)
+        self.assertIn('dns_register_requests_total{rcode="NOERROR"} 1', lines)
+        self.assertIn('dns_cache_hits_total{cache="response"} 0', lines)
+        self.assertIn('dns_cache_hits_total{cache="negative"} 1', lines)
+        self.assertIn("dns_cache_misses_total 1", lines)
+
+    def test_sample_timing(self):
+        dns_metrics = DNSMetrics(latency_sample_every=4)
+        samples = [dns_metrics.sample_timing() for _ in range(8)]
+        self.assertEqual([bool(sample) for sample in samples], [False, False, False, True] * 2)
+
+    def test_observe_stage(self):
+        start = self.dns_metrics.sample_timing()
+        end = self.dns_metrics.observe_stage(READ_QUERY_STAGE, start)
+        values = self.dns_metrics.collect()
+        offset = STAGE_OFFSETS[READ_QUERY_STAGE]
+        self.assertEqual(sum(values[offset:offset + BUCKET_COUNT]), 1)
+        self.assertEqual(values[offset + BUCKET_COUNT], end - start)
+        self.assertGreaterEqual(DNSMetrics.quantile(values, READ_QUERY_STAGE, 0.5), (end - start) / 1e9)
+        self.assertIn('dns_stage_latency_seconds_count{stage="read_query"} 1',
+                      self.dns_metrics.render_prometheus().splitlines())
+
+    def test_latencies_fall_between_bucket_bounds(self):
+        offset = STAGE_OFFSETS[READ_QUERY_STAGE]
+        for latency in (0, 5, 15, 16, 17, 100, 1000, 123456, 10 ** 9):
+            dns_metrics = DNSMetrics()
+            with patch("src.dns_metrics.time.perf_counter_ns", return_value=latency):
+                dns_metrics.observe_stage(READ_QUERY_STAGE, 0)
+            buckets = dns_metrics.collect()[offset:offset + BUCKET_COUNT]
+            bucket = buckets.index(1)
+            lower_bound = bucket_upper_bound(bucket - 1) if bucket else 0
+            self.assertLessEqual(lower_bound, latency)
+            self.assertLess(latency, bucket_upper_bound(bucket))
+
+    def test_slots_are_aggregated_across_processes(self):
+        dns_metrics = DNSMetrics(slot_count=3)
+        dns_metrics.count_query(1, ResponseCode.NO_ERROR)
+        context = multiprocessing.get_context("fork")
+        workers = [context.Process(target=count_queries_in_slot, args=(dns_metrics, slot)) for slot in (1, 2)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        # The values of the parent are collected from its list, the values of the workers from their slots
+        self.assertEqual(dns_metrics.collect()[QUERY_TYPE_OFFSETS[1] + ResponseCode.NO_ERROR], 7)
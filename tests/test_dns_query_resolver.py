@@ -1,9 +1,12 @@
 import unittest
 
 from src.dns_query_resolver import DNSQueryResolver
+from src.domain_name_codec import DomainNameCodec
 from src.custom_types.dns_query import DNSQuery
 from src.custom_types.dns_record_type import DNSRecordType
+from src.custom_types.edns_options import EDNSOptions
 from src.custom_types.error_types import FunctionalityNotImplementedError, FormatError
+from src.custom_types.response_code import ResponseCode
 
 
 class TestDNSQueryResolver(unittest.TestCase):
@@ -39,6 +42,20 @@ class TestDNSQueryResolver(unittest.TestCase):
         with self.assertRaises(FunctionalityNotImplementedError):
             self.dns_resolver.read_query(query_data)
 
+    def test_parse_query_response_codes(self):
+        header = b'\x12\x34\x01\x20\x00\x01\x00\x00\x00\x00\x00\x00'
+        question = b'\x07example\x03com\x00\x00\x01\x00\x01'
+
+        response_code, dns_query = self.dns_resolver.parse_query(header + question)
+        self.assertEqual((response_code, dns_query.domain_name), (ResponseCode.NO_ERROR, "example.com"))
+        self.assertEqual(self.dns_resolver.parse_query(header[:4] + b'\x00\x02' + header[6:] + question + question),
+                         (ResponseCode.NOT_IMPLEMENTED, None))
+        # Truncated headers, labels overrunning the query, unknown query types and labels that are not UTF-8
+        for query_data in (header[:6], header + question[:5], header + b'\x0aexample\x03com\x00\x00\x01\x00\x01',
+                           header + question[:-4] + b'\x00\x63\x00\x01', header + b'\x02\xff\xfe' + question[8:]):
+            with self.subTest(query_data=query_data):
+                self.assertEqual(self.dns_resolver.parse_query(query_data), (ResponseCode.FORMAT_ERROR, None))
+
     def test_read_query_empty_domain(self):
         # Example DNS query data with empty domain name
         query_data = b'\x12\x34\x01\x20\x00\x01\x00\x00\x00\x00\x00\x00\x00\x00\x01\x00\x01'
@@ -46,6 +63,29 @@ class TestDNSQueryResolver(unittest.TestCase):
         with self.assertRaises(FormatError):
             self.dns_resolver.read_query(query_data)
 
+    def test_read_query_edns(self):
+        # Example DNS query data with an OPT record advertising a 4096 byte UDP payload size and the DO flag
+        query_data = b'\x12\x34\x01\x20\x00\x01\x00\x00\x00\x00\x00\x01\x07example\x03com\x00\x00\x01\x00\x01' \
+                     b'\x00\x00\x29\x10\x00\x00\x00\x80\x00\x00\x06\x00\x0a\x00\x02\xab\xcd'
+
+        dns_query = self.dns_resolver.read_query(query_data)
+
+        self.assertEqual(dns_query.question, b'\x07example\x03com\x00\x00\x01\x00\x01')
+        self.assertEqual(dns_query.edns, EDNSOptions(udp_payload_size=4096, version=0, dnssec_ok=True,
+                                                     options=b'\x00\x0a\x00\x02\xab\xcd'))
+        self.assertIsNone(self.dns_resolver.read_query(query_data[:11] + b'\x00' + query_data[12:]).edns)
+
+    def test_read_query_malformed_opt_record(self):
+        query_data = b'\x12\x34\x01\x20\x00\x01\x00\x00\x00\x00\x00\x01\x07example\x03com\x00\x00\x01\x00\x01' \
+                     b'\x00\x00\x29\x10\x00\x00\x00\x00\x00\x00\x04\x00\x0a'
+
+        # The RDATA length exceeds the query
+        with self.assertRaises(FormatError):
+            self.dns_resolver.read_query(query_data)
+        # The OPT record is not owned by the root domain
+        with self.assertRaises(FormatError):
+            self.dns_resolver.read_query(query_data[:-13] + b'\xc0\x0c\x00\x29\x10\x00\x00\x00\x00\x00\x00\x00')
+
     def test_read_query_question_valid(self):
         question_data = b"\x03www\x07example\x03com\x00\x00\x01\x00\x01"
         dns_query_question = self.dns_resolver.read_dns_query_question(question_data)
@@ -53,6 +93,13 @@ class TestDNSQueryResolver(unittest.TestCase):
         self.assertEqual(dns_query_question.query_type, DNSRecordType(1))
         self.assertEqual(dns_query_question.query_class, 1)
         self.assertEqual(dns_query_question.as_bytes, question_data)
+        self.assertEqual(dns_query_question.domain_name_key, b"\x03www\x07example\x03com\x00")
+
+    def test_read_query_question_domain_name_key_case_folded(self):
+        question_data = b"\x03WwW\x07eXaMpLe\x03CoM\x00\x00\x01\x00\x01"
+        dns_query_question = self.dns_resolver.read_dns_query_question(question_data)
+        self.assertEqual(dns_query_question.domain_name, "WwW.eXaMpLe.CoM")
+        self.assertEqual(dns_query_question.domain_name_key, DomainNameCodec.encode("www.example.com"))
 
     def test_read_query_question_no_null_pointer(self):
         # No null pointer after domain name
@@ -77,6 +124,7 @@ class TestDNSQueryResolver(unittest.TestCase):
         question_data_http = b"\x07http\x03www\x07example\x03com\x00\x00\x01\x00\x01"
         dns_query_question_http = self.dns_resolver.read_dns_query_question(question_data_http)
         self.assertEqual("http://www.example.com", dns_query_question_http.domain_name)
+        self.assertEqual(DomainNameCodec.encode("http://www.example.com"), dns_query_question_http.domain_name_key)
 
         # Test domain name with "https://" prefix
         question_data_https = b"\x08https\x03www\x07example\x03com\x00\x00\x01\x00\x01"
@@ -90,7 +138,7 @@ class TestDNSQueryResolver(unittest.TestCase):
             self.dns_resolver.read_query(query_data)
 
     def test_validate_query_length_valid(self):
-        query_data = bytes(17)
+        query_data = bytes(35)
         authorization_count = 1
         additional_count = 1
         self.assertTrue(DNSQueryResolver.validate_dns_query_length(query_data, authorization_count, additional_count))
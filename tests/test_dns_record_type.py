@@ -0,0 +1,30 @@
+import pickle
+import unittest
+
+from src.custom_types.dns_record_type import DNSRecordType
+from src.custom_types.error_types import UnknownRecordTypeError
+
+
+class TestDNSRecordType(unittest.TestCase):
+    def test_record_types_are_shared(self):
+        self.assertIs(DNSRecordType(1), DNSRecordType(1))
+        self.assertEqual(DNSRecordType(28), DNSRecordType(28))
+        self.assertNotEqual(DNSRecordType(1), DNSRecordType(28))
+        self.assertIs(pickle.loads(pickle.dumps(DNSRecordType(5))), DNSRecordType(5))
+
+    def test_to_string_and_to_bytes(self):
+        self.assertEqual(DNSRecordType(1).to_string(), "A")
+        self.assertEqual(DNSRecordType(1).to_bytes(), b"\x00\x01")
+        self.assertEqual(DNSRecordType(33).to_string(), "SRV")
+        self.assertEqual(DNSRecordType(33).to_bytes(), b"\x00\x21")
+        self.assertEqual(DNSRecordType(255).to_bytes(), b"\x00\xff")
+
+    def test_unknown_record_type(self):
+        with self.assertRaises(UnknownRecordTypeError):
+            DNSRecordType(7)
+        with self.assertRaises(UnknownRecordTypeError):
+            DNSRecordType("A")
+
+    def test_has_no_instance_dict(self):
+        self.assertFalse(hasattr(DNSRecordType(1), "__dict__"))
+        self.assertEqual(repr(DNSRecordType(1)), "DNSRecordType(value=1)")
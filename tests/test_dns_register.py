@@ -1,8 +1,13 @@
+import dataclasses
 import unittest
 from src.custom_types.dns_query import DNSQuery
+from src.domain_name_codec import DomainNameCodec
 from src.dns_response_factory import DNSResponseFactory
+from src.dns_query_resolver import DNSQueryResolver
 from src.dns_register import DNSRegister
+from src.fast_dns_query_resolver import FastDNSQueryResolver
 from src.custom_types.dns_record_type import DNSRecordType
+from src.custom_types.register_operation import RegisterOperation
 
 EXAMPLE_DNS_QUERY = DNSQuery(
     original_query=b"",
@@ -14,8 +19,10 @@ EXAMPLE_DNS_QUERY = DNSQuery(
     additional_count=1,
     question=b"",
     domain_name="example.com",
+    domain_name_key=b"\x07example\x03com\x00",
     query_type=DNSRecordType(1),
-    query_class=1
+    query_class=1,
+    edns=None
 )
 
 
@@ -30,14 +37,14 @@ class TestDNSRegister(unittest.TestCase):
         self.register.register_domain(domain_name, ip_address)
 
         # Verify that the domain and IP address are registered
-        self.assertEqual(self.register.records[domain_name], ip_address)
+        self.assertEqual(self.register.records[b"\x03www\x07example\x03com\x00"], ip_address)
 
     def test_resolve_ip_registered(self):
         domain_name = "www.example.com"
         ip_address = "1.1.1.1"
-        dns_query = EXAMPLE_DNS_QUERY
-        dns_query.domain_name = domain_name
-        dns_query.query_type = DNSRecordType(1)
+        dns_query = dataclasses.replace(EXAMPLE_DNS_QUERY, domain_name=domain_name,
+                                        domain_name_key=DomainNameCodec.encode(domain_name),
+                                        query_type=DNSRecordType(1))
         self.register.register_domain(domain_name, ip_address)
 
         # Verify that the DNS query is resolved to the correct IP address
@@ -46,9 +53,9 @@ class TestDNSRegister(unittest.TestCase):
 
     def test_resolve_ip_not_registered(self):
         domain_name = "www.example.com"
-        dns_query = EXAMPLE_DNS_QUERY
-        dns_query.domain_name = domain_name
-        dns_query.query_type = DNSRecordType(1)
+        dns_query = dataclasses.replace(EXAMPLE_DNS_QUERY, domain_name=domain_name,
+                                        domain_name_key=DomainNameCodec.encode(domain_name),
+                                        query_type=DNSRecordType(1))
 
         # Verify that the DNS query returns None for an unregistered domain
         resolved_ip = self.register.resolve_ip(dns_query)
@@ -57,9 +64,9 @@ class TestDNSRegister(unittest.TestCase):
     def test_generate_response_registered(self):
         domain_name = "www.example.com"
         ip_address = "1.1.1.1"
-        dns_query = EXAMPLE_DNS_QUERY
-        dns_query.domain_name = domain_name
-        dns_query.query_type = DNSRecordType(1)
+        dns_query = dataclasses.replace(EXAMPLE_DNS_QUERY, domain_name=domain_name,
+                                        domain_name_key=DomainNameCodec.encode(domain_name),
+                                        query_type=DNSRecordType(1))
 
         self.register.register_domain(domain_name, ip_address)
 
@@ -68,3 +75,139 @@ class TestDNSRegister(unittest.TestCase):
 
         # Verify that the response contains the correct IP address
         self.assertIn(b"\x01\x01\x01\x01", response)
+
+    def test_resolve_ip_wildcard(self):
+        self.register.register_domain("*.example.com", "2.2.2.2")
+        self.register.load_records([("*.a.example.com", "3.3.3.3"), ("www.example.com", "1.1.1.1")])
+
+        # Verify that exact names take precedence over the deepest matching wildcard
+        for domain_name, ip_address in (("www.example.com", "1.1.1.1"), ("mail.example.com", "2.2.2.2"),
+                                        ("b.a.example.com", "3.3.3.3"), ("example.com", None)):
+            dns_query = dataclasses.replace(EXAMPLE_DNS_QUERY, domain_name=domain_name,
+                                            domain_name_key=DomainNameCodec.encode(domain_name))
+            self.assertEqual(self.register.resolve_ip(dns_query), ip_address)
+
+    def test_load_records_skips_invalid_domain_names(self):
+        self.register = DNSRegister(records={})
+        records = [("example.com", "1.1.1.1"), ("bad..label", "2.2.2.2"), ("a" * 64 + ".com", "3.3.3.3")]
+        self.assertEqual(self.register.load_records(records), 2)
+        self.assertEqual(self.register.records, {DomainNameCodec.encode("example.com"): "1.1.1.1"})
+
+        # Registrations listened to are skipped the same way
+        registrations = []
+        self.register.add_register_listener(lambda domain_name, ip_address: registrations.append(domain_name))
+        self.assertEqual(self.register.load_records([("www.example.com", "4.4.4.4")] + records[1:]), 2)
+        self.assertEqual(registrations, ["www.example.com"])
+
+    def test_resolve_ip_case_insensitive(self):
+        self.register.register_domain("www.Example.com", "1.1.1.1")
+        query_data = b"\x12\x34\x01\x00\x00\x01\x00\x00\x00\x00\x00\x00\x03WwW\x07eXaMpLe\x03CoM\x00\x00\x01\x00\x01"
+
+        # Verify that a 0x20-randomized query resolves with both query resolvers
+        for dns_resolver in (DNSQueryResolver(), FastDNSQueryResolver()):
+            self.assertEqual(self.register.resolve_ip(dns_resolver.read_query(query_data)), "1.1.1.1")
+
+    def test_register_record(self):
+        self.register.register_record("example.com", DNSRecordType(15), "10 mail.example.com")
+        self.register.register_record("Example.com", DNSRecordType(15), "20 backup.example.com", ttl=300)
+        self.register.register_record("example.com", DNSRecordType(15), "10 mail.example.com", ttl=300)
+        self.register.register_record("www.example.com", DNSRecordType(1), "1.1.1.1")
+
+        rrset = self.register.rrsets[b"\x07example\x03com\x00"][15]
+        self.assertEqual(rrset.ttl, 300)
+        self.assertEqual(rrset.rdatas, (b"\x00\x0a\x04mail\x07example\x03com\x00",
+                                        b"\x00\x14\x06backup\x07example\x03com\x00"))
+        self.assertEqual(self.register.records[b"\x03www\x07example\x03com\x00"], "1.1.1.1")
+        with self.assertRaises(ValueError):
+            self.register.register_record("example.com", DNSRecordType(6), "ns1.example.com. admin.example.com.")
+
+    def test_resolve_records(self):
+        dns_resolver = DNSQueryResolver()
+
+        def read_query(domain_name: str, query_type: int) -> DNSQuery:
+            return dns_resolver.read_query(b"\x12\x34\x01\x00\x00\x01\x00\x00\x00\x00\x00\x00"
+                                           + DomainNameCodec.encode(domain_name) + bytes((0, query_type, 0, 1)))
+
+        self.register.register_domain("www.example.com", "1.1.1.1")
+        self.register.register_record("www.example.com", DNSRecordType(28), "2001:db8::1")
+        self.register.register_record("alias.example.com", DNSRecordType(5), "cdn.example.com")
+        self.register.register_record("cdn.example.com", DNSRecordType(5), "www.example.com")
+        self.register.register_record("loop.example.com", DNSRecordType(5), "loop.example.com")
+        self.register.register_record("external.example.com", DNSRecordType(5), "example.org")
+
+        www_rrsets = self.register.rrsets[b"\x03www\x07example\x03com\x00"]
+        alias_rrset = self.register.rrsets[b"\x05alias\x07example\x03com\x00"][5]
+        cdn_rrset = self.register.rrsets[b"\x03cdn\x07example\x03com\x00"][5]
+        self.assertEqual(self.register.resolve_records(read_query("www.example.com", 28)),
+                         [(b"\x03www\x07example\x03com\x00", www_rrsets[28])])
+        # CNAME records are followed up to the A or AAAA records of the canonical name
+        answers = self.register.resolve_records(read_query("alias.example.com", 1))
+        self.assertEqual([(owner, rrset.record_type.value) for owner, rrset in answers], [
+            (b"\x05alias\x07example\x03com\x00", 5),
+            (b"\x03cdn\x07example\x03com\x00", 5),
+            (b"\x03www\x07example\x03com\x00", 1),
+        ])
+        self.assertEqual(answers[-1][1].rdatas, (b"\x01\x01\x01\x01",))
+        self.assertEqual(self.register.resolve_records(read_query("alias.example.com", 28))[-1][1], www_rrsets[28])
+        self.assertEqual(self.register.resolve_records(read_query("alias.example.com", 5)),
+                         [(b"\x05alias\x07example\x03com\x00", alias_rrset)])
+        self.assertEqual(self.register.resolve_records(read_query("alias.example.com", 15)),
+                         [(b"\x05alias\x07example\x03com\x00", alias_rrset),
+                          (b"\x03cdn\x07example\x03com\x00", cdn_rrset)])
+        self.assertEqual(len(self.register.resolve_records(read_query("loop.example.com", 1))), 8)
+        self.assertEqual(len(self.register.resolve_records(read_query("external.example.com", 1))), 1)
+        # Registered names without records of the query type have no answer, unknown names do not exist
+        self.assertEqual(self.register.resolve_records(read_query("www.example.com", 15)), [])
+        self.assertIsNone(self.register.resolve_records(read_query("unknown.example.com", 28)))
+
+    def test_add_and_remove_address(self):
+        dns_resolver = DNSQueryResolver()
+        query_data = b"\x12\x34\x01\x00\x00\x01\x00\x00\x00\x00\x00\x00\x03www\x07example\x03com\x00\x00\x01\x00\x01"
+        notifications = []
+        self.register.add_record_listener(lambda domain_name, data: notifications.append((domain_name, data)))
+        self.register.register_domain("www.example.com", "1.1.1.1")
+
+        # The registered address joins the address set with a weight of 1
+        self.register.add_address("www.example.com", "2.2.2.2", weight=2)
+        address_set = self.register.address_sets[b"\x03www\x07example\x03com\x00"]
+        self.assertEqual(address_set.weights, {"1.1.1.1": 1, "2.2.2.2": 2})
+        answers = self.register.resolve_records(dns_resolver.read_query(query_data))
+        # The heaviest address comes first
+        self.assertEqual(answers[0][1].rdatas, (b"\x02\x02\x02\x02", b"\x01\x01\x01\x01"))
+        self.assertEqual(notifications, [("www.example.com", "2.2.2.2")])
+
+        self.assertFalse(self.register.remove_address("www.example.com", "3.3.3.3"))
+        self.assertTrue(self.register.remove_address("www.example.com", "1.1.1.1"))
+        self.assertTrue(self.register.remove_address("www.example.com", "2.2.2.2"))
+        # The record in records is shadowed by the empty address set
+        self.assertIsNone(self.register.resolve_records(dns_resolver.read_query(query_data)))
+        # Registering the name replaces its address set
+        self.register.register_domain("www.example.com", "4.4.4.4")
+        self.assertNotIn(b"\x03www\x07example\x03com\x00", self.register.address_sets)
+        with self.assertRaises(ValueError):
+            self.register.add_address("*.example.com", "1.1.1.1")
+
+    def test_address_listeners_are_notified_before_changes(self):
+        operations = []
+
+        def address_listener(domain_name: str, ip_address: str, operation: int, weight: int):
+            if ip_address == "9.9.9.9":
+                raise OSError("Journal unavailable.")
+            operations.append((domain_name, ip_address, operation, weight))
+
+        self.register.add_address_listener(address_listener)
+        self.register.register_domain("www.example.com", "1.1.1.1")
+        self.register.add_address("www.example.com", "2.2.2.2", weight=2)
+        self.assertFalse(self.register.remove_address("www.example.com", "3.3.3.3"))
+        self.assertTrue(self.register.remove_address("www.example.com", "1.1.1.1"))
+        # Operations a listener raises for, and invalid operations, are not applied
+        with self.assertRaises(OSError):
+            self.register.add_address("www.example.com", "9.9.9.9")
+        with self.assertRaises(ValueError):
+            self.register.add_address("www.example.com", "4.4.4.4", weight=0)
+
+        self.assertEqual(operations, [
+            ("www.example.com", "2.2.2.2", RegisterOperation.ADD_ADDRESS, 2),
+            ("www.example.com", "1.1.1.1", RegisterOperation.REMOVE_ADDRESS, 0),
+        ])
+        self.assertEqual(self.register.address_sets[b"\x03www\x07example\x03com\x00"].weights, {"2.2.2.2": 2})
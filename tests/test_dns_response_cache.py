@@ -0,0 +1,86 @@
+import unittest
+from unittest.mock import patch
+
+from src.dns_query_resolver import DNSQueryResolver
+from src.dns_response_cache import DNSResponseCache
+from src.dns_response_factory import DEFAULT_RECORD_TTL, DNSResponseFactory
+
+EXAMPLE_QUERY = b"\x12\x34\x01\x00\x00\x01\x00\x00\x00\x00\x00\x00\x07example\x03com\x00\x00\x01\x00\x01"
+OTHER_QUERY = b"\x12\x34\x01\x00\x00\x01\x00\x00\x00\x00\x00\x00\x07example\x03net\x00\x00\x01\x00\x01"
+
+
+class TestDNSResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = DNSResponseCache(max_entries=2)
+        self.dns_query = DNSQueryResolver().read_query(EXAMPLE_QUERY)
+        self.response = DNSResponseFactory.generate_response(self.dns_query, "1.2.3.4")
+
+    def test_lookup_miss(self):
+        self.assertIsNone(self.cache.lookup_query(EXAMPLE_QUERY))
+
+    def test_lookup_hit_patches_transaction_id(self):
+        self.cache.store(self.dns_query, self.response)
+
+        self.assertEqual(self.cache.lookup_query(EXAMPLE_QUERY), self.response)
+        cached_response = self.cache.lookup_query(b"\xab\xcd" + EXAMPLE_QUERY[2:])
+        self.assertEqual(cached_response, b"\xab\xcd" + self.response[2:])
+
+    def test_entries_expire(self):
+        with patch("src.dns_response_cache.time.monotonic", return_value=100.0):
+            self.cache.store(self.dns_query, self.response)
+        with patch("src.dns_response_cache.time.monotonic", return_value=100.0 + DEFAULT_RECORD_TTL - 1):
+            self.assertEqual(self.cache.lookup_query(EXAMPLE_QUERY), self.response)
+        with patch("src.dns_response_cache.time.monotonic", return_value=100.0 + DEFAULT_RECORD_TTL):
+            self.assertIsNone(self.cache.lookup_query(EXAMPLE_QUERY))
+        self.assertEqual(self.cache.responses, {})
+        self.assertEqual(self.cache.questions_by_domain_name_key, {})
+
+    def test_lookup_ignores_queries_with_other_sections(self):
+        self.cache.store(self.dns_query, self.response)
+        query_data = EXAMPLE_QUERY[:10] + b"\x00\x01" + EXAMPLE_QUERY[12:] + b"\x00\x00"
+        self.assertIsNone(self.cache.lookup_query(query_data))
+
+    def test_lookup_edns_query(self):
+        edns_query = EXAMPLE_QUERY[:11] + b"\x01" + EXAMPLE_QUERY[12:] + b"\x00\x00\x29\x10\x00\x00\x00\x00\x00\x00\x00"
+        edns_dns_query = DNSQueryResolver().read_query(edns_query)
+        edns_response = DNSResponseFactory.generate_response(edns_dns_query, "1.2.3.4")
+        self.cache.store(self.dns_query, self.response)
+        self.cache.store(edns_dns_query, edns_response)
+
+        self.assertEqual(self.cache.lookup_query(edns_query), edns_response)
+        self.assertEqual(self.cache.lookup_query(EXAMPLE_QUERY), self.response)
+
+        # OPT records with options, such as cookies, are specific to a client and not cached
+        options_query = edns_query[:-2] + b"\x00\x06\x00\x0a\x00\x02\xab\xcd"
+        self.assertIsNone(self.cache.cache_key(DNSQueryResolver().read_query(options_query)))
+
+    def test_invalidate(self):
+        self.cache.store(self.dns_query, self.response)
+
+        self.cache.invalidate("example.net", "1.2.3.4")
+        self.assertIsNotNone(self.cache.lookup_query(EXAMPLE_QUERY))
+
+        self.cache.invalidate("Example.COM", "5.6.7.8")
+        self.assertIsNone(self.cache.lookup_query(EXAMPLE_QUERY))
+        self.assertEqual(self.cache.questions_by_domain_name_key, {})
+
+    def test_evicts_oldest_entry(self):
+        other_dns_query = DNSQueryResolver().read_query(OTHER_QUERY)
+        self.cache.store(self.dns_query, self.response)
+        self.cache.store(other_dns_query, DNSResponseFactory.generate_response(other_dns_query, "5.6.7.8"))
+        third_dns_query = DNSQueryResolver().read_query(EXAMPLE_QUERY[:-4] + b"\x00\x1c\x00\x01")
+        self.cache.store(third_dns_query, self.response)
+
+        self.assertEqual(len(self.cache.responses), 2)
+        self.assertIsNone(self.cache.lookup_query(EXAMPLE_QUERY))
+        self.assertIsNotNone(self.cache.lookup_query(OTHER_QUERY))
+        self.assertEqual(self.cache.questions_by_domain_name_key[b"\x07example\x03com\x00"], [third_dns_query.question])
+
+    def test_invalidate_wildcard(self):
+        other_dns_query = DNSQueryResolver().read_query(OTHER_QUERY)
+        self.cache.store(self.dns_query, self.response)
+        self.cache.store(other_dns_query, DNSResponseFactory.generate_response(other_dns_query, "5.6.7.8"))
+
+        self.cache.invalidate("*.com", "5.6.7.8")
+        self.assertIsNone(self.cache.lookup_query(EXAMPLE_QUERY))
+        self.assertIsNotNone(self.cache.lookup_query(OTHER_QUERY))
@@ -1,8 +1,11 @@
 import unittest
 from src.custom_types.dns_query import DNSQuery
+from src.custom_types.edns_options import EDNSOptions
 from src.custom_types.dns_query_question import DNSQueryQuestion
 from src.custom_types.dns_record_type import DNSRecordType
-from src.dns_response_factory import DNSResponseFactory
+from src.dns_query_resolver import DNSQueryResolver
+from src.dns_response_factory import DNSResponseFactory, OPT_RECORD
+from src.custom_types.resource_record_set import ResourceRecordSet
 
 EXAMPLE_DNS_QUERY = DNSQuery(
     original_query=b"",
@@ -14,8 +17,10 @@ EXAMPLE_DNS_QUERY = DNSQuery(
     additional_count=1,
     question=b"",
     domain_name="example.com",
+    domain_name_key=b"\x07example\x03com\x00",
     query_type=DNSRecordType(1),
-    query_class=1
+    query_class=1,
+    edns=None
 )
 
 
@@ -60,6 +65,7 @@ class TestDNSResponseFactory(unittest.TestCase):
         # Test generating a DNS response with a custom transaction ID
         dns_query_question = DNSQueryQuestion(
             domain_name="example.com",
+            domain_name_key=b"\x07example\x03com\x00",
             query_type=DNSRecordType(1),
             query_class=1,
             as_bytes=b"\x07example\x03com\x00\x00\x01\x00\x01"
@@ -74,8 +80,10 @@ class TestDNSResponseFactory(unittest.TestCase):
             additional_count=0,
             question=dns_query_question.as_bytes,
             domain_name=dns_query_question.domain_name,
+            domain_name_key=dns_query_question.domain_name_key,
             query_type=dns_query_question.query_type,
-            query_class=dns_query_question.query_class
+            query_class=dns_query_question.query_class,
+            edns=None
         )
         resolved_ip = "192.168.1.1"
         response = self.factory.generate_response(dns_query=dns_query, resolved_ip=resolved_ip)
@@ -100,3 +108,58 @@ class TestDNSResponseFactory(unittest.TestCase):
         expected_response = b"\x124\x81\x03\x00\x01\x00\x00\x00\x00\x00\x00\x03www\x06google\x03com\x00\x00\x01\x00\x01"
 
         self.assertEqual(response, expected_response)
+
+    def test_generate_response_echoes_opt_record(self):
+        dns_query = DNSQueryResolver().read_query(
+            b"\x12\x34\x01\x00\x00\x01\x00\x00\x00\x00\x00\x01\x07example\x03com\x00\x00\x01\x00\x01"
+            b"\x00\x00\x29\x10\x00\x00\x00\x80\x00\x00\x00"
+        )
+        response = self.factory.generate_response(dns_query=dns_query, resolved_ip="192.168.1.1")
+
+        expected_response = b"\x12\x34\x81\x80\x00\x01\x00\x01\x00\x00\x00\x01\x07example\x03com\x00\x00\x01\x00\x01" \
+                            b"\xc0\x0c\x00\x01\x00\x01\x00\x00\x00\x0e\x00\x04\xc0\xa8\x01\x01" \
+                            b"\x00\x00\x29\x04\xd0\x00\x00\x00\x00\x00\x00"
+        self.assertEqual(response, expected_response)
+        self.assertEqual(self.factory.max_udp_response_size(dns_query), 1232)
+        self.assertEqual(self.factory.max_udp_response_size(EXAMPLE_DNS_QUERY), 512)
+
+    def test_generate_error_response_with_extended_error_code(self):
+        edns = EDNSOptions(udp_payload_size=4096, version=1, dnssec_ok=False, options=b"")
+        question = b"\x07example\x03com\x00\x00\x01\x00\x01"
+
+        response = self.factory.generate_error_response(error_code=16, transaction_id=b"\x12\x34", question=question,
+                                                        edns=edns)
+
+        # BADVERS (16) is sent as response code 0 and extended response code 1
+        self.assertEqual(response, b"\x12\x34\x81\x00\x00\x01\x00\x00\x00\x00\x00\x01" + question
+                         + b"\x00\x00\x29\x04\xd0\x01\x00\x00\x00\x00\x00")
+
+    def test_generate_records_response_compresses_names(self):
+        dns_query = DNSQueryResolver().read_query(
+            b"\x12\x34\x01\x00\x00\x01\x00\x00\x00\x00\x00\x00\x05Alias\x07example\x03com\x00\x00\x0f\x00\x01"
+        )
+        answers = [
+            (b"\x05alias\x07example\x03com\x00", ResourceRecordSet(
+                record_type=DNSRecordType(5), ttl=60, rdatas=(b"\x04mail\x07example\x03com\x00",))),
+            (b"\x04mail\x07example\x03com\x00", ResourceRecordSet(
+                record_type=DNSRecordType(15), ttl=300, rdatas=(b"\x00\x0a\x02mx\x07example\x03com\x00",
+                                                                 b"\x00\x14\x02mx\x07example\x03org\x00"))),
+        ]
+        response = self.factory.generate_records_response(dns_query=dns_query, answers=answers)
+
+        expected_response = b"\x12\x34\x81\x80\x00\x01\x00\x03\x00\x00\x00\x00" \
+                            b"\x05Alias\x07example\x03com\x00\x00\x0f\x00\x01" \
+                            b"\xc0\x0c\x00\x05\x00\x01\x00\x00\x00\x3c\x00\x07\x04mail\xc0\x12" \
+                            b"\xc0\x2f\x00\x0f\x00\x01\x00\x00\x01\x2c\x00\x07\x00\x0a\x02mx\xc0\x12" \
+                            b"\xc0\x2f\x00\x0f\x00\x01\x00\x00\x01\x2c\x00\x12\x00\x14\x02mx\x07example\x03org\x00"
+        self.assertEqual(response, expected_response)
+
+    def test_generate_records_response_without_answers(self):
+        dns_query = DNSQueryResolver().read_query(
+            b"\x12\x34\x01\x00\x00\x01\x00\x00\x00\x00\x00\x01\x07example\x03com\x00\x00\x1c\x00\x01"
+            b"\x00\x00\x29\x10\x00\x00\x00\x00\x00\x00\x00"
+        )
+        response = self.factory.generate_records_response(dns_query=dns_query, answers=[])
+
+        self.assertEqual(response, b"\x12\x34\x81\x80\x00\x01\x00\x00\x00\x00\x00\x01"
+                                   b"\x07example\x03com\x00\x00\x1c\x00\x01" + OPT_RECORD)
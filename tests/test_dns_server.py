@@ -1,15 +1,22 @@
+import os
 import socket
+import tempfile
 import unittest
 from unittest.mock import Mock, patch, MagicMock
 
+from src.dns_forwarder import DNSForwarder
+from src.dns_metrics import QUERY_TYPE_OFFSETS
 from src.dns_register import DNSRegister
 from src.dns_query_resolver import DNSQueryResolver
 from src.dns_response_factory import DNSResponseFactory
 from src.dns_server import DNSServer
+from src.mmap_record_store import MmapRecordStore
+from src.query_log_writer import QueryLogWriter
+from src.register_journal import RegisterJournal
 from src.register_request_resolver import RegisterRequestResolver
 from src.custom_types.dns_query import DNSQuery
 from src.custom_types.dns_record_type import DNSRecordType
-from src.custom_types.error_types import FormatError, FunctionalityNotImplementedError
+from src.custom_types.response_code import ResponseCode
 
 EXAMPLE_DNS_QUERY = DNSQuery(
     original_query=b"",
@@ -21,8 +28,10 @@ EXAMPLE_DNS_QUERY = DNSQuery(
     additional_count=1,
     question=b"",
     domain_name="example.com",
+    domain_name_key=b"\x07example\x03com\x00",
     query_type=DNSRecordType(1),
-    query_class=1
+    query_class=1,
+    edns=None
 )
 
 
@@ -30,6 +39,7 @@ class TestDnsServer(unittest.TestCase):
     def setUp(self):
         self.dns_query_resolver_mock = MagicMock(spec=DNSQueryResolver)
         self.dns_register_mock = MagicMock(spec=DNSRegister)
+        self.dns_register_mock.address_sets = {}
         self.register_request_resolver_mock = MagicMock(spec=RegisterRequestResolver)
 
         self.mock_create_dns_socket = Mock()
@@ -69,22 +79,22 @@ class TestDnsServer(unittest.TestCase):
             mock_create_register_request_socket.assert_called_once()
 
     def test_handle_query_success(self):
-        self.dns_query_resolver_mock.read_query.return_value = EXAMPLE_DNS_QUERY
+        self.dns_query_resolver_mock.parse_query.return_value = (ResponseCode.NO_ERROR, EXAMPLE_DNS_QUERY)
         self.dns_register_mock.resolve_ip.return_value = "192.0.2.1"
 
         data = b"DNS_QUERY_DATA"
         result = self.dns_server.handle_dns_query(data)
         self.assertEqual(result, b"DNS_RESPONSE")
-        self.dns_query_resolver_mock.read_query.assert_called_once_with(data)
+        self.dns_query_resolver_mock.parse_query.assert_called_once_with(data)
         self.dns_register_mock.resolve_ip.assert_called_once_with(EXAMPLE_DNS_QUERY)
 
     def test_handle_query_format_error(self):
-        self.dns_query_resolver_mock.read_query.side_effect = FormatError(message="")
+        self.dns_query_resolver_mock.parse_query.return_value = (ResponseCode.FORMAT_ERROR, None)
 
         data = b"\x00\x01\x00\x00\x00"
         result = self.dns_server.handle_dns_query(data)
         self.assertEqual(result, b"ERROR_RESPONSE")
-        self.dns_query_resolver_mock.read_query.assert_called_once_with(data)
+        self.dns_query_resolver_mock.parse_query.assert_called_once_with(data)
         self.dns_response_factory_mock.generate_error_response.assert_called_once_with(
             error_code=1,
             transaction_id=b"\x00\x01",
@@ -92,28 +102,30 @@ class TestDnsServer(unittest.TestCase):
         )
 
     def test_handle_query_no_record_error(self):
-        self.dns_query_resolver_mock.read_query.return_value = EXAMPLE_DNS_QUERY
+        self.dns_query_resolver_mock.parse_query.return_value = (ResponseCode.NO_ERROR, EXAMPLE_DNS_QUERY)
         self.dns_register_mock.resolve_ip.return_value = None
+        self.dns_register_mock.resolve_records.return_value = None
 
         data = b'\x00\x01\x00\x00'
         result = self.dns_server.handle_dns_query(data)
         self.assertEqual(result, b"ERROR_RESPONSE")
-        self.dns_query_resolver_mock.read_query.assert_called_once_with(data)
+        self.dns_query_resolver_mock.parse_query.assert_called_once_with(data)
         self.dns_register_mock.resolve_ip.assert_called_once_with(EXAMPLE_DNS_QUERY)
+        self.dns_register_mock.resolve_records.assert_called_once_with(EXAMPLE_DNS_QUERY)
         self.dns_response_factory_mock.generate_error_response.assert_called_once_with(
             transaction_id=b'\x00\x01',
             error_code=3,
-            question=EXAMPLE_DNS_QUERY.question
+            question=EXAMPLE_DNS_QUERY.question,
+            edns=None
         )
 
     def test_handle_query_not_implemented_error(self):
-        self.dns_query_resolver_mock.read_query.side_effect = FunctionalityNotImplementedError(
-            transaction_id=b'\x00\x01', message="")
+        self.dns_query_resolver_mock.parse_query.return_value = (ResponseCode.NOT_IMPLEMENTED, None)
 
         data = b'\x00\x01\x00\x00'
         result = self.dns_server.handle_dns_query(data)
         self.assertEqual(result, b"ERROR_RESPONSE")
-        self.dns_query_resolver_mock.read_query.assert_called_once_with(data)
+        self.dns_query_resolver_mock.parse_query.assert_called_once_with(data)
         self.dns_register_mock.resolve_ip.assert_not_called()
         self.dns_response_factory_mock.generate_error_response.assert_called_once_with(
             transaction_id=b'\x00\x01',
@@ -121,4 +133,266 @@ class TestDnsServer(unittest.TestCase):
             question=None
         )
 
+    def test_handle_query_uses_response_cache(self):
+        with patch.object(DNSServer, "create_dns_query_socket"), \
+                patch.object(DNSServer, "create_register_request_socket"):
+            dns_server = DNSServer(
+                dns_resolver=DNSQueryResolver(),
+                dns_register=DNSRegister(),
+                register_request_resolver=RegisterRequestResolver()
+            )
+        query_data = b"\x12\x34\x01\x00\x00\x01\x00\x00\x00\x00\x00\x00\x07example\x03com\x00\x00\x01\x00\x01"
+        dns_server.dns_register.register_domain("example.com", "1.2.3.4")
+        response = dns_server.handle_dns_query(query_data)
+
+        with patch.object(dns_server.dns_resolver, "parse_query") as parse_query_mock:
+            cached_response = dns_server.handle_dns_query(b"\xab\xcd" + query_data[2:])
+            parse_query_mock.assert_not_called()
+        self.assertEqual(cached_response, b"\xab\xcd" + response[2:])
+
+        # Registering the domain again invalidates the cached response
+        dns_server.dns_register.register_domain("example.com", "5.6.7.8")
+        self.assertEqual(dns_server.handle_dns_query(query_data)[-4:], b"\x05\x06\x07\x08")
+
+    def test_handle_query_uses_negative_answer_cache(self):
+        with patch.object(DNSServer, "create_dns_query_socket"), \
+                patch.object(DNSServer, "create_register_request_socket"):
+            dns_server = DNSServer(
+                dns_resolver=DNSQueryResolver(),
+                dns_register=DNSRegister(),
+                register_request_resolver=RegisterRequestResolver()
+            )
+        query_data = b"\x12\x34\x01\x00\x00\x01\x00\x00\x00\x00\x00\x00\x07unknown\x03com\x00\x00\x01\x00\x01"
+        response = dns_server.handle_dns_query(query_data)
+        self.assertEqual(response[3] & 0x0f, 3)
+
+        with patch.object(dns_server.dns_resolver, "parse_query") as parse_query_mock:
+            self.assertEqual(dns_server.handle_dns_query(query_data), response)
+            parse_query_mock.assert_not_called()
+
+        # Registering the domain invalidates the cached NXDOMAIN response
+        dns_server.dns_register.register_domain("unknown.com", "5.6.7.8")
+        self.assertEqual(dns_server.handle_dns_query(query_data)[-4:], b"\x05\x06\x07\x08")
+
+    def test_handle_edns_query(self):
+        with patch.object(DNSServer, "create_dns_query_socket"), \
+                patch.object(DNSServer, "create_register_request_socket"):
+            dns_server = DNSServer(
+                dns_resolver=DNSQueryResolver(),
+                dns_register=DNSRegister(),
+                register_request_resolver=RegisterRequestResolver()
+            )
+        query_data = b"\x12\x34\x01\x00\x00\x01\x00\x00\x00\x00\x00\x01\x07example\x03com\x00\x00\x01\x00\x01" \
+                     b"\x00\x00\x29\x10\x00\x00\x00\x00\x00\x00\x00"
+        dns_server.dns_register.register_domain("example.com", "1.2.3.4")
+        response = dns_server.handle_dns_query(query_data)
+        self.assertEqual(response[10:12], b"\x00\x01")
+        self.assertEqual(response[-15:], b"\x01\x02\x03\x04\x00\x00\x29\x04\xd0\x00\x00\x00\x00\x00\x00")
+
+        # EDNS queries without options are cached too
+        with patch.object(dns_server.dns_resolver, "parse_query") as parse_query_mock:
+            self.assertEqual(dns_server.handle_dns_query(query_data), response)
+            parse_query_mock.assert_not_called()
+        self.assertEqual(dns_server.dns_metrics.values[QUERY_TYPE_OFFSETS[1] + ResponseCode.NO_ERROR], 2)
+
+        # Only EDNS version 0 is implemented
+        bad_version_query = query_data[:-5] + b"\x01" + query_data[-4:]
+        response = dns_server.handle_dns_query(bad_version_query)
+        self.assertEqual(response[3] & 0x0f, 0)
+        self.assertEqual(response[-11:], b"\x00\x00\x29\x04\xd0\x01\x00\x00\x00\x00\x00")
+
+    def test_handle_query_record_sets(self):
+        with patch.object(DNSServer, "create_dns_query_socket"), \
+                patch.object(DNSServer, "create_register_request_socket"):
+            dns_server = DNSServer(
+                dns_resolver=DNSQueryResolver(),
+                dns_register=DNSRegister(),
+                register_request_resolver=RegisterRequestResolver()
+            )
+        dns_server.dns_register.register_domain("www.example.com", "1.2.3.4")
+        dns_server.dns_register.register_record("alias.example.com", DNSRecordType(5), "www.example.com")
+        header = b"\x12\x34\x01\x00\x00\x01\x00\x00\x00\x00\x00\x00"
+        aaaa_query_data = header + b"\x03www\x07example\x03com\x00\x00\x1c\x00\x01"
+        alias_query_data = header + b"\x05alias\x07example\x03com\x00\x00\x01\x00\x01"
+
+        # A name without records of the query type has no answer, and the response is cached
+        response = dns_server.handle_dns_query(aaaa_query_data)
+        self.assertEqual(response[2:8], b"\x81\x80\x00\x01\x00\x00")
+        self.assertEqual(dns_server.handle_dns_query(aaaa_query_data), response)
+        # Registering a record invalidates the cached responses of its name
+        dns_server.dns_register.register_record("www.example.com", DNSRecordType(28), "2001:db8::1")
+        response = dns_server.handle_dns_query(aaaa_query_data)
+        self.assertEqual(response[6:8], b"\x00\x01")
+        self.assertEqual(response[-18:], b"\x00\x10\x20\x01\x0d\xb8" + bytes(11) + b"\x01")
+
+        # A query for an alias is answered with its CNAME record and the A record of the canonical name
+        response = dns_server.handle_dns_query(alias_query_data)
+        self.assertEqual(response[6:8], b"\x00\x02")
+        self.assertEqual(response[len(alias_query_data):],
+                         b"\xc0\x0c\x00\x05\x00\x01\x00\x00\x00\x0e\x00\x06\x03www\xc0\x12"
+                         b"\xc0\x2f\x00\x01\x00\x01\x00\x00\x00\x0e\x00\x04\x01\x02\x03\x04")
+        # It is not cached, since registering the canonical name does not invalidate the alias
+        dns_server.dns_register.register_domain("www.example.com", "5.6.7.8")
+        self.assertEqual(dns_server.handle_dns_query(alias_query_data)[-4:], b"\x05\x06\x07\x08")
+
+        # Neither is the response of an alias whose canonical name is not registered yet
+        dns_server.dns_register.register_record("dangling.example.com", DNSRecordType(5), "www.example.org")
+        dangling_query_data = header + b"\x08dangling\x07example\x03com\x00\x00\x01\x00\x01"
+        self.assertEqual(dns_server.handle_dns_query(dangling_query_data)[6:8], b"\x00\x01")
+        dns_server.dns_register.register_domain("www.example.org", "1.2.3.4")
+        response = dns_server.handle_dns_query(dangling_query_data)
+        self.assertEqual((response[6:8], response[-4:]), (b"\x00\x02", b"\x01\x02\x03\x04"))
+
+        # Other query types are not implemented
+        response = dns_server.handle_dns_query(header + b"\x03www\x07example\x03com\x00\x00\x06\x00\x01")
+        self.assertEqual(response[3] & 0x0f, ResponseCode.NOT_IMPLEMENTED)
+
+    def test_handle_query_address_sets(self):
+        with patch.object(DNSServer, "create_dns_query_socket"), \
+                patch.object(DNSServer, "create_register_request_socket"):
+            dns_server = DNSServer(
+                dns_resolver=DNSQueryResolver(),
+                dns_register=DNSRegister(),
+                register_request_resolver=RegisterRequestResolver()
+            )
+        register_request_prefix = b"\x00\x09\x00\x01\x0c\x07example\x03com\x00\x00\x06"
+        query_data = b"\x12\x34\x01\x00\x00\x01\x00\x00\x00\x00\x00\x00\x07example\x03com\x00\x00\x01\x00\x01"
+        dns_server.dns_register.register_domain("example.com", "1.2.3.4")
+        self.assertEqual(dns_server.handle_dns_query(query_data)[-4:], b"\x01\x02\x03\x04")
+
+        # Adding an address invalidates the cached response, and the answers then rotate on every query
+        response = dns_server.handle_register_request(register_request_prefix + b"\x05\x06\x07\x08\x01\x01")
+        self.assertEqual(response, b"\x00\x09\x01")
+        first_response = dns_server.handle_dns_query(query_data)
+        second_response = dns_server.handle_dns_query(query_data)
+        self.assertEqual(first_response[6:8], b"\x00\x02")
+        self.assertEqual(first_response[len(query_data):],
+                         b"\xc0\x0c\x00\x01\x00\x01\x00\x00\x00\x0e\x00\x04\x01\x02\x03\x04"
+                         b"\xc0\x0c\x00\x01\x00\x01\x00\x00\x00\x0e\x00\x04\x05\x06\x07\x08")
+        self.assertEqual(second_response[len(query_data):], first_response[len(query_data) + 16:]
+                         + first_response[len(query_data):len(query_data) + 16])
+
+        dns_server.handle_register_request(register_request_prefix + b"\x01\x02\x03\x04\x02\x00")
+        response = dns_server.handle_dns_query(query_data)
+        self.assertEqual(response[6:8], b"\x00\x01")
+        self.assertEqual(response[-4:], b"\x05\x06\x07\x08")
+
+    def test_address_operations_refused_with_record_store_only(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = MmapRecordStore(os.path.join(directory, "records.db"), capacity=8)
+            with patch.object(DNSServer, "create_dns_query_socket"), \
+                    patch.object(DNSServer, "create_register_request_socket"):
+                dns_server = DNSServer(
+                    dns_resolver=DNSQueryResolver(),
+                    dns_register=DNSRegister(records=store),
+                    register_request_resolver=RegisterRequestResolver()
+                )
+            register_request_prefix = b"\x00\x09\x00\x01\x0c\x07example\x03com\x00"
+
+            # Address sets could not be persisted by the store, registrations still are
+            response = dns_server.handle_register_request(register_request_prefix + b"\x00\x06\x05\x06\x07\x08\x01\x01")
+            self.assertEqual(response[2:4], b"\x81\x05")
+            self.assertEqual(dns_server.dns_register.address_sets, {})
+            response = dns_server.handle_register_request(register_request_prefix + b"\x00\x04\x05\x06\x07\x08")
+            self.assertEqual(response, b"\x00\x09\x01")
+            store.close()
+
+    def test_handle_query_with_forwarder(self):
+        dns_forwarder_mock = MagicMock(spec=DNSForwarder)
+        dns_forwarder_mock.lookup_query.return_value = None
+        with patch.object(DNSServer, "create_dns_query_socket"), \
+                patch.object(DNSServer, "create_register_request_socket"):
+            dns_server = DNSServer(
+                dns_resolver=DNSQueryResolver(),
+                dns_register=DNSRegister(),
+                register_request_resolver=RegisterRequestResolver(),
+                dns_forwarder=dns_forwarder_mock
+            )
+        query_data = b"\x12\x34\x01\x00\x00\x01\x00\x00\x00\x00\x00\x00\x07unknown\x03com\x00\x00\x01\x00\x01"
+        mx_query_data = query_data[:-3] + b"\x0f\x00\x01"
+
+        # Unknown names and unsupported types must be forwarded
+        self.assertIsNone(dns_server.handle_dns_query(query_data))
+        self.assertIsNone(dns_server.handle_dns_query(mx_query_data))
+        dns_forwarder_mock.lookup_query.assert_called_with(mx_query_data)
+
+        # Unless the forwarder has a cached response
+        dns_forwarder_mock.lookup_query.return_value = b"FORWARDED_RESPONSE"
+        self.assertEqual(dns_server.handle_dns_query(query_data), b"FORWARDED_RESPONSE")
+
+        # Registered names are still answered by the server
+        dns_server.dns_register.register_domain("unknown.com", "5.6.7.8")
+        self.assertEqual(dns_server.handle_dns_query(query_data)[-4:], b"\x05\x06\x07\x08")
+
+    def test_fit_udp_response(self):
+        with patch.object(DNSServer, "create_dns_query_socket"), \
+                patch.object(DNSServer, "create_register_request_socket"):
+            dns_server = DNSServer(
+                dns_resolver=DNSQueryResolver(),
+                dns_register=DNSRegister(),
+                register_request_resolver=RegisterRequestResolver()
+            )
+        query_data = b"\x12\x34\x01\x00\x00\x01\x00\x00\x00\x00\x00\x00\x07example\x03com\x00\x00\x01\x00\x01"
+        edns_query_data = query_data[:11] + b"\x01" + query_data[12:] + b"\x00\x00\x29\x10\x00\x00\x00\x00\x00\x00\x00"
+        response = b"\x12\x34\x81\x80\x00\x01\x00\x01\x00\x00\x00\x00" + query_data[12:] + bytes(1000)
+
+        # Without EDNS, responses are limited to 512 bytes
+        truncated_response = dns_server.fit_udp_response(query_data, response)
+        self.assertEqual(truncated_response, b"\x12\x34\x83\x80\x00\x01\x00\x00\x00\x00\x00\x00" + query_data[12:])
+        # The UDP payload size advertised by the query is used
+        self.assertEqual(dns_server.fit_udp_response(edns_query_data, response), response)
+        self.assertEqual(dns_server.fit_udp_response(edns_query_data, response + bytes(1000))[:12],
+                         b"\x12\x34\x83\x80\x00\x01\x00\x00\x00\x00\x00\x01")
+
+    def test_handle_query_unexpected_error(self):
+        self.dns_query_resolver_mock.parse_query.side_effect = RuntimeError("unexpected")
+
+        result = self.dns_server.handle_dns_query(b"\x00\x01\x00\x00")
+        self.assertEqual(result, b"ERROR_RESPONSE")
+        self.dns_response_factory_mock.generate_error_response.assert_called_once_with(
+            transaction_id=None,
+            error_code=2
+        )
+
+    def test_handle_register_request_errors(self):
+        dns_server = self.dns_server
+        dns_server.dns_response_factory = DNSResponseFactory()
+        dns_server.register_request_resolver = RegisterRequestResolver()
+
+        # Malformed register request
+        response = dns_server.handle_register_request(b"\x00\x07\x00\x01\x05")
+        self.assertEqual(response[:4], b"\x00\x07\x81\x01")
+
+        # AAAA register request
+        register_request = b"\x00\x08\x00\x1c\x0c\x07example\x03com\x00\x00\x04\x01\x02\x03\x04"
+        response = dns_server.handle_register_request(register_request)
+        self.assertEqual(response[:4], b"\x00\x08\x81\x04")
+        # Record data that is not an IPv4 address
+        register_request = b"\x00\x09\x00\x01\x0c\x07example\x03com\x00\x00\x05\x01\x02\x03\x04\x05"
+        response = dns_server.handle_register_request(register_request)
+        self.assertEqual(response[:4], b"\x00\x09\x81\x01")
+        self.dns_register_mock.register_domain.assert_not_called()
+
+    def test_send_when_durable(self):
+        send_mock = Mock()
+        self.dns_server.send_when_durable(send_mock)
+        send_mock.assert_called_once_with()
+
+        register_journal_mock = MagicMock(spec=RegisterJournal)
+        self.dns_server.register_journal = register_journal_mock
+        send_mock = Mock()
+        self.dns_server.send_when_durable(send_mock)
+        send_mock.assert_not_called()
+        register_journal_mock.when_durable.assert_called_once_with(send_mock)
+
+    def test_log_dns_exchange(self):
+        self.assertFalse(self.dns_server.is_logging_dns_exchanges())
+        with self.assertLogs("src.dns_server", level="DEBUG") as logs:
+            self.dns_server.log_dns_exchange(b"QUERY", b"RESPONSE", ("127.0.0.1", 5353))
+        self.assertEqual(logs.output, ["DEBUG:src.dns_server:DNS query from 127.0.0.1:5353 answered with 8 bytes"])
 
+        query_log_mock = MagicMock(spec=QueryLogWriter)
+        self.dns_server.query_log = query_log_mock
+        self.assertTrue(self.dns_server.is_logging_dns_exchanges())
+        self.dns_server.log_dns_exchange(b"QUERY", b"RESPONSE", ("127.0.0.1", 5353))
+        query_log_mock.log_exchange.assert_called_once_with(b"QUERY", b"RESPONSE", ("127.0.0.1", 5353))
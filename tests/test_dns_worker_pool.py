@@ -0,0 +1,137 @@
+import os
+import socket
+import tempfile
+import time
+import unittest
+from multiprocessing import Pipe
+from unittest.mock import MagicMock, patch
+
+from src.dns_register import DNSRegister
+from src.domain_name_codec import DomainNameCodec
+from src.dns_query_resolver import DNSQueryResolver
+from src.dns_server import DNSServer
+from src.dns_worker_pool import DNSWorkerPool
+from src.mmap_record_store import MmapRecordStore
+from src.register_request_resolver import RegisterRequestResolver
+from src.custom_types.register_operation import RegisterOperation
+from tests.helpers import create_loopback_socket
+
+EXAMPLE_QUERY = b"\x12\x34\x01\x00\x00\x01\x00\x00\x00\x00\x00\x00\x07example\x03com\x00\x00\x01\x00\x01"
+
+
+class TestDNSWorkerPool(unittest.TestCase):
+    def setUp(self):
+        with patch.object(DNSServer, "create_dns_query_socket", side_effect=create_loopback_socket), \
+                patch.object(DNSServer, "create_register_request_socket", side_effect=create_loopback_socket):
+            self.dns_server = DNSServer(
+                dns_resolver=DNSQueryResolver(),
+                dns_register=DNSRegister(),
+                register_request_resolver=RegisterRequestResolver()
+            )
+        self.dns_query_address = self.dns_server.dns_query_socket.getsockname()
+
+    def tearDown(self):
+        self.dns_server.dns_query_socket.close()
+        self.dns_server.register_request_socket.close()
+
+    def test_invalid_worker_count(self):
+        with self.assertRaises(ValueError):
+            DNSWorkerPool(self.dns_server, worker_count=0)
+
+    def test_broadcast_registration(self):
+        pool = DNSWorkerPool(self.dns_server, worker_count=2)
+        pool.update_connections = [MagicMock(), MagicMock()]
+
+        pool.broadcast_registration("example.com", "1.2.3.4")
+        pool.broadcast_registration("example.com", "5.6.7.8", RegisterOperation.ADD_ADDRESS, 3)
+
+        for connection in pool.update_connections:
+            self.assertEqual([call.args for call in connection.send.call_args_list], [
+                (("example.com", "1.2.3.4", RegisterOperation.REGISTER, 1),),
+                (("example.com", "5.6.7.8", RegisterOperation.ADD_ADDRESS, 3),),
+            ])
+
+    def test_handle_worker_update(self):
+        pool = DNSWorkerPool(self.dns_server, worker_count=1)
+        receive_connection, send_connection = Pipe(duplex=False)
+
+        send_connection.send(("example.com", "1.2.3.4", RegisterOperation.REGISTER, 1))
+        self.assertTrue(pool.handle_worker_update(receive_connection))
+        self.assertEqual(self.dns_server.dns_register.records[DomainNameCodec.encode("example.com")], "1.2.3.4")
+        # Address operations are applied to the address sets of the worker
+        send_connection.send(("example.com", "5.6.7.8", RegisterOperation.ADD_ADDRESS, 3))
+        send_connection.send(("example.com", "1.2.3.4", RegisterOperation.REMOVE_ADDRESS, 0))
+        self.assertTrue(pool.handle_worker_update(receive_connection))
+        self.assertTrue(pool.handle_worker_update(receive_connection))
+        address_set = self.dns_server.dns_register.address_sets[DomainNameCodec.encode("example.com")]
+        self.assertEqual(address_set.weights, {"5.6.7.8": 3})
+
+        send_connection.close()
+        self.assertFalse(pool.handle_worker_update(receive_connection))
+
+    def test_handle_worker_update_with_record_store(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = MmapRecordStore(os.path.join(directory, "records.db"), capacity=8)
+            self.dns_server.dns_register = DNSRegister(records=store)
+            self.dns_server.dns_register.add_register_listener(self.dns_server.dns_response_cache.invalidate)
+            pool = DNSWorkerPool(self.dns_server, worker_count=1)
+            receive_connection, send_connection = Pipe(duplex=False)
+            example_com = DomainNameCodec.encode("example.com")
+
+            store[example_com] = "1.2.3.4"
+            self.assertEqual(self.dns_server.handle_dns_query(EXAMPLE_QUERY)[-4:], socket.inet_aton("1.2.3.4"))
+            # The parent wrote a newer address before the worker applies the broadcast of the older one
+            store[example_com] = "5.6.7.8"
+            send_connection.send(("example.com", "1.2.3.4", RegisterOperation.REGISTER, 1))
+            self.assertTrue(pool.handle_worker_update(receive_connection))
+            # The worker does not write the shared store, and its cached response is invalidated
+            self.assertEqual(store[example_com], "5.6.7.8")
+            self.assertEqual(self.dns_server.handle_dns_query(EXAMPLE_QUERY)[-4:], socket.inet_aton("5.6.7.8"))
+
+            store[DomainNameCodec.encode("*.example.net")] = "9.9.9.9"
+            send_connection.send(("*.example.net", "9.9.9.9", RegisterOperation.REGISTER, 1))
+            self.assertTrue(pool.handle_worker_update(receive_connection))
+            self.assertEqual(self.dns_server.dns_register.wildcard_trie.lookup("www.example.net"), "9.9.9.9")
+            send_connection.close()
+            receive_connection.close()
+            store.close()
+
+    def test_workers_serve_queries_and_registrations(self):
+        pool = DNSWorkerPool(self.dns_server, worker_count=2, dns_query_address=self.dns_query_address)
+        pool.start()
+        try:
+            self.dns_server.dns_register.register_domain("example.com", "1.2.3.4")
+            # Registrations reach the workers asynchronously, every query must eventually see the new address
+            for _ in range(20):
+                deadline = time.monotonic() + 5
+                response = b""
+                while response[-4:] != socket.inet_aton("1.2.3.4") and time.monotonic() < deadline:
+                    client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                    client.settimeout(1)
+                    try:
+                        client.sendto(EXAMPLE_QUERY, self.dns_query_address)
+                        response = client.recv(1024)
+                    except socket.timeout:
+                        # A worker still starting or busy applying an update, the query is sent again
+                        pass
+                    finally:
+                        client.close()
+                self.assertEqual(response[-4:], socket.inet_aton("1.2.3.4"))
+            # Added addresses are broadcast as well, the answers eventually carry both addresses
+            self.dns_server.dns_register.add_address("example.com", "5.6.7.8")
+            deadline = time.monotonic() + 5
+            while response[6:8] != b"\x00\x02" and time.monotonic() < deadline:
+                client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                client.settimeout(1)
+                try:
+                    client.sendto(EXAMPLE_QUERY, self.dns_query_address)
+                    response = client.recv(1024)
+                except socket.timeout:
+                    pass
+                finally:
+                    client.close()
+            self.assertEqual(response[6:8], b"\x00\x02")
+        finally:
+            pool.stop()
+        self.assertNotIn(pool.broadcast_registration, self.dns_server.dns_register.register_listeners)
+        self.assertNotIn(pool.broadcast_registration, self.dns_server.dns_register.address_listeners)
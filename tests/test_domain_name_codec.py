@@ -0,0 +1,30 @@
+import unittest
+
+from src.domain_name_codec import DomainNameCodec
+
+
+class TestDomainNameCodec(unittest.TestCase):
+    def test_encode(self):
+        self.assertEqual(DomainNameCodec.encode("www.Example.COM"), b"\x03www\x07example\x03com\x00")
+        self.assertEqual(DomainNameCodec.encode("http://www.example.com"), b"\x07http\x03www\x07example\x03com\x00")
+        self.assertEqual(DomainNameCodec.encode("https://WWW.example.com"),
+                         b"\x08https\x03www\x07example\x03com\x00")
+        self.assertEqual(DomainNameCodec.encode(""), b"\x00")
+
+    def test_encode_invalid_lengths(self):
+        self.assertEqual(DomainNameCodec.encode("a" * 63 + ".com"), b"\x3f" + b"a" * 63 + b"\x03com\x00")
+        self.assertEqual(len(DomainNameCodec.encode(".".join(["a" * 63] * 3 + ["a" * 61]))), 255)
+        for domain_name in ("a" * 64 + ".com", "a" * 256 + ".com", "www..com", ".com", "www.example.com.",
+                            ".".join(["a" * 63] * 3 + ["a" * 62])):
+            with self.subTest(domain_name=domain_name):
+                with self.assertRaises(ValueError):
+                    DomainNameCodec.encode(domain_name)
+
+    def test_fold(self):
+        self.assertEqual(DomainNameCodec.fold(b"\x03WwW\x07ExAmPlE\x03cOm\x00"), b"\x03www\x07example\x03com\x00")
+
+    def test_decode(self):
+        for domain_name in ("www.example.com", "http://www.example.com", "https://www.example.com", "*.example.com"):
+            with self.subTest(domain_name=domain_name):
+                self.assertEqual(DomainNameCodec.decode(DomainNameCodec.encode(domain_name)), domain_name)
+        self.assertEqual(DomainNameCodec.decode(b"\x03WWW\x07example\x03com\x00"), "WWW.example.com")
@@ -0,0 +1,89 @@
+import unittest
+
+from src.dns_query_resolver import DNSQueryResolver
+from src.fast_dns_query_resolver import FastDNSQueryResolver
+from src.custom_types.lazy_dns_query import LazyDNSQuery
+from src.custom_types.error_types import FormatError, FunctionalityNotImplementedError
+from src.custom_types.response_code import ResponseCode
+
+HEADER = b"\x12\x34\x01\x20\x00\x01\x00\x00\x00\x00\x00\x00"
+VALID_QUERIES = [
+    HEADER + b"\x07example\x03com\x00\x00\x01\x00\x01",
+    HEADER + b"\x03www\x07example\x03com\x00\x00\x1c\x00\x01",
+    HEADER + b"\x03WwW\x07ExAmPlE\x03cOm\x00\x00\x01\x00\x01",
+    HEADER + b"\x07http\x03www\x07example\x03com\x00\x00\x01\x00\x01",
+    HEADER + b"\x08https\x03www\x06google\x03com\x00\x00\x01\x00\x01",
+    HEADER + b"\x07example\x03com\x00\x00\x01\x00\x01\x00\x00\x00\x00",
+    b"\x12\x34\x01\x20\x00\x01\x00\x00\x00\x00\x00\x01\x07example\x03com\x00\x00\x01\x00\x01"
+    b"\x00\x00\x29\x10\x00\x00\x00\x80\x00\x00\x00",
+    b"\x12\x34\x01\x20\x00\x01\x00\x00\x00\x01\x00\x02\x07example\x03com\x00\x00\x01\x00\x01"
+    b"\xc0\x0c\x00\x02\x00\x01\x00\x00\x00\x0e\x00\x00"
+    b"\x00\x00\x29\x04\xd0\x00\x00\x00\x00\x00\x06\x00\x0a\x00\x02\xab\xcd"
+    b"\x03www\xc0\x0c\x00\x01\x00\x01\x00\x00\x00\x0e\x00\x04\x7f\x00\x00\x01",
+]
+MALFORMED_QUERIES = [
+    b"",
+    b"\x12\x34\x01\x20\x00\x01",
+    HEADER,
+    HEADER + b"\x00\x00\x01\x00\x01",
+    HEADER + b"\x07example\x03com\x00\x01\x00\x01",
+    HEADER + b"\x07example\x03com\x00\x00\x01",
+    HEADER + b"\x07example\x03com\x00\x00\x07\x00\x01",
+    HEADER + b"\x07exa\xffple\x03com\x00\x00\x01\x00\x01",
+    HEADER + b"\x3fexample\x03com\x00\x00\x01\x00\x01",
+    b"\x12\x34\x01\x20\x00\x01\x00\x00\x00\x05\x00\x05\x07example\x03com\x00\x00\x01\x00\x01",
+    b"\x12\x34\x01\x20\x00\x01\x00\x00\x00\x00\x00\x01\x07example\x03com\x00\x00\x01\x00\x01\xab\xcd",
+    b"\x12\x34\x01\x20\x00\x01\x00\x00\x00\x00\x00\x01\x07example\x03com\x00\x00\x01\x00\x01"
+    b"\x00\x00\x29\x04\xd0\x00\x00\x00\x00\x00\x04\x00\x0a",
+    b"\x12\x34\x01\x20\x00\x01\x00\x00\x00\x00\x00\x01\x07example\x03com\x00\x00\x01\x00\x01"
+    b"\xc0\x0c\x00\x29\x04\xd0\x00\x00\x00\x00\x00\x00",
+    b"\x12\x34\x01\x20\x00\x01\x00\x00\x00\x00\x00\x02\x07example\x03com\x00\x00\x01\x00\x01"
+    b"\x00\x00\x29\x04\xd0\x00\x00\x00\x00\x00\x00\x00\x00\x29\x04\xd0\x00\x00\x00\x00\x00\x00",
+    b"\x12\x34\x01\x20\x00\x01\x00\x01\x00\x00\x00\x00\x07example\x03com\x00\x00\x01\x00\x01"
+    b"\x00\x00\x29\x04\xd0\x00\x00\x00\x00\x00\x00",
+]
+DNS_QUERY_ATTRIBUTES = [
+    "original_query", "transaction_id", "flags", "question_count", "answer_count", "authority_count",
+    "additional_count", "question", "domain_name", "domain_name_key", "query_type", "query_class", "edns"
+]
+
+
+class TestFastDNSQueryResolver(unittest.TestCase):
+    def setUp(self):
+        self.dns_resolver = DNSQueryResolver()
+        self.fast_dns_resolver = FastDNSQueryResolver()
+
+    def test_read_query_matches_dns_query_resolver(self):
+        for query_data in VALID_QUERIES:
+            with self.subTest(query_data=query_data):
+                lazy_dns_query = self.fast_dns_resolver.read_query(query_data)
+                dns_query = self.dns_resolver.read_query(query_data)
+                self.assertIsInstance(lazy_dns_query, LazyDNSQuery)
+                for attribute in DNS_QUERY_ATTRIBUTES:
+                    self.assertEqual(getattr(lazy_dns_query, attribute), getattr(dns_query, attribute), attribute)
+
+    def test_read_query_malformed(self):
+        for query_data in MALFORMED_QUERIES:
+            with self.subTest(query_data=query_data):
+                with self.assertRaises(FormatError):
+                    self.fast_dns_resolver.read_query(query_data)
+
+    def test_read_query_multiple_questions(self):
+        query_data = b"\x12\x34\x01\x20\x00\x02\x00\x00\x00\x00\x00\x00\x07example\x03com\x00\x00\x01\x00\x01" \
+                     b"\x07example\x03net\x00\x00\x01\x00\x01"
+
+        with self.assertRaises(FunctionalityNotImplementedError) as context:
+            self.fast_dns_resolver.read_query(query_data)
+        self.assertEqual(context.exception.transaction_id, b"\x12\x34")
+
+    def test_parse_query_reports_response_codes(self):
+        for query_data in MALFORMED_QUERIES:
+            with self.subTest(query_data=query_data):
+                self.assertEqual(self.fast_dns_resolver.parse_query(query_data), (ResponseCode.FORMAT_ERROR, None))
+                self.assertEqual(self.dns_resolver.parse_query(query_data), (ResponseCode.FORMAT_ERROR, None))
+
+        query_data = b"\x12\x34\x01\x20\x00\x02\x00\x00\x00\x00\x00\x00\x07example\x03com\x00\x00\x01\x00\x01"
+        self.assertEqual(self.fast_dns_resolver.parse_query(query_data), (ResponseCode.NOT_IMPLEMENTED, None))
+        response_code, lazy_dns_query = self.fast_dns_resolver.parse_query(VALID_QUERIES[0])
+        self.assertEqual(response_code, ResponseCode.NO_ERROR)
+        self.assertEqual(lazy_dns_query.domain_name, "example.com")
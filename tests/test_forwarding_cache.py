@@ -0,0 +1,67 @@
+import unittest
+from unittest.mock import patch
+
+from src.forwarding_cache import ForwardingCache
+
+QUERY = b"\x12\x34\x01\x00\x00\x01\x00\x00\x00\x00\x00\x00\x07example\x03com\x00\x00\x01\x00\x01"
+QUESTION = QUERY[12:]
+# Two A records with TTLs of 300 and 60 seconds
+POSITIVE_RESPONSE = b"\x12\x34\x81\x80\x00\x01\x00\x02\x00\x00\x00\x00" + QUESTION \
+    + b"\xc0\x0c\x00\x01\x00\x01\x00\x00\x01\x2c\x00\x04\x01\x02\x03\x04" \
+    + b"\xc0\x0c\x00\x01\x00\x01\x00\x00\x00\x3c\x00\x04\x05\x06\x07\x08"
+# An SOA record with a TTL of 3600 seconds and a MINIMUM of 120 seconds
+SOA_RECORD = b"\xc0\x14\x00\x06\x00\x01\x00\x00\x0e\x10\x00\x20\x02ns\xc0\x14\x04host\xc0\x14" \
+    + b"\x00\x00\x00\x01\x00\x00\x0e\x10\x00\x00\x02\x58\x00\x09\x3a\x80\x00\x00\x00\x78"
+NEGATIVE_RESPONSE = b"\x12\x34\x81\x83\x00\x01\x00\x00\x00\x01\x00\x00" + QUESTION + SOA_RECORD
+
+
+class TestForwardingCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = ForwardingCache(max_entries=2)
+
+    def test_lookup_decrements_ttls(self):
+        with patch("src.forwarding_cache.time.monotonic", return_value=1000.0):
+            self.assertTrue(self.cache.store(QUERY, POSITIVE_RESPONSE))
+            self.assertEqual(self.cache.lookup_query(b"\xab\xcd" + QUERY[2:]), b"\xab\xcd" + POSITIVE_RESPONSE[2:])
+
+        with patch("src.forwarding_cache.time.monotonic", return_value=1010.5):
+            response = self.cache.lookup_query(QUERY)
+        self.assertEqual(len(response), len(POSITIVE_RESPONSE))
+        self.assertEqual(response[len(QUERY) + 6:len(QUERY) + 10], (300 - 10).to_bytes(4, "big"))
+        self.assertEqual(response[len(QUERY) + 22:len(QUERY) + 26], (60 - 10).to_bytes(4, "big"))
+
+        # The response expires with its shortest TTL
+        with patch("src.forwarding_cache.time.monotonic", return_value=1060.0):
+            self.assertIsNone(self.cache.lookup_query(QUERY))
+        self.assertEqual(self.cache.responses, {})
+
+    def test_negative_responses_use_soa_minimum(self):
+        with patch("src.forwarding_cache.time.monotonic", return_value=1000.0):
+            self.assertTrue(self.cache.store(QUERY, NEGATIVE_RESPONSE))
+        with patch("src.forwarding_cache.time.monotonic", return_value=1119.0):
+            self.assertIsNotNone(self.cache.lookup_query(QUERY))
+        with patch("src.forwarding_cache.time.monotonic", return_value=1120.0):
+            self.assertIsNone(self.cache.lookup_query(QUERY))
+
+    def test_does_not_store_uncacheable_responses(self):
+        # A negative response without SOA record
+        self.assertFalse(self.cache.store(QUERY, NEGATIVE_RESPONSE[:-len(SOA_RECORD)].replace(
+            b"\x00\x01\x00\x00\x00\x01", b"\x00\x01\x00\x00\x00\x00", 1)))
+        # SERVFAIL
+        self.assertFalse(self.cache.store(QUERY, b"\x12\x34\x81\x82" + POSITIVE_RESPONSE[4:]))
+        # Truncated
+        self.assertFalse(self.cache.store(QUERY, b"\x12\x34\x83\x80" + POSITIVE_RESPONSE[4:]))
+        # Malformed
+        self.assertFalse(self.cache.store(QUERY, POSITIVE_RESPONSE[:-3]))
+        self.assertEqual(self.cache.responses, {})
+
+    def test_evicts_oldest_entry(self):
+        other_query = QUERY[:-3] + b"\x1c\x00\x01"
+        third_query = QUERY[:2] + b"\x00" + QUERY[3:]
+        self.cache.store(QUERY, POSITIVE_RESPONSE)
+        self.cache.store(other_query, POSITIVE_RESPONSE)
+        self.cache.store(third_query, POSITIVE_RESPONSE)
+
+        self.assertIsNone(self.cache.lookup_query(QUERY))
+        self.assertIsNotNone(self.cache.lookup_query(other_query))
+        self.assertIsNotNone(self.cache.lookup_query(third_query))
@@ -0,0 +1,53 @@
+import unittest
+
+from src.label_trie import ReverseLabelTrie
+
+
+class TestReverseLabelTrie(unittest.TestCase):
+    def setUp(self):
+        self.trie = ReverseLabelTrie()
+        self.trie.insert("example.com", "1.1.1.1")
+        self.trie.insert("www.example.com", "2.2.2.2")
+        self.trie.insert("*.example.com", "3.3.3.3")
+        self.trie.insert("host.zone.example.org", "4.4.4.4")
+
+    def test_get(self):
+        self.assertEqual(self.trie.get("www.example.com"), "2.2.2.2")
+        self.assertIsNone(self.trie.get("mail.example.com"))
+        self.assertIsNone(self.trie.get("zone.example.org"))
+        self.assertIn("example.com", self.trie)
+        self.assertNotIn("zone.example.org", self.trie)
+
+    def test_lookup_wildcard(self):
+        self.assertEqual(self.trie.lookup("www.example.com"), "2.2.2.2")
+        self.assertEqual(self.trie.lookup("mail.example.com"), "3.3.3.3")
+        self.assertEqual(self.trie.lookup("a.b.example.com"), "3.3.3.3")
+        self.assertEqual(self.trie.lookup("example.com"), "1.1.1.1")
+        # An existing name blocks the wildcards above it
+        self.assertIsNone(self.trie.lookup("a.www.example.com"))
+        self.assertIsNone(self.trie.lookup("example.net"))
+
+    def test_closest_encloser(self):
+        self.assertEqual(self.trie.closest_encloser("a.zone.example.org"), ("zone.example.org", None))
+        self.assertEqual(self.trie.closest_encloser("a.b.example.com"), ("example.com", "1.1.1.1"))
+        self.assertEqual(self.trie.closest_encloser("example.net"), ("", None))
+
+    def test_longest_match(self):
+        self.assertEqual(self.trie.longest_match("a.www.example.com"), ("www.example.com", "2.2.2.2"))
+        self.assertEqual(self.trie.longest_match("a.zone.example.org"), None)
+        self.assertEqual(self.trie.longest_match("host.zone.example.org"), ("host.zone.example.org", "4.4.4.4"))
+
+    def test_insert_overwrites(self):
+        self.trie.insert("www.example.com", "5.5.5.5")
+
+        self.assertEqual(self.trie.get("www.example.com"), "5.5.5.5")
+        self.assertEqual(len(self.trie), 4)
+
+    def test_remove_prunes_empty_nodes(self):
+        self.assertTrue(self.trie.remove("host.zone.example.org"))
+        self.assertFalse(self.trie.remove("host.zone.example.org"))
+        self.assertFalse(self.trie.remove("example.net"))
+
+        self.assertNotIn("org", self.trie.root)
+        self.assertEqual(len(self.trie), 3)
+        self.assertEqual(sorted(self.trie), ["*.example.com", "example.com", "www.example.com"])
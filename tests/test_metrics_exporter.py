@@ -0,0 +1,31 @@
+import unittest
+import urllib.error
+import urllib.request
+
+from src.dns_metrics import DNSMetrics
+from src.metrics_exporter import MetricsExporter
+from src.custom_types.response_code import ResponseCode
+
+
+class TestMetricsExporter(unittest.TestCase):
+    def setUp(self):
+        self.dns_metrics = DNSMetrics()
+        self.exporter = MetricsExporter(lambda: self.dns_metrics, address=("127.0.0.1", 0))
+        self.exporter.start()
+        host, port = self.exporter.http_server.server_address[:2]
+        self.base_url = f"http://{host}:{port}"
+
+    def tearDown(self):
+        self.exporter.close()
+
+    def test_serves_metrics(self):
+        self.dns_metrics.count_query(1, ResponseCode.NAME_ERROR)
+        with urllib.request.urlopen(self.base_url + "/metrics", timeout=2) as response:
+            self.assertTrue(response.headers["Content-Type"].startswith("text/plain"))
+            body = response.read().decode("utf-8")
+        self.assertIn('dns_queries_total{qtype="A",rcode="NXDOMAIN"} 1\n', body)
+
+    def test_other_paths_are_not_found(self):
+        with self.assertRaises(urllib.error.HTTPError) as context:
+            urllib.request.urlopen(self.base_url + "/", timeout=2)
+        self.assertEqual(context.exception.code, 404)
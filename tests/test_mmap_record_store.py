@@ -0,0 +1,105 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from src.dns_register import DNSRegister
+from src.domain_name_codec import DomainNameCodec
+from src.mmap_record_store import MmapRecordStore
+
+EXAMPLE_COM = b"\x07example\x03com\x00"
+EXAMPLE_NET = b"\x07example\x03net\x00"
+HTTPS_WWW_EXAMPLE_COM = b"\x08https\x03www\x07example\x03com\x00"
+
+
+class TestMmapRecordStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "records.db")
+        self.store = MmapRecordStore(self.path, capacity=8)
+
+    def tearDown(self):
+        self.store.close()
+        self.directory.cleanup()
+
+    def test_set_and_get(self):
+        self.store[EXAMPLE_COM] = "1.2.3.4"
+        self.store[HTTPS_WWW_EXAMPLE_COM] = "5.6.7.8"
+
+        self.assertEqual(self.store[EXAMPLE_COM], "1.2.3.4")
+        self.assertEqual(self.store.get(HTTPS_WWW_EXAMPLE_COM), "5.6.7.8")
+        self.assertIsNone(self.store.get(EXAMPLE_NET))
+        self.assertIn(EXAMPLE_COM, self.store)
+        self.assertNotIn(EXAMPLE_NET, self.store)
+        with self.assertRaises(KeyError):
+            _ = self.store[EXAMPLE_NET]
+        self.assertEqual(len(self.store), 2)
+        self.assertEqual(set(self.store), {EXAMPLE_COM, HTTPS_WWW_EXAMPLE_COM})
+
+    def test_overwrite_in_place(self):
+        self.store[EXAMPLE_COM] = "1.2.3.4"
+        self.store[EXAMPLE_COM] = "5.6.7.8"
+
+        self.assertEqual(self.store[EXAMPLE_COM], "5.6.7.8")
+        self.assertEqual(len(self.store), 1)
+
+    def test_records_persist_after_reopening(self):
+        self.store[EXAMPLE_COM] = "1.2.3.4"
+        self.store.flush()
+        self.store.close()
+
+        self.store = MmapRecordStore(self.path)
+        self.assertEqual(self.store.capacity, 8)
+        self.assertEqual(self.store[EXAMPLE_COM], "1.2.3.4")
+
+    def test_readers_share_the_mapping(self):
+        reader = MmapRecordStore(self.path)
+        try:
+            self.store[EXAMPLE_COM] = "1.2.3.4"
+            self.assertEqual(reader.get(EXAMPLE_COM), "1.2.3.4")
+            self.store[EXAMPLE_COM] = "5.6.7.8"
+            self.assertEqual(reader.get(EXAMPLE_COM), "5.6.7.8")
+        finally:
+            reader.close()
+
+    def test_full_store(self):
+        for index in range(8):
+            self.store[DomainNameCodec.encode(f"host{index}.example.com")] = f"10.0.0.{index}"
+        for index in range(8):
+            self.assertEqual(self.store[DomainNameCodec.encode(f"host{index}.example.com")], f"10.0.0.{index}")
+
+        with self.assertRaises(ValueError):
+            self.store[EXAMPLE_COM] = "1.2.3.4"
+        # Updating an existing record does not need a new slot
+        self.store[DomainNameCodec.encode("host0.example.com")] = "1.2.3.4"
+        self.assertEqual(self.store[DomainNameCodec.encode("host0.example.com")], "1.2.3.4")
+
+    def test_invalid_file(self):
+        invalid_path = os.path.join(self.directory.name, "invalid.db")
+        with open(invalid_path, "wb") as invalid_file:
+            invalid_file.write(b"not a record store" * 4)
+        with self.assertRaises(ValueError):
+            MmapRecordStore(invalid_path)
+
+    def test_wildcard_items(self):
+        wildcard_example_com = DomainNameCodec.encode("*.example.com")
+        wildcard_example_net = DomainNameCodec.encode("*.example.net")
+        self.store[wildcard_example_com] = "1.1.1.1"
+        self.store[EXAMPLE_COM] = "1.2.3.4"
+        self.store[wildcard_example_net] = "2.2.2.2"
+        self.store[wildcard_example_com] = "3.3.3.3"
+
+        self.assertEqual(list(self.store.wildcard_items()), [(wildcard_example_net, "2.2.2.2"),
+                                                              (wildcard_example_com, "3.3.3.3")])
+        self.store.close()
+        # The wildcard names of a reopened store are indexed without iterating its records
+        self.store = MmapRecordStore(self.path)
+        with patch.object(MmapRecordStore, "__iter__", side_effect=AssertionError):
+            register = DNSRegister(records=self.store)
+        self.assertEqual(register.wildcard_trie.lookup("www.example.com"), "3.3.3.3")
+        self.assertEqual(register.wildcard_trie.lookup("www.example.net"), "2.2.2.2")
+
+    def test_dns_register_with_store(self):
+        register = DNSRegister(records=self.store)
+        register.register_domain("Example.com", "1.2.3.4")
+        self.assertEqual(self.store[EXAMPLE_COM], "1.2.3.4")
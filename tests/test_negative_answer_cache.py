@@ -0,0 +1,61 @@
+import unittest
+from unittest.mock import patch
+
+from src.dns_query_resolver import DNSQueryResolver
+from src.dns_response_factory import DNSResponseFactory
+from src.negative_answer_cache import NegativeAnswerCache
+
+HEADER = b"\x12\x34\x01\x00\x00\x01\x00\x00\x00\x00\x00\x00"
+EXAMPLE_QUERY = HEADER + b"\x07unknown\x07example\x03com\x00\x00\x01\x00\x01"
+OTHER_QUERY = HEADER + b"\x05other\x07example\x03com\x00\x00\x01\x00\x01"
+THIRD_QUERY = HEADER + b"\x05third\x07example\x03net\x00\x00\x01\x00\x01"
+
+
+class TestNegativeAnswerCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = NegativeAnswerCache(max_entries=2, ttl=30)
+
+    def store(self, query_data: bytes) -> bytes:
+        dns_query = DNSQueryResolver().read_query(query_data)
+        response = DNSResponseFactory.generate_error_response(error_code=3, transaction_id=query_data[:2],
+                                                              question=dns_query.question)
+        self.cache.store(dns_query, response)
+        return response
+
+    def test_lookup_hit_patches_transaction_id(self):
+        self.assertIsNone(self.cache.lookup_query(EXAMPLE_QUERY))
+        response = self.store(EXAMPLE_QUERY)
+
+        self.assertEqual(self.cache.lookup_query(EXAMPLE_QUERY), response)
+        self.assertEqual(self.cache.lookup_query(b"\xab\xcd" + EXAMPLE_QUERY[2:]), b"\xab\xcd" + response[2:])
+
+    def test_entries_expire(self):
+        with patch("src.negative_answer_cache.time.monotonic", return_value=100.0):
+            self.store(EXAMPLE_QUERY)
+        with patch("src.negative_answer_cache.time.monotonic", return_value=129.0):
+            self.assertIsNotNone(self.cache.lookup_query(EXAMPLE_QUERY))
+        with patch("src.negative_answer_cache.time.monotonic", return_value=130.0):
+            self.assertIsNone(self.cache.lookup_query(EXAMPLE_QUERY))
+        self.assertEqual(len(self.cache.responses), 0)
+
+    def test_eviction_spares_entries_with_hits(self):
+        self.store(EXAMPLE_QUERY)
+        self.store(OTHER_QUERY)
+        self.cache.lookup_query(EXAMPLE_QUERY)
+
+        self.store(THIRD_QUERY)
+        self.assertIsNotNone(self.cache.lookup_query(EXAMPLE_QUERY))
+        self.assertIsNone(self.cache.lookup_query(OTHER_QUERY))
+        self.assertIsNotNone(self.cache.lookup_query(THIRD_QUERY))
+
+    def test_invalidate_on_registration(self):
+        self.store(EXAMPLE_QUERY)
+        self.store(THIRD_QUERY)
+
+        self.cache.invalidate("*.example.com", "1.2.3.4")
+        self.assertIsNone(self.cache.lookup_query(EXAMPLE_QUERY))
+        self.assertIsNotNone(self.cache.lookup_query(THIRD_QUERY))
+
+        self.cache.invalidate("third.example.net", "1.2.3.4")
+        self.assertIsNone(self.cache.lookup_query(THIRD_QUERY))
+        self.assertEqual(self.cache.questions_by_domain_name_key, {})
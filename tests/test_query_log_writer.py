@@ -0,0 +1,63 @@
+import os
+import tempfile
+import unittest
+
+from src.query_log_writer import QueryLogWriter, QUERY_MESSAGE, RESPONSE_MESSAGE
+
+
+class TestQueryLogWriter(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "queries.log")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_exchanges_are_written_on_close(self):
+        query_log = QueryLogWriter(self.path, flush_interval=60)
+        query_log.start()
+        query_log.log_exchange(b"QUERY", b"RESPONSE", ("127.0.0.1", 5353))
+        query_log.log_exchange(b"QUERY2", b"RESPONSE2", ("10.0.0.1", 53))
+        query_log.close()
+
+        records = list(QueryLogWriter.read_records(self.path))
+        self.assertEqual([record[1:] for record in records], [
+            (QUERY_MESSAGE, ("127.0.0.1", 5353), b"QUERY"),
+            (RESPONSE_MESSAGE, ("127.0.0.1", 5353), b"RESPONSE"),
+            (QUERY_MESSAGE, ("10.0.0.1", 53), b"QUERY2"),
+            (RESPONSE_MESSAGE, ("10.0.0.1", 53), b"RESPONSE2"),
+        ])
+
+    def test_full_batch_is_written_without_waiting(self):
+        query_log = QueryLogWriter(self.path, flush_interval=60, max_batch_entries=2)
+        query_log.start()
+        query_log.log_exchange(b"QUERY", b"RESPONSE", ("127.0.0.1", 5353))
+        query_log.log_exchange(b"QUERY2", b"RESPONSE2", ("127.0.0.1", 5353))
+        for _ in range(200):
+            if len(list(QueryLogWriter.read_records(self.path))) == 4:
+                break
+            query_log._thread.join(0.01)
+        self.assertEqual(len(list(QueryLogWriter.read_records(self.path))), 4)
+        query_log.close()
+
+    def test_records_are_dropped_when_writer_falls_behind(self):
+        query_log = QueryLogWriter(self.path, max_pending_entries=2)
+        # The writer thread is not started, so nothing is drained
+        query_log.log_exchange(b"QUERY", b"RESPONSE", ("127.0.0.1", 5353))
+        query_log.log_exchange(b"QUERY", b"RESPONSE", ("127.0.0.1", 5353))
+        query_log.log_exchange(b"QUERY", b"RESPONSE", ("127.0.0.1", 5353))
+        self.assertEqual(query_log.dropped_count, 1)
+
+    def test_appends_to_existing_log(self):
+        for _ in range(2):
+            query_log = QueryLogWriter(self.path)
+            query_log.start()
+            query_log.log_exchange(b"QUERY", b"RESPONSE", ("127.0.0.1", 5353))
+            query_log.close()
+        self.assertEqual(len(list(QueryLogWriter.read_records(self.path))), 4)
+
+    def test_read_records_rejects_other_files(self):
+        with open(self.path, "wb") as log_file:
+            log_file.write(b"NOTALOG!")
+        with self.assertRaises(ValueError):
+            list(QueryLogWriter.read_records(self.path))
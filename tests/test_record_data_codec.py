@@ -0,0 +1,42 @@
+import unittest
+
+from src.record_data_codec import RecordDataCodec
+from src.custom_types.dns_record_type import DNSRecordType
+
+
+class TestRecordDataCodec(unittest.TestCase):
+    def test_encode(self):
+        self.assertEqual(RecordDataCodec.encode(DNSRecordType(1), "192.0.2.1"), b"\xc0\x00\x02\x01")
+        self.assertEqual(RecordDataCodec.encode(DNSRecordType(28), "2001:db8::1"),
+                         b"\x20\x01\x0d\xb8" + bytes(11) + b"\x01")
+        self.assertEqual(RecordDataCodec.encode(DNSRecordType(5), "WWW.example.com."),
+                         b"\x03www\x07example\x03com\x00")
+        self.assertEqual(RecordDataCodec.encode(DNSRecordType(2), "ns1.example.com"),
+                         b"\x03ns1\x07example\x03com\x00")
+        self.assertEqual(RecordDataCodec.encode(DNSRecordType(15), "10 mail.example.com."),
+                         b"\x00\x0a\x04mail\x07example\x03com\x00")
+        self.assertEqual(RecordDataCodec.encode(DNSRecordType(33), "10 5 5060 sip.example.com."),
+                         b"\x00\x0a\x00\x05\x13\xc4\x03sip\x07example\x03com\x00")
+
+    def test_encode_character_strings(self):
+        self.assertEqual(RecordDataCodec.encode(DNSRecordType(16), '"v=spf1 -all"'), b"\x0bv=spf1 -all")
+        self.assertEqual(RecordDataCodec.encode(DNSRecordType(16), '"a \\"b\\"" "" ; comment'), b"\x05a \"b\"\x00")
+        self.assertEqual(RecordDataCodec.encode(DNSRecordType(16), "hello world"), b"\x05hello\x05world")
+        # Strings longer than 255 bytes are split
+        self.assertEqual(RecordDataCodec.encode(DNSRecordType(16), "a" * 300),
+                         b"\xff" + b"a" * 255 + b"\x2d" + b"a" * 45)
+
+    def test_encode_invalid_data(self):
+        invalid_records = [
+            (DNSRecordType(1), "1.2.3"),
+            (DNSRecordType(28), "1.2.3.4"),
+            (DNSRecordType(15), "mail.example.com"),
+            (DNSRecordType(15), "70000 mail.example.com"),
+            (DNSRecordType(33), "10 5 sip.example.com"),
+            (DNSRecordType(16), ""),
+            (DNSRecordType(6), "ns1.example.com. admin.example.com. 1 2 3 4 5"),
+        ]
+        for record_type, data in invalid_records:
+            with self.subTest(record_type=record_type, data=data):
+                with self.assertRaises(ValueError):
+                    RecordDataCodec.encode(record_type, data)
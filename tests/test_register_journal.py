@@ -0,0 +1,201 @@
+import errno
+import os
+import socket
+import struct
+import tempfile
+import threading
+import unittest
+import zlib
+from unittest.mock import MagicMock
+
+from src.dns_register import DNSRegister
+from src.domain_name_codec import DomainNameCodec
+from src.register_journal import RegisterJournal
+
+
+class TestRegisterJournal(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.dns_register = DNSRegister(records={})
+        self.journal = RegisterJournal(self.directory.name, self.dns_register, commit_interval=0.001)
+
+    def tearDown(self):
+        self.journal.close()
+        self.directory.cleanup()
+
+    def replay_into_new_register(self) -> DNSRegister:
+        dns_register = DNSRegister(records={})
+        RegisterJournal(self.directory.name, dns_register).replay()
+        return dns_register
+
+    def test_registrations_are_journaled(self):
+        self.journal.start()
+        self.dns_register.register_domain("example.com", "1.2.3.4")
+        self.dns_register.register_domain("www.example.com", "5.6.7.8")
+        self.dns_register.register_domain("example.com", "9.9.9.9")
+        self.journal.close()
+
+        dns_register = self.replay_into_new_register()
+        self.assertEqual(dns_register.records, {
+            DomainNameCodec.encode("example.com"): "9.9.9.9",
+            DomainNameCodec.encode("www.example.com"): "5.6.7.8",
+        })
+
+    def test_registrations_are_journaled_before_being_applied(self):
+        self.journal.start()
+        failing_append = self.journal.append
+
+        def append(domain_name: str, ip_address: str):
+            if domain_name == "www.example.com":
+                raise OSError("Journal unavailable.")
+            failing_append(domain_name, ip_address)
+
+        self.dns_register.write_ahead_listeners[0] = append
+        self.dns_register.register_domain("example.com", "1.2.3.4")
+        with self.assertRaises(OSError):
+            self.dns_register.register_domain("www.example.com", "5.6.7.8")
+        with self.assertRaises(ValueError):
+            self.dns_register.register_domain("example.com", "1.2.3.4.5")
+        self.dns_register.write_ahead_listeners[0] = failing_append
+        self.journal.close()
+
+        # Registrations that could not be journaled are not applied either
+        self.assertEqual(self.dns_register.records, {DomainNameCodec.encode("example.com"): "1.2.3.4"})
+        self.assertEqual(self.replay_into_new_register().records, self.dns_register.records)
+
+    def test_address_operations_are_journaled(self):
+        self.journal.start()
+        self.dns_register.register_domain("example.com", "1.2.3.4")
+        self.dns_register.add_address("example.com", "5.6.7.8", 3)
+        self.dns_register.add_address("www.example.com", "9.9.9.9")
+        self.dns_register.remove_address("example.com", "1.2.3.4")
+        self.journal.close()
+
+        dns_register = self.replay_into_new_register()
+        self.assertEqual(dns_register.address_sets[DomainNameCodec.encode("example.com")].weights, {"5.6.7.8": 3})
+        self.assertEqual(dns_register.address_sets[DomainNameCodec.encode("www.example.com")].weights, {"9.9.9.9": 1})
+
+    def test_when_durable_runs_after_commit(self):
+        self.journal.start()
+        durable = threading.Event()
+
+        self.dns_register.register_domain("example.com", "1.2.3.4")
+        self.journal.when_durable(durable.set)
+
+        self.assertTrue(durable.wait(timeout=2))
+        self.assertEqual(self.replay_into_new_register().records, {DomainNameCodec.encode("example.com"): "1.2.3.4"})
+
+    def test_when_durable_runs_immediately_without_pending_registrations(self):
+        self.journal.start()
+        durable = []
+        self.journal.when_durable(lambda: durable.append(True))
+        self.assertEqual(durable, [True])
+
+    def test_write_error_stops_registrations(self):
+        self.journal.start()
+        self.journal._journal_file.close()
+        write_allowed = threading.Event()
+
+        def write(data: bytes):
+            write_allowed.wait(timeout=2)
+            raise OSError(errno.ENOSPC, "No space left on device")
+
+        self.journal._journal_file = MagicMock()
+        self.journal._journal_file.write.side_effect = write
+        durable = []
+
+        with self.assertLogs("src.register_journal", level="ERROR") as logs:
+            self.dns_register.register_domain("example.com", "1.2.3.4")
+            self.journal.when_durable(lambda: durable.append("example.com"))
+            write_allowed.set()
+            self.journal._thread.join(timeout=2)
+        self.assertIn("No space left on device", logs.output[0])
+
+        # The response of the registration that is not durable is dropped, later registrations are refused
+        with self.assertRaises(OSError):
+            self.dns_register.register_domain("www.example.com", "5.6.7.8")
+        self.assertNotIn(DomainNameCodec.encode("www.example.com"), self.dns_register.records)
+        self.journal.when_durable(lambda: durable.append("www.example.com"))
+        self.assertEqual(durable, ["www.example.com"])
+
+    def test_snapshot_compacts_journal(self):
+        self.journal.snapshot_interval_entries = 3
+        self.journal.start()
+        durable = threading.Event()
+        for index in range(3):
+            self.dns_register.register_domain("example.com", f"10.0.0.{index}")
+        self.journal.when_durable(durable.set)
+        self.assertTrue(durable.wait(timeout=2))
+        # The snapshot is written by the thread applying the next registration, once it is applied
+        self.assertFalse(os.path.exists(self.journal.snapshot_path))
+        self.dns_register.register_domain("www.example.com", "5.6.7.8")
+        self.assertTrue(os.path.exists(self.journal.snapshot_path))
+        self.dns_register.add_address("api.example.com", "7.7.7.7")
+        self.journal.close()
+
+        # The registration pending when the snapshot was written may be journaled again after it
+        journaled_domain_names = [entry[0] for entry in self.journal.read_entries(self.journal.journal_path)]
+        self.assertIn(journaled_domain_names, (["api.example.com"], ["www.example.com", "api.example.com"]))
+        dns_register = self.replay_into_new_register()
+        self.assertEqual(dns_register.records, {
+            DomainNameCodec.encode("example.com"): "10.0.0.2",
+            DomainNameCodec.encode("www.example.com"): "5.6.7.8",
+        })
+        self.assertEqual(dns_register.address_sets[DomainNameCodec.encode("api.example.com")].weights, {"7.7.7.7": 1})
+
+    def test_snapshot_keeps_address_sets(self):
+        self.dns_register.load_records([("example.com", "1.2.3.4"), ("www.example.com", "5.6.7.8"),
+                                        ("api.example.com", "7.7.7.7")])
+        self.dns_register.add_address("example.com", "2.2.2.2", 2)
+        self.dns_register.add_address("example.com", "3.3.3.3", 5)
+        self.dns_register.remove_address("example.com", "1.2.3.4")
+        self.dns_register.remove_address("www.example.com", "5.6.7.8")
+        self.dns_register.add_address("mail.example.com", "4.4.4.4", 7)
+        self.journal.snapshot()
+
+        # Address sets are restored with their weights and rotations, and shadowed records stay shadowed
+        dns_register = self.replay_into_new_register()
+        self.assertEqual(dns_register.records, self.dns_register.records)
+        self.assertEqual(set(dns_register.address_sets), set(self.dns_register.address_sets))
+        for domain_name_key, address_set in self.dns_register.address_sets.items():
+            replayed_address_set = dns_register.address_sets[domain_name_key]
+            self.assertEqual(list(replayed_address_set.weights.items()), list(address_set.weights.items()))
+            self.assertEqual(replayed_address_set.rrsets, address_set.rrsets)
+
+    def test_legacy_journal_is_replayed_and_rewritten(self):
+        with open(self.journal.journal_path, "wb") as journal_file:
+            for domain_name, ip_address in (("example.com", "1.2.3.4"), ("www.example.com", "5.6.7.8")):
+                payload = domain_name.encode("utf-8") + socket.inet_aton(ip_address)
+                journal_file.write(struct.pack("!IB", zlib.crc32(payload), len(payload) - 4) + payload)
+
+        self.assertEqual(self.journal.replay(), 2)
+        self.journal.start()
+        self.dns_register.add_address("example.com", "9.9.9.9")
+        self.journal.close()
+
+        dns_register = self.replay_into_new_register()
+        self.assertEqual(dns_register.records, {
+            DomainNameCodec.encode("example.com"): "1.2.3.4",
+            DomainNameCodec.encode("www.example.com"): "5.6.7.8",
+        })
+        self.assertEqual(dns_register.address_sets[DomainNameCodec.encode("example.com")].weights,
+                         {"1.2.3.4": 1, "9.9.9.9": 1})
+
+    def test_incomplete_entry_is_dropped(self):
+        self.journal.start()
+        self.dns_register.register_domain("example.com", "1.2.3.4")
+        self.journal.close()
+        with open(self.journal.journal_path, "ab") as journal_file:
+            journal_file.write(RegisterJournal.encode_entry("www.example.com", "5.6.7.8")[:-2])
+
+        dns_register = DNSRegister(records={})
+        journal = RegisterJournal(self.directory.name, dns_register, commit_interval=0.001)
+        self.assertEqual(journal.replay(), 1)
+        journal.start()
+        dns_register.register_domain("api.example.com", "9.9.9.9")
+        journal.close()
+
+        self.assertEqual(self.replay_into_new_register().records, {
+            DomainNameCodec.encode("example.com"): "1.2.3.4",
+            DomainNameCodec.encode("api.example.com"): "9.9.9.9",
+        })
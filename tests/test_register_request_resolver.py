@@ -3,7 +3,9 @@ import unittest
 from src.register_request_resolver import RegisterRequestResolver
 from src.custom_types.dns_record_type import DNSRecordType
 from src.custom_types.error_types import FormatError
+from src.custom_types.register_operation import RegisterOperation
 from src.custom_types.register_request import RegisterRequest
+from src.custom_types.response_code import ResponseCode
 
 
 class TestRegisterRequestResolver(unittest.TestCase):
@@ -26,12 +28,46 @@ class TestRegisterRequestResolver(unittest.TestCase):
             transaction_id=b"\x00\x01",
             record_type=DNSRecordType(1),
             domain_name="example.com",
-            ip_address="129.1.0.1"
+            ip_address="129.1.0.1",
+            operation=RegisterOperation.REGISTER,
+            weight=1
         )
 
         request = self.resolver.read_request(request_data)
         self.assertEqual(request, expected_request)
 
+    def test_read_request_invalid_record_data_length(self):
+        # Record data is either an IPv4 address or an IPv4 address followed by an operation and a weight
+        request_data = b"\x00\x01\x00\x01\x0c\x07example\x03com\x00\x00\x05\x01\x02\x03\x04\x05"
+        self.assertEqual(self.resolver.parse_request(request_data), (ResponseCode.FORMAT_ERROR, None))
+
+    def test_parse_request_response_codes(self):
+        request_data = b"\x00\x01\x00\x01\x0c\x07example\x03com\x00\x00\x04\x81\x01\x00\x01"
+
+        response_code, request = self.resolver.parse_request(request_data)
+        self.assertEqual((response_code, request.domain_name), (ResponseCode.NO_ERROR, "example.com"))
+        # Truncated requests, unknown record types, labels overrunning the domain name or containing a dot, and
+        # unknown operations
+        for invalid_data in (request_data[:4], b"\x00\x01\x00\x63" + request_data[4:],
+                             request_data[:5] + b"\x09example\x03com\x00" + request_data[18:],
+                             request_data[:5] + b"\x07exa.ple\x03com\x00" + request_data[18:],
+                             request_data[:19] + b"\x06\x81\x01\x00\x01\x07\x01"):
+            with self.subTest(request_data=invalid_data):
+                self.assertEqual(self.resolver.parse_request(invalid_data), (ResponseCode.FORMAT_ERROR, None))
+
+    def test_read_request_address_operations(self):
+        request_prefix = b"\x00\x01\x00\x01\x0c\x07example\x03com\x00\x00\x06\x81\x01\x00\x01"
+
+        request = self.resolver.read_request(request_prefix + b"\x01\x03")
+        self.assertEqual((request.ip_address, request.operation, request.weight),
+                         ("129.1.0.1", RegisterOperation.ADD_ADDRESS, 3))
+        request = self.resolver.read_request(request_prefix + b"\x02\x00")
+        self.assertEqual((request.ip_address, request.operation), ("129.1.0.1", RegisterOperation.REMOVE_ADDRESS))
+        # Unknown operations and addresses added without weight are malformed
+        for operation_data in (b"\x03\x01", b"\x01\x00"):
+            with self.assertRaises(FormatError):
+                self.resolver.read_request(request_prefix + operation_data)
+
     def test_read_request_malformed_request(self):
         # Malformed register request data (record data length doesn't match actual length)
         request_data = b'\x01\x23\x01\x00\x0c\x07example\x03com\x00\x00\x03\x01\x02\x03\x04'
@@ -50,6 +86,12 @@ class TestRegisterRequestResolver(unittest.TestCase):
         with self.assertRaises(FormatError):
             self.resolver.read_request(request_data)
 
+    def test_read_request_label_too_long(self):
+        # Register request data with a 64 bytes label, which DNSRegister cannot encode
+        request_data = b"\x00\x01\x00\x01\x45\x40" + b"a" * 64 + b"\x03com\x00\x00\x04\x01\x02\x03\x04"
+        with self.assertRaises(FormatError):
+            self.resolver.read_request(request_data)
+
     def test_read_request_empty_ip_address(self):
         # Register request data with empty IP Address
         request_data = b'\x00\x01\x00\x01\x0c\x07example\x03com\x00\x00\x00'
@@ -0,0 +1,55 @@
+import os
+import signal
+import tempfile
+import threading
+import time
+import unittest
+
+from src.sampling_profiler import SamplingProfiler
+
+
+def busy_loop(stop: threading.Event):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+class TestSamplingProfiler(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.profiler = SamplingProfiler(self.directory.name, interval=0.001)
+        self.stop = threading.Event()
+        self.busy_thread = threading.Thread(target=busy_loop, args=(self.stop,), name="busy-thread")
+        self.busy_thread.start()
+
+    def tearDown(self):
+        self.stop.set()
+        self.busy_thread.join()
+        self.directory.cleanup()
+
+    def test_profile_is_written_as_collapsed_stacks(self):
+        self.assertTrue(self.profiler.start(0.2))
+        self.assertFalse(self.profiler.start(0.2))
+        path = self.profiler.wait(timeout=5)
+
+        self.assertEqual(os.path.dirname(path), self.directory.name)
+        with open(path) as collapsed_file:
+            lines = collapsed_file.read().splitlines()
+        busy_lines = [line for line in lines if line.startswith("busy-thread;")]
+        self.assertTrue(busy_lines)
+        stack, count = busy_lines[0].rsplit(" ", 1)
+        self.assertIn(";busy_loop (", stack)
+        self.assertGreater(int(count), 0)
+        self.assertFalse(any(line.startswith("sampling-profiler;") for line in lines))
+
+    @unittest.skipUnless(hasattr(signal, "SIGUSR1"), "SIGUSR1 is not available")
+    def test_signal_starts_profile(self):
+        previous_handler = signal.getsignal(signal.SIGUSR1)
+        try:
+            self.profiler.install_signal_handler(0.05)
+            os.kill(os.getpid(), signal.SIGUSR1)
+            deadline = time.monotonic() + 5
+            while self.profiler.wait(timeout=0.01) is None and time.monotonic() < deadline:
+                pass
+            self.assertIsNotNone(self.profiler.output_path)
+        finally:
+            signal.signal(signal.SIGUSR1, previous_handler)
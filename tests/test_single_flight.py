@@ -0,0 +1,68 @@
+import asyncio
+import unittest
+from typing import List
+
+from src.single_flight import SingleFlight
+
+QUERY = b"\x12\x34\x01\x00\x00\x01\x00\x00\x00\x00\x00\x00\x07example\x03com\x00\x00\x01\x00\x01"
+EDNS_QUERY = QUERY[:11] + b"\x01" + QUERY[12:] + b"\x00\x00\x29\x10\x00\x00\x00\x00\x00\x00\x00"
+ANSWER = b"\xc0\x0c\x00\x01\x00\x01\x00\x00\x01\x2c\x00\x04\x01\x02\x03\x04"
+
+
+class TestSingleFlight(unittest.TestCase):
+    def setUp(self):
+        self.single_flight = SingleFlight()
+        self.lookups = []  # type: List[bytes]
+
+    async def lookup(self, query_data: bytes) -> bytes:
+        self.lookups.append(query_data)
+        await asyncio.sleep(0.05)
+        return query_data[:2] + b"\x81\x80\x00\x01\x00\x01" + query_data[8:] + ANSWER
+
+    def test_coalesces_identical_questions(self):
+        queries = [
+            QUERY,
+            b"\xab\xcd" + QUERY[2:],
+            # DNS 0x20: the name is sent with a randomized letter case
+            b"\x56\x78" + QUERY[2:12] + b"\x07ExAmPlE\x03cOm" + QUERY[24:],
+        ]
+
+        async def resolve_all():
+            return await asyncio.gather(*[self.single_flight.resolve(query, self.lookup) for query in queries])
+
+        responses = asyncio.run(resolve_all())
+        self.assertEqual(self.lookups, [QUERY])
+        for query, response in zip(queries, responses):
+            self.assertEqual(response, query[:2] + b"\x81\x80\x00\x01\x00\x01" + query[8:] + ANSWER)
+        self.assertEqual(self.single_flight.in_flight, {})
+
+    def test_separates_different_questions(self):
+        queries = [
+            QUERY,
+            QUERY[:-3] + b"\x1c\x00\x01",
+            EDNS_QUERY,
+            # Only the UDP payload size differs
+            EDNS_QUERY[:-8] + b"\x04\xd0" + EDNS_QUERY[-6:],
+            # The DO flag is set
+            EDNS_QUERY[:-4] + b"\x80" + EDNS_QUERY[-3:],
+        ]
+
+        async def resolve_all():
+            return await asyncio.gather(*[self.single_flight.resolve(query, self.lookup) for query in queries])
+
+        responses = asyncio.run(resolve_all())
+        self.assertEqual(self.lookups, [QUERY, queries[1], EDNS_QUERY, queries[4]])
+        self.assertEqual(responses[3][-len(ANSWER):], ANSWER)
+
+    def test_cancelled_client_does_not_cancel_lookup(self):
+        async def resolve_all():
+            first = asyncio.ensure_future(self.single_flight.resolve(QUERY, self.lookup))
+            second = asyncio.ensure_future(self.single_flight.resolve(b"\xab\xcd" + QUERY[2:], self.lookup))
+            await asyncio.sleep(0.01)
+            first.cancel()
+            return await second
+
+        response = asyncio.run(resolve_all())
+        self.assertEqual(len(self.lookups), 1)
+        self.assertEqual(response[:2], b"\xab\xcd")
+
@@ -0,0 +1,71 @@
+import asyncio
+import socket
+import unittest
+from unittest.mock import patch
+
+from src.dns_register import DNSRegister
+from src.dns_query_resolver import DNSQueryResolver
+from src.dns_server import DNSServer
+from src.register_request_resolver import RegisterRequestResolver
+from src.tcp_dns_server import TCPDNSServer
+
+EXAMPLE_QUERY = b"\x12\x34\x01\x00\x00\x01\x00\x00\x00\x00\x00\x00\x08https\x03www\x06google\x03com\x00\x00\x01\x00\x01"
+
+
+def frame(message: bytes) -> bytes:
+    return len(message).to_bytes(2, "big") + message
+
+
+class TestTCPDNSServer(unittest.TestCase):
+    def setUp(self):
+        with patch.object(DNSServer, "create_dns_query_socket"), \
+                patch.object(DNSServer, "create_register_request_socket"):
+            self.dns_server = DNSServer(
+                dns_resolver=DNSQueryResolver(),
+                dns_register=DNSRegister(),
+                register_request_resolver=RegisterRequestResolver()
+            )
+
+    def run_with_server(self, exchange, idle_timeout: float = 10.0):
+        async def run():
+            tcp_dns_server = TCPDNSServer(self.dns_server, address=("127.0.0.1", 0), idle_timeout=idle_timeout)
+            await tcp_dns_server.start()
+            try:
+                reader, writer = await asyncio.open_connection(*tcp_dns_server.server.sockets[0].getsockname())
+                try:
+                    return await asyncio.wait_for(exchange(reader, writer), timeout=5)
+                finally:
+                    writer.close()
+            finally:
+                tcp_dns_server.close()
+
+        return asyncio.run(run())
+
+    def test_pipelined_queries_on_one_connection(self):
+        queries = [bytes((0, index)) + EXAMPLE_QUERY[2:] for index in range(3)]
+
+        async def exchange(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+            # Two queries in one write, the third one split across writes
+            writer.write(frame(queries[0]) + frame(queries[1]) + frame(queries[2])[:7])
+            await writer.drain()
+            await asyncio.sleep(0.05)
+            writer.write(frame(queries[2])[7:])
+            responses = []
+            for _ in queries:
+                length = int.from_bytes(await reader.readexactly(2), "big")
+                responses.append(await reader.readexactly(length))
+            return responses
+
+        responses = self.run_with_server(exchange)
+        self.assertEqual([response[:2] for response in responses], [query[:2] for query in queries])
+        for response in responses:
+            self.assertEqual(response[-4:], socket.inet_aton("172.217.1.110"))
+
+    def test_idle_connection_is_closed(self):
+        async def exchange(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+            writer.write(frame(EXAMPLE_QUERY))
+            length = int.from_bytes(await reader.readexactly(2), "big")
+            await reader.readexactly(length)
+            return await reader.read()
+
+        self.assertEqual(self.run_with_server(exchange, idle_timeout=0.1), b"")
@@ -0,0 +1,54 @@
+import unittest
+
+from src.weighted_address_set import WeightedAddressSet
+
+
+def a_record(rdata: bytes) -> bytes:
+    return b"\xc0\x0c\x00\x01\x00\x01\x00\x00\x00\x0e\x00\x04" + rdata
+
+
+class TestWeightedAddressSet(unittest.TestCase):
+    def test_rotates_answer_blocks(self):
+        address_set = WeightedAddressSet()
+        address_set.add("1.1.1.1")
+        address_set.add("2.2.2.2")
+        address_set.add("3.3.3.3")
+
+        first, second, third = (a_record(bytes((value,)) * 4) for value in (1, 2, 3))
+        self.assertEqual(address_set.answer_count, 3)
+        self.assertEqual([address_set.next_answer_block() for _ in range(4)],
+                         [first + second + third, second + third + first, third + first + second,
+                          first + second + third])
+        self.assertEqual(address_set.next_rrset().rdatas,
+                         (b"\x02\x02\x02\x02", b"\x03\x03\x03\x03", b"\x01\x01\x01\x01"))
+
+    def test_weighted_schedule(self):
+        address_set = WeightedAddressSet()
+        address_set.add("1.1.1.1", weight=4)
+        address_set.add("2.2.2.2", weight=2)
+        address_set.add("3.3.3.3", weight=2)
+
+        # Weights are divided by their greatest common divisor, and heavy addresses are interleaved
+        self.assertEqual(address_set.schedule, (0, 1, 2, 0))
+        address_set.add("1.1.1.1", weight=1)
+        self.assertEqual(sorted(address_set.schedule), [0, 1, 1, 2, 2])
+
+    def test_remove(self):
+        address_set = WeightedAddressSet()
+        address_set.add("1.1.1.1")
+        address_set.add("2.2.2.2", weight=3)
+
+        self.assertTrue(address_set.remove("1.1.1.1"))
+        self.assertFalse(address_set.remove("1.1.1.1"))
+        self.assertEqual(address_set.schedule, (0,))
+        self.assertEqual(address_set.next_answer_block(), a_record(b"\x02\x02\x02\x02"))
+        self.assertTrue(address_set.remove("2.2.2.2"))
+        self.assertEqual(address_set.answer_count, 0)
+        self.assertIsNone(address_set.next_rrset())
+
+    def test_add_invalid_address(self):
+        address_set = WeightedAddressSet()
+        for ip_address, weight in [("1.1.1.1", 0), ("1.1.1.1", 256), ("not an address", 1)]:
+            with self.assertRaises(ValueError):
+                address_set.add(ip_address, weight)
+        self.assertEqual(address_set.weights, {})
@@ -0,0 +1,96 @@
+import os
+import tempfile
+import unittest
+
+from src.dns_register import DNSRegister
+from src.domain_name_codec import DomainNameCodec
+from src.zone_loader import ZoneLoader
+from src.custom_types.dns_record_type import DNSRecordType
+from src.custom_types.resource_record_set import ResourceRecordSet
+
+ZONE_FILE = """$ORIGIN example.com.
+$TTL 3600
+@       IN  SOA ns1.example.com. admin.example.com. (
+                2024010101 ; serial
+                3600       ; refresh
+                900 )      ; retry
+@           IN  A     1.2.3.4
+www     300 IN  A     5.6.7.8 ; comment
+            IN  A     5.6.7.9
+mail        IN  MX    10 mail.example.com.
+            IN  AAAA  2001:db8::1
+alias   60  IN  CNAME www
+@           IN  TXT   "v=spf1 -all" ; comment
+api.example.org.  A   9.9.9.9
+bad         IN  A     not.an.ip.address
+bad         IN  AAAA  1.2.3.4
+bad..label  IN  A     1.2.3.4
+"""
+
+CSV_FILE = """domain_name,ip_address
+example.com,1.2.3.4
+# comment,1.1.1.1
+www.example.com., 5.6.7.8
+invalid.example.com,1.2.3
+%s.example.com,1.2.3.4
+""" % ("a" * 64)
+
+
+class TestZoneLoader(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.dns_register = DNSRegister(records={})
+        self.zone_loader = ZoneLoader(self.dns_register)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write_file(self, name: str, content: str) -> str:
+        path = os.path.join(self.directory.name, name)
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(content)
+        return path
+
+    def test_load_zone_file(self):
+        report = self.zone_loader.load(self.write_file("example.zone", ZONE_FILE))
+
+        self.assertEqual(self.dns_register.records, {
+            DomainNameCodec.encode("example.com"): "1.2.3.4",
+            DomainNameCodec.encode("www.example.com"): "5.6.7.9",
+            DomainNameCodec.encode("api.example.org"): "9.9.9.9",
+        })
+        mail_rrsets = self.dns_register.rrsets[DomainNameCodec.encode("mail.example.com")]
+        self.assertEqual(mail_rrsets[15], ResourceRecordSet(record_type=DNSRecordType(15), ttl=3600,
+                                                             rdatas=(b"\x00\x0a\x04mail\x07example\x03com\x00",)))
+        self.assertEqual(mail_rrsets[28].rdatas, (b"\x20\x01\x0d\xb8" + bytes(11) + b"\x01",))
+        alias_rrset = self.dns_register.rrsets[DomainNameCodec.encode("alias.example.com")][5]
+        self.assertEqual((alias_rrset.ttl, alias_rrset.rdatas), (60, (b"\x03www\x07example\x03com\x00",)))
+        txt_rrset = self.dns_register.rrsets[DomainNameCodec.encode("example.com")][16]
+        self.assertEqual(txt_rrset.rdatas, (b"\x0bv=spf1 -all",))
+        self.assertEqual(report.record_count, 8)
+        self.assertEqual(report.skipped_count, 7)
+        self.assertGreaterEqual(report.seconds, 0)
+
+    def test_load_csv_file(self):
+        report = self.zone_loader.load(self.write_file("example.csv", CSV_FILE))
+
+        self.assertEqual(self.dns_register.records, {
+            DomainNameCodec.encode("example.com"): "1.2.3.4",
+            DomainNameCodec.encode("www.example.com"): "5.6.7.8",
+        })
+        self.assertEqual(report.record_count, 2)
+        self.assertEqual(report.skipped_count, 4)
+
+    def test_load_notifies_register_listeners(self):
+        registrations = []
+        self.dns_register.add_register_listener(lambda domain_name, ip_address: registrations.append(domain_name))
+
+        self.zone_loader.load(self.write_file("example.txt", CSV_FILE), file_format="csv")
+
+        self.assertEqual(registrations, ["example.com", "www.example.com"])
+
+    def test_absolute_domain_name(self):
+        self.assertEqual(ZoneLoader.absolute_domain_name("@", "example.com"), "example.com")
+        self.assertEqual(ZoneLoader.absolute_domain_name("www", "example.com"), "www.example.com")
+        self.assertEqual(ZoneLoader.absolute_domain_name("www.example.org.", "example.com"), "www.example.org")
+        self.assertEqual(ZoneLoader.absolute_domain_name("www", ""), "www")